@@ -0,0 +1,79 @@
+'''
+    Measures the password verifications per second of each hasher of utils/hashing_utils.py at several cost settings,
+    on one thread (logins per second per core: a login is one verification) and on the password hashing pool
+    (--workers threads, default one per core), with the time of one verification and the memory it needs.
+    Use it to pick the costs in utils/auth_settings.py: the per-core figure times the cores given to the
+    Authentication service is the login rate it can sustain. Hashers whose package is not installed are skipped.
+
+    Run it from the Authentication_service directory:
+
+        python -m benchmarks.hashing_benchmark
+        python -m benchmarks.hashing_benchmark --seconds 5 --workers 8
+'''
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import hashing_utils
+from utils.hashing_utils import make_hasher
+
+PASSWORD = "correct horse battery staple"
+
+# (algorithm, cost parameters, memory per hash in bytes)
+COSTS = [
+    ("sha256", {}, 0),
+    ("scrypt", {"n": 2 ** 12, "r": 8, "p": 1}, 128 * 2 ** 12 * 8),
+    ("scrypt", {"n": 2 ** 14, "r": 8, "p": 1}, 128 * 2 ** 14 * 8),
+    ("scrypt", {"n": 2 ** 15, "r": 8, "p": 1}, 128 * 2 ** 15 * 8),
+    ("scrypt", {"n": 2 ** 16, "r": 8, "p": 1}, 128 * 2 ** 16 * 8),
+    ("argon2id", {"time_cost": 2, "memory_cost": 19456, "parallelism": 1}, 19456 * 1024),
+    ("argon2id", {"time_cost": 3, "memory_cost": 65536, "parallelism": 1}, 65536 * 1024),
+    ("argon2id", {"time_cost": 4, "memory_cost": 131072, "parallelism": 1}, 131072 * 1024),
+    ("bcrypt", {"rounds": 10}, 4096),
+    ("bcrypt", {"rounds": 12}, 4096),
+    ("bcrypt", {"rounds": 13}, 4096),
+]
+
+
+def verifications_per_second(hasher, encoded: str, seconds: float, workers: int) -> float:
+    def verify_for(deadline):
+        done = 0
+        while time.perf_counter() < deadline:
+            hasher.verify(PASSWORD, encoded)
+            done += 1
+        return done
+
+    started = time.perf_counter()
+    deadline = started + seconds
+    if workers == 1:
+        done = verify_for(deadline)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            done = sum(executor.map(verify_for, [deadline] * workers))
+    return done / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password hashing cost benchmark")
+    parser.add_argument("--seconds", type=float, default=2.0, help="measuring time per setting and mode")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="threads of the pooled run")
+    args = parser.parse_args()
+
+    print(f"cores={os.cpu_count()} workers={args.workers}")
+    for algorithm, costs, memory in COSTS:
+        label = algorithm + " " + ",".join(f"{key}={value}" for key, value in costs.items())
+        try:
+            hasher = hashing_utils.LegacySha256Hasher() if algorithm == "sha256" else make_hasher(algorithm, **costs)
+        except RuntimeError as error:
+            print(f"{label:<55} skipped: {error}")
+            continue
+        encoded = hasher.hash(PASSWORD)
+        per_core = verifications_per_second(hasher, encoded, args.seconds, 1)
+        pooled = verifications_per_second(hasher, encoded, args.seconds, args.workers)
+        print(f"{label:<55} latency={1000 / per_core:9.2f} ms  memory={memory / 2 ** 20:7.1f} MiB  "
+              f"per_core={per_core:10.1f} logins/s  pool={pooled:10.1f} logins/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@ from fastapi import FastAPI
 from controllers.auth_controller import router as auth_router
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from models.models import UserDirectory
+from services.user_directory import rebuild_user_directory
+from utils.db_utils import engine, SessionLocal, database
 
 app = FastAPI(
     title="Authentication Service",
@@ -31,6 +34,22 @@ we only store the relative path according to the static directory. For example:
 '''
 
 
+# Create the credential index if needed and bring it in line with the role tables
+@app.on_event("startup")
+def build_user_directory():
+    UserDirectory.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        rebuild_user_directory(db)
+    finally:
+        db.close()
+
+
+# Connection pool metrics: checkout wait times, timeouts and saturation of each engine
+@app.get("/db/stats")
+def db_stats():
+    return database.stats()
+
 # Register the authentication routes
 app.include_router(auth_router)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, CHAR, VARCHAR
+from sqlalchemy import Column, String, Integer, CHAR, VARCHAR, DateTime
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql.sqltypes import Text
 from sqlalchemy.sql.schema import ForeignKey
@@ -66,3 +66,20 @@ class Admin(Base):
     email = Column(VARCHAR(100), nullable=False, unique=True)
     password = Column(VARCHAR(255), nullable=False)
     phone_number = Column(VARCHAR(20), nullable=True)
+
+
+class UserDirectory(Base):
+    '''
+        One row per login email: the role table the account lives in, its id and its password hash, so that a login
+        is one primary key lookup instead of a probe of the four role tables. See services/user_directory.py.
+    '''
+    __tablename__ = "user_directory"
+
+    email = Column(VARCHAR(100), primary_key=True)
+    role = Column(VARCHAR(20), nullable=False)
+    user_id = Column(VARCHAR(36), nullable=False)
+    password = Column(VARCHAR(255), nullable=False)
+    name = Column(VARCHAR(50), nullable=True)
+    surname = Column(VARCHAR(50), nullable=True)
+    phone_number = Column(VARCHAR(20), nullable=True)
+    updated_at = Column(DateTime, nullable=False)
@@ -1,8 +1,14 @@
+import logging
 from sqlalchemy.orm import Session
 from models.models import Customer, ProductManager, SalesManager, Admin, Address
 from utils.jwt_utils import create_access_token, decode_access_token
-from utils.hashing_utils import hash_password, verify_password
+from utils.hashing_utils import hash_password_async, verify_and_update_async
+from services.user_directory import find_entry, put_entry, update_password
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+logger = logging.getLogger(__name__)
 
 
 class AuthService:
@@ -78,11 +84,14 @@ class AuthService:
         }
 
     # new version of login function
-    def login(request, db: Session):
+    @staticmethod
+    async def login(request, db: Session):
         '''
             Function to authenticate a user.
                 It queries the database for a user with the given email address and verifies the password.
                 If the user is found and the password is correct, the method generates an access token using the create_access_token function from the jwt_utils module.
+                A password stored with another algorithm or other costs than the configured ones (see utils/hashing_utils.py) is rehashed and saved.
+                The hashing runs on the password hashing threads and the queries on the threadpool, not on the event loop.
 
             Parameters:
                 request: LoginRequest - A pydantic model representing the user login request. 
@@ -93,35 +102,27 @@ class AuthService:
             Returns:    
                 dict: A dictionary containing the access token and token type.
         '''
-        user = None
-        role = None
+        # One primary key lookup in the credential index instead of a probe of the four role tables
+        user = await run_in_threadpool(find_entry, db, request.email)
 
-        # Check each table for a user match
-        user = db.query(Customer).filter(Customer.email == request.email).first()
-        if user:
-            role = "customer"
-        else:
-            user = db.query(ProductManager).filter(ProductManager.email == request.email).first()
-            if user:
-                role = "product_manager"
-            else:
-                user = db.query(SalesManager).filter(SalesManager.email == request.email).first()
-                if user:
-                    role = "sales_manager"
-                else:
-                    user = db.query(Admin).filter(Admin.email == request.email).first()
-                    if user:
-                        role = "admin"
-
-        # If user is not found in any role-based table
-        if not user or not verify_password(request.password, user.password):
+        # If the email has no account or the password does not match
+        valid, new_hash = await verify_and_update_async(request.password, user.password if user else None)
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid email or password"
             )
 
+        # Upgrade a legacy or outdated hash; the login succeeds even if it cannot be saved
+        if new_hash:
+            try:
+                await run_in_threadpool(update_password, db, user, new_hash)
+            except SQLAlchemyError:
+                db.rollback()
+                logger.exception("Could not rehash the password of %s", user.email)
+
         # Generate access token with email and role
-        access_token = create_access_token(data={"sub": user.email, "role": role})
+        access_token = create_access_token(data={"sub": user.email, "role": user.role})
         return {"access_token": access_token, "token_type": "bearer"}
 
     """
@@ -157,12 +158,13 @@ class AuthService:
     """
 
     @staticmethod
-    def register(request, db: Session):
+    async def register(request, db: Session):
         '''
             Function to register a new user.
                 It checks if the user already exists in the database and raises an exception if the user already exists.
                 If the user does not exist, the method hashes the password and creates a new Customer object with the user's details.
-                The new user is then added to the database and the database session is committed.
+                The new user is then added to the database together with its entry in the credential index (user_directory)
+                and the database session is committed.
 
             Parameters:
                 request: RegisterRequest - A pydantic model representing the user registration request. 
@@ -178,10 +180,10 @@ class AuthService:
                 dict: A dictionary containing the registration message and the user_id of the newly registered user
         '''
 
-        existing_user = db.query(Customer).filter(Customer.email == request.email).first()
-        if existing_user:
+        existing_user = await run_in_threadpool(find_entry, db, request.email)
+        if existing_user and existing_user.role == "customer":
             raise HTTPException(status_code=400, detail="Email already registered")
-        hashed_password = hash_password(request.password)
+        hashed_password = await hash_password_async(request.password)
         new_customer = Customer(
             name=request.name,
             middlename=request.middlename,
@@ -190,7 +192,19 @@ class AuthService:
             password=hashed_password,
             phone_number=request.phone_number
         )
+        return await run_in_threadpool(AuthService._save_customer, new_customer, db)
+
+    @staticmethod
+    def _save_customer(new_customer: Customer, db: Session):
+        # the customer and its entry in the credential index, in one transaction
         db.add(new_customer)
+        try:
+            db.flush()
+        except IntegrityError:
+            # a customer that is not in the index yet
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Email already registered")
+        put_entry(db, "customer", new_customer.user_id, new_customer)
         db.commit()
         db.refresh(new_customer)
         return {"message": "Registration successful!", "user_id": new_customer.user_id}
@@ -0,0 +1,128 @@
+'''
+    The credential index used by the login.
+
+    Accounts live in four role tables (customers, product_managers, sales_managers, admins) and the login used to
+    probe them one by one, up to four queries per attempt. user_directory holds one row per email with the role,
+    the id in the role table and the password hash, so a login is one primary key lookup, a failed one included.
+
+    The index is kept correct on the write side: the registration adds the entry in the same transaction as the new
+    customer, and a password rehash (update_password) replaces the hash of the account and of its entry together.
+    Managers and admins are created directly in the database; the index is rebuilt from the role tables at startup
+    (rebuild_user_directory), and after adding or changing such accounts by hand from the Authentication_service
+    directory with
+
+        python -m services.user_directory
+
+    When an email exists in several role tables, the first role in ROLE_TABLES wins, as in the previous login.
+'''
+
+import logging
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, cast, literal, select, union_all
+from sqlalchemy.orm import Session
+from models.models import Customer, ProductManager, SalesManager, Admin, UserDirectory
+
+logger = logging.getLogger(__name__)
+
+# (role, model, id column), in the order the login used to probe them
+ROLE_TABLES = (
+    ("customer", Customer, Customer.user_id),
+    ("product_manager", ProductManager, ProductManager.pm_id),
+    ("sales_manager", SalesManager, SalesManager.sm_id),
+    ("admin", Admin, Admin.admin_id),
+)
+
+
+def _accounts():
+    # every account of the role tables, in priority order
+    selects = []
+    for priority, (role, model, id_column) in enumerate(ROLE_TABLES):
+        selects.append(select(
+            literal(priority).label("priority"),
+            literal(role).label("role"),
+            cast(id_column, String).label("user_id"),
+            model.email.label("email"),
+            model.password.label("password"),
+            model.name.label("name"),
+            model.surname.label("surname"),
+            model.phone_number.label("phone_number"),
+        ))
+    accounts = union_all(*selects).subquery()
+    return select(accounts).order_by(accounts.c.priority)
+
+
+def _entry(row) -> UserDirectory:
+    return UserDirectory(email=row.email, role=row.role, user_id=row.user_id, password=row.password, name=row.name,
+                         surname=row.surname, phone_number=row.phone_number, updated_at=datetime.utcnow())
+
+
+def put_entry(db: Session, role: str, user_id, user) -> UserDirectory:
+    '''
+        Adds or replaces the entry of the given account in the session; the caller commits it with the account.
+    '''
+    return db.merge(UserDirectory(email=user.email, role=role, user_id=str(user_id), password=user.password,
+                                  name=user.name, surname=user.surname, phone_number=user.phone_number,
+                                  updated_at=datetime.utcnow()))
+
+
+def update_password(db: Session, entry: UserDirectory, password: str) -> bool:
+    '''
+        Replaces the password hash of the account and of its entry, unless it was changed since the entry was read.
+        Returns whether it was replaced.
+    '''
+    model = next(model for role, model, _ in ROLE_TABLES if role == entry.role)
+    updated = db.query(model).filter(model.email == entry.email, model.password == entry.password) \
+        .update({model.password: password}, synchronize_session=False)
+    if updated:
+        entry.password = password
+        entry.updated_at = datetime.utcnow()
+    db.commit()
+    return bool(updated)
+
+
+def find_entry(db: Session, email: str) -> Optional[UserDirectory]:
+    '''
+        The directory entry of the email, or None when it has no account. The index is trusted: it is kept in line
+        with the role tables by the writes of the accounts, and the login neither reads the role tables nor repairs it.
+    '''
+    return db.get(UserDirectory, email)
+
+
+def rebuild_user_directory(db: Session) -> int:
+    '''
+        Brings the directory in line with the role tables: adds missing emails, refreshes changed entries and removes
+        the emails that no longer have an account. Returns the number of entries changed.
+    '''
+    accounts = {}
+    for row in db.execute(_accounts()):
+        accounts.setdefault(row.email, row)
+
+    changed = 0
+    for entry in db.query(UserDirectory).all():
+        row = accounts.pop(entry.email, None)
+        if row is None:
+            db.delete(entry)
+            changed += 1
+        elif (entry.role, entry.user_id, entry.password, entry.name, entry.surname, entry.phone_number) != \
+                (row.role, row.user_id, row.password, row.name, row.surname, row.phone_number):
+            db.merge(_entry(row))
+            changed += 1
+    for row in accounts.values():
+        db.add(_entry(row))
+        changed += 1
+    db.commit()
+    logger.info("user_directory rebuilt, %d entries changed", changed)
+    return changed
+
+
+if __name__ == "__main__":
+    from utils.db_utils import SessionLocal, engine
+
+    logging.basicConfig(level=logging.INFO)
+    UserDirectory.__table__.create(bind=engine, checkfirst=True)
+    session = SessionLocal()
+    try:
+        rebuild_user_directory(session)
+    finally:
+        session.close()
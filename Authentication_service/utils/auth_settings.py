@@ -0,0 +1,34 @@
+from importlib.util import find_spec
+from pydantic import field_validator
+from pydantic_settings import BaseSettings
+
+# the package each optional password hasher needs
+HASHER_PACKAGES = {"scrypt": None, "argon2id": ("argon2", "argon2-cffi"), "bcrypt": ("bcrypt", "bcrypt")}
+
+class Settings(BaseSettings):
+    # password hashing (see utils/hashing_utils.py): scrypt, argon2id (needs argon2-cffi) or bcrypt (needs bcrypt)
+    password_hasher: str = "scrypt"
+    scrypt_n: int = 2 ** 14  # CPU/memory cost, a power of two; memory is 128 * n * r bytes per hash
+    scrypt_r: int = 8
+    scrypt_p: int = 1
+    argon2_time_cost: int = 3
+    argon2_memory_cost: int = 65536  # KiB
+    argon2_parallelism: int = 1
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 0  # threads hashing passwords; 0 means one per CPU core
+
+    @field_validator("password_hasher")
+    @classmethod
+    def hasher_installed(cls, value: str) -> str:
+        # the service refuses to start with a hasher it cannot run, rather than failing on the first login
+        if value not in HASHER_PACKAGES:
+            raise ValueError(f"unknown password hasher {value!r}, expected one of {', '.join(HASHER_PACKAGES)}")
+        package = HASHER_PACKAGES[value]
+        if package is not None and find_spec(package[0]) is None:
+            raise ValueError(f"password_hasher={value} needs the {package[1]} package (pip install {package[1]})")
+        return value
+
+    class Config:
+        env_file = ".env"
+
+settings = Settings()
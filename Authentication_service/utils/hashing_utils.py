@@ -1,9 +1,249 @@
+'''
+    Password hashing.
+
+    A hash is stored with its algorithm and cost parameters, so the algorithm or its cost can be changed in the
+    settings (utils/auth_settings.py) without invalidating the stored passwords: every hasher verifies its own
+    hashes, and a hash made by another algorithm or with other parameters than the configured ones is reported by
+    needs_rehash, so the login replaces it after a successful verification. The unsalted SHA-256 hex digests of the
+    first version are verified by LegacySha256Hasher and always rehashed.
+
+    Hashers:
+        scrypt    hashlib.scrypt, no dependency (default)      scrypt$<n>$<r>$<p>$<salt>$<hash>
+        argon2id  needs argon2-cffi                            $argon2id$v=19$m=...,t=...,p=...$<salt>$<hash>
+        bcrypt    needs bcrypt, uses the first 72 bytes         $2b$<rounds>$<salt+hash>
+
+    argon2-cffi and bcrypt are optional: the settings refuse to load when the configured hasher's package is not
+    installed, so the service fails at startup with the package to install.
+
+    The key derivation is CPU-heavy on purpose. The async variants run it on a pool of password_hash_workers threads
+    (hashlib.scrypt, argon2-cffi and bcrypt release the GIL while hashing), so the event loop is not blocked and the
+    number of concurrent hashes, which bounds the CPU and memory used by logins, is fixed.
+'''
+
+import asyncio
+import base64
 import hashlib
+import hmac
+import os
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from utils.auth_settings import settings
+
+try:
+    import argon2
+except ImportError:  # optional
+    argon2 = None
+
+try:
+    import bcrypt
+except ImportError:  # optional
+    bcrypt = None
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4), validate=True)
+
+
+class Hasher:
+    name = None
+
+    def hash(self, password: str) -> str:
+        raise NotImplementedError
+
+    def verify(self, password: str, encoded: str) -> bool:
+        raise NotImplementedError
+
+    def identifies(self, encoded: str) -> bool:
+        raise NotImplementedError
+
+    def needs_rehash(self, encoded: str) -> bool:
+        '''Whether a hash of this algorithm was made with other parameters than the configured ones.'''
+        return False
+
+
+class LegacySha256Hasher(Hasher):
+    name = "sha256"
+
+    def hash(self, password: str) -> str:
+        return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+    def verify(self, password: str, encoded: str) -> bool:
+        return hmac.compare_digest(self.hash(password), encoded)
+
+    def identifies(self, encoded: str) -> bool:
+        return len(encoded) == 64 and all(c in "0123456789abcdef" for c in encoded)
+
+
+class ScryptHasher(Hasher):
+    name = "scrypt"
+
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1, salt_size: int = 16, key_size: int = 32):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.salt_size = salt_size
+        self.key_size = key_size
+
+    def _derive(self, password: str, salt: bytes, n: int, r: int, p: int, key_size: int) -> bytes:
+        return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=key_size,
+                              maxmem=256 * n * r * p + 1024 * 1024)
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(self.salt_size)
+        key = self._derive(password, salt, self.n, self.r, self.p, self.key_size)
+        return f"scrypt${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def _parse(self, encoded: str):
+        _, n, r, p, salt, key = encoded.split("$")
+        key = _b64decode(key)
+        if len(key) < 16:  # a truncated hash
+            raise ValueError("scrypt key too short")
+        return int(n), int(r), int(p), _b64decode(salt), key
+
+    def verify(self, password: str, encoded: str) -> bool:
+        try:
+            n, r, p, salt, key = self._parse(encoded)
+            return hmac.compare_digest(self._derive(password, salt, n, r, p, len(key)), key)
+        except ValueError:  # a malformed hash, or costs scrypt rejects
+            return False
 
-# Hashes the given password using SHA-256
+    def identifies(self, encoded: str) -> bool:
+        return encoded.startswith("scrypt$")
+
+    def needs_rehash(self, encoded: str) -> bool:
+        n, r, p, _, key = self._parse(encoded)
+        return (n, r, p, len(key)) != (self.n, self.r, self.p, self.key_size)
+
+
+class Argon2Hasher(Hasher):
+    name = "argon2id"
+
+    def __init__(self, time_cost: int = 3, memory_cost: int = 65536, parallelism: int = 1):
+        if argon2 is None:
+            raise RuntimeError("password_hasher=argon2id needs the argon2-cffi package")
+        self._hasher = argon2.PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism,
+                                             type=argon2.Type.ID)
+
+    def hash(self, password: str) -> str:
+        return self._hasher.hash(password)
+
+    def verify(self, password: str, encoded: str) -> bool:
+        try:
+            return self._hasher.verify(encoded, password)
+        except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHashError):
+            return False
+
+    def identifies(self, encoded: str) -> bool:
+        return encoded.startswith("$argon2")
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return self._hasher.check_needs_rehash(encoded)
+
+
+class BcryptHasher(Hasher):
+    name = "bcrypt"
+
+    def __init__(self, rounds: int = 12):
+        if bcrypt is None:
+            raise RuntimeError("password_hasher=bcrypt needs the bcrypt package")
+        self.rounds = rounds
+
+    @staticmethod
+    def _secret(password: str) -> bytes:
+        # bcrypt only uses the first 72 bytes
+        return password.encode("utf-8")[:72]
+
+    def hash(self, password: str) -> str:
+        return bcrypt.hashpw(self._secret(password), bcrypt.gensalt(rounds=self.rounds)).decode("ascii")
+
+    def verify(self, password: str, encoded: str) -> bool:
+        try:
+            return bcrypt.checkpw(self._secret(password), encoded.encode("ascii"))
+        except ValueError:  # a malformed hash
+            return False
+
+    def identifies(self, encoded: str) -> bool:
+        return encoded.startswith(("$2a$", "$2b$", "$2y$"))
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return int(encoded.split("$")[2]) != self.rounds
+
+
+def make_hasher(name: str, **costs) -> Hasher:
+    '''
+        The hasher of the given algorithm, with the cost parameters of the settings unless given.
+    '''
+    if name == "scrypt":
+        return ScryptHasher(n=costs.get("n", settings.scrypt_n), r=costs.get("r", settings.scrypt_r),
+                            p=costs.get("p", settings.scrypt_p))
+    if name == "argon2id":
+        return Argon2Hasher(time_cost=costs.get("time_cost", settings.argon2_time_cost),
+                            memory_cost=costs.get("memory_cost", settings.argon2_memory_cost),
+                            parallelism=costs.get("parallelism", settings.argon2_parallelism))
+    if name == "bcrypt":
+        return BcryptHasher(rounds=costs.get("rounds", settings.bcrypt_rounds))
+    raise ValueError(f"Unknown password hasher: {name}")
+
+
+# the hasher of new passwords
+hasher = make_hasher(settings.password_hasher)
+_legacy = LegacySha256Hasher()
+_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers or os.cpu_count() or 1,
+                               thread_name_prefix="password-hash")
+
+
+def _identify(encoded: str) -> Optional[Hasher]:
+    # the configured hasher, or the one that made a hash of another algorithm (its costs are read from the hash)
+    if hasher.identifies(encoded):
+        return hasher
+    if _legacy.identifies(encoded):
+        return _legacy
+    if encoded.startswith("scrypt$"):
+        return ScryptHasher()
+    if encoded.startswith("$argon2") and argon2 is not None:
+        return Argon2Hasher()
+    if encoded.startswith("$2") and bcrypt is not None:
+        return BcryptHasher()
+    return None
+
+
+# Hashes the given password with the configured hasher
 def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode('utf-8')).hexdigest()
+    return hasher.hash(password)
 
-# Verifies the given plain password against the hashed password
+# Verifies the given plain password against the hashed password
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return hash_password(plain_password) == hashed_password
+    return verify_and_update(plain_password, hashed_password)[0]
+
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    return hasher.hash("dummy password")
+
+def verify_and_update(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    '''
+        Verifies the password and, when it matches a hash of another algorithm or with other costs than the
+        configured ones, also returns its new hash (None otherwise).
+        Without a hash (an unknown email) it hashes anyway, so the response time does not tell that the email is unknown.
+    '''
+    if hashed_password is None:
+        hasher.verify(plain_password, _dummy_hash())
+        return False, None
+    stored = _identify(hashed_password)
+    if stored is None or not stored.verify(plain_password, hashed_password):
+        return False, None
+    if stored is not hasher or hasher.needs_rehash(hashed_password):
+        return True, hasher.hash(plain_password)
+    return True, None
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password, password)
+
+async def verify_and_update_async(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    return await asyncio.get_running_loop().run_in_executor(_executor, verify_and_update, plain_password,
+                                                            hashed_password)
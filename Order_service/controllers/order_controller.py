@@ -1,7 +1,7 @@
 import os
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from models.models import (
     OrderCreateSchema,
     OrderResponseSchema,
@@ -10,6 +10,9 @@ from models.models import (
     Delivery
 )
 from services.order_service import OrderService
+from services.order_outbox import get_order_jobs as get_order_jobs_service
+from services.stock_reservation import StockReservationError
+from services.pagination import MAX_PAGE_SIZE
 from utils.db_utils import get_db
 from utils.authentication_utils import verify_user_role, oauth2_scheme
 from fastapi.security import OAuth2PasswordBearer
@@ -102,7 +105,7 @@ output is sth like:
 }
 """
 @router.post("/create", response_model=OrderResponseSchema, dependencies=[Depends(verify_user_role)])
-async def create_order(order: OrderCreateSchema, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def create_order(order: OrderCreateSchema, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     try:
         # for debugging: print(order)
         # Create the order
@@ -145,6 +148,9 @@ async def create_order(order: OrderCreateSchema, db: Session = Depends(get_db),
                 for item in new_order.order_items
             ]
         )
+    except StockReservationError as e:
+        # one entry per order line that could not be reserved
+        raise HTTPException(status_code=400, detail={"message": str(e), "items": e.failures})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -180,7 +186,7 @@ output is the order with the given order_id in the following format:
 }
 """
 @router.get("/{order_id}", response_model=OrderResponseSchema, dependencies=[Depends(verify_user_role)])
-async def get_order(order_id: str, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def get_order(order_id: str, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     order = OrderService.get_order(order_id, db)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -217,8 +223,9 @@ async def get_order(order_id: str, db: Session = Depends(get_db), token: str = D
 
 
 """
-Returns all orders for a given customer.
-input is customer_id
+Returns the orders of a given customer, newest first.
+input is customer_id, optionally limit (page size) and cursor (the X-Next-Cursor header of the previous page;
+the header is only set when there is a next page)
 
 output is a list of orders in the following format:
 [
@@ -251,57 +258,85 @@ output is a list of orders in the following format:
 ]
 """
 @router.get("/customer/{customer_id}", response_model=List[OrderResponseSchema], dependencies=[Depends(verify_user_role)])
-async def list_orders_for_customer(customer_id: str, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def list_orders_for_customer(
+    customer_id: str,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size, every order when omitted"),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+):
     try:
-        orders = OrderService.list_orders_for_customer(customer_id, db)
-
-        orders_in_correct_format = []
+        # newest first; items, delivery and address come from the same eager-loaded read
+        orders, next_cursor = OrderService.list_order_history(customer_id, db, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if not orders:
-            raise HTTPException(status_code=404, detail="No orders found for the customer")
+    if not orders and cursor is None:
+        raise HTTPException(status_code=404, detail="No orders found for the customer")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    orders_in_correct_format = []
+    for order in orders:
+        # for the previously added order with no delivery and address, return None for the address fields
+        delivery = order.delivery[0] if order.delivery else None
+        address = delivery.address if delivery else None
+
+        orders_in_correct_format.append(OrderResponseSchema(
+            order_id=order.order_id,
+            customer_id=order.customer_id,
+            total_price=order.total_price,
+            order_date=order.order_date.strftime("%Y-%m-%d %H:%M:%S"),
+            order_address = address.address if address else None,
+            order_address_type= address.type if address else None,
+            order_address_name= address.name if address else None,
+            payment_status=order.payment_status,
+            invoice_link=order.invoice_link,
+            order_status=order.order_status,
+            items=[
+                {
+                    "product_id": item.product_id,
+                    "quantity": item.quantity,
+                    "price": item.price_at_purchase,
+                }
+                for item in order.order_items
+            ]
+        ))
 
-        for order in orders:
+    return orders_in_correct_format
 
-            # find the related delivery object using the order_id column in the delivery table
-            delivery = db.query(Delivery).filter(Delivery.order_id == order.order_id).first()
+"""
+input is order_id
+output is the state of the background jobs of the order (invoice rendering and invoice email):
+{
+    "order_id": "o1",
+    "invoice_link": "/.../invoices/INV-o1.pdf",   -> null until the invoice is rendered
+    "jobs": [
+        {
+            "outbox_id": "j1",
+            "job_type": "invoice",
+            "status": "done",                      -> pending, processing, done or failed
+            "attempts": 1,
+            "max_attempts": 5,
+            "next_attempt_at": null,               -> time of the next retry while pending
+            "last_error": null,
+            "created_at": "2021-10-10 00:00:00",
+            "updated_at": "2021-10-10 00:00:01"
+        },
+        ...
+    ]
+}
+"""
+@router.get("/{order_id}/jobs", response_model=dict, dependencies=[Depends(verify_user_role)])
+def get_order_jobs(order_id: str, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    order = OrderService.get_order(order_id, db)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return {"order_id": order.order_id, "invoice_link": order.invoice_link, "jobs": get_order_jobs_service(order_id, db)}
 
-            #if not delivery:
-                #raise HTTPException(status_code=404, detail="Delivery not found for the order with the id: " + order.order_id)
-            
-            address = None
-            # for the previously added order with no delivery and address, return None for the address fields
-            if not delivery:
-                address = None
-            else:
-                # find the related address object using the addres_id column in the delivery table
-                address = db.query(Address).filter(Address.customer_adres_id == delivery.addres_id).first()
-
-            current_order_in_correct_format = OrderResponseSchema(
-                order_id=order.order_id,
-                customer_id=order.customer_id,
-                total_price=order.total_price,
-                order_date=order.order_date.strftime("%Y-%m-%d %H:%M:%S"),
-                order_address = address.address if address else None,
-                order_address_type= address.type if address else None,
-                order_address_name= address.name if address else None,
-                payment_status=order.payment_status,
-                invoice_link=order.invoice_link,
-                order_status=order.order_status,
-                items=[
-                    {
-                        "product_id": item.product_id,
-                        "quantity": item.quantity,
-                        "price": item.price_at_purchase,
-                    }
-                    for item in order.order_items
-                ]
-            )
-            orders_in_correct_format.append(current_order_in_correct_format)
-        
-        return orders_in_correct_format
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
 
 """
 input is sth like:
@@ -316,7 +351,7 @@ output is sth like:
 }
 """
 @router.patch("/{order_id}/status", response_model=dict, dependencies=[Depends(verify_user_role)])
-async def update_order_status(order_id: str, status_update: OrderStatusUpdateSchema, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def update_order_status(order_id: str, status_update: OrderStatusUpdateSchema, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     try:
         updated_status = OrderService.update_order_status(order_id, status_update.status, db)
         if not updated_status:
@@ -338,7 +373,7 @@ input url: api/orders/invoice/ORDER_ID
 output is the invoice PDF file for the given order ID.
 """
 @router.get("/invoice/{order_id}", response_class=FileResponse)
-async def get_invoice(order_id: str, db: Session = Depends(get_db)):
+def get_invoice(order_id: str, db: Session = Depends(get_db)):
     """
     Serve the invoice PDF for the given order ID.
     """
@@ -1,7 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from utils.db_utils import get_db
-from utils.authentication_utils import verify_user_role, oauth2_scheme
+from utils.authentication_utils import verify_user_role, Principal
 from utils.order_settings import settings
 from schemas.refund_cancel_schemas import RefundRequestSchema, RefundResponseSchema, CancelRequestSchema, CancelResponseSchema, RefundSchema, StatusSchema
 from services.refund_cancel_service import refund_products, cancel_order_service, get_refund_status
@@ -11,7 +11,7 @@ router = APIRouter()
 
 
 @router.post('/refund', dependencies=[Depends(verify_user_role)])
-async def refund_product(refund_request: RefundRequestSchema, db=Depends(get_db), token: str = Depends(oauth2_scheme)):
+def refund_product(refund_request: RefundRequestSchema, db=Depends(get_db), user: Principal = Depends(verify_user_role)):
     """
     Refunds products based on the provided refund request.
 
@@ -24,7 +24,7 @@ async def refund_product(refund_request: RefundRequestSchema, db=Depends(get_db)
                 reason, Optional[str]
             }
         db (Session, optional): The database session dependency. Defaults to Depends(get_db).
-        token (str, optional): The OAuth2 token dependency. Defaults to Depends(oauth2_scheme).
+        user (Principal): The customer of the token, resolved by verify_user_role.
 
     Returns:
         RefundResponseSchema: The schema containing the details of the refund response.
@@ -44,7 +44,7 @@ async def refund_product(refund_request: RefundRequestSchema, db=Depends(get_db)
 
     """
     try:
-        result = refund_products(refund_request, db, token)
+        result = refund_products(refund_request, db, user)
     except ValueError as e:
         raise HTTPException(status_code = 400 , detail=f"{str(e)}")
     else:
@@ -57,14 +57,14 @@ async def refund_product(refund_request: RefundRequestSchema, db=Depends(get_db)
     
 
 @router.get('/refund-status/{order_id}/{product_id}', response_model= RefundSchema, dependencies=[Depends(verify_user_role)])
-async def refund_status(order_id:str, product_id:str, db=Depends(get_db), token: str = Depends(oauth2_scheme)):
+def refund_status(order_id:str, product_id:str, db=Depends(get_db), user: Principal = Depends(verify_user_role)):
     """
     Retrieves the refund status of a specific order.
 
     Args:
         order_id (str): The ID of the order to retrieve the refund status for.
         db (Session, optional): The database session dependency. Defaults to Depends(get_db).
-        token (str, optional): The OAuth2 token dependency. Defaults to Depends(oauth2_scheme).
+        user (Principal): The customer of the token, resolved by verify_user_role.
 
     Returns:
         RefundResponseSchema: The schema containing the details of the refund response.
@@ -80,7 +80,7 @@ async def refund_status(order_id:str, product_id:str, db=Depends(get_db), token:
                         refund_amount, float
                     }
     """
-    refunds = get_refund_status(order_id, product_id, db, token)
+    refunds = get_refund_status(order_id, product_id, db, user)
 
     if not refunds:
         raise HTTPException(status_code=404, detail="Refund not found")
@@ -90,7 +90,7 @@ async def refund_status(order_id:str, product_id:str, db=Depends(get_db), token:
 
 
 @router.post('/cancel', response_model = CancelResponseSchema, dependencies=[Depends(verify_user_role)])
-async def cancel_order(cancel_request: CancelRequestSchema, db=Depends(get_db), token: str = Depends(oauth2_scheme)):
+def cancel_order(cancel_request: CancelRequestSchema, db=Depends(get_db), user: Principal = Depends(verify_user_role)):
     """
     Cancels an order based on the provided order ID and cancel request.
 
@@ -102,7 +102,7 @@ async def cancel_order(cancel_request: CancelRequestSchema, db=Depends(get_db),
                     reason, Optional[str]
                 }
         db (Session, optional): The database session dependency. Defaults to Depends(get_db).
-        token (str, optional): The OAuth2 token dependency. Defaults to Depends(oauth2_scheme).
+        user (Principal): The customer of the token, resolved by verify_user_role.
 
     Returns:
         CancelResponseSchema: The schema containing the details of the cancel response.
@@ -114,7 +114,7 @@ async def cancel_order(cancel_request: CancelRequestSchema, db=Depends(get_db),
                 }
     """
     
-    result = cancel_order_service(cancel_request, db, token)
+    result = cancel_order_service(cancel_request, db, user)
 
     return result
 
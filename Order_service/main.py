@@ -3,7 +3,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from controllers.order_controller import router as order_router
 from controllers.refund_cancel_controller import router as refund_cancel_router
-from utils.db_utils import engine, Base
+from utils.db_utils import engine, Base, database
+from models.models import OrderOutbox
+from services.order_outbox import outbox_worker
+from services.mail_transport import get_mail_transport, reset_mail_transport
 import uvicorn
 
 # Initialize the app
@@ -21,6 +24,27 @@ app.add_middleware(
 # Initialize database (create tables if they don't exist)
 Base.metadata.create_all(bind=engine)
 
+# Background jobs of the orders (invoice rendering and email delivery)
+@app.on_event("startup")
+def start_outbox_worker():
+    OrderOutbox.__table__.create(bind=engine, checkfirst=True)
+    outbox_worker.start()
+
+@app.on_event("shutdown")
+def stop_outbox_worker():
+    outbox_worker.stop()
+    reset_mail_transport()
+
+# Send counters, send rate and latency of the pooled SMTP connections
+@app.get("/mail/stats")
+def mail_stats():
+    return get_mail_transport().stats()
+
+# Connection pool metrics: checkout wait times, timeouts and saturation of each engine
+@app.get("/db/stats")
+def db_stats():
+    return database.stats()
+
 # Include routers
 app.include_router(order_router, prefix="/api/orders", tags=["Orders"])
 app.include_router(refund_cancel_router, tags=["Refund/Cancel"])
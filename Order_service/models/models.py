@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, String, Integer, ForeignKey, Text,
-    DECIMAL, DateTime, CHAR, VARCHAR
+    DECIMAL, DateTime, Date, CHAR, VARCHAR, Index, BigInteger, UniqueConstraint
 )
 from sqlalchemy.orm import relationship, declarative_base
 from uuid import uuid4
@@ -69,6 +69,7 @@ class OrderItem(Base):
     order_id = Column(CHAR(36), ForeignKey('orders.order_id', ondelete="CASCADE"), nullable=True)
     price_at_purchase = Column(DECIMAL(10, 2), nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
+    unit_cost = Column(DECIMAL(10, 2), nullable=True)  # products.cost when ordered, NULL for the older lines
 
     # Relationships
     order = relationship("Order", back_populates="order_items")
@@ -90,6 +91,7 @@ class Product(Base):
     distributor = Column(VARCHAR(100), nullable=True)
     image_url = Column(VARCHAR(255), nullable=True)
     price = Column(DECIMAL(10, 2), nullable=False, default=0.00)
+    cost = Column(DECIMAL(10, 2), nullable=False, default=0.00)
     item_sold = Column(Integer, nullable=False, default=0)
 
     # Relationships
@@ -193,6 +195,7 @@ class Refund(Base):
     request_date = Column(DateTime, nullable=False, default=datetime.utcnow)
     status = Column(String(50), nullable=False)
     refund_amount = Column(DECIMAL(10, 2), nullable=False)
+    approved_at = Column(DateTime, nullable=True)  # set when the refund is approved
     #sm_id = Column(CHAR(36), ForeignKey('sales_managers.sm_id'))
 
     # Relationships
@@ -215,6 +218,103 @@ class Delivery(Base):
     address = relationship("Address", back_populates="delivery")
 
 
+# Cache Version Table (a counter per cached data set, bumped when the data changes so that the caches reload it)
+class CacheVersion(Base):
+    __tablename__ = 'cache_version'
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Order Outbox Table (background jobs of an order, written in the same transaction as the order itself)
+class OrderOutbox(Base):
+    __tablename__ = 'order_outbox'
+    __table_args__ = (Index('ix_order_outbox_status_next_attempt', 'status', 'next_attempt_at'),)
+
+    outbox_id = Column(CHAR(36), primary_key=True, default=lambda: str(uuid4()))
+    order_id = Column(CHAR(36), ForeignKey('orders.order_id', ondelete="CASCADE"), nullable=False, index=True)
+    job_type = Column(VARCHAR(50), nullable=False)  # invoice, invoice_email
+    status = Column(VARCHAR(20), nullable=False, default="pending")  # pending, processing, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)  # lease of the worker processing the job
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Inventory Movement Table (append-only ledger of the stock changes, written in the transaction of each change)
+class InventoryMovement(Base):
+    __tablename__ = 'inventory_movement'
+    __table_args__ = (Index('ix_inventory_movement_product_created', 'product_id', 'created_at'),)
+
+    # an increasing key keeps the appends at the end of the table (SQLite only autoincrements an INTEGER key)
+    movement_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    product_id = Column(CHAR(36), nullable=False)  # no foreign key: the history outlives deleted products
+    delta = Column(Integer, nullable=False)  # signed change of products.quantity
+    kind = Column(String(20), nullable=False)  # order, cancel, refund, set
+    reference_id = Column(CHAR(36), nullable=True)  # order_id, refund_id... of the change
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+# Stock Hold Table (stock held for a customer between prepare_checkout and the checkout, until expires_at)
+class StockHold(Base):
+    __tablename__ = 'stock_hold'
+    __table_args__ = (
+        UniqueConstraint('customer_id', 'product_id', name='ux_stock_hold_customer_product'),
+        # covers the sum of the active holds of a product (available to sell = stock - active holds)
+        Index('ix_stock_hold_product_expires', 'product_id', 'expires_at', 'quantity'),
+    )
+
+    hold_id = Column(CHAR(36), primary_key=True, default=lambda: str(uuid4()))
+    customer_id = Column(CHAR(36), nullable=False)
+    product_id = Column(CHAR(36), nullable=False)  # no foreign key: a hold never outlives its expiry for long
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Daily Sales Fact Table (sales and refunds per product and day, kept up to date in the transactions of the order and
+# refund writes; the revenue, profit and loss reports read it instead of the orders)
+class SalesDailyFact(Base):
+    __tablename__ = 'sales_daily_fact'
+    __table_args__ = (
+        Index('ix_sales_daily_fact_category_day', 'category_id', 'day'),
+        Index('ix_sales_daily_fact_product_day', 'product_id', 'day'),
+    )
+
+    day = Column(Date, primary_key=True)  # day of the order (UTC), day of the approval for the refunds
+    product_id = Column(CHAR(36), primary_key=True)  # no foreign key: the history outlives deleted products
+    category_id = Column(Integer, nullable=True)  # category of the product at the last write
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)  # quantity * price_at_purchase
+    cost = Column(DECIMAL(14, 2), nullable=False, default=0)  # quantity * order_items.unit_cost
+    refunded_units = Column(Integer, nullable=False, default=0)
+    refunds = Column(DECIMAL(14, 2), nullable=False, default=0)  # refund_amount of the approved refunds
+    refunded_cost = Column(DECIMAL(14, 2), nullable=False, default=0)  # cost of the refunded units, back in stock
+
+
+# Monthly Sales Fact Table (sales_daily_fact summed per product and month, written with it: the month and year
+# reports over long ranges read one row per product and month)
+class SalesMonthlyFact(Base):
+    __tablename__ = 'sales_monthly_fact'
+    __table_args__ = (
+        Index('ix_sales_monthly_fact_category_month', 'category_id', 'month'),
+        Index('ix_sales_monthly_fact_product_month', 'product_id', 'month'),
+    )
+
+    month = Column(Date, primary_key=True)  # first day of the month
+    product_id = Column(CHAR(36), primary_key=True)
+    category_id = Column(Integer, nullable=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+    cost = Column(DECIMAL(14, 2), nullable=False, default=0)
+    refunded_units = Column(Integer, nullable=False, default=0)
+    refunds = Column(DECIMAL(14, 2), nullable=False, default=0)
+    refunded_cost = Column(DECIMAL(14, 2), nullable=False, default=0)
+
+
 # Pydantic models
 from pydantic import BaseModel, Field
 from typing import List, Optional
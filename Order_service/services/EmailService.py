@@ -1,9 +1,10 @@
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 import os
+from utils.order_settings import settings
+from services.mail_transport import get_mail_transport
 
 class EmailService:
     @staticmethod
@@ -18,10 +19,8 @@ class EmailService:
         Output:
         - None (raises exception on failure).
         """
-        sender_email = "bugrayapilmisev@gmail.com"  # Replace with your email
-        sender_password = "olee olco ingu upeb"  # Replace with your app-specific password
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
+        # the SMTP server is configured in utils/order_settings.py (or the .env file)
+        sender_email = settings.smtp_sender
 
         # Create the email
         subject = "Your Invoice from Our Store"
@@ -44,13 +43,9 @@ class EmailService:
         )
         msg.attach(part)
 
-        # Send the email
+        # Send the email on a pooled SMTP connection (see services/mail_transport.py)
         try:
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, customer_email, msg.as_string())
-            server.quit()
+            get_mail_transport().send(msg, sender_email, [customer_email])
             print(f"Email sent successfully to {customer_email}")
         except Exception as e:
             print(f"Failed to send email: {e}")
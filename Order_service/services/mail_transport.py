@@ -0,0 +1,244 @@
+'''
+    Pooled SMTP transport: a small pool of connected (STARTTLS + login) SMTP connections that are reused
+    between messages instead of connecting, upgrading and logging in for every single email.
+
+        - at most smtp_pool_size connections are open; a sender waits for a free one,
+        - a connection idle for more than smtp_noop_after seconds is checked with NOOP before reuse and replaced when
+          the server dropped it; a send that fails on a dropped connection is retried once on a new connection,
+        - a connection is closed after smtp_max_messages_per_connection messages (servers limit them per session),
+        - send_many() sends a batch on pool-size threads, so a bulk send costs one handshake per pool slot.
+
+    stats() returns the counters, the send rate of the last minute and the send latency percentiles.
+
+    Mirrored in dashboards_service/services/mailTransportServices.py.
+'''
+
+import logging
+import smtplib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from typing import Iterable, List, Optional, Tuple
+from utils.order_settings import settings
+
+logger = logging.getLogger(__name__)
+
+# connection errors after which the connection is replaced and the message sent again
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+LATENCY_SAMPLES = 1000
+RATE_WINDOW_SECONDS = 60
+
+
+class _Connection:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
+class SmtpConnectionPool:
+    def __init__(self, host: str, port: int, user: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = True, timeout: float = 10.0, pool_size: int = 3,
+                 max_messages_per_connection: int = 100, noop_after: float = 30.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.noop_after = noop_after
+
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle: List[_Connection] = []
+        self._lock = threading.Lock()
+
+        self.sent = 0
+        self.failed = 0
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.reconnects = 0
+        self.noop_checks = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._sent_at = deque()
+
+    def _connect(self) -> _Connection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.user:
+                smtp.login(self.user, self.password)
+        except Exception:
+            self._close(smtp)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return _Connection(smtp)
+
+    def _close(self, smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _discard(self, connection: _Connection) -> None:
+        self._close(connection.smtp)
+        with self._lock:
+            self.connections_closed += 1
+
+    def _healthy(self, connection: _Connection) -> bool:
+        if time.monotonic() - connection.last_used < self.noop_after:
+            return True
+        with self._lock:
+            self.noop_checks += 1
+        try:
+            return connection.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> _Connection:
+        # the caller holds a slot
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                return self._connect()
+            if self._healthy(connection):
+                return connection
+            self._discard(connection)
+            with self._lock:
+                self.reconnects += 1
+
+    def _release(self, connection: _Connection) -> None:
+        connection.last_used = time.monotonic()
+        if connection.messages >= self.max_messages_per_connection:
+            self._discard(connection)
+            return
+        with self._lock:
+            self._idle.append(connection)
+
+    def send(self, message: Message, sender: Optional[str] = None, recipients: Optional[Iterable[str]] = None) -> None:
+        '''
+            Sends one message on a pooled connection (raises on failure).
+            sender and recipients default to the From and To headers of the message.
+        '''
+        started = time.perf_counter()
+        with self._slots:
+            connection = None
+            try:
+                connection = self._acquire()
+                try:
+                    connection.smtp.send_message(message, from_addr=sender, to_addrs=recipients)
+                except RECONNECT_ERRORS as e:
+                    # the server closed the session since the last check: one more try on a fresh connection
+                    logger.info("SMTP connection lost (%s), reconnecting", e)
+                    self._discard(connection)
+                    connection = None
+                    with self._lock:
+                        self.reconnects += 1
+                    connection = self._connect()
+                    connection.smtp.send_message(message, from_addr=sender, to_addrs=recipients)
+                connection.messages += 1
+                self._release(connection)
+                connection = None
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                if connection is not None:
+                    self._discard(connection)
+        finished = time.perf_counter()
+        with self._lock:
+            self.sent += 1
+            self._latencies.append(finished - started)
+            self._sent_at.append(time.monotonic())
+
+    def send_many(self, messages: Iterable[Tuple[Message, Optional[str], Optional[Iterable[str]]]]) -> List[Optional[Exception]]:
+        '''
+            Sends (message, sender, recipients) tuples on pool_size threads.
+            Returns one entry per message: None when it was sent, the exception otherwise.
+        '''
+        def send_one(item):
+            try:
+                self.send(*item)
+                return None
+            except Exception as e:
+                logger.warning("Could not send email: %s", e)
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="smtp-send") as executor:
+            return list(executor.map(send_one, list(messages)))
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            while self._sent_at and now - self._sent_at[0] > RATE_WINDOW_SECONDS:
+                self._sent_at.popleft()
+            latencies = sorted(self._latencies)
+            counters = {
+                "sent": self.sent,
+                "failed": self.failed,
+                "connections_opened": self.connections_opened,
+                "connections_closed": self.connections_closed,
+                "reconnects": self.reconnects,
+                "noop_checks": self.noop_checks,
+                "idle_connections": len(self._idle),
+                "pool_size": self.pool_size,
+                "sent_last_minute": len(self._sent_at),
+                "send_rate_per_second": round(len(self._sent_at) / RATE_WINDOW_SECONDS, 3),
+            }
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3) if latencies else None
+
+        counters.update(latency_ms_p50=percentile(0.50), latency_ms_p95=percentile(0.95), latency_ms_max=percentile(1.0))
+        return counters
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_mail_transport() -> SmtpConnectionPool:
+    # the transport of this process, built from the SMTP settings on first use
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = SmtpConnectionPool(
+                host=settings.smtp_host,
+                port=settings.smtp_port,
+                user=settings.smtp_user,
+                password=settings.smtp_password,
+                starttls=settings.smtp_starttls,
+                timeout=settings.smtp_timeout,
+                pool_size=settings.smtp_pool_size,
+                max_messages_per_connection=settings.smtp_max_messages_per_connection,
+                noop_after=settings.smtp_noop_after,
+            )
+        return _transport
+
+
+def reset_mail_transport() -> None:
+    # closes the pooled connections; the next send builds the transport again from the settings
+    global _transport
+    with _transport_lock:
+        transport, _transport = _transport, None
+    if transport is not None:
+        transport.close()
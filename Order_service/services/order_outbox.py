@@ -0,0 +1,253 @@
+'''
+    Durable outbox of the side effects of an order: rendering its invoice and emailing it to the customer.
+
+    create_order only writes an "invoice" job into order_outbox in the same transaction as the order, so checkout
+    waits for the database commit alone and a committed order never fails because of the PDF or the SMTP server.
+    The OutboxWorker claims the due jobs (SELECT ... FOR UPDATE SKIP LOCKED, so several processes can share the table)
+    and runs them on a thread pool:
+        - "invoice" renders the PDF, stores its path in orders.invoice_link and enqueues "invoice_email",
+        - "invoice_email" sends the PDF to the customer.
+    A failed job is retried with exponential backoff (outbox_backoff_base * 2^(attempts - 1) seconds, with jitter,
+    capped at outbox_backoff_max) and marked "failed" after outbox_max_attempts attempts. A job whose worker died keeps
+    its "processing" status until its lease (outbox_lease_seconds) expires, then it is claimed again.
+
+    The worker runs inside the service (started in main.py, outbox_workers=0 disables it) or on its own:
+
+        python -m services.order_outbox
+'''
+
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+from uuid import uuid4
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from models.models import Order, Customer, OrderOutbox
+from services.InvoiceService import InvoiceService
+from services.EmailService import EmailService
+from utils.db_utils import SessionLocal
+from utils.order_settings import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_INVOICE = "invoice"
+JOB_INVOICE_EMAIL = "invoice_email"
+
+
+def enqueue_job(db: Session, order_id: str, job_type: str) -> OrderOutbox:
+    # added to the caller's transaction, the caller commits
+    now = datetime.utcnow()
+    job = OrderOutbox(
+        outbox_id=str(uuid4()),
+        order_id=order_id,
+        job_type=job_type,
+        status="pending",
+        attempts=0,
+        max_attempts=settings.outbox_max_attempts,
+        next_attempt_at=now,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(job)
+    return job
+
+
+def render_invoice(job: OrderOutbox, db: Session) -> None:
+    order = db.query(Order).filter_by(order_id=job.order_id).first()
+    if not order:
+        raise ValueError(f"Order {job.order_id} not found.")
+    order.invoice_link = InvoiceService.generate_invoice(order, db)
+    enqueue_job(db, order.order_id, JOB_INVOICE_EMAIL)
+
+
+def send_invoice_email(job: OrderOutbox, db: Session) -> None:
+    order = db.query(Order).filter_by(order_id=job.order_id).first()
+    if not order or not order.invoice_link:
+        raise ValueError(f"Order {job.order_id} has no invoice to send.")
+    customer = db.query(Customer).filter_by(user_id=order.customer_id).first()
+    if not customer:
+        raise ValueError(f"Customer of order {job.order_id} not found.")
+    EmailService.send_invoice_email(customer.email, order.invoice_link)
+
+
+JOB_HANDLERS: Dict[str, Callable[[OrderOutbox, Session], None]] = {
+    JOB_INVOICE: render_invoice,
+    JOB_INVOICE_EMAIL: send_invoice_email,
+}
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(settings.outbox_backoff_max, settings.outbox_backoff_base * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def get_order_jobs(order_id: str, db: Session) -> List[dict]:
+    jobs = (
+        db.query(OrderOutbox)
+        .filter(OrderOutbox.order_id == order_id)
+        .order_by(OrderOutbox.created_at, OrderOutbox.outbox_id)
+        .all()
+    )
+    return [
+        {
+            "outbox_id": job.outbox_id,
+            "job_type": job.job_type,
+            "status": job.status,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "next_attempt_at": job.next_attempt_at.strftime("%Y-%m-%d %H:%M:%S") if job.status == "pending" else None,
+            "last_error": job.last_error,
+            "created_at": job.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "updated_at": job.updated_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for job in jobs
+    ]
+
+
+class OutboxWorker:
+    def __init__(self, session_factory=SessionLocal, handlers=None, workers: int = settings.outbox_workers,
+                 batch_size: int = settings.outbox_batch_size, poll_interval: float = settings.outbox_poll_interval):
+        self.session_factory = session_factory
+        self.handlers = handlers if handlers is not None else JOB_HANDLERS
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._executor = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def start(self) -> None:
+        if self.workers <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="order-outbox")
+        self._thread = threading.Thread(target=self._dispatch, name="order-outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def wake(self) -> None:
+        # called after a commit that enqueued jobs, so that they start without waiting for the next poll
+        self._wake.set()
+
+    def claim(self, limit: int) -> List[str]:
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            jobs = (
+                db.query(OrderOutbox)
+                .filter(or_(
+                    and_(OrderOutbox.status == "pending", OrderOutbox.next_attempt_at <= now),
+                    and_(OrderOutbox.status == "processing", OrderOutbox.locked_until < now),
+                ))
+                .order_by(OrderOutbox.next_attempt_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for job in jobs:
+                job.status = "processing"
+                job.locked_until = now + timedelta(seconds=settings.outbox_lease_seconds)
+                job.updated_at = now
+            db.commit()
+            return [job.outbox_id for job in jobs]
+        finally:
+            db.close()
+
+    def run_job(self, outbox_id: str) -> None:
+        db = self.session_factory()
+        try:
+            job = db.query(OrderOutbox).filter_by(outbox_id=outbox_id).first()
+            if job is None or job.status != "processing":
+                return
+            try:
+                handler = self.handlers.get(job.job_type)
+                if handler is None:
+                    raise ValueError(f"Unknown job type {job.job_type}.")
+                handler(job, db)
+                job.status = "done"
+                job.attempts += 1
+                job.last_error = None
+                job.locked_until = None
+                job.updated_at = datetime.utcnow()
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                job = db.query(OrderOutbox).filter_by(outbox_id=outbox_id).first()
+                now = datetime.utcnow()
+                job.attempts += 1
+                job.last_error = f"{type(e).__name__}: {e}"[:2000]
+                job.locked_until = None
+                job.updated_at = now
+                if job.attempts >= job.max_attempts:
+                    job.status = "failed"
+                else:
+                    job.status = "pending"
+                    job.next_attempt_at = now + timedelta(seconds=backoff_seconds(job.attempts))
+                db.commit()
+                logger.warning("Order job %s (%s) of order %s failed, attempt %s/%s: %s",
+                               job.outbox_id, job.job_type, job.order_id, job.attempts, job.max_attempts, e)
+        finally:
+            db.close()
+
+    def run_pending(self) -> int:
+        # claims and runs the due jobs in the calling thread until none is left; returns how many were run
+        processed = 0
+        while True:
+            outbox_ids = self.claim(self.batch_size)
+            if not outbox_ids:
+                return processed
+            for outbox_id in outbox_ids:
+                self.run_job(outbox_id)
+            processed += len(outbox_ids)
+
+    def _done(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._wake.set()
+
+    def _dispatch(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            with self._lock:
+                capacity = self.workers - self._in_flight
+            claimed = []
+            if capacity > 0:
+                try:
+                    claimed = self.claim(min(capacity, self.batch_size))
+                except Exception as e:
+                    logger.warning("Could not claim order jobs: %s", e)
+            for outbox_id in claimed:
+                with self._lock:
+                    self._in_flight += 1
+                self._executor.submit(self.run_job, outbox_id).add_done_callback(self._done)
+            if not claimed or len(claimed) < capacity:
+                self._wake.wait(self.poll_interval)
+
+
+# worker of this process, started in main.py
+outbox_worker = OutboxWorker()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    worker = OutboxWorker(workers=max(1, settings.outbox_workers))
+    worker.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        worker.stop()
@@ -1,4 +1,7 @@
-from sqlalchemy.orm import Session
+import os
+import sys
+from sqlalchemy.orm import Session, selectinload
+from typing import Optional
 from datetime import datetime
 from models.models import (
     Order,
@@ -9,9 +12,15 @@ from models.models import (
 )
 from sqlalchemy.exc import SQLAlchemyError
 from uuid import uuid4
-from services.InvoiceService import InvoiceService
-from services.EmailService import EmailService
+from services.order_outbox import enqueue_job, outbox_worker, JOB_INVOICE
 from models.models import Customer, Product, Order, OrderItem, Delivery, Address
+from services.cache_version import bump_cache_versions, product_cache_key
+from services.stock_reservation import reserve_stock
+from services.pagination import encode_cursor, decode_cursor, keyset_predicate
+
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.sales_facts import record_sales, unit_costs
 
 ORDER_STATUS_MAP = {
     0: "pending",
@@ -100,23 +109,16 @@ class OrderService:
                 db.add(new_delivery)
                 print(f"Delivery added successfully: {new_delivery}")
 
-                # Create order items and update stock
+                # Lock the ordered products, decrement their stock and consume the customer's stock holds
+                # (services/stock_reservation.py)
+                reserve_stock(db, order_data.items, order_id, order_data.customer_id)
+
+                # Create order items, with the cost of their product at this time
+                costs = unit_costs(db, [item.product_id for item in order_data.items])
+                new_items = []
                 for item in order_data.items:
                     print(f"Processing item: {item}")
 
-                    product = db.query(Product).filter_by(product_id=item.product_id).first()
-                    if not product:
-                        raise ValueError(f"Product {item.product_id} not found.")
-                    
-                    print(f"Product fetched: {product}")
-                    if product.quantity < item.quantity:
-                        raise ValueError(f"Insufficient stock for product {item.product_id}. "
-                                        f"Available: {product.quantity}, Requested: {item.quantity}")
-
-                    # Deduct stock
-                    product.quantity -= item.quantity
-                    print(f"Stock updated for product {item.product_id}: Remaining {product.quantity}")
-
                     # Add order item
                     try:
                         new_item = OrderItem(
@@ -124,37 +126,28 @@ class OrderService:
                             product_id=item.product_id,
                             quantity=item.quantity,
                             price_at_purchase=item.price_at_purchase,
+                            unit_cost=costs.get(item.product_id),
                         )
                         db.add(new_item)
+                        new_items.append(new_item)
                         print(f"OrderItem added: {new_item}")
                     except Exception as e:
                         print(f"Failed to add OrderItem: {str(e)}")
                         raise e
-                    
-                db.commit()
-                """
-                # Commit the transaction
-                db.commit()
-                print("Transaction committed successfully.")
 
-                # Reload the order to include relationships
-                db.refresh(new_order)
-                """
-                # Generate the invoice
-                db.refresh(new_order)
-                invoice_path = InvoiceService.generate_invoice(new_order, db)
-                new_order.invoice_link = invoice_path  # Update invoice link in the order
-                db.commit()
+                # the lines count in the daily sales of the reports (common/sales_facts.py)
+                record_sales(db, new_items, new_order.order_date)
 
-                # Send the invoice email
-                # take the customer email using the customer_id in order data and customer table in the database
-                customer_id = order_data.customer_id
-                customer = db.query(Customer).filter_by(user_id=customer_id).first()
+                # the invoice is rendered and emailed in the background (services/order_outbox.py); the job is written
+                # in the same transaction as the order so that it cannot get lost
+                enqueue_job(db, order_id, JOB_INVOICE)
 
-                customer_email = customer.email
-                EmailService.send_invoice_email(customer_email, invoice_path)
+                # the stock of the ordered products changed: invalidate their cached details in the other services
+                bump_cache_versions(db, [product_cache_key(item.product_id) for item in order_data.items])
+                db.commit()
+                outbox_worker.wake()
 
-                
+                db.refresh(new_order)
                 return new_order
 
             except ValueError as ve:
@@ -208,15 +201,47 @@ class OrderService:
         - db: SQLAlchemy Session object.
 
         Output:
-        - List of Order objects for the customer.
+        - List of Order objects for the customer, newest first.
         """
-        orders = db.query(Order).filter_by(customer_id=customer_id).all()
-        for order in orders:
-            db.refresh(order)  # Ensure items are loaded 
-        
-        orders.sort(key=lambda x: x.order_date, reverse=True)
+        orders, _ = OrderService.list_order_history(customer_id, db)
         return orders
 
+    @staticmethod
+    def list_order_history(customer_id: str, db: Session, cursor: Optional[str] = None, limit: Optional[int] = None):
+        """
+        One page of the order history of a customer, newest first, with the items, the delivery and the delivery
+        address of each order loaded eagerly (one query per relationship, whatever the number of orders).
+
+        Input:
+        - customer_id: Customer ID to retrieve orders for.
+        - db: SQLAlchemy Session object.
+        - cursor: next_cursor of the previous page, None for the first page.
+        - limit: page size, None for every order after the cursor.
+
+        Output:
+        - (orders, next_cursor); next_cursor is None on the last page. Raises ValueError for an invalid cursor.
+        """
+        sort_keys = [(Order.order_date, True), (Order.order_id, True)]
+        query = (
+            db.query(Order)
+            .options(
+                selectinload(Order.order_items),
+                selectinload(Order.delivery).selectinload(Delivery.address),
+            )
+            .filter(Order.customer_id == customer_id)
+        )
+        if cursor:
+            query = query.filter(keyset_predicate(sort_keys, decode_cursor(cursor, sort_keys)))
+        query = query.order_by(Order.order_date.desc(), Order.order_id.desc())
+
+        if limit is None:
+            return query.all(), None
+        orders = query.limit(limit + 1).all()
+        if len(orders) <= limit:
+            return orders, None
+        orders = orders[:limit]
+        return orders, encode_cursor([orders[-1].order_date, orders[-1].order_id])
+
     @staticmethod
     def update_order_status(order_id: str, new_status: int, db: Session):
         """
@@ -258,9 +283,9 @@ class OrderService:
         if not all(key in payment_data for key in required_keys):
             raise ValueError("Missing required payment information.")
 
-        # Fetch all products in a single query
+        # Fetch all products in a single query (the stock is locked and deducted by create_order)
         product_ids = [item['product_id'] for item in payment_data['cartItems']]
-        products = db.query(Product).filter(Product.product_id.in_(product_ids)).with_for_update().all()
+        products = db.query(Product).filter(Product.product_id.in_(product_ids)).all()
         products_map = {product.product_id: product for product in products}
 
         # Validate products and calculate total price
@@ -274,8 +299,6 @@ class OrderService:
                 raise ValueError(f"Insufficient stock for {product.name} (ID: {product.product_id}). "
                                 f"Available: {product.quantity}, Requested: {item['quantity']}.")
 
-            # Deduct stock
-            product.quantity -= item['quantity']
             total_price += product.price * item['quantity']
 
             order_items.append(OrderItemCreateSchema(
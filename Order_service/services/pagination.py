@@ -0,0 +1,56 @@
+'''
+    Keyset (cursor) pagination, mirrored from ProductListing/services/pagination.py for the order history
+    (the cursor values of date columns are read back with fromisoformat, the order history is sorted by order_date).
+
+    The cursor holds the sort key values of the last row of the previous page, so the next page is read with
+    "WHERE (sort keys) after (cursor values) ORDER BY ... LIMIT n" and costs the same as the first one.
+'''
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Sequence, Tuple
+from sqlalchemy import and_, or_
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    # numbers and dates are written as strings and read back with the type of their sort column
+    payload = json.dumps([None if value is None else str(value) for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str, sort_keys: Sequence[Tuple[Any, bool]]) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != len(sort_keys):
+        raise ValueError("Invalid cursor.")
+
+    decoded = []
+    for value, (expression, _) in zip(values, sort_keys):
+        if value is None:
+            decoded.append(None)
+            continue
+        try:
+            python_type = expression.type.python_type
+            decoded.append(python_type.fromisoformat(value) if python_type in (datetime, date) else python_type(value))
+        except (TypeError, ValueError, ArithmeticError, NotImplementedError):
+            raise ValueError("Invalid cursor.")
+    return decoded
+
+
+def keyset_predicate(sort_keys: Sequence[Tuple[Any, bool]], values: Sequence[Any]):
+    '''
+        The rows that come after `values` in the order of sort_keys ((expression, descending) pairs),
+        written as (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... so that mixed directions work on every database.
+        The last sort key must be unique (order_id) for the order to be total.
+    '''
+    branches = []
+    for position, (expression, descending) in enumerate(sort_keys):
+        equal_prefix = [sort_keys[i][0] == values[i] for i in range(position)]
+        after = expression < values[position] if descending else expression > values[position]
+        branches.append(and_(*equal_prefix, after))
+    return or_(*branches)
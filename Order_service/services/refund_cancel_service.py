@@ -1,23 +1,32 @@
 
+import os
+import sys
 from datetime import datetime, timedelta
 import uuid
 from sqlalchemy.orm import Session
 from typing import List
 from schemas.refund_cancel_schemas import CancelRequestSchema, CancelResponseSchema, RefundRequestSchema, RefundResponseSchema, RefundSchema
 from models.models import Customer, Delivery, OrderItem, Order, Product, Refund
+from services.cache_version import bump_cache_versions, product_cache_key
+from services.inventory_counters import restock_items
+from services.inventory_ledger import CANCEL
 from utils.db_utils import get_db
 from utils.order_settings import settings
 from fastapi import HTTPException
-from jose import JWTError, jwt
+from utils.authentication_utils import Principal
 
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.sales_facts import record_sales
 
-def refund_products(refund_request: RefundRequestSchema, db: Session, token: str) -> RefundResponseSchema:
+
+def refund_products(refund_request: RefundRequestSchema, db: Session, user: Principal) -> RefundResponseSchema:
     """
     Create refund object and sales manager will apply or not according to the reason and amount. So just create the refund object and return the refund object.
     Args:
         refund_request (RefundRequestSchema): Refund Requests.
         db (Session): Database session.
-        token (str): JWT token.
+        user (Principal): The customer of the request, resolved by verify_user_role.
     Returns:
         List[RefundResponseSchema]: List of refund responses.
     """
@@ -26,15 +35,8 @@ def refund_products(refund_request: RefundRequestSchema, db: Session, token: str
 
     try:
 
-        # Decode the JWT token to get the user email
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        email = payload.get("sub")
-
         order_id = refund_request.order_id
 
-        # Get the user ID from the email
-        user = db.query(Customer).filter(Customer.email == email).first()
-
         if not user:
             print("User not found")
             raise ValueError(status_code=404, detail="User not found")
@@ -95,14 +97,14 @@ def refund_products(refund_request: RefundRequestSchema, db: Session, token: str
 
     return {"message": "Refund Requests Successfull Created"}
 
-def get_refund_status(order_id: str, product_id: str, db: Session, token: str) -> RefundResponseSchema:
+def get_refund_status(order_id: str, product_id: str, db: Session, user: Principal) -> RefundResponseSchema:
     """
     Get the refund status of a specific order.
     Args:
         order_id (str): The ID of the order to retrieve the refund status for.
         product_id (str): The ID of the product to retrieve the refund status for.
         db (Session): Database session.
-        token (str): JWT token.
+        user (Principal): The customer of the request, resolved by verify_user_role.
     Returns:
         RefundResponseSchema: The schema containing the details of the refund response.
     """
@@ -110,11 +112,6 @@ def get_refund_status(order_id: str, product_id: str, db: Session, token: str) -
     # Authentication is done in the controller
 
     try:
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        email = payload.get("sub")
-
-        user = db.query(Customer).filter(Customer.email == email).first()
-
         if not user:
             print("User not found")
             raise HTTPException(status_code=404, detail="User not found")
@@ -153,18 +150,13 @@ def get_refund_status(order_id: str, product_id: str, db: Session, token: str) -
         raise HTTPException(status_code=500, detail=f"Error processing refund status request: {str(e)}")
 
 
-def cancel_order_service(cancel_request: CancelRequestSchema, db: Session, token: str) -> CancelResponseSchema:
+def cancel_order_service(cancel_request: CancelRequestSchema, db: Session, user: Principal) -> CancelResponseSchema:
     
     # Authentication is done in the controller
 
     # Check if the user and order exists
 
     try:
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        email = payload.get("sub")
-
-        user = db.query(Customer).filter(Customer.email == email).first()
-
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -193,10 +185,12 @@ def cancel_order_service(cancel_request: CancelRequestSchema, db: Session, token
 
         order_items = db.query(OrderItem).filter(OrderItem.order_id == order.order_id).all()
 
-        for item in order_items:
-            product = db.query(Product).filter(Product.product_id == item.product_id).first()
-            product.stock += item.quantity
+        # the stock of the whole order goes back with one atomic UPDATE
+        restock_items(db, order_items, CANCEL, order.order_id)
+        # and the order no longer counts in the sales of its day, at the cost its lines were ordered at
+        record_sales(db, order_items, order.order_date, sign=-1)
 
+        bump_cache_versions(db, [product_cache_key(item.product_id) for item in order_items])
         db.commit()
 
         return CancelResponseSchema(
@@ -0,0 +1,43 @@
+'''
+    Stock holds, as read by the checkout: the stock set aside for a customer between prepare_checkout and the checkout,
+    one stock_hold row per (customer, product) with the quantity held and an expiry. The holds are placed at
+    prepare_checkout and the expired ones swept by shoppingCart_service/services/stock_holds.py, which also creates
+    the table.
+
+    The checkout checks the order against the stock minus the active holds of the other customers (the holds of the
+    customer do not count against their own order), an aggregate over the (product_id, expires_at, quantity) index,
+    and consumes the holds of the customer in its transaction (services/stock_reservation.py).
+'''
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from models.models import StockHold
+
+
+def _active_holds(product_ids: List[str], now: datetime, exclude_customer: Optional[str] = None):
+    # quantity held per product by the holds that have not expired
+    stmt = (
+        select(StockHold.product_id, func.sum(StockHold.quantity).label("held"))
+        .where(StockHold.product_id.in_(product_ids), StockHold.expires_at > now)
+        .group_by(StockHold.product_id)
+    )
+    if exclude_customer is not None:
+        stmt = stmt.where(StockHold.customer_id != exclude_customer)
+    return stmt
+
+
+def held_quantities(db: Session, product_ids: Iterable[str], exclude_customer: Optional[str] = None,
+                    now: Optional[datetime] = None) -> Dict[str, int]:
+    '''Quantity held per product (products without active holds are left out), without the holds of exclude_customer.'''
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return {}
+    rows = db.execute(_active_holds(product_ids, now or datetime.utcnow(), exclude_customer))
+    return {product_id: int(held) for product_id, held in rows}
+
+
+def release_holds(db: Session, customer_id: str) -> int:
+    '''Deletes the holds of the customer (consumed by the checkout, or replaced); the caller commits.'''
+    return db.execute(delete(StockHold).where(StockHold.customer_id == customer_id)).rowcount
@@ -0,0 +1,117 @@
+'''
+    Stock reservation of an order, in the caller's transaction.
+
+        1. the quantities are summed per product (an order may list a product twice),
+        2. the products are locked with one SELECT ... FOR UPDATE, in product_id order, so that two checkouts sharing
+           products always lock them in the same order and cannot deadlock,
+        3. every line is validated against the locked stock minus the active stock holds of the other customers
+           (services/stock_holds.py) and all the failures are reported together,
+        4. the stock is decremented with one conditional UPDATE:
+               UPDATE products SET quantity = quantity - CASE product_id WHEN ... END
+               WHERE product_id IN (...) AND quantity >= CASE product_id WHEN ... END
+           the guard keeps the stock from going negative even on a database that ignores FOR UPDATE (SQLite), and a
+           row count lower than the number of products means that another checkout took the stock first,
+        5. the decrements are appended to the inventory_movement ledger (services/inventory_ledger.py),
+        6. the holds of the customer, placed by prepare_checkout in shoppingCart_service, are consumed.
+
+    A failed reservation raises StockReservationError (a ValueError, so create_order rolls back and the controller
+    answers 400) whose failures list says, for each line, what was requested and what is available.
+'''
+
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+from models.models import Product
+from services.inventory_ledger import record_movements, ORDER
+from services.stock_holds import held_quantities, release_holds
+
+
+class StockReservationError(ValueError):
+    def __init__(self, failures: List[dict]):
+        self.failures = failures
+        super().__init__("; ".join(
+            f"Product {failure['product_id']} not found." if failure["reason"] == "not_found" else
+            f"Insufficient stock for product {failure['product_id']}. "
+            f"Available: {failure['available']}, Requested: {failure['requested']}"
+            for failure in failures
+        ))
+
+
+def _requested_quantities(items: Iterable) -> Dict[str, int]:
+    requested: Dict[str, int] = {}
+    for item in items:
+        product_id = item["product_id"] if isinstance(item, dict) else item.product_id
+        quantity = item["quantity"] if isinstance(item, dict) else item.quantity
+        if quantity <= 0:
+            raise ValueError(f"Invalid quantity {quantity} for product {product_id}.")
+        requested[product_id] = requested.get(product_id, 0) + quantity
+    return requested
+
+
+def _check(requested: Dict[str, int], available: Dict[str, int]) -> List[dict]:
+    failures = []
+    for product_id in sorted(requested):
+        if product_id not in available:
+            failures.append({"product_id": product_id, "requested": requested[product_id], "available": 0,
+                             "reason": "not_found"})
+        elif available[product_id] < requested[product_id]:
+            failures.append({"product_id": product_id, "requested": requested[product_id],
+                             "available": available[product_id], "reason": "insufficient_stock"})
+    return failures
+
+
+def reserve_stock(db: Session, items: Iterable, order_id: Optional[str] = None,
+                  customer_id: Optional[str] = None) -> Dict[str, int]:
+    '''
+        Decrements the stock of the ordered products (items have product_id and quantity), records the decrements
+        in the inventory ledger under the order_id and consumes the stock holds of the customer_id.
+        Returns the remaining stock of each product; the caller commits (or rolls back to release the locks).
+    '''
+    requested = _requested_quantities(items)
+    if not requested:
+        return {}
+    product_ids = sorted(requested)
+
+    locked = (
+        db.query(Product.product_id, Product.quantity)
+        .filter(Product.product_id.in_(product_ids))
+        .order_by(Product.product_id)
+        .with_for_update()
+        .all()
+    )
+    available = {row.product_id: row.quantity for row in locked}
+    held = held_quantities(db, product_ids, exclude_customer=customer_id)
+    failures = _check(requested, {
+        product_id: max(quantity - held.get(product_id, 0), 0) for product_id, quantity in available.items()
+    })
+    if failures:
+        raise StockReservationError(failures)
+
+    amount = case(requested, value=Product.product_id)
+    result = db.execute(
+        update(Product)
+        .where(Product.product_id.in_(product_ids), Product.quantity >= amount)
+        .values(quantity=Product.quantity - amount)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(product_ids):
+        # only possible without row locks: another checkout changed the stock after the SELECT. The rows that were
+        # not decremented are reported with their current stock; the caller rolls the others back.
+        current = dict(db.query(Product.product_id, Product.quantity).filter(Product.product_id.in_(product_ids)).all())
+        raise StockReservationError([
+            {"product_id": product_id, "requested": requested[product_id], "available": current.get(product_id, 0),
+             "reason": "insufficient_stock"}
+            for product_id in product_ids
+            if current.get(product_id) != available[product_id] - requested[product_id]
+        ])
+
+    record_movements(db, {product_id: -quantity for product_id, quantity in requested.items()}, ORDER, order_id)
+    if customer_id is not None:
+        release_holds(db, customer_id)
+
+    # Product objects already loaded in the session still hold the old stock
+    for instance in list(db.identity_map.values()):
+        if isinstance(instance, Product) and instance.product_id in requested:
+            db.expire(instance, ["quantity"])
+
+    return {product_id: available[product_id] - requested[product_id] for product_id in product_ids}
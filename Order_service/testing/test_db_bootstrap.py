@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+
+# Proje kök dizinini PYTHONPATH'e ekle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the repository root, for the modules shared by the services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from common.db_bootstrap import DatabaseSettings, build_database
+
+
+@pytest.fixture
+def database_file(tmp_path):
+    return f"sqlite:///{tmp_path / 'bootstrap.db'}"
+
+
+def test_settings_come_from_the_environment(monkeypatch, database_file):
+    monkeypatch.setenv("DATABASE_URL", database_file)
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "1")
+    monkeypatch.setenv("DB_READ_REPLICA_URLS", f"{database_file}, {database_file}")
+    database = build_database("mysql+pymysql://unused@127.0.0.1/unused")
+
+    assert str(database.engine.url) == database_file
+    assert database.engine.pool.size() == 3
+    assert len(database.read_engines) == 2
+    # the read sessions go round-robin over the replicas
+    binds = [database.read_session().get_bind() for _ in range(4)]
+    assert binds == database.read_engines * 2
+
+
+def test_pool_records_waits_timeouts_and_saturation(database_file):
+    database = build_database(database_file, DatabaseSettings(db_pool_size=1, db_max_overflow=0, db_pool_timeout=0.1))
+    holder = database.SessionLocal()
+    holder.execute(text("SELECT 1"))
+
+    stats = database.stats()["primary"]
+    assert stats["in_use"] == 1 and stats["saturation"] == 1.0 and stats["checkouts"] == 1
+
+    errors = []
+
+    def checkout():
+        session = database.SessionLocal()
+        try:
+            session.execute(text("SELECT 1"))
+        except PoolTimeoutError as error:
+            errors.append(error)
+        finally:
+            session.close()
+
+    thread = threading.Thread(target=checkout)
+    thread.start()
+    thread.join()
+    holder.close()
+
+    stats = database.stats()["primary"]
+    assert len(errors) == 1
+    assert stats["timeouts"] == 1 and stats["in_use"] == 0
+    assert stats["wait_max_ms"] >= 100
+    database.engine.dispose()
@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+
+# Proje kök dizinini PYTHONPATH'e ekle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models.models import Base, Customer, Product, Order, OrderItem, Delivery, InventoryMovement
+from schemas.refund_cancel_schemas import CancelRequestSchema
+from services.inventory_counters import apply_counter_deltas, collect_deltas
+from services.refund_cancel_service import cancel_order_service
+from services.stock_reservation import reserve_stock
+from utils.authentication_utils import Principal
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'counters.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    session.add(Customer(user_id="c1", name="Test", surname="Customer", email="customer@example.com", password="x"))
+    session.add(Product(product_id="p1", name="Product 1", model="M-1", serial_number="SN-1", quantity=10, price=50))
+    session.add(Product(product_id="p2", name="Product 2", model="M-2", serial_number="SN-2", quantity=1, price=20))
+    session.commit()
+    session.close()
+    yield Session
+    engine.dispose()
+
+
+def counters(db, product_id):
+    db.expire_all()
+    product = db.query(Product).filter_by(product_id=product_id).first()
+    return product.quantity, product.item_sold
+
+
+def test_deltas_of_an_order_are_applied_in_one_update(Session):
+    db = Session()
+    product = db.query(Product).filter_by(product_id="p1").first()
+    items = [{"product_id": "p1", "quantity": 2}, {"product_id": "p2", "quantity": 1}, {"product_id": "p1", "quantity": 3}]
+
+    assert collect_deltas(items, sign=-1) == {"p1": -5, "p2": -1}
+    assert apply_counter_deltas(db, stock=collect_deltas(items, sign=-1), sold=collect_deltas(items)) == 2
+    db.commit()
+
+    # the loaded product was expired and reloads the new counters
+    assert (product.quantity, product.item_sold) == (5, 5)
+    assert counters(db, "p2") == (0, 1)
+    assert apply_counter_deltas(db, sold={"missing": 1}) == 0
+    db.close()
+
+
+def test_concurrent_increments_are_not_lost(Session):
+    def sell():
+        for _ in range(20):
+            db = Session()
+            try:
+                apply_counter_deltas(db, sold={"p1": 1})
+                db.commit()
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=sell) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db = Session()
+    assert counters(db, "p1") == (10, 160)
+    db.close()
+
+
+def test_cancelling_an_order_puts_its_stock_back(Session):
+    db = Session()
+    db.add(Order(order_id="o1", customer_id="c1", total_price=70, payment_status="paid", order_status=0))
+    db.add(Delivery(order_id="o1", delivery_status="PENDING"))
+    db.add_all([
+        OrderItem(order_id="o1", product_id="p1", quantity=2, price_at_purchase=50),
+        OrderItem(order_id="o1", product_id="p2", quantity=1, price_at_purchase=20),
+    ])
+    db.commit()
+
+    user = Principal(user_id="c1", email="customer@example.com", role="customer")
+    response = cancel_order_service(CancelRequestSchema(order_id="o1"), db, user)
+
+    assert response.status == 4
+    assert counters(db, "p1") == (12, 0)
+    assert counters(db, "p2") == (2, 0)
+    movements = db.query(InventoryMovement).order_by(InventoryMovement.product_id).all()
+    assert [(m.product_id, m.delta, m.kind, m.reference_id) for m in movements] == [
+        ("p1", 2, "cancel", "o1"), ("p2", 1, "cancel", "o1"),
+    ]
+    db.close()
+
+
+def test_reserved_stock_is_recorded_in_the_ledger(Session):
+    db = Session()
+    reserve_stock(db, [{"product_id": "p1", "quantity": 2}, {"product_id": "p1", "quantity": 1}], order_id="o2")
+    db.commit()
+
+    movement = db.query(InventoryMovement).one()
+    assert (movement.product_id, movement.delta, movement.kind, movement.reference_id) == ("p1", -3, "order", "o2")
+    assert counters(db, "p1") == (7, 0)
+    db.close()
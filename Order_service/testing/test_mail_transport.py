@@ -0,0 +1,68 @@
+import os
+import sys
+
+# Proje kök dizinini PYTHONPATH'e ekle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from email.mime.text import MIMEText
+from services.mail_transport import SmtpConnectionPool
+from testing.smtp_sink import SmtpSink
+
+
+def message(recipient):
+    msg = MIMEText("There is a discounted product in your wishlist!")
+    msg["From"] = "store@example.com"
+    msg["To"] = recipient
+    msg["Subject"] = "Discount"
+    return msg
+
+
+def test_bulk_send_costs_one_handshake_per_pool_slot():
+    with SmtpSink() as sink:
+        pool = SmtpConnectionPool(sink.host, sink.port, starttls=False, pool_size=3)
+        errors = pool.send_many([(message(f"customer{i}@example.com"), None, None) for i in range(30)])
+        pool.close()
+
+    assert errors == [None] * 30
+    assert sorted(recipients[0] for _, recipients, _ in sink.messages) == sorted(f"customer{i}@example.com" for i in range(30))
+    assert sink.connections <= 3
+    stats = pool.stats()
+    assert stats["sent"] == 30 and stats["failed"] == 0
+    assert stats["connections_opened"] == sink.connections
+    assert stats["sent_last_minute"] == 30
+    assert stats["latency_ms_p95"] is not None
+
+
+def test_connection_is_replaced_after_the_message_cap():
+    with SmtpSink() as sink:
+        pool = SmtpConnectionPool(sink.host, sink.port, starttls=False, pool_size=1, max_messages_per_connection=2)
+        for i in range(5):
+            pool.send(message(f"customer{i}@example.com"))
+        pool.close()
+
+    assert len(sink.messages) == 5
+    assert pool.stats()["connections_opened"] == 3
+
+
+def test_dropped_connection_is_reconnected():
+    with SmtpSink() as sink:
+        pool = SmtpConnectionPool(sink.host, sink.port, starttls=False, pool_size=1)
+        pool.send(message("first@example.com"))
+        # the server side of the idle connection goes away
+        pool._idle[0].smtp.close()
+        pool.send(message("second@example.com"))
+        pool.close()
+
+    assert [recipients for _, recipients, _ in sink.messages] == [["first@example.com"], ["second@example.com"]]
+    stats = pool.stats()
+    assert (stats["sent"], stats["reconnects"], stats["connections_opened"]) == (2, 1, 2)
+
+
+def test_idle_connection_is_checked_with_noop():
+    with SmtpSink() as sink:
+        pool = SmtpConnectionPool(sink.host, sink.port, starttls=False, pool_size=1, noop_after=0)
+        pool.send(message("first@example.com"))
+        pool.send(message("second@example.com"))
+        pool.close()
+
+    stats = pool.stats()
+    assert (stats["noop_checks"], stats["connections_opened"]) == (1, 1)
@@ -0,0 +1,74 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Proje kök dizinini PYTHONPATH'e ekle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from models.models import Base, Customer, Product, Order, OrderItem, Delivery, Address
+from services.order_service import OrderService
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Customer(user_id="c1", name="Test", surname="Customer", email="customer@example.com", password="x"))
+    db.add(Product(product_id="p1", name="Test Product", model="M-1", serial_number="SN-1", quantity=10, price=50))
+    started = datetime(2025, 1, 1)
+    for i in range(30):
+        order_id = f"o{i:02d}"
+        # two orders per day, so the page boundaries fall between orders of the same date
+        db.add(Order(order_id=order_id, customer_id="c1", total_price=50, order_date=started + timedelta(days=i // 2),
+                     payment_status="paid", order_status=0))
+        db.add(OrderItem(order_id=order_id, product_id="p1", quantity=1, price_at_purchase=50))
+        db.add(Address(customer_adres_id=f"a{i:02d}", customer_id="c1", address=f"Street {i}", type="Home"))
+        db.add(Delivery(order_id=order_id, delivery_status="Pending", addres_id=f"a{i:02d}"))
+    db.commit()
+    db.close()
+    yield engine
+    engine.dispose()
+
+
+def test_order_history_pages_with_constant_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    db = sessionmaker(bind=engine)()
+
+    seen = []
+    cursor = None
+    while True:
+        statements.clear()
+        orders, cursor = OrderService.list_order_history("c1", db, cursor, limit=7)
+        # touching the relationships must not query again
+        for order in orders:
+            seen.append((order.order_id, order.order_items[0].quantity, order.delivery[0].address.address))
+        # orders, their items, their deliveries, the delivery addresses
+        assert len(statements) == 4
+        if cursor is None:
+            break
+        db.expire_all()
+
+    expected = sorted(((f"o{i:02d}", 1, f"Street {i}") for i in range(30)),
+                      key=lambda row: (int(row[0][1:]) // 2, row[0]), reverse=True)
+    assert seen == expected
+    db.close()
+
+
+def test_order_history_without_limit_returns_every_order(engine):
+    db = sessionmaker(bind=engine)()
+    orders = OrderService.list_orders_for_customer("c1", db)
+    assert len(orders) == 30
+    assert [order.order_date for order in orders] == sorted((order.order_date for order in orders), reverse=True)
+    db.close()
+
+
+def test_order_history_rejects_an_invalid_cursor(engine):
+    db = sessionmaker(bind=engine)()
+    with pytest.raises(ValueError):
+        OrderService.list_order_history("c1", db, "not-a-cursor", limit=5)
+    db.close()
@@ -0,0 +1,111 @@
+import os
+import sys
+from datetime import datetime
+
+# Proje kök dizinini PYTHONPATH'e ekle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from models.models import Base, Customer, Product, Order, OrderOutbox, OrderCreateSchema, OrderItemCreateSchema
+from services.order_service import OrderService
+from services.order_outbox import OutboxWorker, JOB_INVOICE, JOB_INVOICE_EMAIL
+from services.mail_transport import reset_mail_transport
+from utils.order_settings import settings
+from testing.smtp_sink import SmtpSink
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(Customer(user_id="c1", name="Test", surname="Customer", email="customer@example.com", password="x"))
+    db.add(Product(product_id="p1", name="Test Product", model="M-1", serial_number="SN-1", quantity=10, price=50))
+    db.commit()
+    db.close()
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def smtp_sink(monkeypatch):
+    with SmtpSink() as sink:
+        monkeypatch.setattr(settings, "smtp_host", sink.host)
+        monkeypatch.setattr(settings, "smtp_port", sink.port)
+        monkeypatch.setattr(settings, "smtp_starttls", False)
+        monkeypatch.setattr(settings, "smtp_user", "")
+        reset_mail_transport()
+        yield sink
+        reset_mail_transport()
+
+
+def create_order(db):
+    return OrderService.create_order(OrderCreateSchema(
+        customer_id="c1",
+        total_price=100.0,
+        order_date="2025-01-01",
+        order_address="Tuzla Istanbul Turkey",
+        order_address_type="Home",
+        order_address_name="Home",
+        payment_status="paid",
+        invoice_link=None,
+        order_status=0,
+        items=[OrderItemCreateSchema(product_id="p1", quantity=2, price_at_purchase=50.0)],
+    ), db)
+
+
+def test_create_order_only_enqueues_the_invoice(session_factory):
+    db = session_factory()
+    order = create_order(db)
+
+    jobs = db.query(OrderOutbox).filter_by(order_id=order.order_id).all()
+    assert [(job.job_type, job.status) for job in jobs] == [(JOB_INVOICE, "pending")]
+    assert order.invoice_link is None
+
+
+def test_worker_renders_and_emails_the_invoice(session_factory, smtp_sink):
+    db = session_factory()
+    order_id = create_order(db).order_id
+
+    assert OutboxWorker(session_factory).run_pending() == 2
+
+    db.expire_all()
+    jobs = {job.job_type: job.status for job in db.query(OrderOutbox).filter_by(order_id=order_id)}
+    assert jobs == {JOB_INVOICE: "done", JOB_INVOICE_EMAIL: "done"}
+    invoice_link = db.query(Order).filter_by(order_id=order_id).first().invoice_link
+    assert os.path.exists(invoice_link)
+    os.remove(invoice_link)
+    assert [(recipients, b"INV-" + order_id.encode() in message) for _, recipients, message in smtp_sink.messages] == [
+        (["customer@example.com"], True)
+    ]
+
+
+def test_failed_email_is_retried_with_backoff(session_factory, monkeypatch):
+    with SmtpSink() as sink:
+        closed_port = sink.port
+    monkeypatch.setattr(settings, "smtp_host", "127.0.0.1")
+    monkeypatch.setattr(settings, "smtp_port", closed_port)
+    monkeypatch.setattr(settings, "smtp_starttls", False)
+    monkeypatch.setattr(settings, "outbox_max_attempts", 2)
+    reset_mail_transport()
+    db = session_factory()
+    order_id = create_order(db).order_id
+    worker = OutboxWorker(session_factory)
+
+    worker.run_pending()
+    email_job = db.query(OrderOutbox).filter_by(order_id=order_id, job_type=JOB_INVOICE_EMAIL).first()
+    assert (email_job.status, email_job.attempts) == ("pending", 1)
+    assert email_job.next_attempt_at > datetime.utcnow()
+    assert "ConnectionRefusedError" in email_job.last_error
+
+    # the retry is due: the second failure exhausts the attempts
+    email_job.next_attempt_at = datetime.utcnow()
+    db.commit()
+    worker.run_pending()
+    db.expire_all()
+    email_job = db.query(OrderOutbox).filter_by(order_id=order_id, job_type=JOB_INVOICE_EMAIL).first()
+    assert (email_job.status, email_job.attempts) == ("failed", 2)
+    os.remove(db.query(Order).filter_by(order_id=order_id).first().invoice_link)
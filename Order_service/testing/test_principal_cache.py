@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+# Proje kök dizinini PYTHONPATH'e ekle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from unittest.mock import Mock
+from models.models import Customer
+from utils.authentication_utils import verify_user_role, principal_cache
+from utils.order_settings import settings
+from utils.authentication_utils import Principal, PrincipalCache
+
+
+def make_token(email="customer@example.com", role="customer", expires_in=3600):
+    return jwt.encode({"sub": email, "role": role, "exp": int(time.time()) + expires_in},
+                      settings.jwt_secret, algorithm=settings.jwt_algorithm)
+
+
+@pytest.fixture
+def db():
+    principal_cache.clear()
+    session = Mock()
+    session.query.return_value.filter.return_value.first.return_value = Customer(
+        user_id="c1", name="Test", surname="Customer", email="customer@example.com", password="x")
+    yield session
+    principal_cache.clear()
+
+
+def test_token_is_verified_once(db):
+    token = make_token()
+    first = verify_user_role(token, db)
+    second = verify_user_role(token, db)
+
+    assert first == second == Principal(user_id="c1", email="customer@example.com", role="customer",
+                                        name="Test", surname="Customer")
+    assert db.query.call_count == 1
+
+
+def test_other_role_and_invalid_token_are_rejected(db):
+    with pytest.raises(HTTPException) as error:
+        verify_user_role(make_token(role="sales_manager"), db)
+    assert error.value.status_code == 403
+
+    with pytest.raises(HTTPException) as error:
+        verify_user_role(make_token(expires_in=-10), db)
+    assert error.value.status_code == 401
+
+
+def test_unknown_user_is_not_cached(db):
+    db.query.return_value.filter.return_value.first.return_value = None
+    token = make_token()
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            verify_user_role(token, db)
+        assert error.value.status_code == 403
+    assert db.query.call_count == 2
+
+
+def test_cache_is_bounded_and_expires():
+    cache = PrincipalCache(max_entries=2, ttl=60)
+    principal = Principal(user_id="u", email="u@example.com", role="customer")
+    cache.put("a", principal, time.time() + 60)
+    cache.put("b", principal, time.time() + 60)
+    cache.get("a")
+    cache.put("c", principal, time.time() + 60)
+    # "b" was the least recently used
+    assert cache.get("b") is None and cache.get("a") == principal and cache.get("c") == principal
+
+    cache.put("d", principal, time.time() - 1)
+    assert cache.get("d") is None
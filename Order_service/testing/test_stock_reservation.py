@@ -0,0 +1,123 @@
+import os
+import sys
+
+# Proje kök dizinini PYTHONPATH'e ekle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import date, datetime, timedelta
+from models.models import Base, Customer, Product, Order, StockHold, SalesDailyFact, OrderCreateSchema, OrderItemCreateSchema
+from schemas.refund_cancel_schemas import CancelRequestSchema
+from services.order_service import OrderService
+from services.stock_reservation import reserve_stock, StockReservationError
+from services.refund_cancel_service import cancel_order_service
+from utils.authentication_utils import Principal
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Customer(user_id="c1", name="Test", surname="Customer", email="customer@example.com", password="x"))
+    session.add(Product(product_id="p1", name="Product 1", model="M-1", serial_number="SN-1", quantity=10, price=50))
+    session.add(Product(product_id="p2", name="Product 2", model="M-2", serial_number="SN-2", quantity=1, price=20))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def stock(db, product_id):
+    db.expire_all()
+    return db.query(Product).filter_by(product_id=product_id).first().quantity
+
+
+def order_data(*items):
+    return OrderCreateSchema(
+        customer_id="c1",
+        total_price=100.0,
+        order_date="2025-01-01",
+        order_address="Tuzla Istanbul Turkey",
+        order_address_type="Home",
+        order_address_name=None,
+        payment_status="paid",
+        invoice_link=None,
+        order_status=0,
+        items=[OrderItemCreateSchema(product_id=product_id, quantity=quantity, price_at_purchase=10.0)
+               for product_id, quantity in items],
+    )
+
+
+def test_reserve_stock_sums_duplicate_lines(db):
+    remaining = reserve_stock(db, [{"product_id": "p1", "quantity": 2}, {"product_id": "p1", "quantity": 3},
+                                   {"product_id": "p2", "quantity": 1}])
+    db.commit()
+
+    assert remaining == {"p1": 5, "p2": 0}
+    assert stock(db, "p1") == 5 and stock(db, "p2") == 0
+
+
+def test_reserve_stock_reports_every_failed_line(db):
+    with pytest.raises(StockReservationError) as error:
+        reserve_stock(db, [{"product_id": "p1", "quantity": 4}, {"product_id": "p2", "quantity": 2},
+                           {"product_id": "missing", "quantity": 1}])
+    db.rollback()
+
+    assert error.value.failures == [
+        {"product_id": "missing", "requested": 1, "available": 0, "reason": "not_found"},
+        {"product_id": "p2", "requested": 2, "available": 1, "reason": "insufficient_stock"},
+    ]
+    assert stock(db, "p1") == 10
+
+
+def test_create_order_takes_the_stock_once(db):
+    OrderService.create_order(order_data(("p1", 3), ("p2", 1)), db)
+
+    assert stock(db, "p1") == 7 and stock(db, "p2") == 0
+
+
+def test_create_order_without_stock_writes_nothing(db):
+    with pytest.raises(StockReservationError):
+        OrderService.create_order(order_data(("p1", 3), ("p2", 2)), db)
+
+    assert stock(db, "p1") == 10
+    assert db.query(Order).count() == 0
+
+
+
+def test_checkout_honours_the_holds_of_other_customers(db):
+    # the holds placed by prepare_checkout in shoppingCart_service
+    expires_at = datetime.utcnow() + timedelta(minutes=10)
+    db.add(StockHold(customer_id="c2", product_id="p1", quantity=8, expires_at=expires_at))
+    db.add(StockHold(customer_id="c1", product_id="p1", quantity=2, expires_at=expires_at))
+    db.add(StockHold(customer_id="c3", product_id="p1", quantity=5, expires_at=datetime.utcnow() - timedelta(minutes=1)))
+    db.commit()
+
+    # 8 of the 10 units are held by c2, the expired hold of c3 does not count
+    with pytest.raises(StockReservationError) as error:
+        OrderService.create_order(order_data(("p1", 3)), db)
+    assert error.value.failures[0]["available"] == 2
+
+    # c1 buys what they hold, and the checkout consumes their holds
+    OrderService.create_order(order_data(("p1", 2)), db)
+    assert stock(db, "p1") == 8
+    assert sorted(hold.customer_id for hold in db.query(StockHold)) == ["c2", "c3"]
+
+
+def test_orders_are_added_to_the_daily_sales_and_cancellations_taken_back(db):
+    db.query(Product).filter_by(product_id="p1").update({"cost": 4, "category_id": 7})
+    db.commit()
+    order = OrderService.create_order(order_data(("p1", 3), ("p1", 1)), db)
+
+    fact = db.query(SalesDailyFact).one()
+    assert (fact.day, fact.product_id, fact.category_id, fact.units) == (date(2025, 1, 1), "p1", 7, 4)
+    assert (float(fact.revenue), float(fact.cost)) == (40.0, 16.0)
+
+    user = Principal(user_id="c1", email="customer@example.com", role="customer")
+    cancel_order_service(CancelRequestSchema(order_id=order.order_id), db, user)
+    db.expire_all()
+    fact = db.query(SalesDailyFact).one()
+    assert (fact.units, float(fact.revenue), float(fact.cost)) == (0, 0.0, 0.0)
@@ -0,0 +1,147 @@
+'''
+    Compares the number of SQL statements and the latency of the product listing paths
+    before (one review + one discount query per product) and after the single-query CatalogProjection.
+
+    Runs against an in-memory SQLite database seeded with synthetic data, so it needs no MySQL server.
+    Run it from the ProductListing directory:
+
+        python -m benchmarks.catalog_benchmark --products 2000 --reviews 10
+'''
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, and_
+from sqlalchemy.orm import sessionmaker
+
+from models.models import Base, ProductDB, ReviewDB, Discount, CategoryDB, ProductDiscountSchema
+from services.services import ProductService, ProductFilterParams
+from services.pagination import PageRequest
+from services.rating_summary import rebuild_rating_summary
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def seed(db, products: int, reviews_per_product: int):
+    random.seed(308)
+    now = datetime.utcnow()
+
+    db.add_all([CategoryDB(category_id=1, category_name="Dog Supplies", parentcategory_id=None)])
+    db.add_all([CategoryDB(category_id=i, category_name=f"Sub {i}", parentcategory_id=1) for i in range(2, 6)])
+
+    for i in range(products):
+        product_id = str(uuid.uuid4())
+        db.add(ProductDB(
+            product_id=product_id,
+            name=f"Product {i}",
+            model=f"M-{i}",
+            description=f"Synthetic product number {i}",
+            serial_number=f"SN-{i}",
+            category_id=random.randint(1, 5),
+            quantity=random.randint(0, 50),
+            price=random.randint(5, 500),
+            item_sold=random.randint(0, 100),
+            cost=1,
+        ))
+        for _ in range(reviews_per_product):
+            db.add(ReviewDB(
+                review_id=str(uuid.uuid4()),
+                product_id=product_id,
+                customer_id=str(uuid.uuid4()),
+                rating=random.randint(1, 5),
+                comment="",
+                approval_status=random.choice(["APPROVED", "APPROVED", "PENDING"]),
+            ))
+        if i % 3 == 0:
+            db.add(Discount(
+                product_id=product_id,
+                discount_rate=random.choice([5, 10, 25]),
+                start_date=now - timedelta(days=1),
+                end_date=now + timedelta(days=random.randint(1, 30)),
+                is_active=1,
+            ))
+    db.commit()
+
+
+def legacy_get_all_products(db):
+    # the listing as it was built before CatalogProjection: two extra queries per product
+    products = []
+    for product in db.query(ProductDB).all():
+        reviews = db.query(ReviewDB).filter(and_(ReviewDB.product_id == product.product_id, ReviewDB.approval_status == "APPROVED")).all()
+        discount = db.query(Discount).filter(and_(Discount.product_id == product.product_id, Discount.is_active)).first()
+        average_rating = sum(review.rating for review in reviews) / len(reviews) if reviews else 0
+        products.append(ProductDiscountSchema(
+            product_id=product.product_id,
+            name=product.name,
+            model=product.model,
+            description=product.description,
+            quantity=product.quantity,
+            warranty_status=product.warranty_status,
+            distributor=product.distributor,
+            image_url=product.image_url,
+            item_sold=product.item_sold,
+            price=product.price,
+            cost=product.cost,
+            category_id=product.category_id,
+            discount_rate=discount.discount_rate if discount else 0,
+            end_date=discount.end_date if discount else None,
+            average_rating=average_rating,
+        ))
+    return products
+
+
+def measure(counter, label, fn, repeat):
+    timings = []
+    queries = 0
+    rows = 0
+    for _ in range(repeat):
+        counter.count = 0
+        started = time.perf_counter()
+        result = fn()
+        # the listing methods return a ProductPage, the others a list
+        rows = len(result.items) if hasattr(result, "items") else len(result)
+        timings.append((time.perf_counter() - started) * 1000)
+        queries = counter.count
+    timings.sort()
+    print(f"{label:<32} rows={rows:<6} queries={queries:<6} median={timings[len(timings) // 2]:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Product listing query benchmark")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--reviews", type=int, default=10, help="reviews per product")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, args.products, args.reviews)
+    rebuild_rating_summary(db)
+
+    counter = QueryCounter(engine)
+    service = ProductService(db)
+
+    measure(counter, "legacy get_all_products", lambda: legacy_get_all_products(db), args.repeat)
+    # the whole listing, as the legacy path reads it, then the first page the endpoints return by default
+    everything = PageRequest(limit=None)
+    measure(counter, "get_all_products", lambda: service.get_all_products(everything), args.repeat)
+    measure(counter, "get_all_products first page", service.get_all_products, args.repeat)
+    measure(counter, "get_products_by_category_id", lambda: service.get_products_by_category_id(1, everything), args.repeat)
+    measure(counter, "get_products_sorted_by_price", lambda: service.get_products_sorted_by_price("asc", everything), args.repeat)
+    measure(counter, "search_product_by_name_desc", lambda: service.search_product_by_name_description("1"), args.repeat)
+    measure(counter, "filter_products", lambda: service.filter_products(1, ProductFilterParams(rating_min=3), everything), args.repeat)
+    measure(counter, "get_discounted_products", service.get_discounted_products, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
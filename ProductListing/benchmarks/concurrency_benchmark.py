@@ -0,0 +1,103 @@
+'''
+    Load test of one worker: sends --requests requests to GET /products/get/categories at several concurrency
+    levels and reports the throughput and the latency percentiles, with the handler as a plain "def" that FastAPI
+    runs on its threadpool (as in controllers/controllers.py) and as the previous "async def" calling the synchronous
+    session ("blocking"), which runs every query on the event loop and so serves one request at a time.
+
+    The app runs in process through httpx.ASGITransport against a throw-away SQLite file; each query sleeps
+    --db-latency milliseconds first, standing in for the round trip to MySQL that the event loop waits on.
+    Run it from the ProductListing directory:
+
+        python -m benchmarks.concurrency_benchmark --requests 400 --concurrency 1,8,32 --db-latency 5
+'''
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+
+import controllers.controllers as controllers
+from dbContext import get_db
+from models.models import Base, CategoryDB
+
+
+def make_app(Session, blocking: bool) -> FastAPI:
+    app = FastAPI()
+    if blocking:
+        @app.get("/products/get/categories")
+        async def get_categories(db: Session = Depends(get_db)):
+            return controllers.get_categories(db)
+    else:
+        app.include_router(controllers.router)
+
+    def get_bench_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = get_bench_db
+    return app
+
+
+async def load(app: FastAPI, requests: int, concurrency: int):
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def client_loop(client):
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.get("/products/get/categories")
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return requests / elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent request load test on one worker")
+    parser.add_argument("--requests", type=int, default=400, help="requests per run")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrent clients")
+    parser.add_argument("--db-latency", type=float, default=5.0, help="milliseconds added to every query")
+    parser.add_argument("--categories", type=int, default=50)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    path = os.path.join(tempfile.mkdtemp(), "concurrency_benchmark.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                           pool_size=max(levels), max_overflow=0)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db = Session()
+    db.add_all(CategoryDB(category_id=i, category_name=f"Category {i}") for i in range(1, args.categories + 1))
+    db.commit()
+    db.close()
+
+    latency = args.db_latency / 1000
+    event.listen(engine, "before_cursor_execute", lambda *event_args: time.sleep(latency))
+
+    for label, blocking in (("blocking", True), ("threadpool", False)):
+        app = make_app(Session, blocking)
+        for concurrency in levels:
+            throughput, p50, p95 = asyncio.run(load(app, args.requests, concurrency))
+            print(f"{label:<10} concurrency={concurrency:<4} throughput={throughput:8.1f} req/s "
+                  f"p50={p50:8.2f} ms  p95={p95:8.2f} ms")
+
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
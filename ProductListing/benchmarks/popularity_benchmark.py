@@ -0,0 +1,132 @@
+'''
+    Measures one recomputation of product_popularity with the previous ProductService.update_popularity_scores
+    (one aggregate query, then a SELECT and an UPDATE or INSERT per product through the ORM: "legacy") and with the
+    popularity engine of services/popularity.py, as a full run and as an incremental run after --touched products
+    got a new order. It reports the duration and the number of statements of each run, then the time of one
+    GET /products/popular page read from the score.
+
+    It uses a throw-away SQLite file. Run it from the ProductListing directory:
+
+        python -m benchmarks.popularity_benchmark --products 5000 --orders 20000 --touched 50
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+
+from models.models import Base, ProductDB, ReviewDB, ProductPopularity, ProductRatingSummary, OrderDB, OrderItemDB
+from services.pagination import PageRequest
+from services.popularity import recompute_popularity, run_due
+from services.rating_summary import rebuild_rating_summary
+from services.services import ProductService
+
+
+def legacy_update_popularity_scores(db):
+    # ProductService.update_popularity_scores before the popularity engine
+    popularity_scores = (
+        db.query(
+            ProductDB.product_id,
+            (func.sum(ProductDB.item_sold) * 0.5 +
+             func.avg(ReviewDB.rating) * 0.3 +
+             func.count(ReviewDB.review_id) * 0.2
+             ).label("popularity_score")
+        )
+        .outerjoin(ReviewDB, ReviewDB.product_id == ProductDB.product_id)
+        .group_by(ProductDB.product_id)
+        .all()
+    )
+    for product_id, score in popularity_scores:
+        existing_entry = db.query(ProductPopularity).filter_by(product_id=product_id).first()
+        if existing_entry:
+            existing_entry.popularity_score = score
+            existing_entry.last_updated = datetime.utcnow()
+        else:
+            db.add(ProductPopularity(product_id=product_id, popularity_score=score, last_updated=datetime.utcnow()))
+    db.commit()
+
+
+def seed(Session, args):
+    rng = random.Random(308)
+    db = Session()
+    product_ids = [str(uuid.uuid4()) for _ in range(args.products)]
+    db.add_all(ProductDB(product_id=product_id, name=f"Product {i}", model="M", serial_number=f"SN-{i}",
+                         quantity=100, price=10, cost=5, item_sold=rng.randint(0, 500))
+               for i, product_id in enumerate(product_ids))
+    db.add_all(ReviewDB(customer_id=str(uuid.uuid4()), product_id=rng.choice(product_ids), rating=rng.randint(1, 5),
+                        approval_status="APPROVED") for _ in range(args.products * 2))
+    now = datetime.utcnow()
+    orders, items = [], []
+    for _ in range(args.orders):
+        order_id = str(uuid.uuid4())
+        orders.append(OrderDB(order_id=order_id, total_price=10, payment_status="paid",
+                              order_status=rng.choice((0, 1, 2, 3, 3, 3, 4)),
+                              order_date=now - timedelta(days=rng.uniform(1, 120))))
+        items.extend(OrderItemDB(order_id=order_id, product_id=rng.choice(product_ids), price_at_purchase=10,
+                                 quantity=rng.randint(1, 3)) for _ in range(rng.randint(1, 3)))
+    db.add_all(orders)
+    db.add_all(items)
+    db.commit()
+    rebuild_rating_summary(db)
+    # the reviews were approved before the last run, as in production
+    db.query(ProductRatingSummary).update({ProductRatingSummary.last_updated: now - timedelta(days=1)})
+    db.commit()
+    db.close()
+    return product_ids
+
+
+def measure(engine, label, work):
+    statements = []
+    listener = lambda *event_args: statements.append(event_args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    started = time.perf_counter()
+    result = work()
+    elapsed = (time.perf_counter() - started) * 1000
+    event.remove(engine, "before_cursor_execute", listener)
+    print(f"{label:<12} duration={elapsed:9.1f} ms  statements={len(statements):<6}", end="")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Popularity recomputation benchmark")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--touched", type=int, default=50, help="products ordered again before the incremental run")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "popularity_benchmark.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    product_ids = seed(Session, args)
+
+    db = Session()
+    measure(engine, "legacy", lambda: legacy_update_popularity_scores(db))
+    print()
+    run = measure(engine, "full", lambda: recompute_popularity(db))
+    print(f"  products={run.products_updated}")
+
+    order_id = str(uuid.uuid4())
+    db.add(OrderDB(order_id=order_id, total_price=10, payment_status="paid", order_status=1))
+    db.add_all(OrderItemDB(order_id=order_id, product_id=product_id, price_at_purchase=10, quantity=1)
+               for product_id in random.Random(1).sample(product_ids, args.touched))
+    db.commit()
+    run = measure(engine, "incremental", lambda: run_due(db))
+    print(f"  products={run.products_updated}")
+
+    page = PageRequest(limit=20, fields=["product_id", "name", "price"])
+    measure(engine, "popular page", lambda: ProductService(db).get_products_sorted_by_popularity(page))
+    print()
+    db.close()
+
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
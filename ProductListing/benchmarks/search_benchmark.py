@@ -0,0 +1,68 @@
+'''
+    Compares the product search through the in-process index (services/search_index.py)
+    with the ILIKE '%q%' scan it replaced, on an in-memory SQLite database seeded with synthetic data.
+    Run it from the ProductListing directory:
+
+        python -m benchmarks.search_benchmark --products 20000
+'''
+import argparse
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.models import Base, ProductDB
+from services.services import ProductService
+from services.search_index import search_index
+from services.rating_summary import rebuild_rating_summary
+from benchmarks.catalog_benchmark import seed
+
+QUERIES = ["product", "synthetic 12", "numb", "product 1999", "m-5"]
+
+
+def legacy_search(db, query):
+    # the query the endpoint ran before the index, without the per-product review and discount lookups
+    return db.query(ProductDB).filter(
+        (ProductDB.name.ilike(f"%{query}%")) | (ProductDB.description.ilike(f"%{query}%"))
+    ).all()
+
+
+def timed(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return result, timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Product search benchmark")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=20, help="page size of the indexed search")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, args.products, 0)
+    rebuild_rating_summary(db)
+
+    _, build_ms = timed(lambda: search_index.build(db), 1)
+    print(f"index build: {len(search_index)} products in {build_ms:.1f} ms")
+
+    service = ProductService(db)
+    for query in QUERIES:
+        rows, legacy_ms = timed(lambda: legacy_search(db, query), args.repeat)
+        (total, page), index_ms = timed(lambda: service.search_products(query, 0, args.limit), args.repeat)
+        print(
+            f"{query!r:<16} ilike: {len(rows):<6} rows {legacy_ms:8.2f} ms | "
+            f"index: {total:<6} matches, page of {len(page):<3} {index_ms:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
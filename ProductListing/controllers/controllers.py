@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, Query, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status, Request, Response
+from fastapi.concurrency import run_in_threadpool
 import uuid
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from models.models import Category, CategoryDB, Product, ProductCreate, ProductDB, ProductUpdate, ProductSchema, ProductDiscountSchema
+from models.models import Category, CategoryDB, Product, ProductCreate, ProductDB, ProductUpdate, ProductSchema, ProductDiscountSchema, ProductListingItem
 from services.services import ProductService
-from dbContext import get_db  # This dependency function provides the database session
+from services.pagination import PageRequest, ProductPage, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, parse_fields
+from services.product_cache import product_detail_cache
+from services.popularity import recent_runs
+from dbContext import get_db, get_read_db  # These dependency functions provide the database sessions
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
@@ -15,6 +19,32 @@ class CategoriesSchema(BaseModel):
     category_name : str
 
 
+# fields of the listings that used to return the Product model, returned when the client does not ask for fields
+PRODUCT_MODEL_FIELDS = list(Product.model_fields)
+
+
+def page_request(
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. name,price,image_url"),
+) -> PageRequest:
+    try:
+        return PageRequest(cursor=cursor, limit=limit, fields=parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def page_response(response: Response, load_page) -> list:
+    # runs the listing and puts the cursor of the next page in the X-Next-Cursor header, empty on the last page
+    try:
+        page: ProductPage = load_page()
+    except ValueError as e:
+        # cursor that does not belong to this listing
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["X-Next-Cursor"] = page.next_cursor or ""
+    return page.items
+
+
 @router.get("/{product_id}/category", response_model=dict)
 def get_product_category(product_id: str, db: Session = Depends(get_db)):
     """
@@ -32,16 +62,18 @@ def get_product_category(product_id: str, db: Session = Depends(get_db)):
     return service.get_category_info_of_product(product_id)
     
 
-@router.get("/", response_model=List[ProductDiscountSchema])
-async def get_all_products(db: Session = Depends(get_db)):
+@router.get("/", response_model=List[ProductListingItem], response_model_exclude_unset=True)
+def get_all_products(response: Response, page: PageRequest = Depends(page_request), db: Session = Depends(get_read_db)):
     service = ProductService(db)
-    return service.get_all_products()
+    return page_response(response, lambda: service.get_all_products(page))
 
 
-@router.get("/sorted-by-price", response_model=List[Product])
-async def get_products_sorted_by_price(
+@router.get("/sorted-by-price", response_model=List[ProductListingItem], response_model_exclude_unset=True)
+def get_products_sorted_by_price(
+    response: Response,
     order: str = "asc",  # Default is ascending
-    db: Session = Depends(get_db)
+    page: PageRequest = Depends(page_request),
+    db: Session = Depends(get_read_db)
 ):
     """
     Get products sorted by price.
@@ -56,27 +88,29 @@ async def get_products_sorted_by_price(
             detail="Invalid order parameter. Use 'asc' for ascending or 'desc' for descending."
         )
     
-    return service.get_products_sorted_by_price(order)
+    if page.fields is None:
+        page.fields = PRODUCT_MODEL_FIELDS
+    return page_response(response, lambda: service.get_products_sorted_by_price(order, page))
 
 # TUNAHAN - yeni eklenen path ler
 
 # return the categories which have no parent category
 @router.get("/categories/root", response_model=List[CategoriesSchema])
-async def get_root_categories(db: Session = Depends(get_db)):
+def get_root_categories(db: Session = Depends(get_db)):
     service = ProductService(db)
     return service.get_root_categories()
 
 # return the categories which have the specified parent category
 @router.get("/categories/parent/{parent_id}", response_model=List[CategoriesSchema])
-async def get_categories_by_parent_id(parent_id: int, db: Session = Depends(get_db)):
+def get_categories_by_parent_id(parent_id: int, db: Session = Depends(get_db)):
     service = ProductService(db)
     return service.get_categories_by_parent_id(parent_id)
 
 # root category girilirse subcategorilerindeki ürünler de dönülsün - detailed "/getproduct/category/{category_id}"
-@router.get("/getproduct/category/detailed/{category_id}", response_model=List[ProductDiscountSchema])
-async def get_products_by_category_id(category_id: int, db: Session = Depends(get_db)):
+@router.get("/getproduct/category/detailed/{category_id}", response_model=List[ProductListingItem], response_model_exclude_unset=True)
+def get_products_by_category_id(category_id: int, response: Response, page: PageRequest = Depends(page_request), db: Session = Depends(get_read_db)):
     service = ProductService(db)
-    return service.get_products_by_category_id(category_id)
+    return page_response(response, lambda: service.get_products_by_category_id(category_id, page))
 
 
 # FILTERS
@@ -88,10 +122,12 @@ class ProductFilterParams(BaseModel):
     warranty_status: Optional[int] = None
 
 
-@router.post("/filterproducts/category/{category_id}", response_model=List[ProductDiscountSchema])
-async def filter_products(
+@router.post("/filterproducts/category/{category_id}", response_model=List[ProductListingItem], response_model_exclude_unset=True)
+def filter_products(
     category_id: int,
     filters: ProductFilterParams,
+    response: Response,
+    page: PageRequest = Depends(page_request),
     db: Session = Depends(get_db),
 ):
     """
@@ -106,19 +142,45 @@ async def filter_products(
         List[Product]: List of filtered products.
     """
     service = ProductService(db)
-    return service.filter_products(category_id, filters)    
+    return page_response(response, lambda: service.filter_products(category_id, filters, page))
 
 # ---
 
-@router.get("/popular", response_model=List[Product])
-def get_products_sorted_by_popularity(db: Session = Depends(get_db)):
+@router.get("/popular", response_model=List[ProductListingItem], response_model_exclude_unset=True)
+def get_products_sorted_by_popularity(response: Response, page: PageRequest = Depends(page_request), db: Session = Depends(get_db)):
     service = ProductService(db)
-    popular_products = service.get_products_sorted_by_popularity()
-    return popular_products
+    if page.fields is None:
+        page.fields = PRODUCT_MODEL_FIELDS
+    return page_response(response, lambda: service.get_products_sorted_by_popularity(page))
+
+
+@router.get("/popular/runs", response_model=List[dict])
+def get_popularity_runs(limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_db)):
+    """
+    The last runs of the popularity engine: mode, start time, duration and number of products recomputed.
+    """
+    return [
+        {
+            "run_id": run.run_id,
+            "mode": run.mode,
+            "started_at": run.started_at,
+            "duration_ms": run.duration_ms,
+            "products_updated": run.products_updated,
+        }
+        for run in recent_runs(db, limit)
+    ]
+
+
+@router.get("/cache-stats", response_model=dict)
+def get_product_cache_stats():
+    """
+    Hit / miss / eviction counters of the product detail cache.
+    """
+    return product_detail_cache.stats()
 
 
 @router.get("/{product_id}", response_model=ProductDiscountSchema)
-async def get_product(product_id: str = Path(..., regex=r"^[a-fA-F0-9-]{36}$"), db: Session = Depends(get_db)):
+def get_product(product_id: str = Path(..., regex=r"^[a-fA-F0-9-]{36}$"), db: Session = Depends(get_db)):
     service = ProductService(db)
     product = service.get_product_by_id(product_id)
     if not product:
@@ -148,7 +210,7 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
 
 
 @router.put("/{product_id}", response_model=Product)
-async def update_product(
+def update_product(
     product_data: ProductUpdate,
     product_id: str = Path(..., regex=r"^[a-fA-F0-9-]{36}$"),
     db: Session = Depends(get_db)):
@@ -174,10 +236,13 @@ def delete_product(product_id: uuid.UUID, db: Session = Depends(get_db)):
 
 
 
-@router.post("/search")
-async def search_products(request: Request, db: Session = Depends(get_db)):
+@router.post("/search", response_model=List[ProductDiscountSchema])
+async def search_products(request: Request, response: Response, db: Session = Depends(get_db)):
     """
     Search products based on the input query from the user.
+
+    The body is {"query": ..., "offset": 0, "limit": 20}; offset and limit are optional and
+    the results are ranked by relevance. The number of matches is returned in the X-Total-Count header.
     """
     data = await request.json()
     query = data.get("query", "").strip()  # Get the search query from the request body
@@ -185,22 +250,33 @@ async def search_products(request: Request, db: Session = Depends(get_db)):
     if not query: #If query does not exists
         raise HTTPException(status_code=400, detail="Search query cannot be empty.")
 
+    try:
+        offset = int(data.get("offset", 0))
+        limit = data.get("limit")
+        limit = int(limit) if limit is not None else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="offset and limit must be integers.")
+    if offset < 0 or (limit is not None and limit <= 0):
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit must be > 0.")
+
+    # the handler is async to read the body; the search queries run on the threadpool, not on the event loop
     service = ProductService(db)
-    return service.search_product_by_name_description(query)
-    # Query the database for matching products
+    total, products = await run_in_threadpool(service.search_products, query, offset, limit)
+    response.headers["X-Total-Count"] = str(total)
+    return products
 
 
 
 
 @router.get('/get/categories', response_model=List[CategoriesSchema])
-async def get_categories(db: Session = Depends(get_db)):
+def get_categories(db: Session = Depends(get_db)):
     return db.query(CategoryDB).all()
 
 
 
 
 @router.get("/getproduct/category/{category_id}", response_model=List[ProductSchema])
-async def get_products_by_category(
+def get_products_by_category(
     category_id: int,
     db: Session = Depends(get_db)
 ):
@@ -224,7 +300,7 @@ async def get_products_by_category(
 
 
 @router.get("/products/discounted-by-rate", response_model=List[ProductDiscountSchema])
-async def get_discounted_products_by_rate(db: Session = Depends(get_db)):
+def get_discounted_products_by_rate(db: Session = Depends(get_db)):
     """
     Get discounted products sorted by discount rate.
     """
@@ -233,7 +309,7 @@ async def get_discounted_products_by_rate(db: Session = Depends(get_db)):
 
 
 @router.get("/products/discounted-by-end-date", response_model=List[ProductDiscountSchema])
-async def get_discounted_products_by_end_date(db: Session = Depends(get_db)):
+def get_discounted_products_by_end_date(db: Session = Depends(get_db)):
     """
     Get discounted products sorted by discount end date.
     """
@@ -2,6 +2,11 @@ from fastapi import FastAPI
 from controllers.controllers import router as product_router
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
+from dbContext import engine, SessionLocal, database
+from services.rating_summary import ensure_rating_summary
+from services.search_index import search_index
+from services.popularity import ensure_popularity, popularity_scheduler
+from models.models import CacheVersion
 
 app = FastAPI(title="Product Listing Microservice")
 
@@ -12,16 +17,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, OPTIONS, etc.)
     allow_headers=["*"],  # Allow all headers (e.g., Content-Type, Authorization)
+    expose_headers=["X-Next-Cursor"],  # the cursor of the next page of the product listings
 )
 
 # Register the product router
 app.include_router(product_router)
 
+# Create and backfill the rating summary table the listings read the average ratings from, and the cache version table
+@app.on_event("startup")
+def init_rating_summary():
+    ensure_rating_summary(engine, SessionLocal)
+    # the category tree cache compares its version with the row dashboards_service bumps on category writes
+    CacheVersion.__table__.create(bind=engine, checkfirst=True)
+
+# Build the product search index before the first search request
+@app.on_event("startup")
+def init_search_index():
+    db = SessionLocal()
+    try:
+        search_index.build(db)
+    finally:
+        db.close()
+
+# Recompute product_popularity in the background: a full run first, then the products touched since the last run
+@app.on_event("startup")
+def init_popularity():
+    ensure_popularity(engine)
+    popularity_scheduler.start(SessionLocal)
+
+@app.on_event("shutdown")
+def stop_popularity():
+    popularity_scheduler.stop()
+
 # Root route for health check
 @app.get("/")
 def health_check():
     return {"message": "Product Listing Microservice is running"}
 
+# Connection pool metrics: checkout wait times, timeouts and saturation of each engine
+@app.get("/db/stats")
+def db_stats():
+    return database.stats()
+
 
 from fastapi.staticfiles import StaticFiles
 app.mount("/static", StaticFiles(directory="static"), name="static")
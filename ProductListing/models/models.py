@@ -27,7 +27,7 @@ class ProductDB(Base):
     cost = Column(DECIMAL, nullable=False)   
     # Relationship to reviews
     discounts = relationship("Discount", back_populates="product")
-    reviews = relationship("ReviewDB", back_populates="product")
+    reviews = relationship("ReviewDB", back_populates="product", passive_deletes=True)  # the review rows go with ON DELETE CASCADE
     
 
     def __repr__(self):
@@ -87,6 +87,26 @@ class ProductDiscountSchema(BaseModel):
         from_attributes = True
 
 
+# Pydantic Model of a paginated listing row: every field is optional because the client can pick the fields it needs
+class ProductListingItem(BaseModel):
+    product_id: Optional[str] = None
+    name: Optional[str] = None
+    model: Optional[str] = None
+    description: Optional[str] = None
+    serial_number: Optional[str] = None
+    category_id: Optional[int] = None
+    quantity: Optional[int] = None
+    price: Optional[float] = None
+    distributor: Optional[str] = None
+    image_url: Optional[str] = None
+    item_sold: Optional[int] = None
+    warranty_status: Optional[int] = None
+    cost: Optional[float] = None
+    discount_rate: Optional[float] = None
+    end_date: Optional[datetime] = None
+    average_rating: Optional[float] = None
+
+
 # SQLAlchemy Model for Reviews
 class ReviewDB(Base):
     __tablename__ = 'review'
@@ -109,6 +129,60 @@ class ProductPopularity(Base):
     popularity_score = Column(Float, index=True)  # Precomputed popularity score
     last_updated = Column(DateTime, default=datetime.utcnow)
 
+# Model for PopularityRun: one row per recomputation of product_popularity, the watermark of the incremental runs
+class PopularityRun(Base):
+    __tablename__ = 'popularity_run'
+
+    run_id = Column(Integer, primary_key=True, autoincrement=True)
+    mode = Column(String(20), nullable=False)  # "full" or "incremental"
+    started_at = Column(DateTime, nullable=False, index=True)
+    finished_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Float, nullable=False)
+    products_updated = Column(Integer, nullable=False)
+
+# Orders and their items, read (never written) by the popularity engine for the recent sales of each product
+class OrderDB(Base):
+    __tablename__ = 'orders'
+
+    order_id = Column(CHAR(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    customer_id = Column(CHAR(36), nullable=True)
+    total_price = Column(DECIMAL(10, 2), nullable=False)
+    order_date = Column(DateTime, nullable=False, default=datetime.utcnow)
+    order_status = Column(Integer, nullable=False)
+    payment_status = Column(String(50), nullable=False)
+
+class OrderItemDB(Base):
+    __tablename__ = 'order_items'
+
+    order_item_id = Column(CHAR(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    product_id = Column(CHAR(36), ForeignKey('products.product_id', ondelete="CASCADE"), index=True)
+    order_id = Column(CHAR(36), ForeignKey('orders.order_id', ondelete="CASCADE"), index=True)
+    price_at_purchase = Column(DECIMAL(10, 2), nullable=False)
+    quantity = Column(Integer, nullable=False, default=1)
+
+# Model for ProductRatingSummary: running totals of the approved reviews of a product
+class ProductRatingSummary(Base):
+    __tablename__ = 'product_rating_summary'
+
+    product_id = Column(String(36), ForeignKey('products.product_id', ondelete="CASCADE"), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_1 = Column(Integer, nullable=False, default=0)
+    rating_2 = Column(Integer, nullable=False, default=0)
+    rating_3 = Column(Integer, nullable=False, default=0)
+    rating_4 = Column(Integer, nullable=False, default=0)
+    rating_5 = Column(Integer, nullable=False, default=0)
+    average_rating = Column(Float, nullable=False, default=0, index=True)  # rating_sum / review_count, kept for range filters
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+# Model for CacheVersion: a counter per cached data set, bumped by the services that change the data
+class CacheVersion(Base):
+    __tablename__ = 'cache_version'
+
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 # Pydantic Model for Product
 class Product(BaseModel):
     product_id: uuid.UUID
@@ -0,0 +1,166 @@
+from typing import List, Optional
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from models.models import ProductDB, ProductRatingSummary, Discount, ProductDiscountSchema
+from services.pagination import PageRequest, ProductPage, encode_cursor, decode_cursor, keyset_predicate
+
+
+# Columns of the products table that are copied as-is into ProductDiscountSchema
+PRODUCT_COLUMNS = (
+    ProductDB.product_id,
+    ProductDB.name,
+    ProductDB.model,
+    ProductDB.description,
+    ProductDB.serial_number,
+    ProductDB.category_id,
+    ProductDB.quantity,
+    ProductDB.price,
+    ProductDB.distributor,
+    ProductDB.image_url,
+    ProductDB.item_sold,
+    ProductDB.warranty_status,
+    ProductDB.cost,
+)
+
+
+class CatalogProjection:
+    '''
+        Builds the ProductDiscountSchema rows of the listing endpoints from one SQL statement.
+
+        Every product row is joined (LEFT JOIN) with:
+            - its row of product_rating_summary (average rating and count of the approved reviews),
+            - its active discount (the highest active rate, earliest end date on ties).
+
+        So a listing costs one round trip no matter how many products it returns,
+        instead of two extra queries per product.
+    '''
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def review_stats():
+        # average rating and number of approved reviews per product, kept up to date by services/rating_summary.py
+        return ProductRatingSummary.__table__
+
+    @staticmethod
+    def active_discounts(*criteria):
+        # one active discount per product, picked with a window function so that the rate and the end date come from the same row
+        # criteria on Discount narrow the rows the window runs over (e.g. to the products of one page)
+        ranked = (
+            select(
+                Discount.product_id.label("product_id"),
+                Discount.discount_rate.label("discount_rate"),
+                Discount.end_date.label("end_date"),
+                func.row_number().over(
+                    partition_by=Discount.product_id,
+                    order_by=(Discount.discount_rate.desc(), Discount.end_date.asc()),
+                ).label("rank"),
+            )
+            .where(Discount.is_active == 1, *criteria)
+            .subquery("ranked_discounts")
+        )
+        return (
+            select(ranked.c.product_id, ranked.c.discount_rate, ranked.c.end_date)
+            .where(ranked.c.rank == 1)
+            .subquery("active_discounts")
+        )
+
+    def statement(self, *criteria, order_by=(), review_stats=None, discounts=None, fields=None, joins=()):
+        '''
+            Returns the SELECT statement of the projection.
+
+            Parameters:
+                criteria: WHERE clauses applied to the joined rows (they can reference ProductDB, review_stats and discounts).
+                order_by: ORDER BY clauses.
+                review_stats / discounts: the subqueries to join, so that callers can build criteria on their columns.
+                fields: names of the columns to select (all of them when None). The rating and discount joins are
+                    left out when none of their columns is selected and the caller did not pass them for its criteria.
+                joins: extra (target, onclause) inner joins, e.g. to order by a column of another table.
+        '''
+        join_reviews = review_stats is not None or fields is None or "average_rating" in fields
+        join_discounts = discounts is not None or fields is None or "discount_rate" in fields or "end_date" in fields
+        review_stats = review_stats if review_stats is not None else self.review_stats()
+        discounts = discounts if discounts is not None else self.active_discounts()
+
+        columns = {column.key: column for column in PRODUCT_COLUMNS}
+        columns["average_rating"] = func.coalesce(review_stats.c.average_rating, 0).label("average_rating")
+        columns["discount_rate"] = func.coalesce(discounts.c.discount_rate, 0).label("discount_rate")
+        columns["end_date"] = discounts.c.end_date.label("end_date")
+
+        stmt = select(*(columns.values() if fields is None else [columns[field] for field in fields])).select_from(ProductDB)
+        if join_reviews:
+            stmt = stmt.outerjoin(review_stats, review_stats.c.product_id == ProductDB.product_id)
+        if join_discounts:
+            stmt = stmt.outerjoin(discounts, discounts.c.product_id == ProductDB.product_id)
+        for target, onclause in joins:
+            stmt = stmt.join(target, onclause)
+        if criteria:
+            stmt = stmt.where(*criteria)
+        if order_by:
+            stmt = stmt.order_by(*order_by)
+        return stmt
+
+    def page(self, *criteria, sort_keys, page: PageRequest = None, review_stats=None, discounts=None, joins=()) -> ProductPage:
+        '''
+            One page of the projection in keyset order.
+
+            sort_keys: (expression, descending) pairs, the last one must be ProductDB.product_id so that the order is total.
+            page: cursor / limit / fields of the request (the first DEFAULT_PAGE_SIZE rows, all fields, when None).
+            Raises ValueError for a cursor that was not produced by the same listing.
+        '''
+        page = page or PageRequest()
+        criteria = list(criteria)
+        if page.cursor:
+            criteria.append(keyset_predicate(sort_keys, decode_cursor(page.cursor, sort_keys)))
+
+        stmt = self.statement(
+            *criteria,
+            order_by=[expression.desc() if descending else expression.asc() for expression, descending in sort_keys],
+            review_stats=review_stats,
+            discounts=discounts,
+            fields=page.fields,
+            joins=joins,
+        )
+        # the sort key values are selected too, so that the cursor can be built whatever the selected fields are
+        stmt = stmt.add_columns(*[expression.label(f"_sort_{index}") for index, (expression, _) in enumerate(sort_keys)])
+        if page.limit is not None:
+            # one row more than the page tells whether there is a next page
+            stmt = stmt.limit(page.limit + 1)
+
+        rows = self.db.execute(stmt).all()
+        next_cursor = None
+        if page.limit is not None and len(rows) > page.limit:
+            rows = rows[:page.limit]
+            last = rows[-1]._mapping
+            next_cursor = encode_cursor([last[f"_sort_{index}"] for index in range(len(sort_keys))])
+
+        items = [
+            {key: value for key, value in row._mapping.items() if not key.startswith("_sort_")}
+            for row in rows
+        ]
+        return ProductPage(items=items, next_cursor=next_cursor)
+
+    @staticmethod
+    def to_schema(row) -> ProductDiscountSchema:
+        return ProductDiscountSchema(**row._mapping)
+
+    def fetch(self, *criteria, order_by=(), review_stats=None, discounts=None) -> List[ProductDiscountSchema]:
+        stmt = self.statement(*criteria, order_by=order_by, review_stats=review_stats, discounts=discounts)
+        return self.fetch_statement(stmt)
+
+    def fetch_statement(self, stmt) -> List[ProductDiscountSchema]:
+        # runs a statement built by statement() (possibly extended with extra joins by the caller)
+        return [self.to_schema(row) for row in self.db.execute(stmt)]
+
+    def fetch_one(self, product_id: str) -> Optional[ProductDiscountSchema]:
+        discounts = self.active_discounts(Discount.product_id == product_id)
+        row = self.db.execute(self.statement(ProductDB.product_id == product_id, discounts=discounts)).first()
+        return self.to_schema(row) if row else None
+
+    def fetch_by_ids(self, product_ids: List[str]) -> List[ProductDiscountSchema]:
+        # the products of a known id list (in no particular order), with the discount ranking limited to them
+        if not product_ids:
+            return []
+        discounts = self.active_discounts(Discount.product_id.in_(product_ids))
+        return self.fetch(ProductDB.product_id.in_(product_ids), discounts=discounts)
@@ -0,0 +1,123 @@
+'''
+    Cached category tree of the product listings.
+
+    The category table is loaded once into an adjacency map (parent -> children) and numbered in
+    depth-first order (nested set): the descendants of a category are the contiguous slice
+    [left, right] of that order, so any depth is resolved in memory and a category listing becomes
+    a single "category_id IN (...)" query on the indexed products.category_id.
+
+    Categories are written by dashboards_service, which bumps the "category_tree" row of cache_version in
+    the same transaction. The cache compares that version at most every VERSION_CHECK_INTERVAL seconds
+    and reloads the tree when it changed (and in any case when it is older than MAX_AGE seconds).
+'''
+
+import threading
+import time
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from models.models import CategoryDB
+from services.cache_version import read_cache_version
+
+CACHE_VERSION_NAME = "category_tree"
+VERSION_CHECK_INTERVAL = 5
+MAX_AGE = 600
+
+
+class CategoryTree:
+    def __init__(self, rows):
+        # rows: (category_id, parentcategory_id, category_name)
+        self.names: Dict[int, str] = {}
+        self.parents: Dict[int, Optional[int]] = {}
+        self.children: Dict[int, List[int]] = {}
+        for category_id, parent_id, name in rows:
+            self.names[category_id] = name
+            self.parents[category_id] = parent_id
+            self.children.setdefault(category_id, [])
+        for category_id, parent_id in self.parents.items():
+            if parent_id in self.parents:
+                self.children[parent_id].append(category_id)
+        for children in self.children.values():
+            children.sort()
+
+        # categories whose parent is missing are treated as roots so that they stay reachable
+        self.roots = sorted(category_id for category_id, parent_id in self.parents.items() if parent_id not in self.parents)
+
+        self.order: List[int] = []
+        self.left: Dict[int, int] = {}
+        self.right: Dict[int, int] = {}
+        for root in self.roots:
+            self._number(root)
+        # categories on a parent cycle are not reachable from a root: number them on their own
+        for category_id in sorted(self.parents):
+            if category_id not in self.left:
+                self._number(category_id)
+
+    def _number(self, root: int) -> None:
+        # iterative depth-first numbering; a category already numbered is not entered again
+        stack = [(root, False)]
+        while stack:
+            category_id, leaving = stack.pop()
+            if leaving:
+                self.right[category_id] = len(self.order) - 1
+                continue
+            if category_id in self.left:
+                continue
+            self.left[category_id] = len(self.order)
+            self.order.append(category_id)
+            stack.append((category_id, True))
+            for child in reversed(self.children[category_id]):
+                if child not in self.left:
+                    stack.append((child, False))
+
+    def __contains__(self, category_id: int) -> bool:
+        return category_id in self.left
+
+    def descendants(self, category_id: int, include_self: bool = True) -> List[int]:
+        # every category below category_id, at any depth; [] for an unknown category
+        if category_id not in self.left:
+            return []
+        start = self.left[category_id] if include_self else self.left[category_id] + 1
+        return self.order[start:self.right[category_id] + 1]
+
+    def ancestors(self, category_id: int) -> List[int]:
+        # parent first, root last
+        result = []
+        parent_id = self.parents.get(category_id)
+        while parent_id in self.parents and parent_id not in result and parent_id != category_id:
+            result.append(parent_id)
+            parent_id = self.parents[parent_id]
+        return result
+
+
+class CategoryTreeCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree: Optional[CategoryTree] = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._tree = None
+
+    def get(self, db: Session) -> CategoryTree:
+        now = time.monotonic()
+        tree = self._tree
+        if tree is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return tree
+
+        with self._lock:
+            if self._tree is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+                return self._tree
+            version = read_cache_version(db, CACHE_VERSION_NAME)
+            if self._tree is None or version != self._version or now - self._loaded_at > MAX_AGE:
+                rows = db.query(CategoryDB.category_id, CategoryDB.parentcategory_id, CategoryDB.category_name).all()
+                self._tree = CategoryTree(rows)
+                self._version = version
+                self._loaded_at = now
+            self._checked_at = now
+            return self._tree
+
+
+category_tree_cache = CategoryTreeCache()
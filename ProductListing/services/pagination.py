@@ -0,0 +1,103 @@
+'''
+    Keyset (cursor) pagination and field projection for the product listing endpoints.
+
+    A page is requested with an opaque cursor, a limit and an optional list of fields.
+    The cursor holds the sort key values and the product_id of the last row of the previous page,
+    so the next page is read with "WHERE (sort key, product_id) > (cursor values) ORDER BY ... LIMIT n"
+    and costs the same as the first one, whatever its position. A listing always returns a page: DEFAULT_PAGE_SIZE
+    rows when the client gives no limit, at most MAX_PAGE_SIZE.
+
+    A sort key may be NULL. NULLs come first in ascending order and last in descending order, as MySQL and SQLite
+    sort them; the cursor keeps a NULL value as null and keyset_predicate compares it with IS NULL / IS NOT NULL.
+'''
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from pydantic import BaseModel
+from sqlalchemy import and_, false, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# fields a listing row can be projected to
+LISTING_FIELDS = (
+    "product_id", "name", "model", "description", "serial_number", "category_id", "quantity", "price",
+    "distributor", "image_url", "item_sold", "warranty_status", "cost",
+    "average_rating", "discount_rate", "end_date",
+)
+
+
+class PageRequest(BaseModel):
+    cursor: Optional[str] = None
+    limit: Optional[int] = DEFAULT_PAGE_SIZE  # None (internal callers only) returns every row after the cursor
+    fields: Optional[List[str]] = None       # None returns every listing field
+
+
+class ProductPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None        # None on the last page
+
+
+def parse_fields(fields: Optional[str], default: Optional[Sequence[str]] = None) -> Optional[List[str]]:
+    # "name,price" -> ["product_id", "name", "price"]; product_id is always returned so the rows can be identified
+    if not fields:
+        return list(default) if default is not None else None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in LISTING_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed fields: {', '.join(LISTING_FIELDS)}")
+    return list(dict.fromkeys(["product_id", *requested]))
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    # numbers and dates are written as strings and read back with the type of their sort column
+    payload = json.dumps([None if value is None else str(value) for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str, sort_keys: Sequence[Tuple[Any, bool]]) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != len(sort_keys):
+        raise ValueError("Invalid cursor.")
+
+    decoded = []
+    for value, (expression, _) in zip(values, sort_keys):
+        if value is None:
+            decoded.append(None)
+            continue
+        try:
+            decoded.append(expression.type.python_type(value))
+        except (TypeError, ValueError, ArithmeticError, NotImplementedError):
+            raise ValueError("Invalid cursor.")
+    return decoded
+
+
+def _after(expression, value, descending: bool):
+    # the rows strictly after `value` on one sort key; NULL is the smallest value
+    if value is None:
+        return false() if descending else expression.is_not(None)
+    if descending:
+        return or_(expression < value, expression.is_(None))
+    return expression > value
+
+
+def _equal(expression, value):
+    return expression.is_(None) if value is None else expression == value
+
+
+def keyset_predicate(sort_keys: Sequence[Tuple[Any, bool]], values: Sequence[Any]):
+    '''
+        The rows that come after `values` in the order of sort_keys ((expression, descending) pairs),
+        written as (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... so that mixed directions work on every database.
+        NULL values are compared with IS NULL, NULL being the smallest value (see the module docstring).
+        The last sort key must be unique (product_id) for the order to be total.
+    '''
+    branches = []
+    for position, (expression, descending) in enumerate(sort_keys):
+        equal_prefix = [_equal(sort_keys[i][0], values[i]) for i in range(position)]
+        branches.append(and_(*equal_prefix, _after(expression, values[position], descending)))
+    return or_(*branches)
@@ -0,0 +1,220 @@
+'''
+    Popularity engine: recomputes product_popularity, the precomputed score GET /products/popular is ordered by.
+
+        score = decayed sales * SALES_WEIGHT + average rating * RATING_WEIGHT + review count * REVIEW_COUNT_WEIGHT
+
+    The sales of a product are the quantities of its order items over the last SALES_WINDOW_DAYS days, each one
+    weighted by 0.5 ** (age in days / SALES_HALF_LIFE_DAYS), so that a sale of today counts twice as much as one of
+    SALES_HALF_LIFE_DAYS days ago; cancelled and returned orders do not count. The rating and the review count are the
+    approved reviews of product_rating_summary.
+
+    A run reads the scores with one aggregate SELECT (a consistent read, which unlike INSERT ... SELECT takes no locks
+    on orders and order_items) and writes them with bulk upserts of UPSERT_CHUNK rows. An incremental run only
+    recomputes the products touched since the previous run: products with orders placed or reviews approved since
+    then, and products that have no score yet. A full run recomputes every product; it is the one that lowers the
+    score of products nobody bought since (the decay) and that sees cancellations and returns, so it runs every
+    POPULARITY_FULL_INTERVAL seconds. Each run is recorded in popularity_run with its duration, which is also the
+    watermark of the next incremental run.
+
+    The runs are scheduled by a background thread started with the service (see main.py); it can also be run by hand
+    from the ProductListing directory:
+
+        python -m services.popularity [--full]
+'''
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import DateTime, func, literal, literal_column, select, union
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models.models import ProductDB, ProductPopularity, ProductRatingSummary, PopularityRun, OrderDB, OrderItemDB
+
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+# weights of the score, the ones of the previous ProductService.update_popularity_scores
+SALES_WEIGHT = 0.5
+RATING_WEIGHT = 0.3
+REVIEW_COUNT_WEIGHT = 0.2
+
+SALES_HALF_LIFE_DAYS = 14
+SALES_WINDOW_DAYS = 90
+
+# cancelled and returned orders
+EXCLUDED_ORDER_STATUSES = (4, 5)
+
+# seconds between two runs, and between two full runs
+POPULARITY_INTERVAL = 60
+POPULARITY_FULL_INTERVAL = 3600
+
+# an incremental run also looks this far before the previous run, for the transactions that were still open then
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+UPSERT_CHUNK = 1000
+
+
+def _age_days(dialect: str, order_date, now):
+    if dialect == "mysql":
+        return func.timestampdiff(literal_column("SECOND"), order_date, now) / 86400.0
+    return func.julianday(now) - func.julianday(order_date)
+
+
+def _decayed_sales(dialect: str, now: datetime, product_ids=None):
+    weight = func.pow(0.5, _age_days(dialect, OrderDB.order_date, literal(now, DateTime)) / SALES_HALF_LIFE_DAYS)
+    stmt = (
+        select(OrderItemDB.product_id, func.sum(OrderItemDB.quantity * weight).label("sales"))
+        .join(OrderDB, OrderDB.order_id == OrderItemDB.order_id)
+        .where(OrderDB.order_date >= now - timedelta(days=SALES_WINDOW_DAYS))
+        .where(OrderDB.order_status.not_in(EXCLUDED_ORDER_STATUSES))
+        .group_by(OrderItemDB.product_id)
+    )
+    if product_ids is not None:
+        stmt = stmt.where(OrderItemDB.product_id.in_(product_ids))
+    return stmt.subquery()
+
+
+def touched_products(since: datetime):
+    '''The ids of the products whose score may have changed since the given time, as a SELECT.'''
+    return union(
+        select(OrderItemDB.product_id)
+        .join(OrderDB, OrderDB.order_id == OrderItemDB.order_id)
+        .where(OrderDB.order_date >= since),
+        select(ProductRatingSummary.product_id).where(ProductRatingSummary.last_updated >= since),
+        select(ProductDB.product_id)
+        .outerjoin(ProductPopularity, ProductPopularity.product_id == ProductDB.product_id)
+        .where(ProductPopularity.product_id.is_(None)),
+    )
+
+
+def score_statement(dialect: str, now: datetime, since: Optional[datetime] = None):
+    '''The (product_id, popularity_score) of every product, or of the products touched since the given time.'''
+    product_ids = touched_products(since) if since is not None else None
+    sales = _decayed_sales(dialect, now, product_ids)
+    score = (
+        func.coalesce(sales.c.sales, 0) * SALES_WEIGHT
+        + func.coalesce(ProductRatingSummary.average_rating, 0) * RATING_WEIGHT
+        + func.coalesce(ProductRatingSummary.review_count, 0) * REVIEW_COUNT_WEIGHT
+    )
+    stmt = (
+        select(ProductDB.product_id, score.label("popularity_score"))
+        .outerjoin(sales, sales.c.product_id == ProductDB.product_id)
+        .outerjoin(ProductRatingSummary, ProductRatingSummary.product_id == ProductDB.product_id)
+    )
+    if product_ids is not None:
+        stmt = stmt.where(ProductDB.product_id.in_(product_ids))
+    return stmt
+
+
+def _upsert_scores(db: Session, rows: List[dict]) -> None:
+    '''Writes the scores with an upsert on the primary key (common/upsert.py), UPSERT_CHUNK rows per statement.'''
+    for start in range(0, len(rows), UPSERT_CHUNK):
+        upsert(db, ProductPopularity.__table__, rows[start:start + UPSERT_CHUNK], ["product_id"],
+               lambda new: {"popularity_score": new.popularity_score, "last_updated": new.last_updated})
+
+
+def recompute_popularity(db: Session, since: Optional[datetime] = None) -> PopularityRun:
+    '''
+        Recomputes the scores of every product (since=None) or of the products touched since the given time,
+        records the run in popularity_run and commits. Returns the run.
+    '''
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    dialect = db.get_bind().dialect.name
+    rows = [
+        {"product_id": product_id, "popularity_score": float(score), "last_updated": now}
+        for product_id, score in db.execute(score_statement(dialect, now, since))
+    ]
+    _upsert_scores(db, rows)
+    run = PopularityRun(
+        mode="full" if since is None else "incremental",
+        started_at=now,
+        finished_at=datetime.utcnow(),
+        duration_ms=round((time.perf_counter() - started) * 1000, 3),
+        products_updated=len(rows),
+    )
+    db.add(run)
+    db.commit()
+    logger.info("popularity %s run: %d products in %.1f ms", run.mode, run.products_updated, run.duration_ms)
+    return run
+
+
+def run_due(db: Session, full_interval: float = POPULARITY_FULL_INTERVAL) -> PopularityRun:
+    '''A full run when none was made in the last full_interval seconds, an incremental run otherwise.'''
+    last_full = db.query(func.max(PopularityRun.started_at)).filter(PopularityRun.mode == "full").scalar()
+    if last_full is None or datetime.utcnow() - last_full > timedelta(seconds=full_interval):
+        return recompute_popularity(db)
+    last_run = db.query(func.max(PopularityRun.started_at)).scalar()
+    return recompute_popularity(db, since=last_run - WATERMARK_OVERLAP)
+
+
+def recent_runs(db: Session, limit: int = 20) -> List[PopularityRun]:
+    return db.query(PopularityRun).order_by(PopularityRun.run_id.desc()).limit(limit).all()
+
+
+class PopularityScheduler:
+    '''Runs run_due every interval seconds on a daemon thread.'''
+
+    def __init__(self, interval: float = POPULARITY_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, session_factory) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(session_factory,), name="popularity", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self, session_factory) -> None:
+        while not self._stop.is_set():
+            db = session_factory()
+            try:
+                run_due(db)
+            except Exception:
+                # e.g. a deadlock with the run of another worker: the next run recomputes the same products
+                db.rollback()
+                logger.exception("popularity run failed")
+            finally:
+                db.close()
+            self._stop.wait(self.interval)
+
+
+popularity_scheduler = PopularityScheduler()
+
+
+def ensure_popularity(engine: Engine) -> None:
+    # creates the score and run tables when they are missing; the first scheduled run is a full one
+    ProductPopularity.__table__.create(bind=engine, checkfirst=True)
+    PopularityRun.__table__.create(bind=engine, checkfirst=True)
+
+
+if __name__ == "__main__":
+    from dbContext import engine, SessionLocal
+
+    parser = argparse.ArgumentParser(description="Recompute product_popularity")
+    parser.add_argument("--full", action="store_true", help="recompute every product instead of the due run")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    ensure_popularity(engine)
+    session = SessionLocal()
+    try:
+        result = recompute_popularity(session) if args.full else run_due(session)
+        print(f"{result.mode} run: {result.products_updated} products in {result.duration_ms} ms")
+    finally:
+        session.close()
@@ -0,0 +1,204 @@
+'''
+    Read-through cache of product details with TTL, LRU eviction and write-side invalidation.
+
+    Entries are keyed by product_id and carry the "product:<id>" version of cache_version they were loaded with.
+    Every write path that changes a product's price, stock, discount or reviews bumps that version
+    (ProductListing, dashboards_service, Order_service, Review, shoppingCart_service), so:
+        - an entry is served as is for PRODUCT_CACHE_VERSION_CHECK seconds after it was loaded or last validated,
+        - after that, one primary key lookup on cache_version revalidates it, or reloads it when the version moved,
+        - writes made in this process also drop the entry right away (invalidate()).
+    An entry never lives longer than PRODUCT_CACHE_TTL seconds.
+
+    The backend is chosen with PRODUCT_CACHE_URL: unset or "memory" keeps the entries in this process (bounded
+    by PRODUCT_CACHE_MAX_ENTRIES), "redis://host:port/db" uses any Redis-compatible server (the redis package is
+    then required) so that several workers share the entries; eviction is then the server's maxmemory policy.
+
+    Mirrored in shoppingCart_service/services/product_cache.py.
+'''
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy.orm import Session
+from services.cache_version import product_cache_key, read_cache_version
+
+PRODUCT_CACHE_URL = os.getenv("PRODUCT_CACHE_URL", "memory")
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "300"))
+PRODUCT_CACHE_MAX_ENTRIES = int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "10000"))
+PRODUCT_CACHE_VERSION_CHECK = float(os.getenv("PRODUCT_CACHE_VERSION_CHECK", "2"))
+
+
+class InProcessBackend:
+    # LRU ordered dict with per entry expiry; the least recently used entry is evicted when full
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> dict:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisBackend:
+    # entries are stored as JSON with a server side expiry
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("PRODUCT_CACHE_URL points to a Redis server but the redis package is not installed.") from e
+        self._client = redis.Redis.from_url(url)
+        self.url = url
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: dict, ttl: float) -> None:
+        self._client.set(key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    def clear(self) -> None:
+        # only the keys of the product caches, the server may be shared
+        for key in self._client.scan_iter(match="product-cache:*"):
+            self._client.delete(key)
+
+    def info(self) -> dict:
+        stats = self._client.info("stats")
+        return {
+            "backend": "redis",
+            "url": self.url,
+            "evictions": stats.get("evicted_keys", 0),
+            "expirations": stats.get("expired_keys", 0),
+        }
+
+
+def create_backend(url: str = PRODUCT_CACHE_URL):
+    if not url or url == "memory":
+        return InProcessBackend(PRODUCT_CACHE_MAX_ENTRIES)
+    return RedisBackend(url)
+
+
+class ProductCache:
+    def __init__(self, namespace: str, backend=None, ttl: float = PRODUCT_CACHE_TTL,
+                 version_check_interval: float = PRODUCT_CACHE_VERSION_CHECK):
+        self.namespace = namespace
+        self.backend = backend if backend is not None else create_backend()
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.invalidations = 0
+
+    def _key(self, product_id: str) -> str:
+        return f"product-cache:{self.namespace}:{product_id}"
+
+    def _count(self, counter: str) -> None:
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, db: Session, product_id: str, loader: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        '''
+            Returns the cached details of the product, or calls loader() (which returns a JSON serializable dict,
+            or None for a missing product) and caches its result.
+        '''
+        key = self._key(product_id)
+        now = time.time()
+        entry = self.backend.get(key)
+        version = None
+
+        if entry is not None:
+            if now - entry["checked_at"] < self.version_check_interval:
+                self._count("hits")
+                return entry["value"]
+            version = read_cache_version(db, product_cache_key(product_id))
+            if version == entry["version"]:
+                entry["checked_at"] = now
+                self.backend.set(key, entry, max(0.001, entry["expires_at"] - now))
+                self._count("hits")
+                self._count("revalidations")
+                return entry["value"]
+        else:
+            version = read_cache_version(db, product_cache_key(product_id))
+
+        self._count("misses")
+        # the version is read before the data: a write committed in between leaves an older version in the entry,
+        # so the next validation reloads it
+        value = loader()
+        if value is not None:
+            self.backend.set(
+                key,
+                {"value": value, "version": version, "checked_at": now, "expires_at": now + self.ttl},
+                self.ttl,
+            )
+        return value
+
+    def invalidate(self, product_id: str) -> None:
+        self.backend.delete(self._key(product_id))
+        self._count("invalidations")
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            counters = {
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "revalidations": self.revalidations,
+                "invalidations": self.invalidations,
+                "ttl_seconds": self.ttl,
+                "version_check_seconds": self.version_check_interval,
+            }
+        counters.update(self.backend.info())
+        return counters
+
+
+# cache of GET /products/{product_id}
+product_detail_cache = ProductCache("productlisting")
@@ -0,0 +1,125 @@
+'''
+    product_rating_summary keeps, per product, the count, the sum and the 1-5 histogram of its APPROVED reviews,
+    so that readers get the average rating with a primary key lookup (or an indexed range scan for rating_min)
+    instead of aggregating the review table.
+
+    The same module is mirrored in the Review service (review_services/rating_summary.py)
+    and in dashboards_service (services/ratingSummaryServices.py), which are the services that write reviews.
+    Each of the three creates and backfills the table at startup (ensure_rating_summary), so the writers do not
+    depend on ProductListing having started first.
+'''
+
+from datetime import datetime
+from sqlalchemy import update, insert, select, delete, func, case
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models.models import ProductRatingSummary, ReviewDB
+
+APPROVED = "APPROVED"
+
+RATING_COLUMNS = {
+    1: ProductRatingSummary.rating_1,
+    2: ProductRatingSummary.rating_2,
+    3: ProductRatingSummary.rating_3,
+    4: ProductRatingSummary.rating_4,
+    5: ProductRatingSummary.rating_5,
+}
+
+
+def apply_review_change(db: Session, product_id: str, rating: int, delta: int) -> None:
+    '''
+        Adds (delta=1) or removes (delta=-1) one approved review from the summary of a product.
+        The change is made with a single atomic UPDATE in the caller's transaction; the caller commits.
+    '''
+    if delta == 0 or product_id is None or rating not in RATING_COLUMNS:
+        return
+
+    summary = ProductRatingSummary
+    new_count = summary.review_count + delta
+    new_sum = summary.rating_sum + delta * rating
+
+    # average_rating is assigned first: MySQL evaluates SET clauses left to right with the already updated values,
+    # other databases use the old ones. Computing it from the old columns gives the same result on both.
+    stmt = (
+        update(summary)
+        .where(summary.product_id == product_id)
+        .ordered_values(
+            (summary.average_rating, case((new_count > 0, (new_sum * 1.0) / new_count), else_=0)),
+            (summary.review_count, new_count),
+            (summary.rating_sum, new_sum),
+            (RATING_COLUMNS[rating], RATING_COLUMNS[rating] + delta),
+            (summary.last_updated, datetime.utcnow()),
+        )
+    )
+    if db.execute(stmt).rowcount or delta < 0:
+        return
+
+    # first approved review of the product
+    try:
+        with db.begin_nested():
+            db.execute(insert(summary).values({
+                summary.product_id: product_id,
+                summary.review_count: 1,
+                summary.rating_sum: rating,
+                RATING_COLUMNS[rating]: 1,
+                summary.average_rating: rating,
+                summary.last_updated: datetime.utcnow(),
+            }))
+    except IntegrityError:
+        # another transaction inserted the row in the meantime
+        db.execute(stmt)
+
+
+def apply_status_change(db: Session, product_id: str, rating: int, old_status: str, new_status: str) -> None:
+    # only the transitions into and out of APPROVED change the summary
+    delta = int(new_status == APPROVED) - int(old_status == APPROVED)
+    apply_review_change(db, product_id, rating, delta)
+
+
+def rebuild_rating_summary(db: Session) -> int:
+    '''
+        Recomputes the whole table from the review table in one INSERT ... SELECT.
+        Used to backfill the table and to repair it after reviews were changed outside of the services.
+        Returns the number of products that have a summary.
+    '''
+    histogram = [
+        func.sum(case((ReviewDB.rating == rating, 1), else_=0)).label(column.key)
+        for rating, column in RATING_COLUMNS.items()
+    ]
+    source = (
+        select(
+            ReviewDB.product_id,
+            func.count(ReviewDB.review_id),
+            func.sum(ReviewDB.rating),
+            *histogram,
+            func.avg(ReviewDB.rating * 1.0),
+            func.now(),
+        )
+        .where(ReviewDB.approval_status == APPROVED)
+        .group_by(ReviewDB.product_id)
+    )
+    db.execute(delete(ProductRatingSummary))
+    db.execute(
+        insert(ProductRatingSummary).from_select(
+            [
+                "product_id", "review_count", "rating_sum",
+                *[column.key for column in RATING_COLUMNS.values()],
+                "average_rating", "last_updated",
+            ],
+            source,
+        )
+    )
+    db.commit()
+    return db.query(func.count(ProductRatingSummary.product_id)).scalar()
+
+
+def ensure_rating_summary(engine: Engine, session_factory) -> None:
+    # creates the table when it is missing and backfills it when it is empty
+    ProductRatingSummary.__table__.create(bind=engine, checkfirst=True)
+    db = session_factory()
+    try:
+        if db.query(ProductRatingSummary.product_id).first() is None:
+            rebuild_rating_summary(db)
+    finally:
+        db.close()
@@ -0,0 +1,262 @@
+'''
+    In-process inverted index used by the product search endpoint.
+
+    The name, model, description and distributor of every product are tokenized into a term -> postings map,
+    so a search only touches the postings of its terms instead of scanning products.description with ILIKE '%q%'.
+    Every query term also matches the indexed terms it is a prefix of ("coll" finds "collar"); a term of at least
+    MIN_INFIX_LENGTH characters that is the prefix of no indexed term matches the terms that contain it ("ollar" finds
+    "collar"), as the ILIKE '%q%' search did. The matching products are ranked with BM25.
+
+    The index is built from ProductDB at startup and kept up to date by ProductService.create_product,
+    update_product and delete_product. Products are also written by dashboards_service, which this process
+    does not see, so the index is rebuilt from the database when it is older than SEARCH_INDEX_MAX_AGE seconds.
+    The rebuild runs on a background thread and swaps the new index in at once; the searches use the current index
+    meanwhile, and the writes made during the rebuild are applied to the new one too. Only a search that finds no
+    index at all (the startup build failed) waits for the build.
+'''
+
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Set, Tuple
+from types import SimpleNamespace
+from sqlalchemy.orm import Session
+from models.models import ProductDB
+
+logger = logging.getLogger(__name__)
+
+# rebuild period that bounds how long products written by other services stay invisible to search
+SEARCH_INDEX_MAX_AGE = 300
+
+# how much one occurrence of a term in each field counts
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "model": 2.0,
+    "distributor": 1.0,
+    "description": 1.0,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# a prefix match scores less than the whole word, and a query term expands to at most this many indexed terms
+PREFIX_MATCH_WEIGHT = 0.6
+MAX_PREFIX_EXPANSIONS = 64
+
+# a term found inside an indexed term (when it is the prefix of none) scores less than a prefix match
+INFIX_MATCH_WEIGHT = 0.4
+MIN_INFIX_LENGTH = 3
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, float]] = {}   # term -> {product_id: weighted term frequency}
+        self._terms: List[str] = []                         # sorted terms, for prefix lookups with bisect
+        self._doc_terms: Dict[str, Set[str]] = {}           # product_id -> its terms, to remove a product
+        self._doc_lengths: Dict[str, float] = {}            # product_id -> weighted number of tokens
+        self._total_length = 0.0
+        self._changes = None                                # writes made while a rebuild reads the products
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def is_stale(self, max_age: float = SEARCH_INDEX_MAX_AGE) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at > max_age
+
+    def build(self, db: Session) -> None:
+        '''
+            Rebuilds the index from the products table. The new index is built aside and swapped in under the lock,
+            so the searches keep using the current one until then; the writes made meanwhile are applied to both.
+        '''
+        with self._lock:
+            self._changes = []
+        try:
+            rows = db.query(
+                ProductDB.product_id, ProductDB.name, ProductDB.model, ProductDB.description, ProductDB.distributor
+            ).all()
+            fresh = ProductSearchIndex()
+            for row in rows:
+                fresh._add(row)
+            fresh._terms = sorted(fresh._postings)
+        except Exception:
+            with self._lock:
+                self._changes = None
+            raise
+
+        with self._lock:
+            for product_id, product in self._changes:
+                if product is None:
+                    fresh.remove(product_id)
+                else:
+                    fresh.add(product)
+            self._postings = fresh._postings
+            self._terms = fresh._terms
+            self._doc_terms = fresh._doc_terms
+            self._doc_lengths = fresh._doc_lengths
+            self._total_length = fresh._total_length
+            self._changes = None
+            self.built_at = time.monotonic()
+
+    def add(self, product) -> None:
+        # indexes a new product or re-indexes an updated one (anything with the ProductDB text attributes)
+        with self._lock:
+            if self._changes is not None:
+                # a copy, the ORM object may be expired or changed before the rebuild applies it
+                self._changes.append((product.product_id, SimpleNamespace(
+                    product_id=product.product_id, **{field: getattr(product, field, None) for field in FIELD_WEIGHTS})))
+            self._remove(product.product_id)
+            for term in self._add(product):
+                index = bisect_left(self._terms, term)
+                if index == len(self._terms) or self._terms[index] != term:
+                    insort(self._terms, term)
+
+    def remove(self, product_id: str) -> None:
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((product_id, None))
+            self._remove(product_id)
+
+    def _add(self, product) -> List[str]:
+        frequencies: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(product, field, None)):
+                frequencies[token] = frequencies.get(token, 0.0) + weight
+
+        product_id = product.product_id
+        self._doc_terms[product_id] = set(frequencies)
+        self._doc_lengths[product_id] = sum(frequencies.values())
+        self._total_length += self._doc_lengths[product_id]
+
+        new_terms = []
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                new_terms.append(term)
+            postings[product_id] = frequency
+        return new_terms
+
+    def _remove(self, product_id: str) -> None:
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(product_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                index = bisect_left(self._terms, term)
+                if index < len(self._terms) and self._terms[index] == term:
+                    del self._terms[index]
+
+    def _expand(self, query_term: str) -> List[Tuple[str, float]]:
+        # the indexed terms that start with query_term, with the weight of the match
+        matches = []
+        index = bisect_left(self._terms, query_term)
+        while index < len(self._terms) and len(matches) < MAX_PREFIX_EXPANSIONS:
+            term = self._terms[index]
+            if not term.startswith(query_term):
+                break
+            matches.append((term, 1.0 if term == query_term else PREFIX_MATCH_WEIGHT))
+            index += 1
+        if not matches and len(query_term) >= MIN_INFIX_LENGTH:
+            # a scan of the terms (not of the products), only for the terms that are no prefix
+            for term in self._terms:
+                if query_term in term:
+                    matches.append((term, INFIX_MATCH_WEIGHT))
+                    if len(matches) == MAX_PREFIX_EXPANSIONS:
+                        break
+        return matches
+
+    def search(self, query: str, offset: int = 0, limit: int = None) -> Tuple[int, List[Tuple[str, float]]]:
+        '''
+            Returns (number of matching products, [(product_id, score), ...] of the requested page).
+            A product matches when every query term matches one of its terms, exactly, as a prefix or inside it.
+        '''
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return 0, []
+
+        with self._lock:
+            document_count = len(self._doc_lengths)
+            if document_count == 0:
+                return 0, []
+            average_length = self._total_length / document_count
+
+            scores: Dict[str, float] = None
+            for query_term in query_terms:
+                term_scores: Dict[str, float] = {}
+                for term, match_weight in self._expand(query_term):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for product_id, frequency in postings.items():
+                        if scores is not None and product_id not in scores:
+                            continue
+                        length_norm = K1 * (1 - B + B * self._doc_lengths[product_id] / average_length)
+                        score = match_weight * idf * frequency * (K1 + 1) / (frequency + length_norm)
+                        # a query term counts once per product, with its best matching indexed term
+                        if score > term_scores.get(product_id, 0.0):
+                            term_scores[product_id] = score
+
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {product_id: scores[product_id] + score for product_id, score in term_scores.items()}
+                if not scores:
+                    return 0, []
+
+        rank_key = lambda item: (-item[1], item[0])
+        if limit is None:
+            return len(scores), sorted(scores.items(), key=rank_key)[offset:]
+        # only the first offset + limit results need to be ordered
+        return len(scores), heapq.nsmallest(offset + limit, scores.items(), key=rank_key)[offset:]
+
+
+search_index = ProductSearchIndex()
+_rebuild_lock = threading.Lock()
+
+
+def _rebuild_in_background(bind) -> None:
+    try:
+        db = Session(bind=bind)
+        try:
+            search_index.build(db)
+        finally:
+            db.close()
+    except Exception:
+        # the current index is kept, the next search after SEARCH_INDEX_MAX_AGE tries again
+        logger.exception("search index rebuild failed")
+    finally:
+        _rebuild_lock.release()
+
+
+def get_search_index(db: Session) -> ProductSearchIndex:
+    '''
+        The shared index. One that was never built is built first; one older than SEARCH_INDEX_MAX_AGE is rebuilt on a
+        background thread (one at a time) while this search and the next ones use it as it is.
+    '''
+    if search_index.built_at is None:
+        with _rebuild_lock:
+            # another request may have built it while this one was waiting
+            if search_index.built_at is None:
+                search_index.build(db)
+    elif search_index.is_stale() and _rebuild_lock.acquire(blocking=False):
+        threading.Thread(target=_rebuild_in_background, args=(db.get_bind(),), name="search-index-rebuild",
+                         daemon=True).start()
+    return search_index
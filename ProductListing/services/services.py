@@ -3,7 +3,7 @@ from models.models import Product, ProductDB, ProductCreate, ReviewDB, ProductUp
 
 from models.models import ProductDB, ProductCreate, ProductUpdate, ReviewDB, ProductPopularity, CategoryDB , Discount, ProductDiscountSchema
 
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import uuid
 from fastapi import Path
 from sqlalchemy.exc import IntegrityError
@@ -13,6 +13,14 @@ from pydantic import BaseModel
 from typing import Optional
 
 from sqlalchemy import and_, or_
+from services.catalog import CatalogProjection
+from services.search_index import search_index, get_search_index
+from services.pagination import PageRequest, ProductPage
+from services.category_tree import category_tree_cache
+from services.product_cache import product_detail_cache
+from services.cache_version import bump_cache_versions, product_cache_key
+from services.popularity import recompute_popularity
+from models.models import PopularityRun
 # Filter Parameters Model
 class ProductFilterParams(BaseModel):
     sub_category: Optional[int] = None
@@ -22,6 +30,10 @@ class ProductFilterParams(BaseModel):
     warranty_status: Optional[int] = None
 
 
+# keyset order of the listings that have no sort key of their own
+BY_PRODUCT_ID = [(ProductDB.product_id, False)]
+
+
 class ProductService:
     def __init__(self, db: Session):
         self.db = db
@@ -60,191 +72,46 @@ class ProductService:
             "parent_category_id": category.parentcategory_id
         }
 
-     # ONLY 1 LEVEL DEPTH CATEGORIES ARE SUPPORTED
+    # categories of any depth are resolved from the cached category tree (services/category_tree.py)
 
-    # return the categories which have no parent category
-    def get_root_categories(self) -> List[CategoryDB]:
-        return self.db.query(CategoryDB).filter(CategoryDB.parentcategory_id == None).all()
+    # return the categories which have no parent category
+    def get_root_categories(self) -> List[dict]:
+        tree = category_tree_cache.get(self.db)
+        return [self._category_info(tree, category_id) for category_id in tree.roots]
     
-    # return the categories which have the specified parent category
-    def get_categories_by_parent_id(self, parent_id: str) -> List[CategoryDB]:
-        return self.db.query(CategoryDB).filter(CategoryDB.parentcategory_id == parent_id).all()
-
-    # root category girilirse subcategorilerindeki ürünler de dönülsün - detailed "/getproduct/category/{category_id}"
-    def get_products_by_category_id(self, category_id: int) -> List[ProductDiscountSchema]:
-        # when items from root category is wanted, we return all the products in the subcategories of that root category
-        
-        # if the category is a root category
-        if self.db.query(CategoryDB).filter(CategoryDB.category_id == category_id).first().parentcategory_id == None:
-            # get all the subcategories of the root category
-            subcategories = self.get_categories_by_parent_id(category_id)
-            # get all the products in the subcategories
-            products = []
-            products += self.db.query(ProductDB).filter(ProductDB.category_id == category_id).all()
-            for subcategory in subcategories:
-                products += self.db.query(ProductDB).filter(ProductDB.category_id == subcategory.category_id).all()
-
-            result = []
-
-            for product in products:
-                reviews = self.db.query(ReviewDB).filter(and_(ReviewDB.product_id == product.product_id, ReviewDB.approval_status == "APPROVED")).all()
-
-                discount = self.db.query(Discount).filter(and_(Discount.product_id == product.product_id, Discount.is_active)).first()
-                average_rating = 0
-                
-                if len(reviews) == 0:
-                    average_rating = 0
-                else:
-                    for i in reviews:
-                        average_rating += i.rating
-                    average_rating = average_rating/len(reviews)
-                if discount:
-                    result.append(ProductDiscountSchema(
-                        product_id=product.product_id,
-                        name=product.name,
-                        model=product.model,
-                        description=product.description,
-                        quantity=product.quantity,
-                        serial_number=product.serial_number,
-                        warranty_status=product.warranty_status,
-                        distributor=product.distributor,
-                        image_url=product.image_url,
-                        item_sold=product.item_sold,
-                        price=product.price,
-                        cost=product.cost,
-                        category_id=product.category_id,
-                        average_rating=average_rating,
-                        discount_rate=discount.discount_rate,
-                        end_date=discount.end_date,
-                        ))
-                else:
-                    result.append(ProductDiscountSchema(
-                        product_id=product.product_id,
-                        name=product.name,
-                        model=product.model,
-                        description=product.description,
-                        quantity=product.quantity,
-                        serial_number=product.serial_number,
-                        warranty_status=product.warranty_status,
-                        distributor=product.distributor,
-                        image_url=product.image_url,
-                        item_sold=product.item_sold,
-                        price=product.price,
-                        cost=product.cost,
-                        category_id=product.category_id,
-                        average_rating=average_rating,
-                        discount_rate=0,
-                        end_date=None
-                        ))
-            return result
-        # if the category is not a root category
-        else:
-            return self.db.query(ProductDB).filter(ProductDB.category_id == category_id).all()
-
-    def get_all_products(self) -> List[Product]:
+    # return the categories which have the specified parent category
+    def get_categories_by_parent_id(self, parent_id: int) -> List[dict]:
+        tree = category_tree_cache.get(self.db)
+        return [self._category_info(tree, category_id) for category_id in tree.children.get(parent_id, [])]
 
-        products = self.db.query(ProductDB).all()
-        print(products)
-        results = []
+    @staticmethod
+    def _category_info(tree, category_id: int) -> dict:
+        return {
+            "category_id": category_id,
+            "category_name": tree.names[category_id],
+            "parentcategory_id": tree.parents[category_id],
+        }
 
-        for product in products:
-            reviews = self.db.query(ReviewDB).filter(and_(ReviewDB.product_id == product.product_id, ReviewDB.approval_status == "APPROVED")).all()
+    # root category girilirse subcategorilerindeki ürünler de dönülsün - detailed "/getproduct/category/{category_id}"
+    def get_products_by_category_id(self, category_id: int, page: Optional[PageRequest] = None) -> ProductPage:
+        # when items from a category are wanted, we return the products of all its subcategories too (at any depth)
+        category_ids = category_tree_cache.get(self.db).descendants(category_id)
+        if not category_ids:
+            return ProductPage(items=[])
 
-            average_rating = 0
-            discount = self.db.query(Discount).filter(and_(Discount.product_id == product.product_id, Discount.is_active)).first()
+        return CatalogProjection(self.db).page(ProductDB.category_id.in_(category_ids), sort_keys=BY_PRODUCT_ID, page=page)
 
-            
-            if len(reviews) == 0:
-                average_rating = 0
-            else:
-                for i in reviews:
-                    average_rating += i.rating
-                average_rating = average_rating/len(reviews)
-
-
-            results.append(ProductDiscountSchema(
-                product_id=product.product_id,
-                name=product.name,
-                model=product.model,
-                description=product.description,
-                quantity=product.quantity,
-                warranty_status=product.warranty_status,
-                distributor=product.distributor,
-                image_url=product.image_url,
-                item_sold=product.item_sold,
-                price=product.price,
-                cost=product.cost,
-                category_id=product.category_id,
-                average_rating=average_rating,
-                discount_rate=discount.discount_rate if discount else 0,
-                end_date=discount.end_date if discount else None
-
-                ))
-
-        print(results)
-            
-        return results
+    def get_all_products(self, page: Optional[PageRequest] = None) -> ProductPage:
+        return CatalogProjection(self.db).page(sort_keys=BY_PRODUCT_ID, page=page)
 
     def get_product_by_id(self, product_id: str) -> Optional[ProductDiscountSchema]:
-        products = self.db.query(ProductDB).filter(ProductDB.product_id == product_id).first()
-        discounts = self.db.query(Discount).filter(and_(Discount.product_id == product_id, Discount.is_active)).first()
-
-        if(products and discounts):
-            reviews = self.db.query(ReviewDB).filter(and_(ReviewDB.product_id == product_id, ReviewDB.approval_status == "APPROVED")).all()
-            average_rating = 0
-            if (len(reviews) == 0):
-                average_rating = 0
-            else:
-                average_rating = 0
-                for i in reviews:
-                    average_rating += i.rating
-                average_rating = average_rating/len(reviews)
-            return ProductDiscountSchema(
-                product_id=products.product_id,
-                name=products.name,
-                model=products.model,
-                description=products.description,
-                serial_number=products.serial_number,
-                category_id=products.category_id,
-                quantity=products.quantity,
-                price=products.price,
-                distributor=products.distributor,
-                image_url=products.image_url,
-                item_sold=products.item_sold,
-                warranty_status=products.warranty_status,
-                cost=products.cost,
-                discount_rate=discounts.discount_rate,
-                end_date=discounts.end_date,
-                average_rating=average_rating
-            )
-        elif(products):
-            reviews = self.db.query(ReviewDB).filter(and_(ReviewDB.product_id == product_id, ReviewDB.approval_status == "APPROVED")).all()
-            average_rating = 0
-            if (len(reviews) == 0):
-                average_rating = 0
-            else:
-                average_rating = 0
-                for i in reviews:
-                    average_rating += i.rating
-                average_rating = average_rating/len(reviews)
-            return ProductDiscountSchema(
-                product_id=products.product_id,
-                name=products.name,
-                model=products.model,
-                description=products.description,
-                serial_number=products.serial_number,
-                category_id=products.category_id,
-                quantity=products.quantity,
-                price=products.price,
-                distributor=products.distributor,
-                image_url=products.image_url,
-                item_sold=products.item_sold,
-                warranty_status=products.warranty_status,
-                cost=products.cost,
-                discount_rate=0,
-                end_date=None,
-                average_rating=average_rating
-            )
+        # served from the product detail cache, which is invalidated by every service writing the product
+        details = product_detail_cache.get(self.db, product_id, lambda: self._load_product_details(product_id))
+        return ProductDiscountSchema(**details) if details is not None else None
+
+    def _load_product_details(self, product_id: str) -> Optional[dict]:
+        product = CatalogProjection(self.db).fetch_one(product_id)
+        return product.model_dump(mode="json") if product is not None else None
 
     def create_product(self, product_data: ProductCreate) -> ProductDB:
         # Ensure product_id is not set manually; it will be auto-generated
@@ -258,6 +125,7 @@ class ProductService:
             self.db.add(new_product)
             self.db.commit()
             self.db.refresh(new_product)
+            search_index.add(new_product)
             return new_product
 
         except IntegrityError as e:
@@ -271,7 +139,7 @@ class ProductService:
 
     """
     def update_product(self, product_id: str, product_data: ProductUpdate) -> Optional[ProductDB]:
-        product = self.get_product_by_id(product_id)
+        product = self.db.query(ProductDB).filter(ProductDB.product_id == product_id).first()
         if not product:
             return None
         
@@ -286,78 +154,41 @@ class ProductService:
         self.db.refresh(product)
         return product"""
     
-    def get_products_sorted_by_popularity(self) -> List[ProductDB]:
-        results = (
-            self.db.query(ProductDB, ProductPopularity.popularity_score)
-            .join(ProductPopularity, ProductPopularity.product_id == ProductDB.product_id)
-            .order_by(ProductPopularity.popularity_score.desc())
-            .all()
+    def get_products_sorted_by_popularity(self, page: Optional[PageRequest] = None) -> ProductPage:
+        # every product has a score once the popularity engine ran, so the order is the one of the score index
+        # (ProductPopularity.product_id, equal to ProductDB.product_id through the join, breaks the ties)
+        sort_keys = [(ProductPopularity.popularity_score, True), (ProductPopularity.product_id, True)]
+        return CatalogProjection(self.db).page(
+            sort_keys=sort_keys,
+            page=page,
+            joins=[(ProductPopularity, ProductPopularity.product_id == ProductDB.product_id)],
         )
-
-        # Transform the result into a list of dicts compatible with Product schema
-        popular_products = []
-        for product, popularity_score in results:
-            product_data = {
-                "product_id": product.product_id,
-                "name": product.name,
-                "model": product.model,
-                "description": product.description,
-                "quantity": product.quantity,
-                "item_sold": product.item_sold,
-                "price": getattr(product, "price", 0),  # Ensure `price` exists
-                "cost": getattr(product, "cost", 0),    # Ensure `cost` exists
-                "warranty_status": product.warranty_status,
-                "distributor": product.distributor,
-                "image_url": product.image_url,
-                "category_id": product.category_id,
-            }
-            popular_products.append(product_data)
-
-        return popular_products
     
-    def get_products_sorted_by_price(self, order: str = "asc") -> List[ProductDB]:
+    def get_products_sorted_by_price(self, order: str = "asc", page: Optional[PageRequest] = None) -> ProductPage:
         """
         Get products sorted by price in ascending or descending order.
         
         :param order: "asc" for ascending, "desc" for descending
-        :return: List of products sorted by price
+        :param page: cursor, page size and fields of the request
+        :return: Page of products sorted by price (product_id breaks the ties)
         """
-        if order == "desc":
-            return self.db.query(ProductDB).order_by(desc(ProductDB.price)).all()
-        return self.db.query(ProductDB).order_by(asc(ProductDB.price)).all()
+        descending = order == "desc"
+        sort_keys = [(ProductDB.price, descending), (ProductDB.product_id, descending)]
+        return CatalogProjection(self.db).page(sort_keys=sort_keys, page=page)
     
 
     
-    def update_popularity_scores(db: Session):
-        # Calculate popularity score
-        popularity_scores = (
-            db.query(
-                ProductDB.product_id,
-                (func.sum(ProductDB.item_sold) * 0.5 +       # Weight for sales
-                func.avg(ReviewDB.rating) * 0.3 +             # Weight for rating
-                func.count(ReviewDB.review_id) * 0.2          # Weight for review count
-                ).label("popularity_score")
-            )
-            .outerjoin(ReviewDB, ReviewDB.product_id == ProductDB.product_id)
-            .group_by(ProductDB.product_id)
-            .all()
-        )
-
-        # Update or insert popularity scores into `product_popularity`
-        for product_id, score in popularity_scores:
-            existing_entry = db.query(ProductPopularity).filter_by(product_id=product_id).first()
-            if existing_entry:
-                existing_entry.popularity_score = score
-                existing_entry.last_updated = datetime.utcnow()
-            else:
-                new_entry = ProductPopularity(product_id=product_id, popularity_score=score, last_updated=datetime.utcnow())
-                db.add(new_entry)
-
-        db.commit()
+    @staticmethod
+    def update_popularity_scores(db: Session, since: Optional[datetime] = None) -> PopularityRun:
+        """
+        Recomputes product_popularity (every product, or the products touched since the given time)
+        with the set-based run of services/popularity.py, which the scheduler also runs periodically.
+        """
+        return recompute_popularity(db, since)
 
 
     def update_product(self, product_id: str, product_data: ProductUpdate) -> Optional[ProductDB]:
-        product = self.get_product_by_id(product_id)
+        product = self.db.query(ProductDB).filter(ProductDB.product_id == product_id).first()
         if not product:
             return None
 
@@ -366,66 +197,49 @@ class ProductService:
             if(value is not None):
                 setattr(product, key, value)  # Dynamically set attribute
 
-        # Commit changes to the database
+        # Commit changes to the database (with the version bump of the cached product details)
+        bump_cache_versions(self.db, [product_cache_key(product_id)])
         self.db.commit()
         self.db.refresh(product)
+        product_detail_cache.invalidate(product_id)
+        search_index.add(product)
         return product
 
 
 
     def delete_product(self, product_id: str) -> bool:
-        product = self.get_product_by_id(product_id)
+        product = self.db.query(ProductDB).filter(ProductDB.product_id == product_id).first()
         if not product:
             return False
         self.db.delete(product)
+        bump_cache_versions(self.db, [product_cache_key(product_id)])
         self.db.commit()  # No await here
+        product_detail_cache.invalidate(product_id)
+        search_index.remove(product_id)
         return True
 
-    def search_product_by_name_description(self,query):
-
-        results = self.db.query(ProductDB).filter(
-        (ProductDB.name.ilike(f"%{query}%")) |  # Case-insensitive search for name
-        (ProductDB.description.ilike(f"%{query}%"))  # Case-insensitive search for description
-        ).all()
+    def search_product_by_name_description(self, query: str, offset: int = 0, limit: Optional[int] = None) -> List[ProductDiscountSchema]:
+        return self.search_products(query, offset, limit)[1]
 
-        products = []
-
-
-        for product in results:
-            reviews = self.db.query(ReviewDB).filter(and_(ReviewDB.product_id == product.product_id, ReviewDB.approval_status == "APPROVED")).all()
-            discount = self.db.query(Discount).filter(and_(Discount.product_id == product.product_id, Discount.is_active)).first()
+    def search_products(self, query: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[int, List[ProductDiscountSchema]]:
+        """
+        Ranked search over the name, model, description and distributor of the products.
 
-            average_rating = 0
+        :param query: the words to search, the last letters of each word can be omitted
+        :param offset: number of ranked results to skip
+        :param limit: page size, all the results when None
+        :return: the number of matching products and the requested page, best match first
+        """
+        total, ranked = get_search_index(self.db).search(query, offset, limit)
+        if not ranked:
+            return total, []
 
-            if len(reviews) == 0:
-                average_rating = 0
-            else:
-                for i in reviews:
-                    average_rating += i.rating
-                average_rating = average_rating/len(reviews)
-            
-            products.append(ProductDiscountSchema(
-                product_id=product.product_id,
-                name=product.name,
-                model=product.model,
-                description=product.description,
-                quantity=product.quantity,
-                warranty_status=product.warranty_status,
-                distributor=product.distributor,
-                image_url=product.image_url,
-                item_sold=product.item_sold,
-                price=product.price,
-                cost=product.cost,
-                category_id=product.category_id,
-                discount_rate=discount.discount_rate if discount else 0,
-                end_date=discount.end_date if discount else None,
-                average_rating=average_rating
-                ))
-            
-        
-    
-        # Convert results to a list of dictionaries to return as JSON
-        return products
+        products = {
+            product.product_id: product
+            for product in CatalogProjection(self.db).fetch_by_ids([product_id for product_id, _ in ranked])
+        }
+        # products deleted by another service since the last index rebuild are skipped
+        return total, [products[product_id] for product_id, _ in ranked if product_id in products]
     
     # TUNAHAN EKLENTİ - FILTERING
 
@@ -460,74 +274,36 @@ class ProductService:
         # Execute the query and return results
         return products
     """
-    def filter_products(self, category_id: int, filter_params: ProductFilterParams) -> List[Product]:
-        # Start with all products in the database
-        products = self.db.query(ProductDB)
+    def filter_products(self, category_id: int, filter_params: ProductFilterParams, page: Optional[PageRequest] = None) -> ProductPage:
+        review_stats = CatalogProjection.review_stats()
+        criteria = []
 
         # Check if a subcategory is specified, otherwise use root category and its subcategories
+        # (the descendants at any depth are resolved from the cached category tree)
+        tree = category_tree_cache.get(self.db)
         if filter_params.sub_category is None or filter_params.sub_category == 0:
-            # Fetch subcategories and include products from those
-            subcategories = [category_id] + [
-                sub.category_id for sub in self.get_categories_by_parent_id(category_id)
-            ]
-            products = products.filter(ProductDB.category_id.in_(subcategories))
+            criteria.append(ProductDB.category_id.in_(tree.descendants(category_id)))
         else:
             # Filter by the specified subcategory
-            products = products.filter(ProductDB.category_id == filter_params.sub_category)
+            criteria.append(ProductDB.category_id.in_(tree.descendants(filter_params.sub_category)))
 
         # Apply price range filters
         if filter_params.price_min is not None:
-            products = products.filter(ProductDB.price >= filter_params.price_min)
+            criteria.append(ProductDB.price >= filter_params.price_min)
         if filter_params.price_max is not None:
-            products = products.filter(ProductDB.price <= filter_params.price_max)
-
-
+            criteria.append(ProductDB.price <= filter_params.price_max)
 
-        # Apply rating filter
+        # Apply rating filter: a range predicate on the indexed product_rating_summary.average_rating
+        # (products without approved reviews have no summary row and are left out)
         if filter_params.rating_min is not None:
-            products = products.outerjoin(ReviewDB, ProductDB.product_id == ReviewDB.product_id)\
-                .group_by(ProductDB.product_id)\
-                .having(func.avg(ReviewDB.rating) >= filter_params.rating_min)
+            criteria.append(review_stats.c.average_rating >= filter_params.rating_min)
 
         # Apply warranty filter
         if filter_params.warranty_status is not None:
-            products = products.filter(ProductDB.warranty_status >= filter_params.warranty_status)
-
-        results = []
-
-        for product in products:
-            discount = self.db.query(Discount).filter(and_(Discount.product_id == product.product_id, Discount.is_active)).first()
-            reviews = self.db.query(ReviewDB).filter(and_(ReviewDB.product_id == product.product_id, ReviewDB.approval_status == "APPROVED")).all()
-
-            average_rating = 0
-
-            if len(reviews) != 0:
-                for i in reviews:
-                    average_rating += i.rating
-            
-
-            results.append(ProductDiscountSchema(
-                product_id=product.product_id,
-                name=product.name,
-                model=product.model,
-                description=product.description,
-                quantity=product.quantity,
-                serial_number=product.serial_number,
-                warranty_status=product.warranty_status,
-                distributor=product.distributor,
-                image_url=product.image_url,
-                item_sold=product.item_sold,
-                price=product.price,
-                cost=product.cost,
-                average_rating=average_rating,
-                category_id=product.category_id,
-                discount_rate=discount.discount_rate if discount else 0,
-                end_date=discount.end_date if discount else None
-            ))
-
+            criteria.append(ProductDB.warranty_status >= filter_params.warranty_status)
 
         # Execute the query and return results
-        return results
+        return CatalogProjection(self.db).page(*criteria, sort_keys=BY_PRODUCT_ID, page=page, review_stats=review_stats)
 
     def get_discounted_products(self, sort_by: str = "rate") -> List[ProductDiscountSchema]:
         """
@@ -536,53 +312,15 @@ class ProductService:
         :param sort_by: "rate" to sort by discount rate, "end_date" to sort by discount end date
         :return: List of discounted products
         """
+        discounts = CatalogProjection.active_discounts()
         if sort_by == "end_date":
-            order_criteria = [Discount.end_date.asc(), Discount.discount_rate.desc()]
+            order_criteria = (discounts.c.end_date.asc(), discounts.c.discount_rate.desc())
         else:
-            order_criteria = [Discount.discount_rate.desc(), Discount.end_date.asc()]
-
-        discounted_products = (
-            self.db.query(
-                ProductDB.product_id,
-                ProductDB.name,
-                ProductDB.model,
-                ProductDB.description,
-                ProductDB.serial_number,
-                ProductDB.category_id,
-                ProductDB.quantity,
-                ProductDB.price,
-                ProductDB.distributor,
-                ProductDB.image_url,
-                ProductDB.item_sold,
-                ProductDB.warranty_status,
-                ProductDB.cost,
-                Discount.discount_rate,
-                Discount.end_date,
-            )
-            .join(Discount, ProductDB.product_id == Discount.product_id)
-            .filter(Discount.is_active == 1, ProductDB.quantity > 0)
-            .order_by(*order_criteria)
-            .all()
-        )
-
-        return [
-            ProductDiscountSchema(
-                product_id=product.product_id,
-                name=product.name,
-                model=product.model,
-                description=product.description,
-                serial_number=product.serial_number,
-                category_id=product.category_id,
-                quantity=product.quantity,
-                price=product.price,
-                distributor=product.distributor,
-                image_url=product.image_url,
-                item_sold=product.item_sold,
-                warranty_status=product.warranty_status,
-                cost=product.cost,
-                discount_rate=product.discount_rate,
-                end_date=product.end_date,
-            )
-            for product in discounted_products
-        ]
+            order_criteria = (discounts.c.discount_rate.desc(), discounts.c.end_date.asc())
 
+        return CatalogProjection(self.db).fetch(
+            discounts.c.product_id.isnot(None),
+            ProductDB.quantity > 0,
+            order_by=order_criteria,
+            discounts=discounts,
+        )
@@ -79,7 +79,6 @@ def setup_and_teardown_db(db_session):
             product_id="00000000-0000-0000-0000-000000000002",
             rating=5,
             comment="Excellent product!",
-            pm_id="00000000-0000-0000-0000-000000000003",
             approval_status="Approved",
         )
     ]
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event
+from models.models import Discount, ProductDB, ProductRatingSummary
+from services.catalog import CatalogProjection
+from services.pagination import PageRequest
+
+SEEDED = "00000000-0000-0000-0000-000000000002"
+
+
+def add_product(db, product_id, **columns):
+    db.add(ProductDB(product_id=product_id, name=columns.pop("name", f"Product {product_id}"), model="M",
+                     serial_number=f"SN-{product_id}", quantity=5, price=columns.pop("price", 10), cost=5, **columns))
+
+
+def test_listing_rows_carry_the_rating_and_the_best_active_discount_in_one_query(db_session):
+    add_product(db_session, "p1")
+    now = datetime.utcnow()
+    db_session.add_all([
+        Discount(product_id=SEEDED, discount_rate=Decimal("0.10"), start_date=now, end_date=now + timedelta(days=5)),
+        Discount(product_id=SEEDED, discount_rate=Decimal("0.20"), start_date=now, end_date=now + timedelta(days=9)),
+        Discount(product_id=SEEDED, discount_rate=Decimal("0.20"), start_date=now, end_date=now + timedelta(days=2)),
+        # an inactive discount does not count, whatever its rate
+        Discount(product_id=SEEDED, discount_rate=Decimal("0.50"), start_date=now, end_date=now + timedelta(days=1),
+                 is_active=0),
+        ProductRatingSummary(product_id=SEEDED, review_count=2, rating_sum=9, rating_4=1, rating_5=1,
+                             average_rating=4.5),
+    ])
+    db_session.commit()
+
+    statements = []
+    engine = db_session.get_bind()
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        rows = {row.product_id: row for row in CatalogProjection(db_session).fetch()}
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1
+    seeded = rows[SEEDED]
+    # the highest rate wins, the earliest end date breaks the tie
+    assert (seeded.discount_rate, seeded.end_date, seeded.average_rating) == (0.2, now + timedelta(days=2), 4.5)
+    assert (rows["p1"].discount_rate, rows["p1"].end_date, rows["p1"].average_rating) == (0.0, None, 0.0)
+
+    assert CatalogProjection(db_session).fetch_one(SEEDED) == seeded
+    assert CatalogProjection(db_session).fetch_one("missing") is None
+    assert [row.product_id for row in CatalogProjection(db_session).fetch_by_ids(["p1"])] == ["p1"]
+
+
+def test_projected_fields_leave_out_the_joins_they_do_not_need(db_session):
+    projection = CatalogProjection(db_session)
+    sql = str(projection.statement(fields=["product_id", "name"]))
+    assert "product_rating_summary" not in sql and "discount" not in sql
+    assert "product_rating_summary" in str(projection.statement(fields=["product_id", "average_rating"]))
+
+    page = projection.page(sort_keys=[(ProductDB.product_id, False)], page=PageRequest(fields=["product_id", "name"]))
+    assert page.items == [{"product_id": SEEDED, "name": "Dog Bed"}]
@@ -0,0 +1,62 @@
+from models.models import CategoryDB, ProductDB
+from services import category_tree as category_tree_module
+from services.cache_version import bump_cache_versions
+from services.category_tree import CACHE_VERSION_NAME, CategoryTree, CategoryTreeCache
+from services.services import ProductService
+
+
+def test_descendants_are_the_nested_set_slice_of_a_category():
+    # 1 -> 4 -> 6 -> 7, 1 -> 5, 2 alone, 9 whose parent 8 does not exist, 10 <-> 11 a parent cycle
+    tree = CategoryTree([
+        (1, None, "Dogs"), (2, None, "Cats"), (4, 1, "Food"), (5, 1, "Toys"), (6, 4, "Dry"), (7, 6, "Puppy"),
+        (9, 8, "Orphan"), (10, 11, "Loop A"), (11, 10, "Loop B"),
+    ])
+    assert tree.roots == [1, 2, 9]
+    assert tree.descendants(1) == [1, 4, 6, 7, 5]
+    assert tree.descendants(4, include_self=False) == [6, 7]
+    assert tree.descendants(7) == [7]
+    assert tree.descendants(3) == []
+    assert tree.ancestors(7) == [6, 4, 1]
+    assert tree.ancestors(1) == []
+    # categories that cannot be reached from a root are still numbered, and their ancestors end
+    assert 9 in tree and 10 in tree and 11 in tree
+    assert sorted(tree.descendants(10)) == [10, 11]
+    assert tree.ancestors(10) == [11]
+
+
+def test_a_category_listing_includes_the_products_of_every_depth(db_session):
+    # the seeded categories 1-3 are roots; 4 is below 1 and 5 below 4
+    db_session.add_all([CategoryDB(category_id=4, parentcategory_id=1, category_name="Beds"),
+                        CategoryDB(category_id=5, parentcategory_id=4, category_name="Large Beds")])
+    for index, category_id in enumerate([4, 5, 2]):
+        db_session.add(ProductDB(product_id=f"p{index}", name=f"Product {index}", model="M", serial_number=f"SN-{index}",
+                                 category_id=category_id, quantity=1, price=10, cost=5))
+    db_session.commit()
+    category_tree_module.category_tree_cache.invalidate()
+    service = ProductService(db_session)
+
+    assert sorted(item["product_id"] for item in service.get_products_by_category_id(1).items) == [
+        "00000000-0000-0000-0000-000000000002", "p0", "p1"]
+    assert [item["product_id"] for item in service.get_products_by_category_id(5).items] == ["p1"]
+    assert service.get_products_by_category_id(99).items == []
+    assert [category["category_id"] for category in service.get_categories_by_parent_id(1)] == [4]
+    assert [category["category_id"] for category in service.get_root_categories()] == [1, 2, 3]
+
+
+def test_the_tree_is_reloaded_when_its_version_is_bumped(db_session, monkeypatch):
+    cache = CategoryTreeCache()
+    tree = cache.get(db_session)
+    assert 4 not in tree
+
+    # dashboards_service adds a category and bumps the version in the same transaction
+    db_session.add(CategoryDB(category_id=4, parentcategory_id=1, category_name="Beds"))
+    db_session.commit()
+    assert cache.get(db_session) is tree
+    monkeypatch.setattr(category_tree_module, "VERSION_CHECK_INTERVAL", 0)
+    # the version did not change yet: the tree is kept
+    assert cache.get(db_session) is tree
+
+    bump_cache_versions(db_session, [CACHE_VERSION_NAME])
+    db_session.commit()
+    reloaded = cache.get(db_session)
+    assert reloaded is not tree and reloaded.descendants(1) == [1, 4]
@@ -0,0 +1,80 @@
+import pytest
+from models.models import ProductDB
+from services.catalog import CatalogProjection
+from services.pagination import DEFAULT_PAGE_SIZE, PageRequest, decode_cursor, encode_cursor, parse_fields
+from services.services import ProductService
+
+SEEDED = "00000000-0000-0000-0000-000000000002"
+
+
+def add_products(db, count, **columns):
+    for index in range(count):
+        db.add(ProductDB(product_id=f"p{index:03d}", name=f"Product {index}", model="M", serial_number=f"SN-{index}",
+                         quantity=1, price=columns.get("price", index % 7), cost=1,
+                         warranty_status=None if index % 3 == 0 else index % 4))
+    db.commit()
+
+
+def read_all(load_page, limit):
+    # every page of a listing, following the cursors
+    pages, cursor = [], None
+    while True:
+        page = load_page(PageRequest(cursor=cursor, limit=limit))
+        pages.append([item["product_id"] for item in page.items])
+        cursor = page.next_cursor
+        if cursor is None:
+            return pages
+
+
+def test_a_listing_without_a_limit_returns_the_default_page(db_session):
+    add_products(db_session, DEFAULT_PAGE_SIZE + 10)
+    service = ProductService(db_session)
+
+    first = service.get_all_products()
+    assert len(first.items) == DEFAULT_PAGE_SIZE and first.next_cursor is not None
+    rest = service.get_all_products(PageRequest(cursor=first.next_cursor))
+    assert len(rest.items) == 11 and rest.next_cursor is None
+    # internal callers can still read everything at once
+    assert len(service.get_all_products(PageRequest(limit=None)).items) == DEFAULT_PAGE_SIZE + 11
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_price_pages_cover_every_product_once_in_order(db_session, order):
+    add_products(db_session, 40)
+    service = ProductService(db_session)
+    everything = [item["product_id"] for item in service.get_products_sorted_by_price(order, PageRequest(limit=None)).items]
+
+    pages = read_all(lambda page: service.get_products_sorted_by_price(order, page), limit=6)
+    assert [product_id for page in pages for product_id in page] == everything
+    assert all(len(page) == 6 for page in pages[:-1])
+    prices = {product.product_id: product.price for product in db_session.query(ProductDB)}
+    assert [prices[product_id] for product_id in everything] == sorted(prices.values(), reverse=order == "desc")
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_keep_the_rows_with_a_null_sort_key(db_session, descending):
+    add_products(db_session, 25)
+    projection = CatalogProjection(db_session)
+    sort_keys = [(ProductDB.warranty_status, descending), (ProductDB.product_id, descending)]
+    everything = [item["product_id"] for item in projection.page(sort_keys=sort_keys, page=PageRequest(limit=None)).items]
+    assert len(everything) == 26
+
+    pages = read_all(lambda page: projection.page(sort_keys=sort_keys, page=page), limit=4)
+    assert [product_id for page in pages for product_id in page] == everything
+    # NULL sorts first in ascending order and last in descending order
+    warranty = {product.product_id: product.warranty_status for product in db_session.query(ProductDB)}
+    nulls = [product_id for product_id in everything if warranty[product_id] is None]
+    assert everything[-len(nulls):] == nulls if descending else everything[:len(nulls)] == nulls
+
+
+def test_cursors_and_fields_are_validated(db_session):
+    sort_keys = [(ProductDB.price, False), (ProductDB.product_id, False)]
+    assert decode_cursor(encode_cursor([None, "p1"]), sort_keys) == [None, "p1"]
+    for cursor in ["not base64!", encode_cursor(["p1"]), encode_cursor(["cheap", "p1"])]:
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, sort_keys)
+
+    assert parse_fields("name, price") == ["product_id", "name", "price"]
+    assert parse_fields(None) is None
+    with pytest.raises(ValueError):
+        parse_fields("name,password")
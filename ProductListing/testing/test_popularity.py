@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+import pytest
+from models.models import OrderDB, OrderItemDB, PopularityRun, ProductDB, ProductPopularity, ProductRatingSummary
+from services.popularity import (RATING_WEIGHT, REVIEW_COUNT_WEIGHT, SALES_HALF_LIFE_DAYS, SALES_WEIGHT,
+                                 recompute_popularity, run_due)
+from services.pagination import PageRequest
+from services.services import ProductService
+
+SEEDED = "00000000-0000-0000-0000-000000000002"
+
+
+def add_product(db, product_id):
+    db.add(ProductDB(product_id=product_id, name=product_id, model="M", serial_number=f"SN-{product_id}", quantity=10,
+                     price=10, cost=5))
+
+
+def order(db, order_id, product_id, quantity, at, status=0):
+    db.add(OrderDB(order_id=order_id, customer_id="c1", total_price=10, order_date=at, order_status=status,
+                   payment_status="paid"))
+    db.add(OrderItemDB(order_id=order_id, product_id=product_id, quantity=quantity, price_at_purchase=10))
+
+
+def scores(db):
+    return {row.product_id: row.popularity_score for row in db.query(ProductPopularity)}
+
+
+def test_a_full_run_scores_decayed_sales_and_approved_reviews(db_session):
+    now = datetime.utcnow()
+    add_product(db_session, "p1")
+    add_product(db_session, "p2")
+    order(db_session, "o1", "p1", 4, now)
+    order(db_session, "o2", "p1", 2, now - timedelta(days=SALES_HALF_LIFE_DAYS))
+    # cancelled orders and orders older than the window do not count
+    order(db_session, "o3", "p1", 50, now, status=4)
+    order(db_session, "o4", "p1", 50, now - timedelta(days=365))
+    db_session.add(ProductRatingSummary(product_id="p2", review_count=2, rating_sum=8, rating_4=2, average_rating=4.0))
+    db_session.commit()
+
+    run = recompute_popularity(db_session)
+    assert (run.mode, run.products_updated) == ("full", 3)
+    result = scores(db_session)
+    # a sale of SALES_HALF_LIFE_DAYS days ago counts half
+    assert result["p1"] == pytest.approx((4 + 2 * 0.5) * SALES_WEIGHT, rel=1e-3)
+    assert result["p2"] == pytest.approx(4.0 * RATING_WEIGHT + 2 * REVIEW_COUNT_WEIGHT)
+    assert result[SEEDED] == 0
+
+
+def test_an_incremental_run_only_recomputes_the_touched_products(db_session):
+    now = datetime.utcnow()
+    for product_id in ["p1", "p2", "p3"]:
+        add_product(db_session, product_id)
+    order(db_session, "o1", "p1", 2, now - timedelta(days=1))
+    order(db_session, "o2", "p2", 2, now - timedelta(days=1))
+    db_session.commit()
+    first = run_due(db_session)
+    assert first.mode == "full"
+    before = scores(db_session)
+
+    watermark = datetime.utcnow()
+    order(db_session, "o3", "p2", 6, datetime.utcnow())
+    add_product(db_session, "p4")  # a new product without a score yet
+    db_session.commit()
+
+    run = recompute_popularity(db_session, since=watermark)
+    assert (run.mode, run.products_updated) == ("incremental", 2)
+    after = scores(db_session)
+    assert after["p1"] == before["p1"] and after["p3"] == before["p3"]
+    assert after["p2"] > before["p2"] and after["p4"] == 0
+
+    # the scheduler follows the full run with incremental ones
+    assert run_due(db_session).mode == "incremental"
+    assert [row.mode for row in db_session.query(PopularityRun).order_by(PopularityRun.run_id)] == [
+        "full", "incremental", "incremental"]
+
+
+def test_popular_listing_follows_the_scores(db_session):
+    for product_id, quantity in [("p1", 1), ("p2", 3)]:
+        add_product(db_session, product_id)
+        order(db_session, f"o-{product_id}", product_id, quantity, datetime.utcnow())
+    db_session.commit()
+    recompute_popularity(db_session)
+
+    page = ProductService(db_session).get_products_sorted_by_popularity(PageRequest(limit=2))
+    assert [item["product_id"] for item in page.items] == ["p2", "p1"]
+    rest = ProductService(db_session).get_products_sorted_by_popularity(PageRequest(cursor=page.next_cursor))
+    assert [item["product_id"] for item in rest.items] == [SEEDED]
@@ -0,0 +1,78 @@
+import time
+from services import services as services_module
+from services.cache_version import bump_cache_versions, product_cache_key
+from services.product_cache import InProcessBackend, ProductCache
+from services.services import ProductService
+from models.models import ProductUpdate
+
+SEEDED = "00000000-0000-0000-0000-000000000002"
+
+
+class Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_entries_are_revalidated_against_the_product_version(db_session):
+    cache = ProductCache("test", backend=InProcessBackend(10), ttl=60, version_check_interval=60)
+    loader = Loader({"name": "Dog Bed"})
+
+    assert cache.get(db_session, SEEDED, loader) == {"name": "Dog Bed"}
+    assert cache.get(db_session, SEEDED, loader) == {"name": "Dog Bed"}
+    assert loader.calls == 1
+
+    # a bump inside the check interval is not seen yet; after it, one version lookup finds it and reloads
+    loader.value = {"name": "Updated Dog Bed"}
+    bump_cache_versions(db_session, [product_cache_key(SEEDED)])
+    db_session.commit()
+    assert cache.get(db_session, SEEDED, loader) == {"name": "Dog Bed"}
+    cache.version_check_interval = 0
+    assert cache.get(db_session, SEEDED, loader) == {"name": "Updated Dog Bed"}
+    # an unchanged version revalidates the entry without loading it
+    assert cache.get(db_session, SEEDED, loader) == {"name": "Updated Dog Bed"}
+    assert loader.calls == 2
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["revalidations"]) == (3, 2, 1)
+
+    cache.invalidate(SEEDED)
+    cache.get(db_session, SEEDED, loader)
+    assert loader.calls == 3
+
+
+def test_missing_products_are_not_cached(db_session):
+    cache = ProductCache("test", backend=InProcessBackend(10))
+    loader = Loader(None)
+    assert cache.get(db_session, "missing", loader) is None
+    assert cache.get(db_session, "missing", loader) is None
+    assert loader.calls == 2
+
+
+def test_the_in_process_backend_evicts_the_least_recently_used_and_expired_entries():
+    backend = InProcessBackend(max_entries=2)
+    backend.set("a", {"v": 1}, ttl=60)
+    backend.set("b", {"v": 2}, ttl=60)
+    backend.get("a")
+    backend.set("c", {"v": 3}, ttl=60)
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == ({"v": 1}, None, {"v": 3})
+
+    backend.set("d", {"v": 4}, ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("d") is None
+    assert (backend.evictions, backend.expirations) == (2, 1)
+
+
+def test_a_product_update_is_served_at_once(db_session, monkeypatch):
+    # a check interval long enough that only the invalidation of the write can make the update visible
+    monkeypatch.setattr(services_module, "product_detail_cache",
+                        ProductCache("test", backend=InProcessBackend(10), version_check_interval=60))
+    service = ProductService(db_session)
+
+    assert service.get_product_by_id(SEEDED).name == "Dog Bed"
+    service.update_product(SEEDED, ProductUpdate(name="Updated Dog Bed"))
+    assert service.get_product_by_id(SEEDED).name == "Updated Dog Bed"
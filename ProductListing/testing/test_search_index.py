@@ -0,0 +1,141 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from models.models import Base, ProductDB
+from services import search_index as search_module
+from services.search_index import ProductSearchIndex, get_search_index
+
+
+def product(product_id, name, model="M", description=None, distributor=None):
+    return SimpleNamespace(product_id=product_id, name=name, model=model, description=description,
+                           distributor=distributor)
+
+
+@pytest.fixture
+def index():
+    index = ProductSearchIndex()
+    for item in [
+        product("collar", "Leather Collar", description="A collar for large dogs"),
+        product("leash", "Dog Leash", description="Matches the leather collar"),
+        product("bowl", "Steel Bowl", description="A bowl for dogs and cats", distributor="PetShopCo"),
+        product("bed", "Dog Bed", description="A comfortable bed"),
+    ]:
+        index.add(item)
+    return index
+
+
+def ids(results):
+    return [product_id for product_id, _ in results[1]]
+
+
+def test_matches_are_ranked_with_bm25(index):
+    # the name weighs more than the description, and every query term must match
+    assert ids(index.search("collar")) == ["collar", "leash"]
+    assert ids(index.search("leather collar")) == ["collar", "leash"]
+    # "dog" is a whole word of the leash's name but only the prefix of "dogs" in the collar's description
+    assert ids(index.search("dog collar")) == ["leash", "collar"]
+    assert index.search("collar cat") == (0, [])
+    # the rarer term weighs more: "steel" only matches the bowl
+    scores = dict(index.search("dogs steel")[1])
+    assert list(scores) == ["bowl"]
+
+    assert sorted(ids(index.search("dog"))[:2]) == ["bed", "leash"]
+
+    total, page = index.search("dog", offset=1, limit=2)
+    assert total == 4 and len(page) == 2
+    assert [product_id for product_id, _ in page] == ids(index.search("dog"))[1:3]
+
+
+def test_prefixes_and_infixes_match_with_a_lower_score(index):
+    exact = dict(index.search("collar")[1])["collar"]
+    prefix = dict(index.search("coll")[1])["collar"]
+    infix = dict(index.search("ollar")[1])["collar"]
+    assert exact > prefix > infix > 0
+    # a substring found inside a word, as the ILIKE '%q%' search did
+    assert ids(index.search("eash")) == ["leash"]
+    assert ids(index.search("shopc")) == ["bowl"]
+    # too short to scan the terms for
+    assert index.search("ol") == (0, [])
+
+
+def test_writes_update_the_index(index):
+    index.add(product("collar", "Nylon Harness"))
+    assert ids(index.search("harness")) == ["collar"]
+    assert ids(index.search("leather")) == ["leash"]
+    index.remove("leash")
+    assert index.search("leather") == (0, [])
+    assert len(index) == 3
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(ProductDB(product_id="p1", name="Dog Bed", model="M", serial_number="SN-1", quantity=1, price=1, cost=1))
+    db.add(ProductDB(product_id="p2", name="Cat Toy", model="M", serial_number="SN-2", quantity=1, price=1, cost=1))
+    db.commit()
+    db.close()
+    yield engine
+    engine.dispose()
+
+
+def test_writes_made_during_a_rebuild_are_kept(engine):
+    index = ProductSearchIndex()
+
+    written = []
+
+    def write_while_reading(*args):
+        # another request creates a product and deletes one while the rebuild reads the table
+        if not written:
+            written.append(True)
+            index.add(product("p3", "Cat Bed"))
+            index.remove("p2")
+
+    event.listen(engine, "before_cursor_execute", write_while_reading)
+    db = sessionmaker(bind=engine)()
+    index.build(db)
+    db.close()
+
+    assert sorted(ids(index.search("bed"))) == ["p1", "p3"]
+    assert index.search("toy") == (0, [])
+
+
+def test_a_stale_index_is_rebuilt_in_the_background(engine, monkeypatch):
+    index = ProductSearchIndex()
+    monkeypatch.setattr(search_module, "search_index", index)
+    db = sessionmaker(bind=engine)()
+
+    # no index yet: the first search builds it
+    assert get_search_index(db) is index and ids(index.search("dog")) == ["p1"]
+
+    db.add(ProductDB(product_id="p3", name="Dog Toy", model="M", serial_number="SN-3", quantity=1, price=1, cost=1))
+    db.commit()
+    index.built_at = time.monotonic() - search_module.SEARCH_INDEX_MAX_AGE - 1
+    reading, release = threading.Event(), threading.Event()
+
+    def slow_read(*args):
+        if not release.is_set():
+            reading.set()
+            release.wait(5)
+
+    event.listen(engine, "before_cursor_execute", slow_read)
+    # the stale index is served as it is while the rebuild runs on its own thread
+    assert get_search_index(db) is index
+    assert reading.wait(5)
+    assert get_search_index(db) is index and ids(index.search("dog")) == ["p1"]
+    release.set()
+
+    deadline = time.monotonic() + 5
+    while index.is_stale() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(ids(index.search("dog"))) == ["p1", "p3"]
+    # the rebuild released its lock
+    assert search_module._rebuild_lock.acquire(blocking=False)
+    search_module._rebuild_lock.release()
+    event.remove(engine, "before_cursor_execute", slow_read)
+    db.close()
@@ -38,6 +38,6 @@ def test_delete_product_service(db_session):
 def test_create_review_service(db_session):
     review = db_session.query(ReviewDB).first()
     assert review is not None
-    assert review.pm_id == "00000000-0000-0000-0000-000000000003"
+    assert review.product_id == "00000000-0000-0000-0000-000000000002"
     assert review.approval_status == "Approved"
 
@@ -2,7 +2,8 @@
 from fastapi import FastAPI
 import uvicorn
 from review_controllers.reviewControllers import router as review_controller
-from dbContext_Review import engine, Base
+from dbContext_Review import engine, Base, database, SessionLocal
+from review_services.rating_summary import ensure_rating_summary
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(
@@ -16,6 +17,17 @@ app.include_router(review_controller)
 def read_root():
     return {"message": "Dashboard Service"}
 
+# Connection pool metrics: checkout wait times, timeouts and saturation of each engine
+@app.get("/db/stats")
+def db_stats():
+    return database.stats()
+
+# The reviews created here are added to product_rating_summary: create and backfill it when this service starts
+# before ProductListing
+@app.on_event("startup")
+def init_rating_summary():
+    ensure_rating_summary(engine, SessionLocal)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -4,6 +4,7 @@ from pydantic import BaseModel, Field
 from typing import List, Optional
 from review_services import review_service
 from review_dependencies import oauth2_scheme, verify_user_role
+from review_dependencies import Principal
 from typing import Optional
 from fastapi import status
 from fastapi.security import OAuth2PasswordBearer
@@ -23,12 +24,12 @@ router = APIRouter(prefix="/reviews")
 
 
 @router.post("/add_review",response_model=Review_Response,dependencies=[Depends(verify_user_role)])
-async def add_review(submited_review: Review_Request, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def add_review(submited_review: Review_Request, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme), user: Principal = Depends(verify_user_role)):
     
     #checks if the user of the token ordered the product whose id's is given as parameter
-    check = check_user_orders(db, token, submited_review.product_id)
+    check = check_user_orders(db, user, submited_review.product_id)
     if(check):
-        return create_review(db,token,submited_review)
+        return create_review(db,user,submited_review)
     else:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -36,7 +37,7 @@ async def add_review(submited_review: Review_Request, db: Session = Depends(get_
         )
     
 @router.get("/get_reviews/{product_id}", response_model = List[Review_Response])
-async def get_reviews(product_id: str,db: Session = Depends(get_db)):
+def get_reviews(product_id: str,db: Session = Depends(get_db)):
     requested_reviews = Get_Review_Response(product_id = product_id)
     reviews = get_all_reviews_for_certain_product(db,requested_reviews)
     return reviews
@@ -1,45 +1,35 @@
-from fastapi import Depends, HTTPException, status
+import os
+import sys
+from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from review_settings import settings
 from dbContext_Review import get_db
 from review_models.models import Customer
 
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.principal_cache import Principal, PrincipalCache, resolve_principal
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")  # Path to your auth service token endpoint
 
+# verified tokens of this process (token hash -> principal, until the token expires)
+principal_cache = PrincipalCache(max_entries=settings.principal_cache_max_entries, ttl=settings.principal_cache_ttl)
 
-#this function verifies if the given token is user role token or not
-def verify_user_role(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        print("Verifying user")
-        # Decode JWT token using your JWT secret and algorithm
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        print(token)
-        
-        # Extract user role from token
-        role: str = payload.get("role")
-        if role != "customer":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access forbidden: customer role required"
-            )
 
-        email : str = payload.get("sub")
-        user = db.query(Customer).filter(Customer.email == email).first()
+def load_customer(db: Session, email: str):
+    user = db.query(Customer).filter(Customer.email == email).first()
+    if user is None:
+        return None
+    return Principal(user_id=user.user_id, email=user.email, role="customer", name=user.name, surname=user.surname)
 
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access forbidden: This customer does not exist"
-            )
-        
-        # Optionally, you can add additional checks here (e.g., user status or permissions)
-        
-    except JWTError:
-        raise credentials_exception
+
+#this function verifies if the given token is user role token or not, and returns the customer of the token
+def verify_user_role(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    return resolve_principal(
+        token, db, principal_cache, settings.jwt_secret, settings.jwt_algorithm,
+        role="customer",
+        load_user=load_customer,
+        forbidden="Access forbidden: customer role required",
+        missing_user="Access forbidden: This customer does not exist",
+    )
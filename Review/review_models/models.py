@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, String, Integer, CHAR, ForeignKey, DECIMAL, Text, DateTime, Boolean
+    Column, String, Integer, CHAR, ForeignKey, DECIMAL, Text, DateTime, Boolean, Float
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
@@ -76,6 +76,27 @@ class Review(Base):
     customer = relationship('Customer', back_populates='reviews')
     product = relationship('Product', back_populates='reviews')
 
+# Product Rating Summary Table (running totals of the approved reviews of a product)
+class ProductRatingSummary(Base):
+    __tablename__ = 'product_rating_summary'
+    product_id = Column(CHAR(36), ForeignKey('products.product_id', ondelete='CASCADE'), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_1 = Column(Integer, nullable=False, default=0)
+    rating_2 = Column(Integer, nullable=False, default=0)
+    rating_3 = Column(Integer, nullable=False, default=0)
+    rating_4 = Column(Integer, nullable=False, default=0)
+    rating_5 = Column(Integer, nullable=False, default=0)
+    average_rating = Column(Float, nullable=False, default=0, index=True)
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+# Cache Version Table (a counter per cached data set, bumped when the data changes so that the caches reload it)
+class CacheVersion(Base):
+    __tablename__ = 'cache_version'
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 # Add back_populates to Customer and Product classes
 Customer.reviews = relationship('Review', back_populates='customer', cascade='all, delete-orphan')
 Product.reviews = relationship('Review', back_populates='product', cascade='all, delete-orphan')
@@ -8,15 +8,15 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from review_settings import settings
 from dbContext_Review import get_db
-from review_models.models import Customer, Review,Order,OrderItem
+from review_models.models import Customer, Review,Order,OrderItem, ProductRatingSummary
+from review_services.rating_summary import apply_review_change, APPROVED
+from review_services.cache_version import bump_cache_versions, product_cache_key
+from review_dependencies import Principal
 from uuid import uuid4
 from sqlalchemy import and_
 from review_schemas.schemas import Review_Response,Get_Review_Response, Review_Request
 
-def check_user_orders(db: Session, token: str ,product_id: str):
-    payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-    email : str = payload.get("sub")
-    user = db.query(Customer).filter(Customer.email == email).first()
+def check_user_orders(db: Session, user: Principal ,product_id: str):
     user_id = user.user_id
     result = (db.query(OrderItem).join(Order, OrderItem.order_id == Order.order_id).filter(and_(Order.customer_id == user_id,OrderItem.product_id == product_id )).first())
     if result:
@@ -25,12 +25,9 @@ def check_user_orders(db: Session, token: str ,product_id: str):
         return False
 
 
-def create_review(db: Session, token: str, submitted_review: Review_Request):
-    payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-    email : str = payload.get("sub")
-    user = db.query(Customer).filter(Customer.email == email).first()
+def create_review(db: Session, user: Principal, submitted_review: Review_Request):
     user_id = user.user_id
-    approval_status = "APPROVED" if submitted_review.comment == "" else "PENDING"
+    approval_status = APPROVED if submitted_review.comment == "" else "PENDING"
     review = Review(
         review_id = str(uuid4()),
         customer_id = user_id,
@@ -41,6 +38,11 @@ def create_review(db: Session, token: str, submitted_review: Review_Request):
     )
 
     db.add(review)
+    # reviews without a comment are approved right away, so they count in the rating summary of the product
+    if approval_status == APPROVED:
+        apply_review_change(db, review.product_id, review.rating, 1)
+        # the cached product details carry the average rating
+        bump_cache_versions(db, [product_cache_key(review.product_id)])
     db.commit()
     db.refresh(review)
     return review
@@ -68,15 +70,6 @@ def get_all_reviews_for_certain_product(db: Session, requested_review: Get_Revie
 
 
 def calculate_average_rating(db: Session, product_id: str):
-    reviews = db.query(Review).filter(and_(Review.product_id == product_id, Review.approval_status == "APPROVED")).all()
-
-    print(reviews)
-    
-    if len(reviews) == 0:
-        return 0
-    else:
-        avg = 0
-        for i in reviews:
-            avg += i.rating
-        avg = avg/len(reviews)
-        return avg
\ No newline at end of file
+    # the average of the approved reviews is kept in product_rating_summary, so this is a primary key lookup
+    summary = db.query(ProductRatingSummary.average_rating).filter(ProductRatingSummary.product_id == product_id).first()
+    return summary.average_rating if summary else 0
@@ -62,6 +62,37 @@ def get_wishlist_items(wishlist_id: str, db: Session = Depends(get_db)):
         # Handle unexpected errors with 500 response
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+"""
+Usage: to render a wishlist page we need all of its items with their product details, discount and stock
+
+example query: /wishlist_items/get/1/products (wishlist_id)
+
+example output from the get_wishlist_products endpoint:
+[
+    {
+        "wishlist_item_id": "1",
+        "product_id": "1",
+        "name": "Product Name",
+        "quantity": 10,
+        "in_stock": true,
+        "price": 100.0,
+        "discount_rate": 0,
+        ...
+    }
+]
+"""
+@router.get("/get/{wishlist_id}/products", response_model=list[dict])
+def get_wishlist_products(wishlist_id: str, db: Session = Depends(get_db)):
+    """Get all wishlist items of a wishlist with their product details in one query."""
+    try:
+        return wishlist_item_service.get_wishlist_products(wishlist_id, db)
+    except ValueError as e: # if the wishlist is not found in the database
+        # Map ValueError to HTTP 404 response
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        # Handle unexpected errors with 500 response
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
 """
 usage: to remove an item from the wishlist we need to know the wishlist_item_id 
 
@@ -1,5 +1,5 @@
 from fastapi import FastAPI
-from dbContext import engine, Base
+from dbContext import engine, Base, database
 from fastapi.middleware.cors import CORSMiddleware
 from controllers.wishlist_controller import router as wishlist_router
 from controllers.wishlist_item_controller import router as wishlist_item_router
@@ -24,6 +24,11 @@ app.add_middleware(
 # Initialize database (create tables if they don't exist)
 Base.metadata.create_all(bind=engine)
 
+# Connection pool metrics: checkout wait times, timeouts and saturation of each engine
+@app.get("/db/stats")
+def db_stats():
+    return database.stats()
+
 # Include routers
 app.include_router(wishlist_router, prefix="/api/wishlists", tags=["wishlists"])
 app.include_router(wishlist_item_router, prefix="/api/wishlist_items", tags=["wishlist_items"])
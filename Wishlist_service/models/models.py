@@ -183,3 +183,15 @@ class Review(Base):
     # Relationships
     customer = relationship("Customer", back_populates="reviews")
     product = relationship("Product", back_populates="reviews")
+
+
+# Discount Table (read only here: the active discount of the products shown on a wishlist)
+class Discount(Base):
+    __tablename__ = 'discount'
+
+    discount_id = Column(CHAR(36), primary_key=True, default=lambda: str(uuid4()))
+    product_id = Column(CHAR(36), ForeignKey('products.product_id', ondelete="CASCADE"), nullable=True)
+    discount_rate = Column(DECIMAL(5, 2), nullable=False)
+    start_date = Column(DateTime, nullable=False)
+    end_date = Column(DateTime, nullable=False)
+    is_active = Column(Integer, nullable=False, default=1)
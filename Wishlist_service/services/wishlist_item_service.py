@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
-from models.models import Wishlist, WishlistItem, Product
+from sqlalchemy import func
+from models.models import Wishlist, WishlistItem, Product, Discount
 from schemas import WishlistItemCreate
 
 class WishlistItemService:
@@ -77,6 +78,56 @@ class WishlistItemService:
         return WishlistItemsOfWishList #no need for that again: db.query(WishlistItem).filter(WishlistItem.wishlist_id == wishlist_id).all()
     
 
+    def get_wishlist_products(self, wishlist_id: str, db: Session) -> list[dict]:
+        """
+        This service is to get the wishlist items of a wishlist together with their product details,
+        active discount and stock, so that the wishlist page does not look the products up one by one.
+
+        Args:
+        wishlist_id : str : UUID of the wishlist
+        db : Session : SQLAlchemy Session
+
+        Returns:
+        list[dict] : one entry per wishlist item, with the product fields next to the wishlist_item_id
+        """
+        # Check whether the wishlist exists
+        wishlist = db.query(Wishlist.wishlist_id).filter(Wishlist.wishlist_id == wishlist_id).first()
+        if not wishlist:
+            raise ValueError("Wishlist not found in the database")
+
+        # highest active discount of the products on the wishlist, joined in the same statement
+        discounts = (
+            db.query(Discount.product_id, func.max(Discount.discount_rate).label("discount_rate"))
+            .join(WishlistItem, WishlistItem.product_id == Discount.product_id)
+            .filter(WishlistItem.wishlist_id == wishlist_id, Discount.is_active == 1)
+            .group_by(Discount.product_id)
+            .subquery()
+        )
+        rows = (
+            db.query(WishlistItem.wishlist_item_id, Product, discounts.c.discount_rate)
+            .join(Product, Product.product_id == WishlistItem.product_id)
+            .outerjoin(discounts, discounts.c.product_id == Product.product_id)
+            .filter(WishlistItem.wishlist_id == wishlist_id)
+            .order_by(WishlistItem.wishlist_item_id)
+            .all()
+        )
+        return [
+            {
+                "wishlist_item_id": wishlist_item_id,
+                "product_id": product.product_id,
+                "name": product.name,
+                "model": product.model,
+                "description": product.description,
+                "quantity": product.quantity,
+                "in_stock": product.quantity > 0,
+                "price": float(product.price),
+                "distributor": product.distributor,
+                "image_url": product.image_url,
+                "discount_rate": float(discount_rate) if discount_rate is not None else 0,
+            }
+            for wishlist_item_id, product, discount_rate in rows
+        ]
+
     def delete_wishlist_item(self, wishlist_item_id: str, db: Session):
         """
         This service is to delete a wishlist item.
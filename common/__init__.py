@@ -0,0 +1,7 @@
+'''
+    Modules shared by the services. A service module that imports from common puts the repository root on sys.path
+    first, as the tests do with the service directory:
+
+        sys.path.append(<repository root>)
+        from common.db_bootstrap import build_database
+'''
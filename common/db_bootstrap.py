@@ -0,0 +1,177 @@
+'''
+    Database bootstrap: the engine, the sessions and the connection pool metrics of the service.
+
+    Every service builds its engine with build_database(DATABASE_URL); the settings below are read from the
+    environment (not from .env, whose unknown keys the service settings reject), so each service process can be
+    given its own pool without code changes:
+
+        DATABASE_URL               overrides the URL of the service
+        DB_READ_REPLICA_URLS       comma separated URLs of read replicas, used round-robin by get_read_db (the
+                                   read-only endpoints of ProductListing and dashboards_service)
+        DB_POOL_SIZE               connections kept open (default 5)
+        DB_MAX_OVERFLOW            extra connections opened under load and closed when returned (default 5)
+        DB_POOL_TIMEOUT            seconds a request waits for a connection before failing (default 30)
+        DB_POOL_RECYCLE            seconds after which a connection is replaced (default 1800)
+        DB_POOL_PRE_PING           checks a connection before handing it out (default true)
+        DB_STATEMENT_TIMEOUT_MS    MySQL max_execution_time of the SELECTs, 0 for none (default 0). MySQL applies
+                                   it to read-only SELECT statements only: it does not bound the writes (INSERT,
+                                   UPDATE, DELETE), whose lock waits are limited by innodb_lock_wait_timeout
+
+    A service opens at most pool_size + max_overflow connections per engine, so the seven services with the defaults
+    stay at 70 connections, under the 151 max_connections of a default MySQL. The pool records how long each checkout
+    waited, how many timed out and how full it is; Database.stats() returns them and each service serves them on
+    GET /db/stats.
+
+    Shared by every service (see common/__init__.py).
+'''
+
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+from pydantic_settings import BaseSettings
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseSettings(BaseSettings):
+    database_url: Optional[str] = None
+    db_read_replica_urls: str = ""
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 0
+
+    class Config:
+        extra = "ignore"
+
+
+class PoolMetrics:
+    def __init__(self, name: str, window: int = 1000):
+        self.name = name
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)  # the last checkout waits, for the percentiles
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._recent.append(seconds)
+
+    def stats(self, pool: QueuePool) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            attempts = self.checkouts + self.timeouts
+            capacity = pool.size() + pool._max_overflow
+            in_use = pool.checkedout()
+            return {
+                "name": self.name,
+                "pool_size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "in_use": in_use,
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "saturation": round(in_use / capacity, 4) if capacity else 0.0,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / attempts * 1000, 3) if attempts else 0.0,
+                "wait_p95_ms": round(recent[int(len(recent) * 0.95)] * 1000, 3) if recent else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    '''A QueuePool that records the time spent waiting for each connection in its metrics.'''
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+
+def _create_engine(name: str, url: str, settings: DatabaseSettings):
+    metrics = PoolMetrics(name)
+    # a subclass per engine, so that the pool recreated by dispose() keeps the metrics
+    pool_class = type("MeteredQueuePool", (MeteredQueuePool,), {"metrics": metrics})
+    engine = create_engine(
+        url,
+        poolclass=pool_class,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    if settings.db_statement_timeout_ms and engine.dialect.name == "mysql":
+        # bounds the SELECTs only, not the writes
+        @event.listens_for(engine, "connect")
+        def set_statement_timeout(dbapi_connection, connection_record):
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"SET SESSION max_execution_time = {int(settings.db_statement_timeout_ms)}")
+    return engine, metrics
+
+
+class Database:
+    def __init__(self, url: str, read_urls=(), settings: DatabaseSettings = None):
+        settings = settings or DatabaseSettings()
+        self.engine, self._metrics = _create_engine("primary", url, settings)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.read_engines = []
+        self._read_metrics = []
+        for number, read_url in enumerate(read_urls):
+            engine, metrics = _create_engine(f"replica-{number}", read_url, settings)
+            self.read_engines.append(engine)
+            self._read_metrics.append(metrics)
+        self._read_sessions = [sessionmaker(autocommit=False, autoflush=False, bind=engine)
+                               for engine in self.read_engines]
+        self._next_read = itertools.cycle(range(len(self._read_sessions)))
+        self._lock = threading.Lock()
+
+    def read_session(self) -> Session:
+        '''A session on the next read replica, or on the primary when there is none.'''
+        if not self._read_sessions:
+            return self.SessionLocal()
+        with self._lock:
+            number = next(self._next_read)
+        return self._read_sessions[number]()
+
+    def stats(self) -> dict:
+        return {
+            "primary": self._metrics.stats(self.engine.pool),
+            "replicas": [metrics.stats(engine.pool) for engine, metrics in zip(self.read_engines, self._read_metrics)],
+        }
+
+
+def build_database(default_url: str, settings: DatabaseSettings = None) -> Database:
+    '''
+        The database of the service: DATABASE_URL from the environment or default_url, the read replicas of
+        DB_READ_REPLICA_URLS and the pool settings of the environment.
+    '''
+    settings = settings or DatabaseSettings()
+    read_urls = [url.strip() for url in settings.db_read_replica_urls.split(",") if url.strip()]
+    database = Database(settings.database_url or default_url, read_urls, settings)
+    logger.info("database pool: size=%d max_overflow=%d read_replicas=%d",
+                settings.db_pool_size, settings.db_max_overflow, len(read_urls))
+    return database
@@ -0,0 +1,114 @@
+'''
+    Verified principals of the bearer tokens.
+
+    A role dependency resolves its token once: it decodes the JWT, checks the role and loads the user, and caches the
+    result under the SHA-256 of the token until the token expires (exp), at most principal_cache_ttl seconds, so that
+    a deleted user loses access within that time. The cache is an LRU bounded by principal_cache_max_entries.
+    The next requests with the same token cost no JWT decoding and no user query.
+
+    The dependencies return the Principal, so an endpoint that needs the user declares it as a parameter
+    (user: Principal = Depends(verify_user_role)); FastAPI runs the dependency once per request even when it is also
+    listed in the dependencies of the route.
+
+    Shared by the Order, Review and dashboards services (see common/__init__.py); each builds its PrincipalCache and
+    its role dependencies with resolve_principal.
+'''
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: str
+    email: str
+    role: str
+    name: Optional[str] = None
+    surname: Optional[str] = None
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Principal]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, principal: Principal, expires_at: Optional[float]) -> None:
+        expires_at = min(expires_at, time.time() + self.ttl) if expires_at else time.time() + self.ttl
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (principal, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def resolve_principal(token: str, db: Session, cache: PrincipalCache, secret: str, algorithm: str, role: str,
+                      load_user: Callable[[Session, str], Optional[Principal]],
+                      forbidden: str, missing_user: str) -> Principal:
+    '''
+        The principal of the token for the given role: from the cache, or decoded, checked and loaded.
+        Raises 401 for an invalid token, 403 for another role (forbidden) or an unknown user (missing_user).
+    '''
+    principal = cache.get(token)
+    if principal is None:
+        try:
+            payload = jwt.decode(token, secret, algorithms=[algorithm])
+        except JWTError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if payload.get("role") != role:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=forbidden)
+        principal = load_user(db, payload.get("sub"))
+        if principal is None:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=missing_user)
+        cache.put(token, principal, payload.get("exp"))
+
+    if principal.role != role:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=forbidden)
+    return principal
@@ -0,0 +1,145 @@
+'''
+    sales_daily_fact holds, per product and day, the units sold, the revenue (quantity * price_at_purchase), the cost
+    (quantity * order_items.unit_cost) and the approved refunds (units, amount and cost of the refunded units). The
+    writes of the orders add their lines to it in their own transaction:
+
+        order     the lines added to the day of the order
+        cancel    the lines taken back from the day of the order, as if it had not been placed
+        refund    the refunded line added to the refund columns of the day the refund was approved
+
+    The same amounts are added to sales_monthly_fact, the facts summed per product and month, in the same transaction.
+    The revenue, profit and loss reports of the dashboards (services/salesReportServices.py) read a row per product and
+    day, or per product and month over long ranges, instead of the orders.
+
+    The cost of a line is the cost of the product when it was ordered, kept in order_items.unit_cost, so that a cancel
+    or a refund takes back the cost that the order added; lines written before the column existed use the current cost
+    of the product. The category is the category of the product at the last write.
+
+    The tables are described here with table() clauses rather than the models, which each service declares on its own
+    Base. Shared by the Order and dashboards services (see common/__init__.py).
+'''
+
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import CHAR, DECIMAL, Date, Integer, column, select, table
+from sqlalchemy.orm import Session
+
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.upsert import upsert
+
+AMOUNTS = ("units", "revenue", "cost", "refunded_units", "refunds", "refunded_cost")
+
+
+def _fact_table(name: str, period: str):
+    return table(
+        name,
+        column(period, Date), column("product_id", CHAR(36)), column("category_id", Integer),
+        column("units", Integer), column("revenue", DECIMAL(14, 2)), column("cost", DECIMAL(14, 2)),
+        column("refunded_units", Integer), column("refunds", DECIMAL(14, 2)), column("refunded_cost", DECIMAL(14, 2)),
+    )
+
+
+daily_facts = _fact_table("sales_daily_fact", "day")
+monthly_facts = _fact_table("sales_monthly_fact", "month")
+products = table("products", column("product_id", CHAR(36)), column("cost", DECIMAL(10, 2)),
+                 column("category_id", Integer))
+
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _decimal(value) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _field(item, name, default=None):
+    return item.get(name, default) if isinstance(item, dict) else getattr(item, name, default)
+
+
+def _products(db: Session, product_ids: Iterable[str]) -> Dict[str, Tuple[Decimal, Optional[int]]]:
+    # current cost and category of each product
+    rows = db.execute(
+        select(products.c.product_id, products.c.cost, products.c.category_id)
+        .where(products.c.product_id.in_(sorted(set(product_ids))))
+    )
+    return {row.product_id: (_decimal(row.cost or 0), row.category_id) for row in rows}
+
+
+def unit_costs(db: Session, product_ids: Iterable[str]) -> Dict[str, Decimal]:
+    '''The current cost of each product, to be kept in order_items.unit_cost when the line is ordered.'''
+    return {product_id: cost for product_id, (cost, _) in _products(db, product_ids).items()}
+
+
+def _adding(table_):
+    # the amounts of the written row added to the stored ones, the category replaced
+    return lambda new: {"category_id": new.category_id, **{name: table_.c[name] + new[name] for name in AMOUNTS}}
+
+
+def add_to_facts(db: Session, rows: List[dict]) -> None:
+    '''
+        Adds the amounts of the rows (day, product_id, category_id and AMOUNTS) to the daily and monthly facts of their
+        product, with one upsert per table (common/upsert.py); the rows must have distinct (day, product_id). The
+        caller commits.
+    '''
+    if not rows:
+        return
+    rows = [{"category_id": None, **{name: 0 for name in AMOUNTS}, **row} for row in rows]
+    upsert(db, daily_facts, rows, ["day", "product_id"], _adding(daily_facts))
+    monthly: Dict[Tuple[date, str], dict] = {}
+    for row in rows:
+        key = (row["day"].replace(day=1), row["product_id"])
+        if key in monthly:
+            monthly[key].update(category_id=row["category_id"],
+                                **{name: monthly[key][name] + row[name] for name in AMOUNTS})
+        else:
+            monthly[key] = {"month": key[0], **{k: v for k, v in row.items() if k != "day"}}
+    upsert(db, monthly_facts, list(monthly.values()), ["month", "product_id"], _adding(monthly_facts))
+
+
+def record_sales(db: Session, items: Iterable, day, sign: int = 1) -> None:
+    '''
+        Adds the ordered lines (product_id, quantity, price_at_purchase and unit_cost) to the facts of the day of the
+        order; sign=-1 takes them back (a cancelled order). The caller commits.
+    '''
+    lines: Dict[str, List[Decimal]] = {}
+    missing_cost = []
+    for item in items:
+        quantity = _field(item, "quantity")
+        line = lines.setdefault(_field(item, "product_id"), [0, Decimal(0), Decimal(0)])
+        line[0] += quantity
+        line[1] += quantity * _decimal(_field(item, "price_at_purchase"))
+        unit_cost = _field(item, "unit_cost")
+        if unit_cost is None:
+            missing_cost.append((_field(item, "product_id"), quantity))
+        else:
+            line[2] += quantity * _decimal(unit_cost)
+    if not lines:
+        return
+
+    current = _products(db, lines)
+    for product_id, quantity in missing_cost:
+        lines[product_id][2] += quantity * current.get(product_id, (Decimal(0), None))[0]
+    rows = []
+    for product_id, (units, revenue, cost) in sorted(lines.items()):
+        category_id = current.get(product_id, (None, None))[1]
+        rows.append({"day": _day(day), "product_id": product_id, "category_id": category_id,
+                     "units": sign * units, "revenue": sign * revenue, "cost": sign * cost})
+    add_to_facts(db, rows)
+
+
+def record_refund(db: Session, item, amount, day) -> None:
+    '''
+        Adds an approved refund of an order line (product_id, quantity and unit_cost) to the facts of the day of the
+        approval; the caller commits.
+    '''
+    product_id, quantity = _field(item, "product_id"), _field(item, "quantity")
+    current_cost, category_id = _products(db, [product_id]).get(product_id, (Decimal(0), None))
+    unit_cost = _field(item, "unit_cost")
+    cost = current_cost if unit_cost is None else _decimal(unit_cost)
+    add_to_facts(db, [{"day": _day(day), "product_id": product_id, "category_id": category_id,
+                       "refunded_units": quantity, "refunds": _decimal(amount), "refunded_cost": quantity * cost}])
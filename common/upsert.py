@@ -0,0 +1,66 @@
+'''
+    Dialect-aware upsert: writes rows into a table and updates the rows whose key already exists, in one statement.
+
+        mysql     INSERT ... ON DUPLICATE KEY UPDATE
+        sqlite    INSERT ... ON CONFLICT (key) DO UPDATE
+        others    one executemany UPDATE for the rows whose key exists and one INSERT for the new ones
+
+    The updated values are given by set_, called with the row being written (new.<column>, or new["<column>"]) and
+    returning a dict of column name -> expression, for example:
+
+        upsert(db, table, rows, ["product_id"], lambda new: {"score": new.score})                     # overwrite
+        upsert(db, table, rows, ["day", "product_id"], lambda new: {"units": table.c.units + new.units})  # add
+
+    The rows of one call must have distinct keys and the same columns. The caller commits.
+
+    Shared by the Order, dashboards, ProductListing and shoppingCart services (see common/__init__.py).
+'''
+
+from typing import Callable, Dict, List, Sequence
+from sqlalchemy import and_, bindparam, select, tuple_, update
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+
+class _Params:
+    # the row being written, as bound parameters of the executemany UPDATE of the generic path
+    def __init__(self, table):
+        self._table = table
+
+    def __getitem__(self, name):
+        return bindparam(f"new_{name}", type_=self._table.c[name].type)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+def upsert(db: Session, table, rows: List[dict], key: Sequence[str], set_: Callable[..., Dict[str, object]]) -> None:
+    '''Inserts the rows into the table (a Table or table() clause), updating the rows with the same key columns.'''
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        statement = mysql.insert(table)
+        db.execute(statement.on_duplicate_key_update(**set_(statement.inserted)), rows)
+    elif dialect == "sqlite":
+        statement = sqlite.insert(table)
+        db.execute(statement.on_conflict_do_update(index_elements=[table.c[name] for name in key],
+                                                   set_=set_(statement.excluded)), rows)
+    else:
+        columns = [table.c[name] for name in key]
+        keys = [tuple(row[name] for name in key) for row in rows]
+        existing = {tuple(found) for found in db.execute(select(*columns).where(tuple_(*columns).in_(keys)))}
+        updates = [{**{f"new_{name}": value for name, value in row.items()},
+                    **{f"key_{name}": row[name] for name in key}}
+                   for row, row_key in zip(rows, keys) if row_key in existing]
+        inserts = [row for row, row_key in zip(rows, keys) if row_key not in existing]
+        if updates:
+            db.connection().execute(
+                update(table).where(and_(*[table.c[name] == bindparam(f"key_{name}") for name in key]))
+                .values(**set_(_Params(table))),
+                updates,
+            )
+        if inserts:
+            db.execute(table.insert(), inserts)
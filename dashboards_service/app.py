@@ -3,7 +3,7 @@ from fastapi import FastAPI
 import uvicorn
 from controllers.productControllers import router as product_manager_controller
 from controllers.reviewControllers import router as review_controller
-from dbContext import engine, Base
+from dbContext import engine, Base, database, SessionLocal
 from controllers.categoryControllers import router as category_router
 from controllers.discountControllers import router as dashboard_router
 from controllers.orderControllers import router as order_router
@@ -13,8 +13,16 @@ from controllers.customerControllers import router as customer_router
 from controllers.refundControllers import router as refund_router
 
 from controllers.orderController import router as order_router_pm
+from controllers.inventoryControllers import router as inventory_router
+from controllers.salesReportControllers import router as sales_report_router
 
 from fastapi.middleware.cors import CORSMiddleware
+from services.mailTransportServices import get_mail_transport, reset_mail_transport
+from services.notificationFanoutServices import notification_fanout
+from services.inventorySnapshotServices import ensure_inventory_tables, inventory_snapshot_scheduler
+from services.salesReportServices import ensure_sales_facts
+from services.ratingSummaryServices import ensure_rating_summary
+from models.models import NotificationJob
 
 
 app = FastAPI(
@@ -29,16 +37,56 @@ app.include_router(order_router, prefix="/SalesManager")
 app.include_router(product_router, prefix= "/SalesManager")
 app.include_router(customer_router, prefix="/SalesManager")
 app.include_router(refund_router, prefix="/SalesManager")
+app.include_router(sales_report_router, prefix="/SalesManager")
 # Include Routers
 app.include_router(product_manager_controller, prefix="/ProductManager")
 app.include_router(review_controller, prefix="/ProductManager")
 app.include_router(category_router, prefix="/ProductManager")
 app.include_router(order_router_pm, prefix="/ProductManager")
+app.include_router(inventory_router, prefix="/ProductManager")
 
 @app.get("/")
 def read_root():
     return {"message": "Dashboard Service"}
 
+# Send counters, send rate and latency of the pooled SMTP connections
+@app.get("/mail/stats")
+def mail_stats():
+    return get_mail_transport().stats()
+
+# Connection pool metrics: checkout wait times, timeouts and saturation of each engine
+@app.get("/db/stats")
+def db_stats():
+    return database.stats()
+
+@app.on_event("startup")
+def resume_notification_jobs():
+    NotificationJob.__table__.create(bind=engine, checkfirst=True)
+    notification_fanout.resume_unfinished()
+
+# Inventory ledger tables, and the periodic snapshots the point-in-time stock is projected from
+@app.on_event("startup")
+def start_inventory_snapshots():
+    ensure_inventory_tables(engine)
+    inventory_snapshot_scheduler.start(SessionLocal)
+
+# Daily sales facts of the revenue, profit and loss reports, backfilled from the orders the first time
+@app.on_event("startup")
+def create_sales_facts():
+    ensure_sales_facts(engine, SessionLocal)
+
+# The review moderation applies its changes to product_rating_summary: create and backfill it when this service
+# starts before ProductListing
+@app.on_event("startup")
+def init_rating_summary():
+    ensure_rating_summary(engine, SessionLocal)
+
+@app.on_event("shutdown")
+def close_mail_transport():
+    notification_fanout.stop()
+    reset_mail_transport()
+    inventory_snapshot_scheduler.stop()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
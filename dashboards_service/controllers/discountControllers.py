@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from services.discountServices import get_discounts, create_discount_service, update_discount_service, delete_discount_service
+from services.notificationFanoutServices import get_notification_job, job_progress
 from dbContext import get_db
 from models.models import Discount
 from pydantic import BaseModel, ConfigDict , Field
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from dependencies import verify_sm_role, oauth2_scheme
 router = APIRouter()
@@ -21,6 +22,44 @@ class DiscountCreate(BaseModel):
 def read_discounts(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     return get_discounts(db)
 
-@router.post("/discounts", response_model=DiscountCreate,dependencies=[Depends(verify_sm_role)])
+class NotificationJobProgress(BaseModel):
+    job_id: str
+    status: str
+    total_recipients: Optional[int] = None
+    processed: int
+    sent: int
+    failed: int
+    remaining: Optional[int] = None
+    percent: float
+    last_error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+class DiscountCreateResponse(DiscountCreate):
+    discount_id: str
+    notification_job: NotificationJobProgress
+
+# The wishlist notifications are sent in the background, the response carries the id and counters of their job
+@router.post("/discounts", response_model=DiscountCreateResponse,dependencies=[Depends(verify_sm_role)])
 def create_discount(discount: DiscountCreate, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    return create_discount_service(db, discount)
+    try:
+        created, job = create_discount_service(db, discount)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {
+        "discount_id": created.discount_id,
+        "product_id": created.product_id,
+        "discount_rate": float(created.discount_rate),
+        "start_date": created.start_date,
+        "end_date": created.end_date,
+        "notification_job": job_progress(job),
+    }
+
+# Progress of a wishlist notification job
+@router.get("/discounts/notifications/{job_id}", response_model=NotificationJobProgress,dependencies=[Depends(verify_sm_role)])
+def read_notification_job(job_id: str, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    progress = get_notification_job(db, job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Notification job not found")
+    return progress
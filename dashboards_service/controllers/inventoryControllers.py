@@ -0,0 +1,42 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from dbContext import get_db, get_read_db
+from dependencies import verify_pm_role, oauth2_scheme
+from services.inventorySnapshotServices import stock_at, movement_summary, take_snapshot
+
+
+router = APIRouter(prefix='/inventory')
+
+
+# Stock of the products at a point in time (now when omitted), from the inventory snapshots and movements
+@router.get('/stock', dependencies=[Depends(verify_pm_role)])
+def get_stock_at(
+    at: Optional[datetime] = Query(None, description="Point in time (UTC), now when omitted"),
+    product_id: Optional[List[str]] = Query(None, description="Product id, can be repeated; every product when omitted"),
+    db: Session = Depends(get_read_db),
+    token: str = Depends(oauth2_scheme),
+):
+    at = at or datetime.utcnow()
+    return {"at": at, "stock": stock_at(db, at, product_id)}
+
+
+# Units moved per product and kind (order, cancel, refund, set) between two dates
+@router.get('/movements', dependencies=[Depends(verify_pm_role)])
+def get_movement_summary(
+    date_from: datetime = Query(..., description="Movements at or after this date (UTC)"),
+    date_to: datetime = Query(..., description="Movements before this date (UTC)"),
+    product_id: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+    token: str = Depends(oauth2_scheme),
+):
+    if date_to <= date_from:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_to must be after date_from")
+    return movement_summary(db, date_from, date_to, product_id)
+
+
+# Takes a snapshot of the stock now instead of waiting for the scheduled one
+@router.post('/snapshots', dependencies=[Depends(verify_pm_role)])
+def create_snapshot(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    return take_snapshot(db)
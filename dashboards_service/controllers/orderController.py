@@ -1,20 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from schemas.orderSchemas import OrderResponseSchema, ProductResponseSchema, OrderUpdateSchema
-from dbContext import get_db
+from dbContext import get_db, SessionLocal
 from dependencies import verify_pm_role, oauth2_scheme
-from services.orderService import OrderService
+from services.orderService import OrderService, OrderBoardFilter, BOARD_SORT_KEYS
+from services.paginationServices import decode_cursor, MAX_PAGE_SIZE
 
 
 router = APIRouter(prefix='/orders')
 
 
+def stream_order_board(board_filter: OrderBoardFilter, cursor: Optional[str], limit: Optional[int]):
+    # one JSON order per line; the stream reads the orders chunk by chunk with its own session because the request
+    # session is closed once the response starts. With a limit, a last {"next_cursor": ...} line is written when
+    # more orders follow.
+    db = SessionLocal()
+    try:
+        if limit is None:
+            for order in OrderService.iter_order_board(db, board_filter, cursor):
+                yield order.model_dump_json() + "\n"
+        else:
+            orders, next_cursor = OrderService.get_order_board(db, board_filter, cursor, limit)
+            for order in orders:
+                yield order.model_dump_json() + "\n"
+            if next_cursor:
+                yield '{"next_cursor": "' + next_cursor + '"}\n'
+    finally:
+        db.close()
+
+
+# Admin order board, newest first. Every matching order when limit is omitted; with a limit, the cursor of the next
+# page is in the X-Next-Cursor header. format=ndjson streams the orders one per line (application/x-ndjson).
 @router.get('/', response_model=List[OrderResponseSchema], dependencies=[Depends(verify_pm_role)])
-def get_orders(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    return OrderService.get_orders(db)
+def get_orders(
+    response: Response,
+    order_status: Optional[List[int]] = Query(None, alias="status", description="Order status, can be repeated"),
+    date_from: Optional[datetime] = Query(None, description="Orders placed at or after this date"),
+    date_to: Optional[datetime] = Query(None, description="Orders placed before this date"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header (or next_cursor line) of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size, every order when omitted"),
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+):
+    board_filter = OrderBoardFilter(statuses=order_status, date_from=date_from, date_to=date_to)
+    try:
+        # an invalid cursor is rejected before a stream starts
+        if cursor:
+            decode_cursor(cursor, BOARD_SORT_KEYS)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if response_format == "ndjson":
+        return StreamingResponse(stream_order_board(board_filter, cursor, limit), media_type="application/x-ndjson")
+
+    if limit is None:
+        return list(OrderService.iter_order_board(db, board_filter, cursor))
+    orders, next_cursor = OrderService.get_order_board(db, board_filter, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return orders
 
 
 @router.put('/', dependencies=[Depends(verify_pm_role)])
 def update_order(updates : OrderUpdateSchema, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    return OrderService.update_order(db, updates)
\ No newline at end of file
+    return OrderService.update_order(db, updates)
@@ -41,7 +41,7 @@ class ProductResponse(ProductCreate):
     product_id: str
 
 @router.post("/", response_model=ProductResponse, dependencies=[Depends(verify_pm_role)])
-async def create_product(productCreate: ProductCreate, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def create_product(productCreate: ProductCreate, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     db_product = products.create_product(db, productCreate)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -56,7 +56,7 @@ def read_products(skip: int = 0, limit: int = 10, db: Session = Depends(get_db),
     return productsList
 
 @router.get("/{product_id}", response_model=ProductResponse, dependencies=[Depends(verify_pm_role)])
-async def read_product(product_id: str = Path(..., regex=r"^[a-fA-F0-9-]{36}$"), db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def read_product(product_id: str = Path(..., regex=r"^[a-fA-F0-9-]{36}$"), db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     product = products.get_product_by_id(db, product_id)
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
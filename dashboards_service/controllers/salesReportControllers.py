@@ -0,0 +1,61 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Optional
+from dbContext import get_db, get_read_db
+from dependencies import verify_sm_role, oauth2_scheme
+from services.salesReportServices import sales_report, sales_totals, rebuild_sales_facts
+
+
+router = APIRouter(prefix='/sales')
+
+
+def _check_range(date_from: date, date_to: date) -> None:
+    if date_to < date_from:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_to must not be before date_from")
+
+
+# Revenue, cost, refunds, profit and loss per day, month or year (per category or product with group_by)
+@router.get('/report', dependencies=[Depends(verify_sm_role)])
+def get_sales_report(
+    date_from: date = Query(..., description="First day of the report"),
+    date_to: date = Query(..., description="Last day of the report (included)"),
+    granularity: str = Query("day", description="day, month or year"),
+    group_by: Optional[str] = Query(None, description="category or product"),
+    category_id: Optional[int] = Query(None),
+    product_id: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+    token: str = Depends(oauth2_scheme),
+):
+    _check_range(date_from, date_to)
+    try:
+        return sales_report(db, date_from, date_to, granularity, group_by, category_id, product_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+# The same figures summed over the whole range
+@router.get('/totals', dependencies=[Depends(verify_sm_role)])
+def get_sales_totals(
+    date_from: date = Query(..., description="First day of the range"),
+    date_to: date = Query(..., description="Last day of the range (included)"),
+    category_id: Optional[int] = Query(None),
+    product_id: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+    token: str = Depends(oauth2_scheme),
+):
+    _check_range(date_from, date_to)
+    return sales_totals(db, date_from, date_to, category_id, product_id)
+
+
+# Recomputes the daily sales of a range (every day when omitted) from the orders and the refunds
+@router.post('/rebuild', dependencies=[Depends(verify_sm_role)])
+def rebuild_sales(
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+):
+    if date_from is not None and date_to is not None:
+        _check_range(date_from, date_to)
+    return rebuild_sales_facts(db, date_from, date_to)
@@ -1,76 +1,53 @@
-from fastapi import Depends, HTTPException, status
+import os
+import sys
+from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from settings import settings
 from dbContext import get_db
 from models.models import ProductManager, SalesManager
 
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.principal_cache import Principal, PrincipalCache, resolve_principal
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")  # Path to your auth service token endpoint
 
-def verify_pm_role(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        # Decode JWT token using your JWT secret and algorithm
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        
-        # Extract user role from token
-        role: str = payload.get("role")
-        if role != "product_manager":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access forbidden: Product manager role required"
-            )
+# verified tokens of this process (token hash -> principal, until the token expires)
+principal_cache = PrincipalCache(max_entries=settings.principal_cache_max_entries, ttl=settings.principal_cache_ttl)
+
 
-        email : str = payload.get("sub")
-        user = db.query(ProductManager).filter(ProductManager.email == email).first()
+def load_product_manager(db: Session, email: str):
+    user = db.query(ProductManager).filter(ProductManager.email == email).first()
+    if user is None:
+        return None
+    return Principal(user_id=user.pm_id, email=user.email, role="product_manager", name=user.name, surname=user.surname)
 
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access forbidden: Product manager role required"
-            )
-        
-        # Optionally, you can add additional checks here (e.g., user status or permissions)
-        
-    except JWTError:
-        raise credentials_exception
 
-    
-def verify_sm_role(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+def load_sales_manager(db: Session, email: str):
+    user = db.query(SalesManager).filter(SalesManager.email == email).first()
+    if user is None:
+        return None
+    return Principal(user_id=user.sm_id, email=user.email, role="sales_manager", name=user.name, surname=user.surname)
+
+
+# verifies that the token belongs to a product manager and returns them
+def verify_pm_role(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    return resolve_principal(
+        token, db, principal_cache, settings.jwt_secret, settings.jwt_algorithm,
+        role="product_manager",
+        load_user=load_product_manager,
+        forbidden="Access forbidden: Product manager role required",
+        missing_user="Access forbidden: Product manager role required",
     )
-    try:
-        print("Verifying sm role")
-        # Decode JWT token using your JWT secret and algorithm
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        print(token)
-        
-        # Extract user role from token
-        role: str = payload.get("role")
-        if role != "sales_manager":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access forbidden: Sales manager role required"
-            )
 
-        email : str = payload.get("sub")
-        user = db.query(SalesManager).filter(SalesManager.email == email).first()
 
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access forbidden: Sales manager role required"
-            )
-        
-        # Optionally, you can add additional checks here (e.g., user status or permissions)
-        
-    except JWTError:
-        raise credentials_exception
\ No newline at end of file
+# verifies that the token belongs to a sales manager and returns them
+def verify_sm_role(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    return resolve_principal(
+        token, db, principal_cache, settings.jwt_secret, settings.jwt_algorithm,
+        role="sales_manager",
+        load_user=load_sales_manager,
+        forbidden="Access forbidden: Sales manager role required",
+        missing_user="Access forbidden: Sales manager role required",
+    )
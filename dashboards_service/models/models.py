@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, String, Integer, CHAR, ForeignKey, DECIMAL, Text, DateTime, Boolean
+    Column, String, Integer, CHAR, ForeignKey, DECIMAL, Text, DateTime, Date, Boolean, Float, Index, BigInteger
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
@@ -100,6 +100,7 @@ class OrderItem(Base):
     order_id = Column(CHAR(36), ForeignKey('orders.order_id'))
     price_at_purchase = Column(DECIMAL(10, 2), nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
+    unit_cost = Column(DECIMAL(10, 2), nullable=True)  # products.cost when ordered, NULL for the older lines
 
 # Address Table
 class Address(Base):
@@ -133,6 +134,7 @@ class Refund(Base):
     request_date = Column(DateTime, nullable=False, default=datetime.utcnow)
     status = Column(String(50), nullable=False)
     refund_amount = Column(DECIMAL(10, 2), nullable=False)
+    approved_at = Column(DateTime, nullable=True)  # set when the refund is approved
     
 
 # Delivery Table
@@ -163,6 +165,27 @@ class Review(Base):
     comment = Column(Text)
     approval_status = Column(String(50), nullable=False)
 
+# Product Rating Summary Table (running totals of the approved reviews of a product)
+class ProductRatingSummary(Base):
+    __tablename__ = 'product_rating_summary'
+    product_id = Column(CHAR(36), ForeignKey('products.product_id', ondelete='CASCADE'), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_1 = Column(Integer, nullable=False, default=0)
+    rating_2 = Column(Integer, nullable=False, default=0)
+    rating_3 = Column(Integer, nullable=False, default=0)
+    rating_4 = Column(Integer, nullable=False, default=0)
+    rating_5 = Column(Integer, nullable=False, default=0)
+    average_rating = Column(Float, nullable=False, default=0, index=True)
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+# Cache Version Table (a counter per cached data set, bumped when the data changes so that the caches of other services reload it)
+class CacheVersion(Base):
+    __tablename__ = 'cache_version'
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 # Shopping Cart Table
 class ShoppingCart(Base):
     __tablename__ = 'shoppingcart'
@@ -176,4 +199,91 @@ class ShoppingCartItem(Base):
     shopping_cart_item_id = Column(CHAR(36), primary_key=True, default=generate_uuid)
     cart_id = Column(CHAR(36), ForeignKey('shoppingcart.cart_id'))
     product_id = Column(CHAR(36), ForeignKey('products.product_id'))
-    quantity = Column(Integer, nullable=False, default=1)
\ No newline at end of file
+    quantity = Column(Integer, nullable=False, default=1)
+
+# Notification Job Table (a wishlist discount notification fan-out and its progress, see services/notificationFanoutServices.py)
+class NotificationJob(Base):
+    __tablename__ = 'notification_job'
+    __table_args__ = (Index('ix_notification_job_status', 'status', 'created_at'),)
+
+    job_id = Column(CHAR(36), primary_key=True, default=generate_uuid)
+    kind = Column(String(50), nullable=False)  # wishlist_discount
+    product_id = Column(CHAR(36), ForeignKey('products.product_id', ondelete='CASCADE'), nullable=False)
+    discount_id = Column(CHAR(36), nullable=True)
+    discount_rate = Column(DECIMAL(5, 2), nullable=True)
+    subject = Column(String(255), nullable=False)
+    template = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, done, failed
+    locked_until = Column(DateTime, nullable=True)  # lease of the process running the job, renewed after each chunk
+    last_customer_id = Column(CHAR(36), nullable=True)  # the last customer handled, the job resumes after it
+    total_recipients = Column(Integer, nullable=True)
+    processed = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+# Inventory Movement Table (append-only ledger of the stock changes, written in the transaction of each change)
+class InventoryMovement(Base):
+    __tablename__ = 'inventory_movement'
+    __table_args__ = (Index('ix_inventory_movement_product_created', 'product_id', 'created_at'),)
+
+    # an increasing key keeps the appends at the end of the table (SQLite only autoincrements an INTEGER key)
+    movement_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    product_id = Column(CHAR(36), nullable=False)  # no foreign key: the history outlives deleted products
+    delta = Column(Integer, nullable=False)  # signed change of products.quantity
+    kind = Column(String(20), nullable=False)  # order, cancel, refund, set
+    reference_id = Column(CHAR(36), nullable=True)  # order_id, refund_id... of the change
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+# Inventory Snapshot Table (the stock of every product at snapshot_at, see services/inventorySnapshotServices.py)
+class InventorySnapshot(Base):
+    __tablename__ = 'inventory_snapshot'
+
+    snapshot_at = Column(DateTime, primary_key=True)
+    product_id = Column(CHAR(36), primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    drift = Column(Integer, nullable=False, default=0)  # stock changed outside of the ledger since the previous snapshot
+
+
+# Daily Sales Fact Table (sales and refunds per product and day, kept up to date in the transactions of the order and
+# refund writes; the revenue, profit and loss reports read it instead of the orders)
+class SalesDailyFact(Base):
+    __tablename__ = 'sales_daily_fact'
+    __table_args__ = (
+        Index('ix_sales_daily_fact_category_day', 'category_id', 'day'),
+        Index('ix_sales_daily_fact_product_day', 'product_id', 'day'),
+    )
+
+    day = Column(Date, primary_key=True)  # day of the order (UTC), day of the approval for the refunds
+    product_id = Column(CHAR(36), primary_key=True)  # no foreign key: the history outlives deleted products
+    category_id = Column(Integer, nullable=True)  # category of the product at the last write
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)  # quantity * price_at_purchase
+    cost = Column(DECIMAL(14, 2), nullable=False, default=0)  # quantity * order_items.unit_cost
+    refunded_units = Column(Integer, nullable=False, default=0)
+    refunds = Column(DECIMAL(14, 2), nullable=False, default=0)  # refund_amount of the approved refunds
+    refunded_cost = Column(DECIMAL(14, 2), nullable=False, default=0)  # cost of the refunded units, back in stock
+
+
+# Monthly Sales Fact Table (sales_daily_fact summed per product and month, written with it: the month and year
+# reports over long ranges read one row per product and month)
+class SalesMonthlyFact(Base):
+    __tablename__ = 'sales_monthly_fact'
+    __table_args__ = (
+        Index('ix_sales_monthly_fact_category_month', 'category_id', 'month'),
+        Index('ix_sales_monthly_fact_product_month', 'product_id', 'month'),
+    )
+
+    month = Column(Date, primary_key=True)  # first day of the month
+    product_id = Column(CHAR(36), primary_key=True)
+    category_id = Column(Integer, nullable=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+    cost = Column(DECIMAL(14, 2), nullable=False, default=0)
+    refunded_units = Column(Integer, nullable=False, default=0)
+    refunds = Column(DECIMAL(14, 2), nullable=False, default=0)
+    refunded_cost = Column(DECIMAL(14, 2), nullable=False, default=0)
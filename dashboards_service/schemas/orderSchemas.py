@@ -6,14 +6,14 @@ class ProductResponseSchema(BaseModel):
     product_name: str
     quantity: int
     price_at_purchase: float
-    image_url: str
+    image_url: Optional[str] = None
 
 class OrderResponseSchema(BaseModel):
-    id: str
+    id: Optional[str] = None            # delivery_id, None for an order without delivery
     order_id: str
-    customer_id: str
+    customer_id: Optional[str] = None
     price: float
-    address: str
+    address: Optional[str] = None
     status: int
     products : List[ProductResponseSchema]
 
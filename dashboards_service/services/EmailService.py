@@ -1,11 +1,25 @@
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
+import logging
 import os
+from typing import List
+from settings import settings
+from services.mailTransportServices import get_mail_transport
+
+logger = logging.getLogger(__name__)
 
 class EmailService:
+    @staticmethod
+    def _build_message(customer_email: str, subject: str, message: str) -> MIMEMultipart:
+        msg = MIMEMultipart()
+        msg["From"] = settings.smtp_sender
+        msg["To"] = customer_email
+        msg["Subject"] = subject
+        msg.attach(MIMEText(message, "plain"))
+        return msg
+
     @staticmethod
     def send_discount_email(customer_email: str,subjectt: str, message: str):
         """
@@ -18,31 +32,34 @@ class EmailService:
         Output:
         - None (raises exception on failure).
         """
-        sender_email = "bugrayapilmisev@gmail.com"  # Replace with your email
-        sender_password = "olee olco ingu upeb"  # Replace with your app-specific password
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-
-        # Create the email
-        subject = subjectt
-        body = message
-
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = customer_email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
-
-        
+        # Create the email (the SMTP server is configured in settings.py or the .env file)
+        msg = EmailService._build_message(customer_email, subjectt, message)
 
-        # Send the email
+        # Send the email on a pooled SMTP connection (see services/mailTransportServices.py)
         try:
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, customer_email, msg.as_string())
-            server.quit()
+            get_mail_transport().send(msg, settings.smtp_sender, [customer_email])
             print(f"Email sent successfully to {customer_email}")
         except Exception as e:
             print(f"Failed to send email: {e}")
             raise
+
+    @staticmethod
+    def send_discount_emails(customer_emails: List[str], subject: str, message: str) -> List[str]:
+        """
+        Send the same notification to many customers over the pooled SMTP connections
+        (one handshake per pool connection instead of one per recipient).
+
+        Input:
+        - customer_emails: Email addresses of the recipients.
+        - subject, message: subject and text of the email.
+
+        Output:
+        - The addresses the email could not be sent to.
+        """
+        errors = get_mail_transport().send_many(
+            (EmailService._build_message(customer_email, subject, message), settings.smtp_sender, [customer_email])
+            for customer_email in customer_emails
+        )
+        failed = [customer_email for customer_email, error in zip(customer_emails, errors) if error is not None]
+        logger.info("Emails sent: %d, failed: %d", len(customer_emails) - len(failed), len(failed))
+        return failed
@@ -0,0 +1,59 @@
+import logging
+from datetime import datetime
+from typing import Iterable
+from sqlalchemy import update, insert
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from sqlalchemy.orm import Session
+from models.models import CacheVersion
+
+logger = logging.getLogger(__name__)
+
+# cache_version names read by the caches of ProductListing and shoppingCart_service
+CATEGORY_TREE = "category_tree"
+
+
+def product_cache_key(product_id: str) -> str:
+    # version of the cached details (price, stock, discount, rating) of one product
+    return f"product:{product_id}"
+
+
+def bump_cache_versions(db: Session, names: Iterable[str]):
+    '''
+        Increments the versions of the given cached data sets in the caller's transaction, so the change and the bump
+        are committed together. The caches reading the data compare the version and reload it when it changed.
+        The rows are locked in sorted order so that concurrent writers cannot deadlock on them.
+
+        A failure here (e.g. the table was not created yet) is logged and does not fail the write itself:
+        the caches also expire on their own.
+    '''
+    names = sorted(set(names))
+    if not names:
+        return
+    for attempt in range(2):
+        try:
+            with db.begin_nested():
+                now = datetime.utcnow()
+                db.execute(
+                    update(CacheVersion)
+                    .where(CacheVersion.name.in_(names))
+                    .values(version=CacheVersion.version + 1, updated_at=now)
+                )
+                existing = {row.name for row in db.query(CacheVersion.name).filter(CacheVersion.name.in_(names))}
+                missing = [name for name in names if name not in existing]
+                if missing:
+                    db.execute(insert(CacheVersion), [{"name": name, "version": 1, "updated_at": now} for name in missing])
+            return
+        except IntegrityError:
+            # a concurrent bump inserted one of the missing rows: the second attempt updates it
+            continue
+        except DBAPIError as e:
+            logger.warning("Could not bump cache versions %s: %s", names, e)
+            return
+
+
+def bump_cache_version(db: Session, name: str):
+    bump_cache_versions(db, [name])
+
+
+def bump_product_versions(db: Session, product_ids: Iterable[str]):
+    bump_cache_versions(db, [product_cache_key(product_id) for product_id in product_ids if product_id])
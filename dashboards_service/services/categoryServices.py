@@ -1,10 +1,14 @@
 from sqlalchemy.orm import Session
 from models.models import Category
 from schemas.categorySchemas import CategoryCreate
+from services.cacheVersionServices import bump_cache_version, CATEGORY_TREE
 
 def create_category_(db: Session, category: CategoryCreate):
     category = Category(category_name=category.category_name, parentcategory_id=category.parentcategory_id)
     db.add(category)
+    db.flush()
+    # the product listing service caches the category tree
+    bump_cache_version(db, CATEGORY_TREE)
     db.commit()
     db.refresh(category)
     return category
@@ -22,6 +26,7 @@ def update_category_(db: Session, category_id: int, category: CategoryCreate):
         if value is not None:
             setattr(category_, key, value)
     
+    bump_cache_version(db, CATEGORY_TREE)
     db.commit()
     db.refresh(category_)
     return category_
@@ -33,6 +38,7 @@ def delete_category(db: Session, category_id : int):
         return None
     
     db.delete(category_)
+    bump_cache_version(db, CATEGORY_TREE)
     db.commit()
 
     return {"message" : "Category deleted succesfully!"}
\ No newline at end of file
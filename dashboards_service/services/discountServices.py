@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session, joinedload
 from models.models import Discount, Product, Wishlist, WishlistItem, Customer
 from datetime import datetime
 from services.EmailService import EmailService
+from services.cacheVersionServices import bump_product_versions
+from services.notificationFanoutServices import enqueue_wishlist_discount_job, notification_fanout
 
 def send_notification(customer_email: str, product_name: str, discount_rate: float):
     # For simplicity, we'll just log the notification
@@ -17,7 +19,12 @@ def get_discounts(db: Session):
     return db.query(Discount).all()
 
 def create_discount_service(db: Session, discount_data):
-     # Step 1: Apply the discount
+    # Step 1: Find the product and validate it exists
+    product = db.query(Product).filter(Product.product_id == discount_data.product_id).first()
+    if not product:
+        raise ValueError("Product not found")
+
+    # Step 2: Apply the discount
     discount = Discount(
         product_id=discount_data.product_id,
         discount_rate=discount_data.discount_rate,
@@ -26,36 +33,26 @@ def create_discount_service(db: Session, discount_data):
         is_active=True
     )
     db.add(discount)
+    db.flush()
+    bump_product_versions(db, [discount_data.product_id])
+
+    # Step 3: Queue the notification of the customers who have this product in their wishlist, in the same
+    # transaction as the discount; the emails are sent in the background (see services/notificationFanoutServices.py)
+    job = enqueue_wishlist_discount_job(db, product, discount)
     db.commit()
     db.refresh(discount)
+    notification_fanout.submit(job.job_id)
 
-    # Step 2: Find the product and validate it exists
-    product = db.query(Product).filter(Product.product_id == discount_data.product_id).first()
-    if not product:
-        raise ValueError("Product not found")
-
-    # Step 3: Find customers who have this product in their wishlist
-    # Explicitly join WishlistItem, Wishlist, and Customer to get customer information
-    customers = (
-        db.query(Customer.email)
-        .join(Wishlist, Wishlist.customer_id == Customer.user_id)
-        .join(WishlistItem, WishlistItem.wishlist_id == Wishlist.wishlist_id)
-        .filter(WishlistItem.product_id == discount_data.product_id)
-        .all()
-    )
-
-    # Step 4: Send notifications to each customer
-    for customer_email, in customers:
-        send_notification(customer_email, product.name, discount_data.discount_rate)
-
-    return discount
+    return discount, job
     
 
 def update_discount_service(db: Session, discount_id: str, discount_data):
     discount = db.query(Discount).filter_by(discount_id=discount_id).first()
     if discount:
+        previous_product_id = discount.product_id
         for key, value in discount_data.dict().items():
             setattr(discount, key, value)
+        bump_product_versions(db, [previous_product_id, discount.product_id])
         db.commit()
         db.refresh(discount)
     return discount
@@ -64,6 +61,7 @@ def delete_discount_service(db: Session, discount_id: str):
     discount = db.query(Discount).filter_by(discount_id=discount_id).first()
     if discount:
         db.delete(discount)
+        bump_product_versions(db, [discount.product_id])
         db.commit()
     return {"message": "Discount deleted successfully"}
 
@@ -0,0 +1,80 @@
+'''
+    Atomic updates of the product counters: the stock (products.quantity) and the sold count (products.item_sold).
+
+    Reading a product, changing the counter in Python and writing it back loses an update when two requests do it at
+    the same time (both read 10, both write 11). Here a change is a delta applied by the database, and all the products
+    of an order are changed with one statement:
+
+        UPDATE products SET quantity = quantity + CASE product_id WHEN ... END,
+                            item_sold = item_sold + CASE product_id WHEN ... END
+        WHERE product_id IN (...)
+
+    so concurrent changes add up, and restocking an order costs one UPDATE instead of a SELECT and an UPDATE per item.
+    Given a kind, the stock deltas are also appended to the inventory_movement ledger (see inventory_ledger). The caller
+    commits, together with the rest of its transaction.
+
+    Mirrored from Order_service/services/inventory_counters.py.
+'''
+
+from typing import Dict, Iterable, Mapping, Optional
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+from models.models import Product
+from services.inventoryLedgerServices import record_movements
+
+
+def collect_deltas(items: Iterable, sign: int = 1) -> Dict[str, int]:
+    '''The quantities of the items (order items, or dicts with product_id and quantity) summed per product.'''
+    deltas: Dict[str, int] = {}
+    for item in items:
+        product_id = item["product_id"] if isinstance(item, dict) else item.product_id
+        quantity = item["quantity"] if isinstance(item, dict) else item.quantity
+        if product_id is None or not quantity:
+            continue
+        deltas[product_id] = deltas.get(product_id, 0) + sign * quantity
+    return deltas
+
+
+def apply_counter_deltas(db: Session, stock: Optional[Mapping[str, int]] = None,
+                         sold: Optional[Mapping[str, int]] = None, kind: Optional[str] = None,
+                         reference_id: Optional[str] = None) -> int:
+    '''
+        Adds stock[product_id] to the quantity and sold[product_id] to the item_sold of the products, in one UPDATE,
+        and records the stock deltas in the ledger under kind (when given) and reference_id.
+        Returns the number of products found; the caller commits.
+    '''
+    stock = dict(stock or {})
+    sold = dict(sold or {})
+    product_ids = sorted(set(stock) | set(sold))
+    if not product_ids:
+        return 0
+
+    values = {}
+    if stock:
+        values[Product.quantity] = Product.quantity + case(stock, value=Product.product_id, else_=0)
+    if sold:
+        values[Product.item_sold] = Product.item_sold + case(sold, value=Product.product_id, else_=0)
+    result = db.execute(
+        update(Product)
+        .where(Product.product_id.in_(product_ids))
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+
+    if kind and stock:
+        if result.rowcount < len(product_ids):
+            # no movement for the products that do not exist
+            found = {product_id for (product_id,) in db.query(Product.product_id).filter(Product.product_id.in_(product_ids))}
+            stock = {product_id: delta for product_id, delta in stock.items() if product_id in found}
+        record_movements(db, stock, kind, reference_id)
+
+    # Product objects already loaded in the session still hold the old counters
+    for instance in list(db.identity_map.values()):
+        if isinstance(instance, Product) and instance.product_id in product_ids:
+            db.expire(instance, ["quantity", "item_sold"])
+    return result.rowcount
+
+
+def restock_items(db: Session, items: Iterable, kind: str, reference_id: Optional[str] = None) -> int:
+    '''Puts the quantities of the items (e.g. the items of a cancelled order) back in stock, as movements of the kind.'''
+    return apply_counter_deltas(db, stock=collect_deltas(items), kind=kind, reference_id=reference_id)
@@ -0,0 +1,230 @@
+'''
+    Point-in-time stock and movement analytics, read from the inventory_movement ledger
+    (services/inventoryLedgerServices.py) and from inventory_snapshot, the ledger compacted into the stock of every
+    product at regular times.
+
+    A snapshot at time T holds, per product, products.quantity minus the movements recorded since T, read in one
+    statement. It is taken SNAPSHOT_LAG behind the clock, so that the transactions whose movements are dated before T
+    have committed. Its drift column compares it with the previous snapshot plus the movements in between: a non-zero
+    drift means the stock was changed without a movement (a product created with stock, or a write that bypasses the
+    ledger), and the snapshot resets the projection to the real stock.
+
+    The stock at any time T is then the last snapshot before T plus the movements between the two, an indexed range of
+    at most SNAPSHOT_INTERVAL of ledger rows instead of a scan of the orders. Before the first snapshot it is the
+    current stock minus the movements since T.
+
+    The scheduler takes a snapshot every SNAPSHOT_INTERVAL seconds and compacts the tables: the movements and the
+    snapshots older than LEDGER_RETENTION_DAYS are deleted, except the last snapshot before the cutoff, from which
+    the stock of the retained period is still projected.
+'''
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, insert, select, true
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models.models import InventoryMovement, InventorySnapshot, Product
+
+logger = logging.getLogger(__name__)
+
+# seconds between two snapshots
+SNAPSHOT_INTERVAL = 24 * 3600
+# age of the movements a snapshot includes, longer than any transaction that records movements
+SNAPSHOT_LAG = timedelta(minutes=5)
+# how long the movements and the snapshots are kept
+LEDGER_RETENTION_DAYS = 365
+# seconds between two checks of the scheduler
+SNAPSHOT_CHECK_INTERVAL = 600
+
+INSERT_CHUNK = 1000
+
+
+def _movement_totals(*criteria):
+    # sum of the deltas per product of the movements matching the criteria
+    return (
+        select(InventoryMovement.product_id, func.sum(InventoryMovement.delta).label("delta"))
+        .where(*criteria)
+        .group_by(InventoryMovement.product_id)
+        .subquery()
+    )
+
+
+def last_snapshot_at(db: Session, before: Optional[datetime] = None) -> Optional[datetime]:
+    query = db.query(func.max(InventorySnapshot.snapshot_at))
+    if before is not None:
+        query = query.filter(InventorySnapshot.snapshot_at <= before)
+    return query.scalar()
+
+
+def take_snapshot(db: Session, at: Optional[datetime] = None) -> dict:
+    '''Writes the stock of every product at the given time (SNAPSHOT_LAG ago by default) and commits.'''
+    started = time.perf_counter()
+    at = (at or datetime.utcnow() - SNAPSHOT_LAG).replace(microsecond=0)
+    previous_at = last_snapshot_at(db, at - timedelta(seconds=1))
+
+    since = _movement_totals(InventoryMovement.created_at >= at)
+    stock = Product.quantity - func.coalesce(since.c.delta, 0)
+    columns = [Product.product_id, stock.label("quantity")]
+    stmt = select(*columns).outerjoin(since, since.c.product_id == Product.product_id)
+    if previous_at is not None:
+        # the projection of the previous snapshot, to measure the drift
+        window = _movement_totals(InventoryMovement.created_at >= previous_at, InventoryMovement.created_at < at)
+        previous = (
+            select(InventorySnapshot.product_id, InventorySnapshot.quantity)
+            .where(InventorySnapshot.snapshot_at == previous_at)
+            .subquery()
+        )
+        projected = func.coalesce(previous.c.quantity, 0) + func.coalesce(window.c.delta, 0)
+        stmt = (
+            stmt.add_columns(projected.label("projected"))
+            .outerjoin(window, window.c.product_id == Product.product_id)
+            .outerjoin(previous, previous.c.product_id == Product.product_id)
+        )
+
+    rows = []
+    for row in db.execute(stmt):
+        drift = row.quantity - row.projected if previous_at is not None else 0
+        rows.append({"snapshot_at": at, "product_id": row.product_id, "quantity": row.quantity, "drift": drift})
+    # a snapshot taken again at the same time replaces the previous one
+    db.execute(delete(InventorySnapshot).where(InventorySnapshot.snapshot_at == at))
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.execute(insert(InventorySnapshot), rows[start:start + INSERT_CHUNK])
+    db.commit()
+
+    drifted = sum(1 for row in rows if row["drift"])
+    result = {
+        "snapshot_at": at,
+        "products": len(rows),
+        "drifted_products": drifted,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+    if drifted:
+        logger.warning("inventory snapshot %s: %d products changed outside of the ledger", at, drifted)
+    logger.info("inventory snapshot %s: %d products in %.1f ms", at, len(rows), result["duration_ms"])
+    return result
+
+
+def _of_products(column, product_ids: Optional[List[str]]):
+    return column.in_(product_ids) if product_ids is not None else true()
+
+
+def _stock_back_from_current(db: Session, at: datetime, *criteria) -> Dict[str, int]:
+    # the current stock minus the movements since the given time
+    since = _movement_totals(InventoryMovement.created_at >= at)
+    rows = db.execute(
+        select(Product.product_id, Product.quantity - func.coalesce(since.c.delta, 0))
+        .outerjoin(since, since.c.product_id == Product.product_id)
+        .where(*criteria)
+    )
+    return {product_id: quantity for product_id, quantity in rows}
+
+
+def stock_at(db: Session, at: datetime, product_ids: Optional[List[str]] = None) -> Dict[str, int]:
+    '''The stock of the products (every product when product_ids is None) at the given time.'''
+    base_at = last_snapshot_at(db, at)
+    if base_at is None:
+        return _stock_back_from_current(db, at, _of_products(Product.product_id, product_ids))
+
+    window = _movement_totals(InventoryMovement.created_at >= base_at, InventoryMovement.created_at < at,
+                              _of_products(InventoryMovement.product_id, product_ids))
+    rows = db.execute(
+        select(InventorySnapshot.product_id, InventorySnapshot.quantity + func.coalesce(window.c.delta, 0))
+        .outerjoin(window, window.c.product_id == InventorySnapshot.product_id)
+        .where(InventorySnapshot.snapshot_at == base_at, _of_products(InventorySnapshot.product_id, product_ids))
+    )
+    stock = {product_id: quantity for product_id, quantity in rows}
+    # products created after the snapshot
+    in_snapshot = select(InventorySnapshot.product_id).where(InventorySnapshot.snapshot_at == base_at)
+    stock.update(_stock_back_from_current(db, at, _of_products(Product.product_id, product_ids),
+                                          Product.product_id.not_in(in_snapshot)))
+    return stock
+
+
+def movement_summary(db: Session, start: datetime, end: datetime, product_id: Optional[str] = None) -> List[dict]:
+    '''Units and number of movements per product and kind between start (included) and end (excluded).'''
+    query = (
+        db.query(
+            InventoryMovement.product_id,
+            InventoryMovement.kind,
+            func.sum(InventoryMovement.delta).label("units"),
+            func.count(InventoryMovement.movement_id).label("movements"),
+        )
+        .filter(InventoryMovement.created_at >= start, InventoryMovement.created_at < end)
+        .group_by(InventoryMovement.product_id, InventoryMovement.kind)
+        .order_by(InventoryMovement.product_id, InventoryMovement.kind)
+    )
+    if product_id is not None:
+        query = query.filter(InventoryMovement.product_id == product_id)
+    return [
+        {"product_id": row.product_id, "kind": row.kind, "units": int(row.units), "movements": row.movements}
+        for row in query
+    ]
+
+
+def compact_inventory(db: Session, retention_days: int = LEDGER_RETENTION_DAYS) -> dict:
+    '''
+        Deletes the movements and the snapshots older than the retention, keeping the last snapshot before the cutoff
+        (the projections of the retained period start from it). Nothing is deleted before the first snapshot.
+    '''
+    keep_from = last_snapshot_at(db, datetime.utcnow() - timedelta(days=retention_days))
+    if keep_from is None:
+        return {"movements": 0, "snapshots": 0}
+    movements = db.execute(delete(InventoryMovement).where(InventoryMovement.created_at < keep_from)).rowcount
+    snapshots = db.execute(delete(InventorySnapshot).where(InventorySnapshot.snapshot_at < keep_from)).rowcount
+    db.commit()
+    return {"movements": movements, "snapshots": snapshots}
+
+
+class InventorySnapshotScheduler:
+    '''Takes a snapshot (and compacts the tables) when the last one is older than SNAPSHOT_INTERVAL.'''
+
+    def __init__(self, interval: float = SNAPSHOT_INTERVAL, check_interval: float = SNAPSHOT_CHECK_INTERVAL):
+        self.interval = interval
+        self.check_interval = check_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_due(self, db: Session) -> Optional[dict]:
+        last = last_snapshot_at(db)
+        if last is not None and datetime.utcnow() - SNAPSHOT_LAG - last < timedelta(seconds=self.interval):
+            return None
+        result = take_snapshot(db)
+        compact_inventory(db)
+        return result
+
+    def start(self, session_factory) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(session_factory,), name="inventory-snapshot",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self, session_factory) -> None:
+        while not self._stop.is_set():
+            db = session_factory()
+            try:
+                self.run_due(db)
+            except Exception:
+                db.rollback()
+                logger.exception("inventory snapshot failed")
+            finally:
+                db.close()
+            self._stop.wait(self.check_interval)
+
+
+inventory_snapshot_scheduler = InventorySnapshotScheduler()
+
+
+def ensure_inventory_tables(engine: Engine) -> None:
+    InventoryMovement.__table__.create(bind=engine, checkfirst=True)
+    InventorySnapshot.__table__.create(bind=engine, checkfirst=True)
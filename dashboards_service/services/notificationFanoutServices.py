@@ -0,0 +1,326 @@
+'''
+    Fan-out of the "a product in your wishlist is discounted" emails, outside of the HTTP request.
+
+    create_discount_service writes a notification_job row in the transaction of the discount and hands its id to
+    notification_fanout; the endpoint answers at once with the job id and its counters. The job then:
+        - counts the recipients once (COUNT(DISTINCT customer) over customers - wishlist - wishlist_items),
+        - streams them in chunks of notification_chunk_size, ordered by user_id and resumed after the last handled
+          customer (keyset on user_id, DISTINCT so a customer with the product in several wishlists gets one email),
+        - renders the template of the job for each customer ({name}, {surname}, {product_name}, {discount_rate}),
+        - sends the chunk on the pooled SMTP connections (services/mailTransportServices.py), at most
+          notification_rate_per_second emails per second over all the jobs of the process,
+        - saves last_customer_id and the processed / sent / failed counters after each chunk.
+    A runner claims its job with SELECT ... FOR UPDATE SKIP LOCKED, as the order outbox does, and holds it with a lease
+    (locked_until, notification_lease_seconds) renewed before each chunk, so several dashboards processes can share
+    the table. A job stopped by a shutdown is put back to "queued" after its current chunk; a job whose process died
+    keeps its "running" status until its lease expires. resume_unfinished() at startup submits the queued jobs and the
+    running ones whose lease expired, never a job another live process is sending, and each continues after its last
+    saved chunk (a customer is emailed at most twice: when the process died between the send and the save of a chunk).
+'''
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import and_, distinct, func, or_
+from sqlalchemy.orm import Session
+from models.models import Customer, Wishlist, WishlistItem, Product, NotificationJob
+from services.EmailService import EmailService
+from services.mailTransportServices import get_mail_transport
+from dbContext import SessionLocal
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+KIND_WISHLIST_DISCOUNT = "wishlist_discount"
+
+DEFAULT_SUBJECT = "There is a DISCOUNTED Product in your wishlist!!"
+DEFAULT_TEMPLATE = "Dear {name}, the product '{product_name}' in your wishlist is now discounted by {discount_rate}%!"
+
+
+class _TemplateFields(dict):
+    # unknown placeholders are left in the text instead of failing the whole job
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def render_template(template: str, **fields) -> str:
+    return template.format_map(_TemplateFields(fields))
+
+
+class RateLimiter:
+    '''
+        Token bucket: acquire() waits until one more email may be sent.
+        rate_per_second <= 0 disables the limit.
+    '''
+    def __init__(self, rate_per_second: float, burst: Optional[float] = None):
+        self.rate = rate_per_second
+        self.capacity = burst if burst is not None else max(1.0, rate_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _recipients_query(db: Session, product_id: str):
+    return (
+        db.query(Customer.user_id, Customer.name, Customer.surname, Customer.email)
+        .join(Wishlist, Wishlist.customer_id == Customer.user_id)
+        .join(WishlistItem, WishlistItem.wishlist_id == Wishlist.wishlist_id)
+        .filter(WishlistItem.product_id == product_id)
+    )
+
+
+def count_recipients(db: Session, product_id: str) -> int:
+    return (
+        db.query(func.count(distinct(Customer.user_id)))
+        .select_from(Customer)
+        .join(Wishlist, Wishlist.customer_id == Customer.user_id)
+        .join(WishlistItem, WishlistItem.wishlist_id == Wishlist.wishlist_id)
+        .filter(WishlistItem.product_id == product_id)
+        .scalar()
+    )
+
+
+def next_recipients(db: Session, product_id: str, after: Optional[str], limit: int):
+    # the next chunk of distinct customers after the customer "after" (None: from the start)
+    query = _recipients_query(db, product_id)
+    if after is not None:
+        query = query.filter(Customer.user_id > after)
+    return query.distinct().order_by(Customer.user_id).limit(limit).all()
+
+
+def enqueue_wishlist_discount_job(db: Session, product: Product, discount, subject: str = DEFAULT_SUBJECT,
+                                  template: str = DEFAULT_TEMPLATE) -> NotificationJob:
+    # added to the caller's transaction, the caller commits and then submits the job
+    job = NotificationJob(
+        kind=KIND_WISHLIST_DISCOUNT,
+        product_id=product.product_id,
+        discount_id=discount.discount_id,
+        discount_rate=discount.discount_rate,
+        subject=subject,
+        template=template,
+        status="queued",
+        processed=0,
+        sent=0,
+        failed=0,
+        created_at=datetime.utcnow(),
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def job_progress(job: NotificationJob) -> dict:
+    total = job.total_recipients
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "product_id": job.product_id,
+        "discount_id": job.discount_id,
+        "status": job.status,
+        "total_recipients": total,
+        "processed": job.processed,
+        "sent": job.sent,
+        "failed": job.failed,
+        "remaining": max(0, total - job.processed) if total is not None else None,
+        "percent": round(100.0 * job.processed / total, 1) if total else (100.0 if job.status == "done" else 0.0),
+        "last_error": job.last_error,
+        "created_at": job.created_at.strftime("%Y-%m-%d %H:%M:%S") if job.created_at else None,
+        "started_at": job.started_at.strftime("%Y-%m-%d %H:%M:%S") if job.started_at else None,
+        "finished_at": job.finished_at.strftime("%Y-%m-%d %H:%M:%S") if job.finished_at else None,
+    }
+
+
+def _claimable(now: datetime):
+    # a queued job, or a running one whose process stopped renewing its lease
+    return or_(
+        NotificationJob.status == "queued",
+        and_(NotificationJob.status == "running",
+             or_(NotificationJob.locked_until.is_(None), NotificationJob.locked_until < now)),
+    )
+
+
+def get_notification_job(db: Session, job_id: str) -> Optional[dict]:
+    job = db.query(NotificationJob).filter_by(job_id=job_id).first()
+    return job_progress(job) if job else None
+
+
+class NotificationFanout:
+    def __init__(self, session_factory=SessionLocal, workers: int = settings.notification_job_workers,
+                 chunk_size: int = settings.notification_chunk_size,
+                 rate_per_second: float = settings.notification_rate_per_second, transport=None):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.limiter = RateLimiter(rate_per_second)  # shared by all the jobs of the process
+        self._transport = transport
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def transport(self):
+        return self._transport if self._transport is not None else get_mail_transport()
+
+    def submit(self, job_id: str) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._stop.clear()
+                self._executor = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="notification-job")
+            self._executor.submit(self.run_job, job_id)
+
+    def resume_unfinished(self) -> List[str]:
+        # submits the jobs no live process is running (queued, or running with an expired lease), oldest first;
+        # returns their ids. Each runner claims its job, so a job submitted by two processes runs once.
+        db = self.session_factory()
+        try:
+            job_ids = [
+                job_id for job_id, in
+                db.query(NotificationJob.job_id)
+                .filter(_claimable(datetime.utcnow()))
+                .order_by(NotificationJob.created_at)
+                .all()
+            ]
+        finally:
+            db.close()
+        for job_id in job_ids:
+            self.submit(job_id)
+        return job_ids
+
+    def _lease(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=settings.notification_lease_seconds)
+
+    def claim(self, db: Session, job_id: str) -> Optional[NotificationJob]:
+        # the job, marked running under a new lease, or None when it is finished or another process holds it
+        job = (
+            db.query(NotificationJob)
+            .filter(NotificationJob.job_id == job_id, _claimable(datetime.utcnow()))
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is not None:
+            job.status = "running"
+            job.locked_until = self._lease()
+        db.commit()
+        return job
+
+    def _renew_lease(self, db: Session, job: NotificationJob) -> bool:
+        # extends the lease this runner holds; False when it expired and another process claimed the job
+        renewed = (
+            db.query(NotificationJob)
+            .filter(NotificationJob.job_id == job.job_id, NotificationJob.status == "running",
+                    NotificationJob.locked_until == job.locked_until)
+            .update({"locked_until": self._lease()}, synchronize_session=False)
+        )
+        db.commit()
+        return bool(renewed)
+
+    def stop(self, wait: bool = True) -> None:
+        # running jobs stop after their current chunk and are queued again for the next startup
+        self._stop.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _send_chunk(self, job: NotificationJob, product_name: str, recipients) -> int:
+        # sends one email per recipient, returns how many could not be sent
+        messages = [
+            EmailService._build_message(
+                recipient.email,
+                job.subject,
+                render_template(
+                    job.template,
+                    name=recipient.name,
+                    surname=recipient.surname,
+                    product_name=product_name,
+                    discount_rate=f"{float(job.discount_rate):g}" if job.discount_rate is not None else "",
+                ),
+            )
+            for recipient in recipients
+        ]
+        transport = self.transport
+
+        def send_one(message):
+            self.limiter.acquire()
+            try:
+                transport.send(message, settings.smtp_sender, [message["To"]])
+                return True
+            except Exception as e:
+                logger.warning("Could not send notification to %s: %s", message["To"], e)
+                return False
+
+        with ThreadPoolExecutor(max_workers=transport.pool_size, thread_name_prefix="notification-send") as executor:
+            return sum(1 for ok in executor.map(send_one, messages) if not ok)
+
+    def run_job(self, job_id: str) -> None:
+        db = self.session_factory()
+        try:
+            # only one runner takes the job
+            job = self.claim(db, job_id)
+            if job is None:
+                return
+            try:
+                if job.started_at is None:
+                    job.started_at = datetime.utcnow()
+                product = db.query(Product).filter_by(product_id=job.product_id).first()
+                if product is None:
+                    raise ValueError(f"Product {job.product_id} not found.")
+                if job.total_recipients is None:
+                    job.total_recipients = count_recipients(db, job.product_id)
+                db.commit()
+
+                while not self._stop.is_set():
+                    recipients = next_recipients(db, job.product_id, job.last_customer_id, self.chunk_size)
+                    if not recipients:
+                        job.status = "done"
+                        job.locked_until = None
+                        job.finished_at = datetime.utcnow()
+                        db.commit()
+                        logger.info("Notification job %s done: %s sent, %s failed", job_id, job.sent, job.failed)
+                        return
+                    # the lease covers the sending of the chunk
+                    if not self._renew_lease(db, job):
+                        logger.warning("Notification job %s was taken over by another process", job_id)
+                        return
+                    failed = self._send_chunk(job, product.name, recipients)
+                    job.last_customer_id = recipients[-1].user_id
+                    job.processed += len(recipients)
+                    job.sent += len(recipients) - failed
+                    job.failed += failed
+                    db.commit()
+                # stopped: another process, or the next startup, continues after the last saved chunk
+                job.status = "queued"
+                job.locked_until = None
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                job = db.query(NotificationJob).filter_by(job_id=job_id).first()
+                job.status = "failed"
+                job.locked_until = None
+                job.last_error = f"{type(e).__name__}: {e}"[:2000]
+                job.finished_at = datetime.utcnow()
+                db.commit()
+                logger.warning("Notification job %s failed: %s", job_id, e)
+        finally:
+            db.close()
+
+
+# fan-out of this process, resumed and stopped in app.py
+notification_fanout = NotificationFanout()
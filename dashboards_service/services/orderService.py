@@ -1,8 +1,12 @@
-from typing import List
+from datetime import datetime
+from typing import Iterator, List, Optional
 from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from models.models import Order, OrderItem, Delivery, Address, Customer, Product
 from schemas.orderSchemas import OrderResponseSchema, ProductResponseSchema, OrderUpdateSchema
+from services.paginationServices import encode_cursor, decode_cursor, keyset_predicate
 
 
 status_map = {
@@ -14,51 +18,138 @@ status_map = {
 }
 
 
-class OrderService:
+# orders read per query when the whole board is returned or streamed
+BOARD_CHUNK_SIZE = 500
+
+# newest first; order_id makes the order total
+BOARD_SORT_KEYS = [(Order.order_date, True), (Order.order_id, True)]
+
 
+class OrderBoardFilter(BaseModel):
+    statuses: Optional[List[int]] = None   # order_status values, None for every status
+    date_from: Optional[datetime] = None   # order_date >= date_from
+    date_to: Optional[datetime] = None     # order_date < date_to
 
 
+class OrderService:
+
     @staticmethod
-    def get_orders(db: Session) -> List[OrderResponseSchema]:
-        # I understand you but I need to return a list of OrderResponseSchema for the response model
-        # I will fix this
-
-        orders = db.query(Order).all()
-
-        response = []
-
-        for order in orders:
-            products = []
-            order_items = db.query(OrderItem).filter(OrderItem.order_id == order.order_id).all()
-            for item in order_items:
-                product = db.query(Product).filter(Product.product_id == item.product_id).first()
-                products.append(ProductResponseSchema(
-                    product_id = product.product_id,
-                    product_name = product.name,
-                    quantity = item.quantity,
-                    price_at_purchase = item.price_at_purchase,
-                    image_url = product.image_url
+    def _load_board_page(db: Session, board_filter: OrderBoardFilter, after: Optional[list], limit: int):
+        """
+        One joined query for a page of the board: the page of orders (filtered, sorted and limited in SQL, with the
+        first delivery of each order) joined with the items, their products and the delivery address.
+        The rows are grouped per order in Python. Returns the orders and the sort key values of each of them.
+        """
+        first_delivery = (
+            select(Delivery.delivery_id)
+            .where(Delivery.order_id == Order.order_id)
+            .order_by(Delivery.delivery_id)
+            .limit(1)
+            .correlate(Order)
+            .scalar_subquery()
+        )
+        page = db.query(
+            Order.order_id,
+            Order.order_date,
+            Order.customer_id,
+            Order.total_price,
+            Order.order_status,
+            first_delivery.label("delivery_id"),
+        )
+        if board_filter.statuses:
+            page = page.filter(Order.order_status.in_(board_filter.statuses))
+        if board_filter.date_from is not None:
+            page = page.filter(Order.order_date >= board_filter.date_from)
+        if board_filter.date_to is not None:
+            page = page.filter(Order.order_date < board_filter.date_to)
+        if after is not None:
+            page = page.filter(keyset_predicate(BOARD_SORT_KEYS, after))
+        page = page.order_by(Order.order_date.desc(), Order.order_id.desc()).limit(limit).subquery()
+
+        rows = (
+            db.query(
+                page,
+                OrderItem.order_item_id,
+                OrderItem.product_id,
+                OrderItem.quantity,
+                OrderItem.price_at_purchase,
+                Product.name.label("product_name"),
+                Product.image_url,
+                Address.address,
+            )
+            .select_from(page)
+            .outerjoin(OrderItem, OrderItem.order_id == page.c.order_id)
+            .outerjoin(Product, Product.product_id == OrderItem.product_id)
+            .outerjoin(Delivery, Delivery.delivery_id == page.c.delivery_id)
+            .outerjoin(Address, Address.customer_adres_id == Delivery.addres_id)
+            .order_by(page.c.order_date.desc(), page.c.order_id.desc(), OrderItem.order_item_id)
+            .all()
+        )
+
+        orders = {}
+        keys = []
+        for row in rows:
+            order = orders.get(row.order_id)
+            if order is None:
+                order = orders[row.order_id] = OrderResponseSchema(
+                    id=row.delivery_id,
+                    order_id=row.order_id,
+                    customer_id=row.customer_id,
+                    price=row.total_price,
+                    address=row.address,
+                    status=row.order_status,
+                    products=[],
+                )
+                keys.append([row.order_date, row.order_id])
+            if row.order_item_id is not None:
+                order.products.append(ProductResponseSchema(
+                    product_id=row.product_id,
+                    product_name=row.product_name,
+                    quantity=row.quantity,
+                    price_at_purchase=row.price_at_purchase,
+                    image_url=row.image_url,
                 ))
+        return list(orders.values()), keys
 
-            delivery = db.query(Delivery).filter(Delivery.order_id == order.order_id).first()
-            address = None
-            if delivery:
-                address = db.query(Address).filter(Address.customer_adres_id == delivery.addres_id).first()
-            customer = db.query(Customer).filter(Customer.user_id == order.customer_id).first()
-
-            response.append(OrderResponseSchema(
-                id = delivery.delivery_id,
-                order_id = order.order_id,
-                customer_id = customer.user_id,
-                price = order.total_price,
-                address = address.address,
-                status = order.order_status,
-                products = products
-            ))
-
-        print(response)
-
-        return response
+    @staticmethod
+    def get_order_board(db: Session, board_filter: OrderBoardFilter, cursor: Optional[str] = None,
+                        limit: int = BOARD_CHUNK_SIZE):
+        """
+        One page of the admin order board, newest first.
+
+        Input:
+        - board_filter: status and order date range.
+        - cursor: next_cursor of the previous page, None for the first page (ValueError when invalid).
+        - limit: page size.
+
+        Output:
+        - (orders, next_cursor); next_cursor is None on the last page.
+        """
+        after = decode_cursor(cursor, BOARD_SORT_KEYS) if cursor else None
+        orders, keys = OrderService._load_board_page(db, board_filter, after, limit + 1)
+        if len(orders) <= limit:
+            return orders, None
+        return orders[:limit], encode_cursor(keys[limit - 1])
+
+    @staticmethod
+    def iter_order_board(db: Session, board_filter: OrderBoardFilter, cursor: Optional[str] = None,
+                         chunk_size: Optional[int] = None) -> Iterator[OrderResponseSchema]:
+        """
+        Every order of the board after the cursor, newest first, read chunk_size (BOARD_CHUNK_SIZE) orders per query.
+        """
+        chunk_size = chunk_size or BOARD_CHUNK_SIZE
+        after = decode_cursor(cursor, BOARD_SORT_KEYS) if cursor else None
+        while True:
+            orders, keys = OrderService._load_board_page(db, board_filter, after, chunk_size)
+            yield from orders
+            if len(orders) < chunk_size:
+                return
+            after = keys[-1]
+
+    @staticmethod
+    def get_orders(db: Session, board_filter: Optional[OrderBoardFilter] = None) -> List[OrderResponseSchema]:
+        # the whole board at once, read in chunks
+        return list(OrderService.iter_order_board(db, board_filter or OrderBoardFilter()))
     
     @staticmethod
     def update_order(db: Session, update : OrderUpdateSchema):
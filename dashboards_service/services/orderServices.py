@@ -1,7 +1,13 @@
+import os
+import sys
 from sqlalchemy.orm import Session
 from models.models import Order, OrderItem
 from datetime import datetime
 
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.sales_facts import record_sales, unit_costs
+
 def get_orders(db: Session):
     return db.query(Order).all()
 
@@ -34,7 +40,12 @@ def get_orderItems(db: Session):
 
 def create_orderItem_service(db: Session, orderItem_data):
     orderItem = OrderItem(**orderItem_data.dict())
+    if orderItem.unit_cost is None:
+        orderItem.unit_cost = unit_costs(db, [orderItem.product_id]).get(orderItem.product_id)
     db.add(orderItem)
+    # the line counts in the daily sales of the day of its order
+    order = db.query(Order).filter_by(order_id=orderItem.order_id).first()
+    record_sales(db, [orderItem], order.order_date if order else datetime.utcnow())
     db.commit()
     db.refresh(orderItem)
     return orderItem
@@ -2,6 +2,7 @@ from decimal import Decimal
 from sqlalchemy.orm import Session
 from models.models import Product
 from datetime import datetime
+from services.cacheVersionServices import bump_product_versions
 
 
 def get_products(db: Session):
@@ -19,6 +20,7 @@ def update_product_service(db: Session, product_id: str, product_data):
     if product:
         for key, value in product_data.dict().items():
             setattr(product, key, value)
+        bump_product_versions(db, [product_id])
         db.commit()
         db.refresh(product)
     return product
@@ -27,6 +29,7 @@ def delete_product_service(db: Session, product_id: str):
     product = db.query(Product).filter_by(product_id=product_id).first()
     if product:
         db.delete(product)
+        bump_product_versions(db, [product_id])
         db.commit()
     return {"message": "product deleted successfully"}
 
@@ -35,6 +38,7 @@ def set_product_price(db: Session, product_id: str, new_price: Decimal):
     if not product:
         return None
     product.price = new_price
+    bump_product_versions(db, [product_id])
     db.commit()
     db.refresh(product)
     return product
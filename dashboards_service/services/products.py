@@ -3,6 +3,8 @@ from sqlalchemy.orm import Session
 from models.models import Product
 from datetime import datetime
 #from controllers.productControllers import ProductCreate, ProductUpdate
+from services.cacheVersionServices import bump_product_versions
+from services.inventoryLedgerServices import set_stock
 
 def get_products(db: Session):
     return db.query(Product).all()
@@ -13,6 +15,7 @@ def delete_products(db: Session, product_id: str):
     if not product:
         return None
     db.delete(product)
+    bump_product_versions(db, [product_id])
     db.commit()
     return {"message": "Product deleted successfully"}
 
@@ -33,6 +36,7 @@ def update_product(db: Session, product_id : int, productUpdate)-> Optional[Prod
 
             
 
+    bump_product_versions(db, [product_id])
     db.commit()
     db.refresh(product)
     return product
@@ -46,13 +50,12 @@ def create_product(db: Session, product):
 
 
 def update_product_quantity(db: Session, product_id: str, quantity: int):
-    product = get_product_by_id(db, product_id)
-    if not product:
+    # the new stock and its difference with the previous one, in the inventory ledger
+    if set_stock(db, product_id, quantity) is None:
         return None
-    product.quantity = quantity
+    bump_product_versions(db, [product_id])
     db.commit()
-    db.refresh(product)
-    return product
+    return get_product_by_id(db, product_id)
 
 def get_products_by_category_id(db: Session, category_id: str):
     return db.query(Product).filter(Product.category_id == category_id).all()
\ No newline at end of file
@@ -1,6 +1,15 @@
+import os
+import sys
 from sqlalchemy.orm import Session
 from models.models import Customer, Order, OrderItem, Product, Refund
 from datetime import datetime
+from services.cacheVersionServices import bump_product_versions
+from services.inventoryCounterServices import restock_items
+from services.inventoryLedgerServices import REFUND
+
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.sales_facts import record_refund
 
 from services.EmailService import EmailService
 
@@ -18,6 +27,9 @@ def update_refund_service(db: Session, refund_id: str, refund_data):
     if not refund:
         return None
 
+    # an approval already applied is not applied twice
+    was_approved = refund.status == "Approved"
+
     # Refund tablosundan refund bilgilerini güncelle
     for key, value in refund_data.dict().items():
         setattr(refund, key, value)
@@ -51,14 +63,17 @@ def update_refund_service(db: Session, refund_id: str, refund_data):
     )
     subject = "About your refund request"
 
-    if refund.status == "Approved":
+    if refund.status == "Approved" and not was_approved:
         order_item = db.query(OrderItem).filter(OrderItem.order_item_id == refund.order_item_id).first()
-        product = db.query(Product).filter(Product.product_id == order_item.product_id).first()
 
-        product.quantity += order_item.quantity
+        refund.approved_at = datetime.utcnow()
+        # the refunded units go back in stock with one atomic UPDATE
+        restock_items(db, [order_item], REFUND, refund.refund_id)
+        # and the refund counts in the sales of the day it was approved, at the cost the line was ordered at
+        record_refund(db, order_item, refund.refund_amount, refund.approved_at)
 
+        bump_product_versions(db, [order_item.product_id])
         db.commit()
-        db.refresh(product)
 
     EmailService.send_discount_email(customer_email,subject ,msg)
 
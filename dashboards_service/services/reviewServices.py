@@ -3,6 +3,8 @@ from sqlalchemy.orm import Session
 from models.models import Customer, Product, Review
 from schemas.reviewSchemas import ReviewCreate, ReviewApprovalUpdate, ReviewResponse
 from uuid import uuid4
+from services.ratingSummaryServices import apply_status_change, apply_review_change, APPROVED
+from services.cacheVersionServices import bump_product_versions
 
 def create_review(db: Session, reviewCreate: ReviewCreate, customer_id: str):
     review = Review(
@@ -24,42 +26,53 @@ def update_review_status(db: Session, review_id: str, reviewApprovalUpdate: Revi
     review = db.query(Review).filter(Review.review_id == review_id).first()
     if review is None:
         return None
+    # approving or un-approving a review changes the rating summary of its product in the same transaction
+    apply_status_change(db, review.product_id, review.rating, review.approval_status, reviewApprovalUpdate.approval_status)
     review.approval_status = reviewApprovalUpdate.approval_status
     if pm_id:
         review.pm_id = pm_id
+    bump_product_versions(db, [review.product_id])
     db.commit()
     db.refresh(review)
     return review
 
+def review_response(db: Session, review: Review) -> ReviewResponse:
+    product = db.query(Product).filter(Product.product_id == review.product_id).first()
+    user = db.query(Customer).filter(Customer.user_id == review.customer_id).first()
+    if user.middlename is None:
+        name = user.name + " " + user.surname
+    else:
+        name = user.name + " " + user.middlename + " " + user.surname
+    return ReviewResponse(
+        review_id = review.review_id,
+        image_url = product.image_url,
+        customer_id = review.customer_id,
+        customer_name = name,
+        product_name = product.name,
+        product_id = review.product_id,
+        rating = review.rating,
+        comment = review.comment,
+        approval_status = review.approval_status
+    )
+
 def get_reviews_(db : Session):
     reviews = db.query(Review).all()
 
     reviews_ = []
 
     for review in reviews:
-        product = db.query(Product).filter(Product.product_id == review.product_id).first()
-        user = db.query(Customer).filter(Customer.user_id == review.customer_id).first()
-        if user.middlename is None:
-            name = user.name + " " + user.surname
-        else:
-            name = user.name + " " + user.middlename + " " + user.surname
-        reviews_.append(ReviewResponse(
-            review_id = review.review_id,
-            image_url = product.image_url,
-            customer_id = review.customer_id,
-            customer_name = name,
-            product_name = product.name,
-            product_id = review.product_id,
-            rating = review.rating,
-            comment = review.comment,
-            approval_status = review.approval_status
-        ))
+        reviews_.append(review_response(db, review))
     return reviews_
 
 def delete_review(db: Session, review_id: str, pm_id: str):
     review = db.query(Review).filter(Review.review_id == review_id).first()
     if review is None:
         return None
+    # the response is built while the review still exists
+    response = review_response(db, review)
+    if review.approval_status == APPROVED:
+        apply_review_change(db, review.product_id, review.rating, -1)
     db.delete(review)
+    bump_product_versions(db, [review.product_id])
     db.commit()
-    return review
\ No newline at end of file
+    return response
\ No newline at end of file
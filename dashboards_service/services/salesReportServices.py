@@ -0,0 +1,271 @@
+'''
+    Revenue, profit and loss reports, read from sales_daily_fact and sales_monthly_fact: the sales and the approved
+    refunds per product and day, and per product and month, added by the order and refund writes in their own
+    transaction (common/sales_facts.py).
+
+    A daily report aggregates at most one row per product and day of the range. A monthly or yearly report, and the
+    totals, read the whole months of the range from the monthly facts and only the days of the partial months at its
+    ends from the daily facts, so years of data are a few rows per product. Both tables are read through their primary
+    key (period, product_id), or the (category_id, period) and (product_id, period) indexes when filtered. Per period
+    (optionally per category or product):
+
+        net_revenue = revenue - refunds
+        cost        = cost of the units sold - cost of the refunded units (back in stock)
+        profit      = net_revenue - cost
+        loss        = -profit when the period made a loss, else 0
+
+    rebuild_sales_facts recomputes the facts of a range from the orders, the order items and the approved refunds
+    (cancelled orders excluded), with the unit cost kept on the order lines (the current cost of the product for the
+    older lines without one). It backfills the tables the first time the service starts, and repairs a range after a
+    write that bypassed the services.
+'''
+
+import logging
+import os
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models.models import Order, OrderItem, Product, Refund, SalesDailyFact, SalesMonthlyFact
+
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.sales_facts import AMOUNTS
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("day", "month", "year")
+GROUPINGS = ("category", "product")
+CANCELLED = 4
+
+INSERT_CHUNK = 1000
+
+_PERIOD_FORMATS = {"month": "%Y-%m", "year": "%Y"}
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _period(db: Session, granularity: str, column):
+    if granularity == "day":
+        return column
+    if db.get_bind().dialect.name == "mysql":
+        return func.date_format(column, _PERIOD_FORMATS[granularity])
+    return func.strftime(_PERIOD_FORMATS[granularity], column)
+
+
+def _parts(date_from: date, date_to: date, monthly: bool) -> List[Tuple[object, str, date, date]]:
+    # (table, period column, start, end excluded) of the pieces the range is read from
+    end = date_to + timedelta(days=1)
+    first = date_from if date_from.day == 1 else _next_month(date_from)
+    last = end.replace(day=1)
+    if not monthly or first >= last:
+        return [(SalesDailyFact.__table__, "day", date_from, end)]
+    parts = [(SalesMonthlyFact.__table__, "month", first, last)]
+    if date_from < first:
+        parts.append((SalesDailyFact.__table__, "day", date_from, first))
+    if last < end:
+        parts.append((SalesDailyFact.__table__, "day", last, end))
+    return parts
+
+
+def _sums(db: Session, date_from: date, date_to: date, granularity: Optional[str], group_by: Optional[str],
+          category_id: Optional[int], product_id: Optional[str]) -> Dict[tuple, List]:
+    # the sums of the amounts per (period, category or product) over the pieces of the range
+    sums: Dict[tuple, List] = {}
+    for table, key, start, end in _parts(date_from, date_to, granularity != "day"):
+        columns = []
+        if granularity is not None:
+            columns.append(_period(db, granularity, table.c[key]))
+        if group_by is not None:
+            columns.append(table.c[f"{group_by}_id"])
+        stmt = select(*columns, *(func.sum(table.c[name]) for name in AMOUNTS)).where(
+            table.c[key] >= start, table.c[key] < end
+        )
+        if columns:
+            stmt = stmt.group_by(*columns)
+        if category_id is not None:
+            stmt = stmt.where(table.c.category_id == category_id)
+        if product_id is not None:
+            stmt = stmt.where(table.c.product_id == product_id)
+        for row in db.execute(stmt):
+            amounts = sums.setdefault(tuple(row[:len(columns)]), [0] * len(AMOUNTS))
+            for index, value in enumerate(row[len(columns):]):
+                amounts[index] += Decimal(value or 0)
+    return sums
+
+
+def _report_row(keys: dict, values: List) -> dict:
+    amounts = dict(zip(AMOUNTS, values))
+    for name in ("revenue", "cost", "refunds", "refunded_cost"):
+        amounts[name] = Decimal(amounts[name]).quantize(Decimal("0.01"))
+    net_revenue = amounts["revenue"] - amounts["refunds"]
+    cost = amounts["cost"] - amounts["refunded_cost"]
+    profit = net_revenue - cost
+    return {
+        **keys,
+        "units": int(amounts["units"]),
+        "refunded_units": int(amounts["refunded_units"]),
+        "revenue": amounts["revenue"],
+        "refunds": amounts["refunds"],
+        "net_revenue": net_revenue,
+        "cost": cost,
+        "profit": profit,
+        "loss": -profit if profit < 0 else Decimal("0.00"),
+    }
+
+
+def sales_report(db: Session, date_from: date, date_to: date, granularity: str = "day", group_by: Optional[str] = None,
+                 category_id: Optional[int] = None, product_id: Optional[str] = None) -> List[dict]:
+    '''
+        Revenue, cost, refunds, profit and loss per period between date_from and date_to (both included), per category
+        or product with group_by. Periods without sales are left out.
+    '''
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if group_by is not None and group_by not in GROUPINGS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUPINGS)}")
+
+    names = ("period",) + ((f"{group_by}_id",) if group_by is not None else ())
+    sums = _sums(db, date_from, date_to, granularity, group_by, category_id, product_id)
+    # None (products without a category) sorts first
+    order = sorted(sums, key=lambda key: tuple((value is not None, value) for value in key))
+    return [_report_row(dict(zip(names, key)), sums[key]) for key in order]
+
+
+def sales_totals(db: Session, date_from: date, date_to: date, category_id: Optional[int] = None,
+                 product_id: Optional[str] = None) -> dict:
+    '''The totals of sales_report over the whole range.'''
+    sums = _sums(db, date_from, date_to, None, None, category_id, product_id)
+    return _report_row({"date_from": date_from, "date_to": date_to}, sums.get((), [0] * len(AMOUNTS)))
+
+
+def _as_date(value) -> date:
+    # DATE() returns a date on MySQL and a string on SQLite
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def _insert_rows(db: Session, model, rows: List[dict]) -> None:
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.execute(insert(model), rows[start:start + INSERT_CHUNK])
+
+
+def _rebuild_months(db: Session, month_from: Optional[date], month_to: Optional[date]) -> int:
+    # the monthly facts of the months between month_from and month_to (excluded), summed from the daily facts
+    def in_months(column):
+        criteria = []
+        if month_from is not None:
+            criteria.append(column >= month_from)
+        if month_to is not None:
+            criteria.append(column < month_to)
+        return criteria
+
+    table = SalesDailyFact.__table__
+    month = _period(db, "month", table.c.day)
+    stmt = (
+        select(month, table.c.product_id, func.max(table.c.category_id), *(func.sum(table.c[name]) for name in AMOUNTS))
+        .where(*in_months(table.c.day))
+        .group_by(month, table.c.product_id)
+    )
+    rows = []
+    for period, product_id, category_id, *amounts in db.execute(stmt):
+        year, number = (int(part) for part in period.split("-"))
+        rows.append({"month": date(year, number, 1), "product_id": product_id, "category_id": category_id,
+                     **dict(zip(AMOUNTS, amounts))})
+
+    db.execute(delete(SalesMonthlyFact).where(*in_months(SalesMonthlyFact.month)))
+    _insert_rows(db, SalesMonthlyFact, sorted(rows, key=lambda row: (row["month"], row["product_id"])))
+    return len(rows)
+
+
+def rebuild_sales_facts(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None) -> dict:
+    '''
+        Recomputes the daily facts between date_from and date_to (both included, every day when omitted), then the
+        monthly facts of their months, and commits.
+    '''
+    started = time.perf_counter()
+    facts: Dict[Tuple[date, str], dict] = {}
+
+    def fact(day, product_id, category_id):
+        key = (_as_date(day), product_id)
+        if key not in facts:
+            facts[key] = {"day": key[0], "product_id": product_id, "category_id": category_id,
+                          **{name: 0 for name in AMOUNTS}}
+        return facts[key]
+
+    def in_range(column):
+        criteria = []
+        if date_from is not None:
+            criteria.append(column >= date_from)
+        if date_to is not None:
+            criteria.append(column < date_to + timedelta(days=1))
+        return criteria
+
+    unit_cost = func.coalesce(OrderItem.unit_cost, Product.cost, 0)
+    order_day = func.date(Order.order_date)
+    sales = (
+        select(order_day, OrderItem.product_id, func.max(Product.category_id),
+               func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.price_at_purchase),
+               func.sum(OrderItem.quantity * unit_cost))
+        .join(Order, Order.order_id == OrderItem.order_id)
+        .outerjoin(Product, Product.product_id == OrderItem.product_id)
+        .where(Order.order_status != CANCELLED, *in_range(Order.order_date))
+        .group_by(order_day, OrderItem.product_id)
+    )
+    for day, product_id, category_id, units, revenue, cost in db.execute(sales):
+        row = fact(day, product_id, category_id)
+        row.update(units=units, revenue=revenue, cost=cost)
+
+    # the refunds approved before approved_at existed stay on the day they were requested
+    approved_at = func.coalesce(Refund.approved_at, Refund.request_date)
+    refund_day = func.date(approved_at)
+    refunds = (
+        select(refund_day, OrderItem.product_id, func.max(Product.category_id),
+               func.sum(OrderItem.quantity), func.sum(Refund.refund_amount),
+               func.sum(OrderItem.quantity * unit_cost))
+        .join(OrderItem, OrderItem.order_item_id == Refund.order_item_id)
+        .outerjoin(Product, Product.product_id == OrderItem.product_id)
+        .where(Refund.status == "Approved", *in_range(approved_at))
+        .group_by(refund_day, OrderItem.product_id)
+    )
+    for day, product_id, category_id, units, amount, cost in db.execute(refunds):
+        row = fact(day, product_id, category_id)
+        row.update(refunded_units=units, refunds=amount, refunded_cost=cost)
+
+    db.execute(delete(SalesDailyFact).where(*in_range(SalesDailyFact.day)))
+    rows = [facts[key] for key in sorted(facts)]
+    _insert_rows(db, SalesDailyFact, rows)
+    months = _rebuild_months(db, date_from.replace(day=1) if date_from is not None else None,
+                             _next_month(date_to) if date_to is not None else None)
+    db.commit()
+
+    result = {
+        "date_from": date_from,
+        "date_to": date_to,
+        "rows": len(rows),
+        "monthly_rows": months,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+    logger.info("sales facts rebuilt from %s to %s: %d daily and %d monthly rows in %.1f ms", date_from, date_to,
+                len(rows), months, result["duration_ms"])
+    return result
+
+
+def ensure_sales_facts(engine: Engine, session_factory) -> None:
+    '''Creates the fact tables and backfills them from the orders when they are empty.'''
+    SalesDailyFact.__table__.create(bind=engine, checkfirst=True)
+    SalesMonthlyFact.__table__.create(bind=engine, checkfirst=True)
+    db = session_factory()
+    try:
+        if db.query(SalesDailyFact.day).first() is None:
+            rebuild_sales_facts(db)
+    except Exception:
+        db.rollback()
+        logger.exception("sales facts backfill failed")
+    finally:
+        db.close()
@@ -0,0 +1,95 @@
+import sys
+import os
+
+# Proje kök dizinini PYTHONPATH'e ekle
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)  # Kök dizin
+sys.path.append(project_root)
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from models.models import Base, Product, InventoryMovement, InventorySnapshot
+from services.inventoryLedgerServices import record_movements, set_stock, ORDER, CANCEL
+from services.inventorySnapshotServices import take_snapshot, stock_at, movement_summary, compact_inventory
+from services import products
+
+T0 = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    for p in range(2):
+        session.add(Product(product_id=f"p{p}", name=f"Product {p}", model="M", price=Decimal("10"), cost=Decimal("5"),
+                            serial_number=f"SN-{p}", quantity=10))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def move(db, product_id, delta, kind, at):
+    # a stock change and its movement, dated at the given time
+    db.query(Product).filter_by(product_id=product_id).update({Product.quantity: Product.quantity + delta})
+    db.add(InventoryMovement(product_id=product_id, delta=delta, kind=kind, created_at=at))
+    db.commit()
+
+
+def test_stock_is_projected_from_the_last_snapshot(db):
+    move(db, "p0", -3, ORDER, T0 + timedelta(hours=1))
+    take_snapshot(db, T0 + timedelta(hours=2))
+    move(db, "p0", -2, ORDER, T0 + timedelta(hours=3))
+    move(db, "p0", 1, CANCEL, T0 + timedelta(hours=4))
+
+    # before the first snapshot, back from the current stock
+    assert stock_at(db, T0) == {"p0": 10, "p1": 10}
+    assert stock_at(db, T0 + timedelta(hours=2), ["p0"]) == {"p0": 7}
+    assert stock_at(db, T0 + timedelta(hours=3, minutes=30), ["p0"]) == {"p0": 5}
+    assert stock_at(db, T0 + timedelta(hours=5)) == {"p0": 6, "p1": 10}
+
+    summary = movement_summary(db, T0, T0 + timedelta(days=1), "p0")
+    assert summary == [
+        {"product_id": "p0", "kind": CANCEL, "units": 1, "movements": 1},
+        {"product_id": "p0", "kind": ORDER, "units": -5, "movements": 2},
+    ]
+
+
+def test_snapshot_reports_stock_changed_outside_of_the_ledger(db):
+    take_snapshot(db, T0)
+    move(db, "p0", -4, ORDER, T0 + timedelta(hours=1))
+    db.query(Product).filter_by(product_id="p1").update({Product.quantity: 25})  # no movement
+    db.commit()
+
+    result = take_snapshot(db, T0 + timedelta(hours=2))
+    assert result["products"] == 2 and result["drifted_products"] == 1
+    drift = {row.product_id: (row.quantity, row.drift) for row in
+             db.query(InventorySnapshot).filter_by(snapshot_at=T0 + timedelta(hours=2))}
+    assert drift == {"p0": (6, 0), "p1": (25, 15)}
+
+
+def test_set_quantity_records_the_difference(db):
+    product = products.update_product_quantity(db, "p1", 4)
+    assert product.quantity == 4
+    assert products.update_product_quantity(db, "missing", 4) is None
+
+    movement = db.query(InventoryMovement).one()
+    assert (movement.product_id, movement.delta, movement.kind) == ("p1", -6, "set")
+
+
+def test_compaction_keeps_the_last_snapshot_before_the_cutoff(db):
+    old = datetime.utcnow() - timedelta(days=400)
+    move(db, "p0", -1, ORDER, old)
+    take_snapshot(db, old + timedelta(days=1))
+    take_snapshot(db, old + timedelta(days=2))
+    move(db, "p0", -1, ORDER, datetime.utcnow() - timedelta(days=1))
+
+    assert compact_inventory(db, retention_days=365) == {"movements": 1, "snapshots": 2}
+    assert db.query(InventorySnapshot.snapshot_at).distinct().count() == 1
+    # the retained period is still projected from the kept snapshot
+    assert stock_at(db, datetime.utcnow(), ["p0"]) == {"p0": 8}
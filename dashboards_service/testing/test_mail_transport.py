@@ -0,0 +1,32 @@
+import sys
+import os
+
+# Proje kök dizinini PYTHONPATH'e ekle
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)  # Kök dizin
+sys.path.append(project_root)
+
+from settings import settings
+from services.EmailService import EmailService
+from services.mailTransportServices import get_mail_transport, reset_mail_transport
+from testing.smtp_sink import SmtpSink
+
+
+def test_bulk_discount_emails_reuse_pooled_connections(monkeypatch):
+    with SmtpSink() as sink:
+        monkeypatch.setattr(settings, "smtp_host", sink.host)
+        monkeypatch.setattr(settings, "smtp_port", sink.port)
+        monkeypatch.setattr(settings, "smtp_starttls", False)
+        monkeypatch.setattr(settings, "smtp_user", "")
+        monkeypatch.setattr(settings, "smtp_pool_size", 2)
+        reset_mail_transport()
+
+        recipients = [f"customer{i}@example.com" for i in range(20)]
+        failed = EmailService.send_discount_emails(recipients, "Discount", "The product is now discounted by 10%!")
+        stats = get_mail_transport().stats()
+        reset_mail_transport()
+
+    assert failed == []
+    assert sorted(to[0] for _, to, _ in sink.messages) == sorted(recipients)
+    assert sink.connections <= 2
+    assert stats["sent"] == 20 and stats["connections_opened"] == sink.connections
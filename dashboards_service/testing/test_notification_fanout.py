@@ -0,0 +1,147 @@
+import sys
+import os
+
+# Proje kök dizinini PYTHONPATH'e ekle
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)  # Kök dizin
+sys.path.append(project_root)
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from settings import settings
+from models.models import Base, Customer, Product, Wishlist, WishlistItem, Discount, NotificationJob
+from services.mailTransportServices import SmtpConnectionPool
+from services.notificationFanoutServices import (
+    NotificationFanout, enqueue_wishlist_discount_job, get_notification_job, render_template,
+)
+from testing.smtp_sink import SmtpSink
+
+
+def make_session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False)
+
+
+def seed(db, customers: int):
+    product = Product(product_id="p-1", name="Cat Food", model="CF", price=Decimal("100"), cost=Decimal("50"),
+                      serial_number="SN-1", quantity=10)
+    db.add(product)
+    for i in range(customers):
+        user_id = f"c-{i:03d}"
+        db.add(Customer(user_id=user_id, name=f"Name{i}", surname="Surname", email=f"customer{i}@example.com",
+                        password="x"))
+        # every customer has the product in two wishlists, and should still get one email
+        for n in range(2):
+            wishlist_id = f"w-{i:03d}-{n}"
+            db.add(Wishlist(wishlist_id=wishlist_id, customer_id=user_id, wishlist_status="active"))
+            db.add(WishlistItem(wishlist_id=wishlist_id, product_id="p-1"))
+    discount = Discount(discount_id="d-1", product_id="p-1", discount_rate=Decimal("15"),
+                        start_date=datetime.utcnow(), end_date=datetime.utcnow() + timedelta(days=7))
+    db.add(discount)
+    db.commit()
+    return product, discount
+
+
+def test_render_template_keeps_unknown_placeholders():
+    assert render_template("Hi {name}, {unknown}", name="Ada") == "Hi Ada, {unknown}"
+
+
+def test_fanout_sends_one_email_per_customer_in_chunks(monkeypatch):
+    Session = make_session_factory()
+    db = Session()
+    product, discount = seed(db, customers=7)
+    job = enqueue_wishlist_discount_job(db, product, discount)
+    db.commit()
+    job_id = job.job_id
+    db.close()
+
+    with SmtpSink() as sink:
+        monkeypatch.setattr(settings, "smtp_sender", "shop@example.com")
+        transport = SmtpConnectionPool(host=sink.host, port=sink.port, starttls=False, pool_size=2)
+        fanout = NotificationFanout(session_factory=Session, chunk_size=3, rate_per_second=0, transport=transport)
+        fanout.run_job(job_id)
+        transport.close()
+
+    db = Session()
+    progress = get_notification_job(db, job_id)
+    job = db.query(NotificationJob).filter_by(job_id=job_id).first()
+    db.close()
+
+    assert progress["status"] == "done"
+    assert progress["total_recipients"] == 7
+    assert (progress["processed"], progress["sent"], progress["failed"]) == (7, 7, 0)
+    assert progress["percent"] == 100.0
+    assert job.last_customer_id == "c-006"
+    assert sorted(to[0] for _, to, _ in sink.messages) == sorted(f"customer{i}@example.com" for i in range(7))
+    assert any(b"Dear Name3, the product 'Cat Food' in your wishlist is now discounted by 15%!" in data
+               for _, _, data in sink.messages)
+    assert sink.connections <= 2
+
+    # a finished job is not run again
+    fanout.run_job(job_id)
+    assert len(sink.messages) == 7
+
+
+def test_interrupted_job_resumes_after_last_saved_customer():
+    Session = make_session_factory()
+    db = Session()
+    product, discount = seed(db, customers=5)
+    job = enqueue_wishlist_discount_job(db, product, discount)
+    # the previous process saved the first chunk and died
+    job.status = "running"
+    job.total_recipients = 5
+    job.last_customer_id = "c-001"
+    job.processed = job.sent = 2
+    db.commit()
+    job_id = job.job_id
+    db.close()
+
+    with SmtpSink() as sink:
+        transport = SmtpConnectionPool(host=sink.host, port=sink.port, starttls=False, pool_size=1)
+        fanout = NotificationFanout(session_factory=Session, chunk_size=2, rate_per_second=0, transport=transport)
+        fanout.submit = lambda submitted_id: fanout.run_job(submitted_id)
+        assert fanout.resume_unfinished() == [job_id]
+        transport.close()
+
+    db = Session()
+    progress = get_notification_job(db, job_id)
+    db.close()
+
+    assert progress["status"] == "done"
+    assert (progress["processed"], progress["sent"]) == (5, 5)
+    assert sorted(to[0] for _, to, _ in sink.messages) == [f"customer{i}@example.com" for i in range(2, 5)]
+
+
+def test_job_leased_by_a_live_process_is_not_taken_over():
+    Session = make_session_factory()
+    db = Session()
+    product, discount = seed(db, customers=3)
+    job = enqueue_wishlist_discount_job(db, product, discount)
+    # another process is sending this one
+    job.status = "running"
+    job.locked_until = datetime.utcnow() + timedelta(minutes=5)
+    expired = enqueue_wishlist_discount_job(db, product, discount)
+    expired.status = "running"
+    expired.locked_until = datetime.utcnow() - timedelta(minutes=1)
+    db.commit()
+    job_id, expired_id = job.job_id, expired.job_id
+    db.close()
+
+    with SmtpSink() as sink:
+        transport = SmtpConnectionPool(host=sink.host, port=sink.port, starttls=False, pool_size=1)
+        fanout = NotificationFanout(session_factory=Session, chunk_size=2, rate_per_second=0, transport=transport)
+        fanout.submit = lambda submitted_id: fanout.run_job(submitted_id)
+        assert fanout.resume_unfinished() == [expired_id]
+        fanout.run_job(job_id)
+        transport.close()
+
+    db = Session()
+    assert get_notification_job(db, job_id)["status"] == "running"
+    assert get_notification_job(db, expired_id)["status"] == "done"
+    assert db.query(NotificationJob).filter_by(job_id=expired_id).one().locked_until is None
+    db.close()
+    assert len(sink.messages) == 3
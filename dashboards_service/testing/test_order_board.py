@@ -0,0 +1,91 @@
+import sys
+import os
+
+# Proje kök dizinini PYTHONPATH'e ekle
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)  # Kök dizin
+sys.path.append(project_root)
+
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from models.models import Base, Customer, Product, Order, OrderItem, Delivery, Address
+from services.orderService import OrderService, OrderBoardFilter
+import controllers.orderController as order_controller
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db = Session()
+    db.add(Customer(user_id="c1", name="Test", surname="Customer", email="customer@example.com", password="x"))
+    for p in range(3):
+        db.add(Product(product_id=f"p{p}", name=f"Product {p}", model="M", price=Decimal("10"), cost=Decimal("5"),
+                       serial_number=f"SN-{p}", quantity=10, image_url=f"img{p}.png"))
+    started = datetime(2025, 1, 1)
+    for i in range(25):
+        order_id = f"o{i:02d}"
+        db.add(Order(order_id=order_id, customer_id="c1", total_price=Decimal("30"), order_status=i % 3,
+                     order_date=started + timedelta(hours=i // 2), payment_status="paid"))
+        for p in range(i % 3 + 1):
+            db.add(OrderItem(order_item_id=f"{order_id}-i{p}", order_id=order_id, product_id=f"p{p}", quantity=1,
+                             price_at_purchase=Decimal("10")))
+        if i != 7:  # an order without delivery
+            db.add(Address(customer_adres_id=f"a{i:02d}", customer_id="c1", address=f"Street {i}", type="Home"))
+            db.add(Delivery(delivery_id=f"d{i:02d}", order_id=order_id, addres_id=f"a{i:02d}", delivery_status="PENDING"))
+    db.commit()
+    db.close()
+    yield Session
+    engine.dispose()
+
+
+def test_board_pages_cost_one_query(session_factory):
+    db = session_factory()
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    seen = []
+    cursor = None
+    while True:
+        statements.clear()
+        orders, cursor = OrderService.get_order_board(db, OrderBoardFilter(), cursor, limit=6)
+        assert len(statements) == 1
+        seen.extend(orders)
+        if cursor is None:
+            break
+
+    assert [order.order_id for order in seen] == sorted((f"o{i:02d}" for i in range(25)), reverse=True)
+    by_id = {order.order_id: order for order in seen}
+    assert [product.product_id for product in by_id["o05"].products] == ["p0", "p1", "p2"]
+    assert by_id["o05"].address == "Street 5" and by_id["o05"].id == "d05"
+    assert by_id["o07"].address is None and by_id["o07"].id is None
+    db.close()
+
+
+def test_board_filters_by_status_and_date(session_factory):
+    db = session_factory()
+    board_filter = OrderBoardFilter(statuses=[1], date_from=datetime(2025, 1, 1, 2), date_to=datetime(2025, 1, 1, 8))
+    orders = OrderService.get_orders(db, board_filter)
+    expected = [f"o{i:02d}" for i in range(25) if i % 3 == 1 and 2 <= i // 2 < 8]
+    assert [order.order_id for order in orders] == sorted(expected, reverse=True)
+    db.close()
+
+
+def test_board_streams_ndjson_in_chunks(session_factory, monkeypatch):
+    monkeypatch.setattr(order_controller, "SessionLocal", session_factory)
+    monkeypatch.setattr("services.orderService.BOARD_CHUNK_SIZE", 4)
+
+    lines = list(order_controller.stream_order_board(OrderBoardFilter(), None, None))
+    assert len(lines) == 25
+    assert json.loads(lines[0])["order_id"] == "o24"
+
+    lines = list(order_controller.stream_order_board(OrderBoardFilter(), None, 10))
+    next_cursor = json.loads(lines[-1])["next_cursor"]
+    rest = list(order_controller.stream_order_board(OrderBoardFilter(), next_cursor, None))
+    assert [json.loads(line)["order_id"] for line in lines[:-1] + rest] == sorted((f"o{i:02d}" for i in range(25)), reverse=True)
@@ -0,0 +1,62 @@
+import sys
+import os
+
+# Proje kök dizinini PYTHONPATH'e ekle
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)  # Kök dizin
+sys.path.append(project_root)
+
+from decimal import Decimal
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from controllers.reviewControllers import router
+from dbContext import get_db
+from dependencies import verify_pm_role
+from models.models import Base, Customer, Product, ProductRatingSummary, Review
+from dependencies import Principal
+from services.ratingSummaryServices import apply_review_change, APPROVED
+
+REVIEW_ID = "00000000-0000-0000-0000-000000000001"
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Customer(user_id="c1", name="Test", surname="Customer", email="customer@example.com", password="x"))
+    session.add(Product(product_id="p1", name="Product 1", model="M", price=Decimal("10"), cost=Decimal("5"),
+                        serial_number="SN-1", quantity=1))
+    session.add(Review(review_id=REVIEW_ID, customer_id="c1", product_id="p1", rating=4, approval_status=APPROVED))
+    apply_review_change(session, "p1", 4, 1)
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(router, prefix="/ProductManager")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[verify_pm_role] = lambda: Principal(user_id="pm1", email="pm@example.com",
+                                                                 role="product_manager")
+    return TestClient(app)
+
+
+def test_delete_review_removes_it_from_the_rating_summary(client, db):
+    response = client.post(f"/ProductManager/reviews/{REVIEW_ID}", headers={"Authorization": "Bearer token"})
+
+    assert response.status_code == 200
+    assert response.json()["customer_name"] == "Test Customer"
+    assert db.query(Review).count() == 0
+    summary = db.query(ProductRatingSummary).filter_by(product_id="p1").one()
+    assert (summary.review_count, summary.rating_sum) == (0, 0)
+
+    missing = client.post(f"/ProductManager/reviews/{REVIEW_ID}", headers={"Authorization": "Bearer token"})
+    assert missing.status_code == 404
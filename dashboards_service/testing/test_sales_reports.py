@@ -0,0 +1,150 @@
+import sys
+import os
+
+# Proje kök dizinini PYTHONPATH'e ekle
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)  # Kök dizin
+sys.path.append(project_root)
+
+from datetime import date, datetime
+from decimal import Decimal
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from models.models import Base, Category, Customer, Order, OrderItem, Product, Refund, SalesDailyFact, SalesMonthlyFact
+from controllers.refundControllers import RefundStatusUpdateSchema
+from services.salesReportServices import sales_report, sales_totals, rebuild_sales_facts
+from services import refundServices
+
+sys.path.append(os.path.dirname(project_root))  # the repository root, for common/
+from common.sales_facts import record_sales, record_refund, unit_costs
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    session.add_all([Category(category_id=1, category_name="Food"), Category(category_id=2, category_name="Toys")])
+    session.add(Product(product_id="p0", name="Product 0", model="M", price=Decimal("10"), cost=Decimal("6"),
+                        serial_number="SN-0", quantity=100, category_id=1))
+    session.add(Product(product_id="p1", name="Product 1", model="M", price=Decimal("20"), cost=Decimal("5"),
+                        serial_number="SN-1", quantity=100, category_id=2))
+    session.add(Customer(user_id="c1", name="Test", surname="Customer", email="customer@example.com", password="x"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def sell(db, order_id, at, *lines, status=0):
+    # an order with its items and their sales facts, as the order service writes them
+    db.add(Order(order_id=order_id, customer_id="c1", total_price=0, order_date=at, order_status=status,
+                 payment_status="paid"))
+    costs = unit_costs(db, [product_id for product_id, _, _ in lines])
+    items = [OrderItem(order_item_id=f"{order_id}-{product_id}", order_id=order_id, product_id=product_id,
+                       quantity=quantity, price_at_purchase=Decimal(price), unit_cost=costs[product_id])
+             for product_id, quantity, price in lines]
+    db.add_all(items)
+    record_sales(db, items, at)
+    db.commit()
+    return items
+
+
+def facts(db, model=SalesDailyFact):
+    return sorted(
+        (row.day if model is SalesDailyFact else row.month, row.product_id, row.category_id, row.units,
+         Decimal(row.revenue), Decimal(row.cost), row.refunded_units, Decimal(row.refunds), Decimal(row.refunded_cost))
+        for row in db.query(model)
+        if row.units or row.refunded_units
+    )
+
+
+def test_sales_are_reported_per_period_and_category(db):
+    sell(db, "o1", datetime(2024, 1, 5, 10), ("p0", 2, "10"), ("p1", 1, "20"))
+    sell(db, "o2", datetime(2024, 1, 5, 18), ("p0", 1, "9"))
+    sell(db, "o3", datetime(2024, 2, 1), ("p1", 3, "20"))
+
+    days = sales_report(db, date(2024, 1, 1), date(2024, 12, 31))
+    assert [(row["period"], row["units"], row["revenue"], row["cost"], row["profit"]) for row in days] == [
+        (date(2024, 1, 5), 4, Decimal("49.00"), Decimal("23.00"), Decimal("26.00")),
+        (date(2024, 2, 1), 3, Decimal("60.00"), Decimal("15.00"), Decimal("45.00")),
+    ]
+
+    categories = sales_report(db, date(2024, 1, 1), date(2024, 12, 31), "month", group_by="category")
+    assert [(row["period"], row["category_id"], row["revenue"]) for row in categories] == [
+        ("2024-01", 1, Decimal("29.00")), ("2024-01", 2, Decimal("20.00")), ("2024-02", 2, Decimal("60.00")),
+    ]
+    assert sales_report(db, date(2024, 1, 1), date(2024, 1, 31), "year", product_id="p1")[0]["units"] == 1
+    # the whole months are read from the monthly facts, the days of the partial ones from the daily facts
+    months = sales_report(db, date(2024, 1, 5), date(2024, 3, 31), "month")
+    assert [(row["period"], row["revenue"]) for row in months] == [
+        ("2024-01", Decimal("49.00")), ("2024-02", Decimal("60.00")),
+    ]
+    years = sales_report(db, date(2024, 1, 6), date(2024, 2, 29), "year")
+    assert [(row["period"], row["units"]) for row in years] == [("2024", 3)]
+    assert sales_totals(db, date(2024, 1, 1), date(2024, 12, 31))["profit"] == Decimal("71.00")
+    with pytest.raises(ValueError):
+        sales_report(db, date(2024, 1, 1), date(2024, 1, 31), "week")
+
+
+class ApprovalTime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return datetime(2024, 3, 12, 9)
+
+
+def test_refunds_and_cancellations_reduce_the_profit(db, monkeypatch):
+    monkeypatch.setattr(refundServices.EmailService, "send_discount_email", lambda *args: None)
+    monkeypatch.setattr(refundServices, "datetime", ApprovalTime)
+    items = sell(db, "o1", datetime(2024, 3, 1), ("p0", 4, "7"))
+    cancelled = sell(db, "o2", datetime(2024, 3, 1), ("p1", 1, "20"))
+    # the cost changes after the orders: the cancel and the refund take back the cost the lines were ordered at
+    db.query(Product).update({"cost": Decimal("50")})
+    # the order service takes a cancelled order back from the day of the order
+    db.query(Order).filter_by(order_id="o2").update({"order_status": 4})
+    record_sales(db, cancelled, datetime(2024, 3, 1), sign=-1)
+    db.add(Refund(refund_id="r1", order_id="o1", order_item_id=items[0].order_item_id,
+                  request_date=datetime(2024, 3, 10), status="Pending", refund_amount=Decimal("28")))
+    db.commit()
+
+    # approving twice applies the refund once
+    for _ in range(2):
+        refundServices.update_refund_service(db, "r1", RefundStatusUpdateSchema(status="Approved"))
+
+    march = sales_totals(db, date(2024, 3, 1), date(2024, 3, 31))
+    assert (march["units"], march["refunded_units"], march["net_revenue"], march["cost"]) == (
+        4, 4, Decimal("0.00"), Decimal("0.00"))
+    first = sales_report(db, date(2024, 3, 1), date(2024, 3, 1))[0]
+    assert (first["profit"], first["loss"]) == (Decimal("4.00"), Decimal("0.00"))
+    # the loss is booked on the day the refund was approved, not the day it was requested
+    assert sales_report(db, date(2024, 3, 10), date(2024, 3, 10)) == []
+    refund_day = sales_report(db, date(2024, 3, 12), date(2024, 3, 12))[0]
+    assert (refund_day["profit"], refund_day["loss"]) == (Decimal("-4.00"), Decimal("4.00"))
+    assert db.query(Refund).filter_by(refund_id="r1").one().approved_at == datetime(2024, 3, 12, 9)
+    assert db.query(Product).filter_by(product_id="p0").one().quantity == 104
+
+
+def test_rebuild_gives_the_incremental_facts(db):
+    sell(db, "o1", datetime(2024, 1, 5), ("p0", 2, "10"), ("p1", 1, "20"))
+    items = sell(db, "o2", datetime(2024, 1, 6), ("p0", 1, "9"))
+    sell(db, "o3", datetime(2024, 1, 7), ("p1", 5, "20"), status=4)
+    record_sales(db, db.query(OrderItem).filter_by(order_id="o3").all(), datetime(2024, 1, 7), sign=-1)
+    db.add(Refund(refund_id="r1", order_id="o2", order_item_id=items[0].order_item_id, request_date=datetime(2024, 1, 7),
+                  approved_at=datetime(2024, 1, 8), status="Approved", refund_amount=Decimal("9")))
+    record_refund(db, items[0], Decimal("9"), datetime(2024, 1, 8))
+    # the rebuild reads the cost kept on the order lines, not the current one
+    db.query(Product).update({"cost": Decimal("50")})
+    db.commit()
+    incremental, monthly = facts(db), facts(db, SalesMonthlyFact)
+    assert [row[:4] for row in monthly] == [(date(2024, 1, 1), "p0", 1, 3), (date(2024, 1, 1), "p1", 2, 1)]
+
+    assert rebuild_sales_facts(db)["rows"] == 4
+    assert facts(db) == incremental and facts(db, SalesMonthlyFact) == monthly
+
+    # a range rebuild leaves the other days alone
+    db.query(SalesDailyFact).filter_by(day=date(2024, 1, 6)).delete()
+    db.commit()
+    rebuild_sales_facts(db, date(2024, 1, 6), date(2024, 1, 6))
+    assert facts(db) == incremental and facts(db, SalesMonthlyFact) == monthly
@@ -29,12 +29,51 @@ example output:
 }
 """
 @router.get("/cart/{customer_id}")
-async def get_cart(customer_id: str, db: Session = Depends(get_db)):
+def get_cart(customer_id: str, db: Session = Depends(get_db)):
     """
     Get the user's shopping cart.
     """
     return CartService.get_cart(customer_id, db)
 
+"""
+example input:
+get request: /cart/c1/priced
+
+example output:
+{
+    "customer_id": "c1",
+    "cart_id": "...",
+    "items": [
+        {
+            "product_id": "p1",
+            "name": "Product Name",
+            "model": "Product Model",
+            "image_url": "images/p1.jpg",
+            "quantity": 2,
+            "unit_price": 100.0,
+            "discount_rate": 10.0,
+            "discounted_unit_price": 90.0,
+            "line_discount": 20.0,
+            "line_total": 180.0,
+            "stock": 5,
+            "in_stock": true,
+            "enough_stock": true
+        }
+    ],
+    "item_count": 2,
+    "items_total": 200.0,
+    "discount_total": 20.0,
+    "subtotal": 180.0,
+    "all_in_stock": true
+}
+"""
+@router.get("/cart/{customer_id}/priced")
+def get_priced_cart(customer_id: str, db: Session = Depends(get_db)):
+    """
+    Get the user's shopping cart with prices, applied discounts, stock flags and totals.
+    """
+    return CartService.get_priced_cart(customer_id, db)
+
 """
 example input:
 {
@@ -54,7 +93,7 @@ example output:
 }
 """
 @router.post("/cart/add")
-async def add_to_cart(cart_item: CartItem, customer_id: str = None, db: Session = Depends(get_db)):
+def add_to_cart(cart_item: CartItem, customer_id: str = None, db: Session = Depends(get_db)):
     """
     Add an item to the user's shopping cart.
     - If `customer_id` is provided, store the item in the persistent cart in the database.
@@ -70,7 +109,7 @@ async def add_to_cart(cart_item: CartItem, customer_id: str = None, db: Session
         return {"message": "Item added to session-based cart (handled on frontend)."}
 
 @router.post("/cart/merge")
-async def merge_cart(items: List[CartItem], customer_id: str, db: Session = Depends(get_db)):
+def merge_cart(items: List[CartItem], customer_id: str, db: Session = Depends(get_db)):
     """
     Merge a session-based cart with the persistent cart after user login.
     """
@@ -89,7 +128,7 @@ example output:
 }
 """
 @router.patch("/cart/increase_quantity")
-async def increase_item_quantity(payload: CartAdjustment, db: Session = Depends(get_db)):
+def increase_item_quantity(payload: CartAdjustment, db: Session = Depends(get_db)):
     """
     Increase the quantity of an item by 1 in the cart.
     """
@@ -114,7 +153,7 @@ example output:
 }
 """
 @router.patch("/cart/decrease_quantity")
-async def decrease_item_quantity(payload: CartAdjustment, db: Session = Depends(get_db)):
+def decrease_item_quantity(payload: CartAdjustment, db: Session = Depends(get_db)):
     """
     Decrease the quantity of an item by 1 in the cart.
     """
@@ -139,7 +178,7 @@ example output:
 }
 """
 @router.delete("/cart/remove")
-async def remove_from_cart(payload: CartAdjustment, db: Session = Depends(get_db)):
+def remove_from_cart(payload: CartAdjustment, db: Session = Depends(get_db)):
     """
     Remove an item from the user's cart.
     """
@@ -153,7 +192,7 @@ async def remove_from_cart(payload: CartAdjustment, db: Session = Depends(get_db
 
 
 @router.delete("/cart/clear")
-async def clear_cart(customer_id: str, db: Session = Depends(get_db)):
+def clear_cart(customer_id: str, db: Session = Depends(get_db)):
     """
     Clear the user's cart.
     """
@@ -163,4 +202,33 @@ async def clear_cart(customer_id: str, db: Session = Depends(get_db)):
     except HTTPException as e:
         raise e
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Could not clear the cart.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Could not clear the cart.")
+
+"""
+example input:
+post request: /cart/prepare_checkout?customer_id=c1
+
+example output:
+{
+    "customer_id": "c1",
+    "expires_at": "2025-01-01T12:10:00",
+    "holds": [
+        {
+            "product_id": "p1",
+            "quantity": 2,
+            "available": 5
+        }
+    ]
+}
+"""
+@router.post("/cart/prepare_checkout")
+def prepare_checkout(customer_id: str, db: Session = Depends(get_db)):
+    """
+    Hold the stock of the cart for the checkout (until the returned expires_at).
+    """
+    try:
+        return CartService.prepare_checkout(customer_id, db)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Could not prepare the checkout.")
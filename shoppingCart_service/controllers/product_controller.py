@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List, Dict
 
-from models.models import Product
+from models.models import Product, ProductBatchRequest
 from utils.db_utils import get_db
 from services.product_service import ProductService
+from services.product_cache import cart_product_cache
 
 # Create a router for product-related endpoints
 router = APIRouter(
@@ -13,7 +14,7 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[Dict])
-async def get_all_products(db: Session = Depends(get_db)):
+def get_all_products(db: Session = Depends(get_db)):
     """
     Retrieve all products for display.
     """
@@ -27,6 +28,40 @@ async def get_all_products(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+"""
+input example: up to 500 product ids, e.g. every product of a cart or wishlist page
+{
+    "product_ids": ["id-1", "id-2", "id-1"]
+}
+
+output example: the products in the requested order without duplicates, and the ids that were not found
+{
+    "products": [
+        {"product_id": "id-1", "name": "...", "quantity": 10, "in_stock": true, "price": 100.0, "discount_rate": 0, ...},
+        {"product_id": "id-2", ...}
+    ],
+    "missing": []
+}
+"""
+@router.post("/batch", response_model=Dict)
+def get_products_by_ids(request: ProductBatchRequest, db: Session = Depends(get_db)):
+    """
+    Get the details, active discount and stock of several products with one query.
+    """
+    try:
+        return ProductService.get_products_by_ids(request.product_ids, db)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@router.get("/cache-stats", response_model=Dict)
+def get_product_cache_stats():
+    """
+    Hit / miss counters of the product details cache.
+    """
+    return cart_product_cache.stats()
+
 """
 input example: get request sadece product_id ile çalışıyor
 
@@ -42,7 +77,7 @@ output example:
 }
 """
 @router.get("/{product_id}", response_model=Dict)
-async def get_product_by_id(product_id: str, db: Session = Depends(get_db)):
+def get_product_by_id(product_id: str, db: Session = Depends(get_db)):
     """
     Get detailed product information by product ID.
     """
@@ -57,7 +92,7 @@ async def get_product_by_id(product_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @router.patch("/{product_id}/quantity", response_model=Dict)
-async def update_product_quantity(product_id: str, quantity: int, db: Session = Depends(get_db)):
+def update_product_quantity(product_id: str, quantity: int, db: Session = Depends(get_db)):
     """
     Update the quantity of a specific product.
     """
@@ -75,7 +110,7 @@ async def update_product_quantity(product_id: str, quantity: int, db: Session =
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @router.patch("/{product_id}/sold", response_model=Dict)
-async def increment_item_sold(product_id: str, quantity_sold: int, db: Session = Depends(get_db)):
+def increment_item_sold(product_id: str, quantity_sold: int, db: Session = Depends(get_db)):
     """
     Increment the number of items sold for a specific product.
     """
@@ -93,7 +128,7 @@ async def increment_item_sold(product_id: str, quantity_sold: int, db: Session =
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @router.get("/{product_id}/inventory", response_model=Dict)
-async def get_product_inventory_status(product_id: str, db: Session = Depends(get_db)):
+def get_product_inventory_status(product_id: str, db: Session = Depends(get_db)):
     """
     Check if a product is in stock and return inventory status.
     """
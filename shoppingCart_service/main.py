@@ -4,6 +4,9 @@ from controllers.cart_controller import router as cart_router
 # Import the product router 
 from controllers.product_controller import router as product_router  
 from fastapi.middleware.cors import CORSMiddleware
+from utils.db_utils import database, engine, SessionLocal
+from models.models import InventoryMovement
+from services.stock_holds import ensure_stock_holds, stock_hold_sweeper
 
 app = FastAPI(
     title="Shopping Cart Service",
@@ -33,6 +36,26 @@ we only store the relative path according to the static directory. For example:
 'images/product123.jpg' -> relative path according to the static directory in the backend directory. 
 '''
 
+# The stock changes of the product endpoints are recorded in the inventory ledger
+@app.on_event("startup")
+def create_inventory_ledger():
+    InventoryMovement.__table__.create(bind=engine, checkfirst=True)
+
+# Stock held by prepare_checkout; the sweeper releases the expired holds
+@app.on_event("startup")
+def start_stock_hold_sweeper():
+    ensure_stock_holds(engine)
+    stock_hold_sweeper.start(SessionLocal)
+
+@app.on_event("shutdown")
+def stop_stock_hold_sweeper():
+    stock_hold_sweeper.stop()
+
+# Connection pool metrics: checkout wait times, timeouts and saturation of each engine
+@app.get("/db/stats")
+def db_stats():
+    return database.stats()
+
 # Include the router from the cart controller
 app.include_router(cart_router)
 # Include the product router
@@ -9,7 +9,7 @@
         in the user related tables, id is auto increment, but in the shopping cart related tables, id is generated by uuid .
 '''
 
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, DECIMAL, DateTime
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, DECIMAL, DateTime, BigInteger, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.mysql import CHAR
@@ -217,9 +217,48 @@ class Category(Base):
     subcategories = relationship("Category", back_populates="parent_category")
     products = relationship("Product", back_populates="category")
 
+# Cache Version Table (a counter per cached data set, bumped when the data changes so that the caches reload it)
+class CacheVersion(Base):
+    __tablename__ = 'cache_version'
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Inventory Movement Table (append-only ledger of the stock changes, written in the transaction of each change)
+class InventoryMovement(Base):
+    __tablename__ = 'inventory_movement'
+    __table_args__ = (Index('ix_inventory_movement_product_created', 'product_id', 'created_at'),)
+
+    # an increasing key keeps the appends at the end of the table (SQLite only autoincrements an INTEGER key)
+    movement_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    product_id = Column(CHAR(36), nullable=False)  # no foreign key: the history outlives deleted products
+    delta = Column(Integer, nullable=False)  # signed change of products.quantity
+    kind = Column(String(20), nullable=False)  # order, cancel, refund, set
+    reference_id = Column(CHAR(36), nullable=True)  # order_id, refund_id... of the change
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+# Stock Hold Table (stock held for a customer between prepare_checkout and the checkout, until expires_at)
+class StockHold(Base):
+    __tablename__ = 'stock_hold'
+    __table_args__ = (
+        UniqueConstraint('customer_id', 'product_id', name='ux_stock_hold_customer_product'),
+        # covers the sum of the active holds of a product (available to sell = stock - active holds)
+        Index('ix_stock_hold_product_expires', 'product_id', 'expires_at', 'quantity'),
+    )
+
+    hold_id = Column(CHAR(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    customer_id = Column(CHAR(36), nullable=False)
+    product_id = Column(CHAR(36), nullable=False)  # no foreign key: a hold never outlives its expiry for long
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 
 
 from pydantic import BaseModel
+from typing import List
 
 # pdyanctic model for the cart item which is to be used when adding an item to the cart with certain quantity
 class CartItem(BaseModel):
@@ -231,6 +270,10 @@ class CartAdjustment(BaseModel):
     product_id: str
     customer_id: str
 
+# Pydantic model for the batch product lookup (cart and wishlist pages ask for all of their products at once)
+class ProductBatchRequest(BaseModel):
+    product_ids: List[str]
+
 
 """
 orders:
@@ -0,0 +1,63 @@
+'''
+    Helpers for the cache_version table, mirrored from ProductListing/services/cache_version.py:
+    the stock and sales updates of this service invalidate the cached product details of the other services.
+'''
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from sqlalchemy import update, insert
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from sqlalchemy.orm import Session
+from models.models import CacheVersion
+
+logger = logging.getLogger(__name__)
+
+
+def product_cache_key(product_id: str) -> str:
+    return f"product:{product_id}"
+
+
+def bump_cache_versions(db: Session, names: Iterable[str]) -> None:
+    '''
+        Increments the versions of the given names in the caller's transaction (the caller commits).
+        The names are locked in sorted order so that concurrent writers cannot deadlock on them.
+        A failure (e.g. the table is missing) is logged and does not fail the write itself.
+    '''
+    names = sorted(set(names))
+    if not names:
+        return
+    for attempt in range(2):
+        try:
+            with db.begin_nested():
+                now = datetime.utcnow()
+                db.execute(
+                    update(CacheVersion)
+                    .where(CacheVersion.name.in_(names))
+                    .values(version=CacheVersion.version + 1, updated_at=now)
+                )
+                existing = {row.name for row in db.query(CacheVersion.name).filter(CacheVersion.name.in_(names))}
+                missing = [name for name in names if name not in existing]
+                if missing:
+                    db.execute(insert(CacheVersion), [{"name": name, "version": 1, "updated_at": now} for name in missing])
+            return
+        except IntegrityError:
+            # a concurrent bump inserted one of the missing rows: the second attempt updates it
+            continue
+        except DBAPIError as e:
+            logger.warning("Could not bump cache versions %s: %s", names, e)
+            return
+
+
+def read_cache_version(db: Session, name: str) -> Optional[int]:
+    row = db.query(CacheVersion.version).filter(CacheVersion.name == name).first()
+    return row.version if row else None
+
+
+def read_cache_versions(db: Session, names: Iterable[str]) -> Dict[str, Optional[int]]:
+    names = list(set(names))
+    versions = {name: None for name in names}
+    if names:
+        for row in db.query(CacheVersion.name, CacheVersion.version).filter(CacheVersion.name.in_(names)):
+            versions[row.name] = row.version
+    return versions
@@ -1,9 +1,38 @@
+import os
+import sys
+import time
+import uuid
 from fastapi import HTTPException
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
 # Import the ShoppingCart and ShoppingCartItem classes from the models module
-from models.models import ShoppingCart, ShoppingCartItem, Product, CartAdjustment
+from models.models import ShoppingCart, ShoppingCartItem, Product, Customer, CartAdjustment
+from services.cache_version import bump_cache_versions
+from services.cart_view import cart_view_cache, cart_cache_key
+from services.stock_holds import place_holds, StockHoldError
+
+# the repository root, for the modules shared by the services (common/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.upsert import upsert
+
+def _upsert_cart_items(db: Session, rows):
+    '''
+    Writes the given cart lines (absolute quantities) with one upsert on the primary key (common/upsert.py).
+    '''
+    upsert(db, ShoppingCartItem.__table__, rows, ["shopping_cart_item_id"], lambda new: {"quantity": new.quantity})
+
 
 class CartService:
+    @staticmethod
+    def _commit_cart_change(customer_id, db: Session):
+        '''
+        Commits a change of the customer's cart and drops its cached priced view
+        (the "cart:<customer_id>" version is bumped in the same transaction for the other workers).
+        '''
+        bump_cache_versions(db, [cart_cache_key(customer_id)])
+        db.commit()
+        cart_view_cache.invalidate(customer_id)
+
     @staticmethod
     def get_cart(customer_id, db: Session):
         '''
@@ -27,6 +56,21 @@ class CartService:
         return {"cart": [{"product_id": item.product_id, "quantity": item.quantity} for item in items]}
 
 
+    @staticmethod
+    def get_priced_cart(customer_id, db: Session):
+        '''
+        This function returns the active cart of a customer with server side pricing: for each line the product details,
+        unit price, applied discount, line total and stock flags, and the totals of the cart. It is computed with one
+        query and cached per customer until the cart or one of its products changes (see services/cart_view.py).
+
+        Parameters:
+        - customer_id: the ID of the customer whose cart will be retrieved.
+
+        Returns:
+        - a dictionary with the lines under "items" and the totals "items_total", "discount_total" and "subtotal".
+        '''
+        return cart_view_cache.get(db, customer_id)
+
     @staticmethod
     def add_item_to_persistent_cart(cart_item, customer_id, db: Session):
         '''
@@ -77,13 +121,17 @@ class CartService:
                 db.add(new_cart_item)
 
 
-        db.commit()
+        CartService._commit_cart_change(customer_id, db)
         return {"message": "Item added to the persistent cart."}
 
     @staticmethod
     def merge_session_cart_with_persistent_cart(items, customer_id, db: Session):
         '''
         This function merges a session-based cart with the persistent cart of a customer in the database.
+        The merge is set based: the incoming lines are collapsed per product, the products and the existing cart lines
+        are read with one IN query, the stock is checked for all lines at once and every change is written with one
+        upsert, all in a single transaction. The customer row is locked first so that two concurrent logins of the
+        same customer merge one after the other into the same active cart.
 
         Parameters:
         - items: a list of instances of the CartItem class which is a Pydantic model representing the items to be added to the cart.
@@ -92,29 +140,84 @@ class CartService:
         - customer_id: the ID of the customer whose cart the items will be added to.
 
         Returns:
-        - a dictionary with the key "message" and a string value indicating that the session cart has been merged with the persistent cart.
+        - a dictionary with the key "message", the per line "results" (status "merged", "clamped" when the quantity was
+          reduced to the stock, or "rejected" with a reason) and the timing "metrics" of the merge in milliseconds.
         '''
-        
+        started = time.perf_counter()
+
+        # collapse the session cart: one line per product, in the order the products first appear
+        requested = {}
+        results = {}
+        for item in items:
+            if item.quantity <= 0:
+                results[item.product_id] = {"product_id": item.product_id, "requested": item.quantity, "quantity": None,
+                                             "status": "rejected", "reason": "invalid_quantity"}
+                continue
+            requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+        for product_id in requested:
+            results.pop(product_id, None)
+
+        # serialize the merges of the same customer (SELECT ... FOR UPDATE on the customer row)
+        db.query(Customer.user_id).filter(Customer.user_id == customer_id).with_for_update().first()
         cart = db.query(ShoppingCart).filter(ShoppingCart.customer_id == customer_id, ShoppingCart.cart_status == "active").first()
-        # if the customer does not have an active cart, create a new cart and add it to db, commit, refresh 
+        # if the customer does not have an active cart, create it in the same transaction as its lines
         if not cart:
-            cart = ShoppingCart(customer_id=customer_id, cart_status="active")
+            cart = ShoppingCart(cart_id=str(uuid.uuid4()), customer_id=customer_id, cart_status="active")
             db.add(cart)
-            db.commit()
-            db.refresh(cart)
-        # for each item in the items list, check if the item is already in the cart (for example, user can add somethign to their shopping list without logging in, once they logged in we need to merge it with the existing one.)
-        for item in items:
-            existing_item = db.query(ShoppingCartItem).filter(ShoppingCartItem.cart_id == cart.cart_id, ShoppingCartItem.product_id == item.product_id).first()
-            if existing_item:
-                existing_item.quantity += item.quantity
+            db.flush()
+
+        # the requested products with their stock and the cart line they already have, if any
+        rows = []
+        if requested:
+            rows = (
+                db.query(Product.product_id, Product.quantity, ShoppingCartItem.shopping_cart_item_id, ShoppingCartItem.quantity)
+                .outerjoin(ShoppingCartItem, and_(ShoppingCartItem.product_id == Product.product_id,
+                                                  ShoppingCartItem.cart_id == cart.cart_id))
+                .filter(Product.product_id.in_(list(requested)))
+                .all()
+            )
+        loaded = time.perf_counter()
+
+        upserts = []
+        seen = set()
+        for product_id, stock, line_id, in_cart in rows:
+            if product_id in seen:
+                # a product with several lines in the cart: the first line is kept up to date
+                continue
+            seen.add(product_id)
+            wanted = (in_cart or 0) + requested[product_id]
+            result = {"product_id": product_id, "requested": requested[product_id], "quantity": in_cart or 0}
+            if stock <= (in_cart or 0):
+                result.update(status="rejected", reason="out_of_stock")
             else:
-                # creating a new instance of the ShoppingCartItem class which is the mapping of the shoppingcart_item table in the database
-                new_cart_item = ShoppingCartItem(cart_id=cart.cart_id, product_id=item.product_id, quantity=item.quantity)
-                # add this ShoppingCartItem to the database
-                db.add(new_cart_item)
-
-        db.commit()
-        return {"message": "Session cart merged with persistent cart."}
+                quantity = min(wanted, stock)
+                result.update(quantity=quantity, status="merged" if quantity == wanted else "clamped")
+                upserts.append({"shopping_cart_item_id": line_id or str(uuid.uuid4()), "cart_id": cart.cart_id,
+                                "product_id": product_id, "quantity": quantity})
+            results[product_id] = result
+        for product_id, quantity in requested.items():
+            if product_id not in seen:
+                results[product_id] = {"product_id": product_id, "requested": quantity, "quantity": None,
+                                       "status": "rejected", "reason": "product_not_found"}
+        validated = time.perf_counter()
+
+        _upsert_cart_items(db, upserts)
+        CartService._commit_cart_change(customer_id, db)
+        finished = time.perf_counter()
+
+        return {
+            "message": "Session cart merged with persistent cart.",
+            "cart_id": cart.cart_id,
+            "results": [results[product_id] for product_id in dict.fromkeys(item.product_id for item in items)],
+            "metrics": {
+                "lines": len(results),
+                "written": len(upserts),
+                "load_ms": round((loaded - started) * 1000, 3),
+                "validate_ms": round((validated - loaded) * 1000, 3),
+                "write_ms": round((finished - validated) * 1000, 3),
+                "total_ms": round((finished - started) * 1000, 3),
+            },
+        }
 
     @staticmethod
     def remove_item_from_cart(product_id, customer_id, db: Session):
@@ -138,7 +241,7 @@ class CartService:
             raise HTTPException(status_code=404, detail="Item not found in cart")
 
         db.delete(item)
-        db.commit()
+        CartService._commit_cart_change(customer_id, db)
         return {"message": "Item removed from the cart"}
 
     # function to decrease the quantity of an item by 1 in the cart (if the quantity is already 1, remove the item)
@@ -168,7 +271,7 @@ class CartService:
             item.quantity -= 1
         else:
             db.delete(item)
-        db.commit()
+        CartService._commit_cart_change(customer_id, db)
         return {"message": "Item quantity decreased in the cart"}
 
     # function to increase the quantity of an item by 1 in the cart (maybe needed for the frontend later)
@@ -197,7 +300,7 @@ class CartService:
         if product.quantity >= item.quantity + 1:
             item.quantity += 1
         
-        db.commit()
+        CartService._commit_cart_change(customer_id, db)
         return {"message": "Item quantity increased in the cart"}
 
 
@@ -223,15 +326,46 @@ class CartService:
         items = db.query(ShoppingCartItem).filter(ShoppingCartItem.cart_id == cart.cart_id).all()
         for item in items:
             db.delete(item)
-        db.commit()
+        CartService._commit_cart_change(customer_id, db)
         return {"message": "Cart cleared"}
 
 
+    @staticmethod
+    def prepare_checkout(customer_id, db: Session):
+        '''
+        This function holds the stock of every line of the active cart of a customer for the checkout, in one
+        transaction (see services/stock_holds.py). The holds expire after HOLD_TTL unless the checkout consumes them;
+        preparing again replaces them.
+
+        Parameters:
+        - customer_id: the ID of the customer whose cart will be checked out.
+        - db: the database session.
+
+        Returns:
+        - a dictionary with the expiry of the holds under "expires_at" and the held lines under "holds".
+        - raises 409 with the lines that cannot be held under "failures".
+        '''
+        cart = db.query(ShoppingCart).filter(ShoppingCart.customer_id == customer_id, ShoppingCart.cart_status == "active").first()
+        if not cart:
+            raise HTTPException(status_code=404, detail="Cart not found")
+
+        items = db.query(ShoppingCartItem).filter(ShoppingCartItem.cart_id == cart.cart_id).all()
+        if not items:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+
+        try:
+            holds = place_holds(db, customer_id, items)
+        except StockHoldError as e:
+            db.rollback()
+            raise HTTPException(status_code=409, detail={"message": str(e), "failures": e.failures})
+        db.commit()
+        return holds
+
+
 '''
 - Total Cost Calculation -> when we have the products table, we can calculate the total cost of the items in the cart.
 - Detailed Cart Item View: Expand the get_cart method to return more detailed information about each item, such as the product name, price, description, and image URL
 - applying discount to the cart when we have the discount table
 - Cart Expiry maybe?
 - Custom Sorting Options: Allow users to view and sort items in the cart (e.g., by price, popularity, etc.), which can be handy for larger shopping lists.
--  Add a prepare_checkout endpoint that checks for item availability and locks stock temporarily to prevent overselling.
 '''
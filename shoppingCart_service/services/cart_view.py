@@ -0,0 +1,179 @@
+'''
+    Priced read model of a customer's active cart.
+
+    One statement joins the cart items with their products, the highest active discount of each product and the
+    "product:<id>" rows of cache_version, and the lines, stock flags and totals are computed from its rows.
+
+    The result is cached per customer (same backend as the product cache, see services/product_cache.py) together with
+    the versions it was computed from: "cart:<customer_id>", bumped by every cart mutation of CartService, and the
+    version of each product in the cart, bumped by every service that changes a price, stock or discount. An entry
+    is served as is for PRODUCT_CACHE_VERSION_CHECK seconds, then revalidated with one query on cache_version, and
+    never lives longer than CART_VIEW_TTL seconds.
+'''
+
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict
+from sqlalchemy import func, literal
+from sqlalchemy.orm import Session
+from models.models import ShoppingCart, ShoppingCartItem, Product, Discount, CacheVersion
+from services.cache_version import read_cache_version, read_cache_versions
+from services.product_cache import create_backend, PRODUCT_CACHE_VERSION_CHECK
+
+CART_VIEW_TTL = float(os.getenv("CART_VIEW_TTL", "120"))
+
+CENT = Decimal("0.01")
+
+
+def cart_cache_key(customer_id: str) -> str:
+    return f"cart:{customer_id}"
+
+
+def _money(value: Decimal) -> float:
+    return float(value.quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def load_cart_view(customer_id: str, db: Session):
+    '''
+        Computes the priced cart of the customer with one query.
+        Returns (view, product_versions) where product_versions maps "product:<id>" to the version read with the rows.
+    '''
+    active_cart = (
+        db.query(ShoppingCart.cart_id)
+        .filter(ShoppingCart.customer_id == customer_id, ShoppingCart.cart_status == "active")
+        .limit(1)
+        .scalar_subquery()
+    )
+    # highest active discount of each product in the cart
+    discounts = (
+        db.query(Discount.product_id, func.max(Discount.discount_rate).label("discount_rate"))
+        .join(ShoppingCartItem, ShoppingCartItem.product_id == Discount.product_id)
+        .filter(ShoppingCartItem.cart_id == active_cart, Discount.is_active == 1)
+        .group_by(Discount.product_id)
+        .subquery()
+    )
+    rows = (
+        db.query(
+            ShoppingCartItem.cart_id,
+            ShoppingCartItem.product_id,
+            ShoppingCartItem.quantity,
+            Product.name,
+            Product.model,
+            Product.image_url,
+            Product.price,
+            Product.quantity.label("stock"),
+            discounts.c.discount_rate,
+            CacheVersion.version.label("product_version"),
+        )
+        .join(Product, Product.product_id == ShoppingCartItem.product_id)
+        .outerjoin(discounts, discounts.c.product_id == ShoppingCartItem.product_id)
+        .outerjoin(CacheVersion, CacheVersion.name == literal("product:") + ShoppingCartItem.product_id)
+        .filter(ShoppingCartItem.cart_id == active_cart)
+        .order_by(ShoppingCartItem.shopping_cart_item_id)
+        .all()
+    )
+
+    lines = []
+    versions = {}
+    items_total = Decimal("0")
+    subtotal = Decimal("0")
+    for row in rows:
+        unit_price = Decimal(row.price)
+        discount_rate = Decimal(row.discount_rate) if row.discount_rate is not None else Decimal("0")
+        discounted_unit_price = (unit_price * (100 - discount_rate) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        line_total = discounted_unit_price * row.quantity
+        items_total += unit_price * row.quantity
+        subtotal += line_total
+        versions[f"product:{row.product_id}"] = row.product_version
+        lines.append({
+            "product_id": row.product_id,
+            "name": row.name,
+            "model": row.model,
+            "image_url": row.image_url,
+            "quantity": row.quantity,
+            "unit_price": _money(unit_price),
+            "discount_rate": float(discount_rate),
+            "discounted_unit_price": _money(discounted_unit_price),
+            "line_discount": _money(unit_price * row.quantity - line_total),
+            "line_total": _money(line_total),
+            "stock": row.stock,
+            "in_stock": row.stock > 0,
+            "enough_stock": row.stock >= row.quantity,
+        })
+
+    view = {
+        "customer_id": customer_id,
+        "cart_id": rows[0].cart_id if rows else None,
+        "items": lines,
+        "item_count": sum(line["quantity"] for line in lines),
+        "items_total": _money(items_total),
+        "discount_total": _money(items_total - subtotal),
+        "subtotal": _money(subtotal),
+        "all_in_stock": all(line["enough_stock"] for line in lines),
+    }
+    return view, versions
+
+
+class CartViewCache:
+    def __init__(self, backend=None, ttl: float = CART_VIEW_TTL,
+                 version_check_interval: float = PRODUCT_CACHE_VERSION_CHECK):
+        self.backend = backend if backend is not None else create_backend()
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key(self, customer_id: str) -> str:
+        return f"product-cache:cart-view:{customer_id}"
+
+    def _count(self, counter: str) -> None:
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, db: Session, customer_id: str) -> Dict[str, Any]:
+        key = self._key(customer_id)
+        now = time.time()
+        entry = self.backend.get(key)
+
+        if entry is not None:
+            if now - entry["checked_at"] < self.version_check_interval:
+                self._count("hits")
+                return entry["value"]
+            if read_cache_versions(db, entry["versions"]) == entry["versions"]:
+                entry["checked_at"] = now
+                self.backend.set(key, entry, max(0.001, entry["expires_at"] - now))
+                self._count("hits")
+                return entry["value"]
+
+        self._count("misses")
+        # the cart version is read before the rows, the product versions with them
+        cart_version = read_cache_version(db, cart_cache_key(customer_id))
+        view, versions = load_cart_view(customer_id, db)
+        versions[cart_cache_key(customer_id)] = cart_version
+        self.backend.set(
+            key,
+            {"value": view, "versions": versions, "checked_at": now, "expires_at": now + self.ttl},
+            self.ttl,
+        )
+        return view
+
+    def invalidate(self, customer_id: str) -> None:
+        self.backend.delete(self._key(customer_id))
+        self._count("invalidations")
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+cart_view_cache = CartViewCache()
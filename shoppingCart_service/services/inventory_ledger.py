@@ -0,0 +1,65 @@
+'''
+    inventory_movement is the append-only ledger of the stock: every change of products.quantity also writes one row
+    per product (the signed delta, the kind of change and the order or refund behind it) in the transaction of the
+    change, so the row is there exactly when the change is committed. The products table keeps only the current stock;
+    the history, the point-in-time stock and the movement analytics of the dashboards are read from the ledger and
+    from the snapshots dashboards_service compacts it into (services/inventorySnapshotServices.py).
+
+    Kinds of movements:
+        order     stock reserved by an order (negative)
+        cancel    stock of a cancelled order put back
+        refund    stock of an approved refund put back
+        set       stock set by a manager (the difference with the previous stock)
+
+    Mirrored from Order_service/services/inventory_ledger.py.
+'''
+
+from datetime import datetime
+from typing import Mapping, Optional
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from models.models import InventoryMovement, Product
+
+ORDER = "order"
+CANCEL = "cancel"
+REFUND = "refund"
+SET = "set"
+
+
+def record_movements(db: Session, deltas: Mapping[str, int], kind: str, reference_id: Optional[str] = None) -> None:
+    '''Appends the stock deltas ({product_id: delta}) to the ledger, in the caller's transaction; the caller commits.'''
+    now = datetime.utcnow()
+    rows = [
+        {"product_id": product_id, "delta": delta, "kind": kind, "reference_id": reference_id, "created_at": now}
+        for product_id, delta in sorted(deltas.items())
+        if delta
+    ]
+    if rows:
+        db.execute(insert(InventoryMovement), rows)
+
+
+def set_stock(db: Session, product_id: str, quantity: int, reference_id: Optional[str] = None) -> Optional[int]:
+    '''
+        Sets the stock of a product and records the difference with the previous stock. The product row is locked
+        while the difference is computed, so that a concurrent change is recorded before or after it, not lost.
+        Returns the previous stock, None when the product does not exist; the caller commits.
+    '''
+    previous = (
+        db.query(Product.quantity)
+        .filter(Product.product_id == product_id)
+        .with_for_update()
+        .scalar()
+    )
+    if previous is None:
+        return None
+    db.execute(
+        update(Product).where(Product.product_id == product_id).values(quantity=quantity)
+        .execution_options(synchronize_session=False)
+    )
+    record_movements(db, {product_id: quantity - previous}, SET, reference_id)
+
+    # Product objects already loaded in the session still hold the old stock
+    for instance in list(db.identity_map.values()):
+        if isinstance(instance, Product) and instance.product_id == product_id:
+            db.expire(instance, ["quantity"])
+    return previous
@@ -1,8 +1,15 @@
 from sqlalchemy.orm import Session
 from models.models import Product, Discount
 from fastapi import HTTPException
-from sqlalchemy import and_
+from sqlalchemy import and_, func
+from services.cache_version import bump_cache_versions, product_cache_key
+from services.product_cache import cart_product_cache
+from services.inventory_counters import apply_counter_deltas
+from services.inventory_ledger import set_stock
+from services.stock_holds import available_to_sell
 
+# upper bound of the ids a batch lookup accepts (one IN list)
+MAX_BATCH_SIZE = 500
 
 
 # This service is for in shopping card FE, to get the product details, update the quantity of the product, get all products, increment the number of items sold for a product, and check if a product is in stock.
@@ -19,24 +26,19 @@ class ProductService:
         Returns:
         - dict: A dictionary with product details or raises an HTTP 404 if the product is not found.
         """
-        product = db.query(Product).filter(Product.product_id == product_id).first()
-        discount = db.query(Discount).filter(and_(Discount.product_id == product.product_id, Discount.is_active)).first()
+        product = cart_product_cache.get(db, product_id, lambda: ProductService._load_product_details(product_id, db))
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
-        if discount:
-            return {
-            "product_id": product.product_id,
-            "name": product.name,
-            "model": product.model,
-            "description": product.description,
-            "quantity": product.quantity,
-            "price": float(product.price),
-            "distributor": product.distributor,
-            "image_url": product.image_url,
-            "discount_rate": float(discount.discount_rate)
-        }
-        else:
-            return {
+        return product
+
+    @staticmethod
+    def _load_product_details(product_id: str, db: Session):
+        # the uncached lookup behind get_product_by_id, None when the product does not exist
+        product = db.query(Product).filter(Product.product_id == product_id).first()
+        if not product:
+            return None
+        discount = db.query(Discount).filter(and_(Discount.product_id == product.product_id, Discount.is_active)).first()
+        return {
             "product_id": product.product_id,
             "name": product.name,
             "model": product.model,
@@ -45,10 +47,60 @@ class ProductService:
             "price": float(product.price),
             "distributor": product.distributor,
             "image_url": product.image_url,
-            "discount_rate": 0
+            "discount_rate": float(discount.discount_rate) if discount else 0
         }
 
-        
+    @staticmethod
+    def get_products_by_ids(product_ids: list, db: Session):
+        """
+        Retrieve the details, active discount and stock of several products in one query.
+
+        Parameters:
+        - product_ids (list): The IDs of the products, in the order the caller wants them back.
+        - db (Session): The database session.
+
+        Returns:
+        - dict: {"products": [...], "missing": [...]}. Products keep the order of product_ids, each ID appears once
+          (later duplicates are dropped), and IDs without a product are listed in "missing".
+        """
+        ordered_ids = list(dict.fromkeys(product_ids))
+        if len(ordered_ids) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} product IDs can be requested at once")
+        if not ordered_ids:
+            return {"products": [], "missing": []}
+
+        # highest active discount of each requested product, joined to the products in the same statement
+        discounts = (
+            db.query(Discount.product_id, func.max(Discount.discount_rate).label("discount_rate"))
+            .filter(Discount.product_id.in_(ordered_ids), Discount.is_active == 1)
+            .group_by(Discount.product_id)
+            .subquery()
+        )
+        rows = (
+            db.query(Product, discounts.c.discount_rate)
+            .outerjoin(discounts, discounts.c.product_id == Product.product_id)
+            .filter(Product.product_id.in_(ordered_ids))
+            .all()
+        )
+
+        found = {}
+        for product, discount_rate in rows:
+            found[product.product_id] = {
+                "product_id": product.product_id,
+                "name": product.name,
+                "model": product.model,
+                "description": product.description,
+                "quantity": product.quantity,
+                "in_stock": product.quantity > 0,
+                "price": float(product.price),
+                "distributor": product.distributor,
+                "image_url": product.image_url,
+                "discount_rate": float(discount_rate) if discount_rate is not None else 0
+            }
+        return {
+            "products": [found[product_id] for product_id in ordered_ids if product_id in found],
+            "missing": [product_id for product_id in ordered_ids if product_id not in found],
+        }
 
     @staticmethod
     def update_product_quantity(product_id: str, quantity: int, db: Session):
@@ -63,15 +115,15 @@ class ProductService:
         Returns:
         - dict: A message indicating success or failure.
         """
-        product = db.query(Product).filter(Product.product_id == product_id).first()
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-
         if quantity < 0:
             raise HTTPException(status_code=400, detail="Quantity cannot be negative")
-        
-        product.quantity = quantity
+
+        # the new stock and its difference with the previous one, in the inventory ledger
+        if set_stock(db, product_id, quantity) is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        bump_cache_versions(db, [product_cache_key(product_id)])
         db.commit()
+        cart_product_cache.invalidate(product_id)
         return {"message": f"Quantity for product {product_id} updated to {quantity}"}
 
     @staticmethod
@@ -113,12 +165,12 @@ class ProductService:
         Returns:
         - dict: A message indicating success or failure.
         """
-        product = db.query(Product).filter(Product.product_id == product_id).first()
-        if not product:
+        # item_sold = item_sold + :quantity_sold in the database, so that concurrent sales all count
+        if not apply_counter_deltas(db, sold={product_id: quantity_sold}):
             raise HTTPException(status_code=404, detail="Product not found")
-
-        product.item_sold += quantity_sold
+        bump_cache_versions(db, [product_cache_key(product_id)])
         db.commit()
+        cart_product_cache.invalidate(product_id)
         return {"message": f"Sold quantity updated for product {product_id}"}
 
     @staticmethod
@@ -131,15 +183,17 @@ class ProductService:
         - db (Session): The database session.
         
         Returns:
-        - dict: Product inventory status.
+        - dict: Product inventory status, "available" being the stock not held by prepared checkouts.
         """
         product = db.query(Product).filter(Product.product_id == product_id).first()
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
 
+        available = available_to_sell(db, [product_id]).get(product_id, 0)
         return {
             "product_id": product.product_id,
             "name": product.name,
             "quantity": product.quantity,
-            "in_stock": product.quantity > 0,
+            "available": available,
+            "in_stock": available > 0,
         }
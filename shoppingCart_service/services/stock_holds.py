@@ -0,0 +1,220 @@
+'''
+    Stock holds: the stock set aside for a customer between prepare_checkout and the checkout, so that the stock
+    cannot be sold to someone else while the customer pays.
+
+    A hold is one stock_hold row per (customer, product) with the quantity held and an expiry (HOLD_TTL after the
+    prepare). The stock itself is not touched until the checkout: the quantity available to sell is
+
+        products.quantity - SUM(stock_hold.quantity) of the holds of the product that have not expired
+
+    an aggregate over the (product_id, expires_at, quantity) index, so it reads the index only.
+
+    place_holds (POST /cart/prepare_checkout) holds every line of the cart in one transaction:
+        1. the products are locked with one SELECT ... FOR UPDATE in product_id order (as the checkout does, see
+           Order_service/services/stock_reservation.py), so two prepares of the same products are serialized,
+        2. every line is checked against the stock minus the active holds of the other customers, and all the
+           failures are reported together,
+        3. the previous holds of the customer are replaced by the new ones.
+    The checkout checks the order against the same available quantity (the holds of the customer do not count
+    against their own order) and consumes the holds of the customer in its transaction. Expired holds no longer
+    count anywhere; the sweeper deletes them in batches every SWEEP_INTERVAL seconds.
+
+    The checkout of Order_service reads and consumes the holds (Order_service/services/stock_holds.py).
+'''
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models.models import Product, StockHold
+
+logger = logging.getLogger(__name__)
+
+# how long the stock of a prepared checkout stays held
+HOLD_TTL = timedelta(minutes=10)
+# seconds between two runs of the sweeper
+SWEEP_INTERVAL = 60
+# expired holds deleted per statement
+SWEEP_BATCH = 1000
+
+
+class StockHoldError(ValueError):
+    def __init__(self, failures: List[dict]):
+        self.failures = failures
+        super().__init__("; ".join(
+            f"Product {failure['product_id']} not found." if failure["reason"] == "not_found" else
+            f"Insufficient stock for product {failure['product_id']}. "
+            f"Available: {failure['available']}, Requested: {failure['requested']}"
+            for failure in failures
+        ))
+
+
+def _requested_quantities(items: Iterable) -> Dict[str, int]:
+    requested: Dict[str, int] = {}
+    for item in items:
+        product_id = item["product_id"] if isinstance(item, dict) else item.product_id
+        quantity = item["quantity"] if isinstance(item, dict) else item.quantity
+        if quantity <= 0:
+            raise ValueError(f"Invalid quantity {quantity} for product {product_id}.")
+        requested[product_id] = requested.get(product_id, 0) + quantity
+    return requested
+
+
+def _active_holds(product_ids: List[str], now: datetime, exclude_customer: Optional[str] = None):
+    # quantity held per product by the holds that have not expired
+    stmt = (
+        select(StockHold.product_id, func.sum(StockHold.quantity).label("held"))
+        .where(StockHold.product_id.in_(product_ids), StockHold.expires_at > now)
+        .group_by(StockHold.product_id)
+    )
+    if exclude_customer is not None:
+        stmt = stmt.where(StockHold.customer_id != exclude_customer)
+    return stmt
+
+
+def held_quantities(db: Session, product_ids: Iterable[str], exclude_customer: Optional[str] = None,
+                    now: Optional[datetime] = None) -> Dict[str, int]:
+    '''Quantity held per product (products without active holds are left out), without the holds of exclude_customer.'''
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return {}
+    rows = db.execute(_active_holds(product_ids, now or datetime.utcnow(), exclude_customer))
+    return {product_id: int(held) for product_id, held in rows}
+
+
+def available_to_sell(db: Session, product_ids: Iterable[str], customer_id: Optional[str] = None,
+                      now: Optional[datetime] = None) -> Dict[str, int]:
+    '''
+        Stock minus active holds of each existing product, in one statement. The holds of customer_id are not
+        subtracted: they are the stock the customer can buy.
+    '''
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return {}
+    held = _active_holds(product_ids, now or datetime.utcnow(), customer_id).subquery()
+    rows = db.execute(
+        select(Product.product_id, Product.quantity - func.coalesce(held.c.held, 0))
+        .outerjoin(held, held.c.product_id == Product.product_id)
+        .where(Product.product_id.in_(product_ids))
+    )
+    return {product_id: max(int(available), 0) for product_id, available in rows}
+
+
+def place_holds(db: Session, customer_id: str, items: Iterable, ttl: timedelta = HOLD_TTL,
+                now: Optional[datetime] = None) -> dict:
+    '''
+        Holds the requested quantities (items have product_id and quantity) for the customer until now + ttl,
+        replacing the previous holds of the customer. Raises StockHoldError with every line that cannot be held.
+        The caller commits (or rolls back to release the locks).
+    '''
+    requested = _requested_quantities(items)
+    now = now or datetime.utcnow()
+    product_ids = sorted(requested)
+
+    stock = dict(
+        db.query(Product.product_id, Product.quantity)
+        .filter(Product.product_id.in_(product_ids))
+        .order_by(Product.product_id)
+        .with_for_update()
+        .all()
+    )
+    held = held_quantities(db, product_ids, exclude_customer=customer_id, now=now)
+    available = {product_id: max(quantity - held.get(product_id, 0), 0) for product_id, quantity in stock.items()}
+
+    failures = []
+    for product_id in product_ids:
+        if product_id not in available:
+            failures.append({"product_id": product_id, "requested": requested[product_id], "available": 0,
+                             "reason": "not_found"})
+        elif available[product_id] < requested[product_id]:
+            failures.append({"product_id": product_id, "requested": requested[product_id],
+                             "available": available[product_id], "reason": "insufficient_stock"})
+    if failures:
+        raise StockHoldError(failures)
+
+    expires_at = now + ttl
+    release_holds(db, customer_id)
+    if product_ids:
+        db.execute(insert(StockHold), [
+            {"customer_id": customer_id, "product_id": product_id, "quantity": requested[product_id],
+             "expires_at": expires_at, "created_at": now}
+            for product_id in product_ids
+        ])
+    return {
+        "customer_id": customer_id,
+        "expires_at": expires_at,
+        "holds": [
+            {"product_id": product_id, "quantity": requested[product_id], "available": available[product_id]}
+            for product_id in product_ids
+        ],
+    }
+
+
+def release_holds(db: Session, customer_id: str) -> int:
+    '''Deletes the holds of the customer (consumed by the checkout, or replaced); the caller commits.'''
+    return db.execute(delete(StockHold).where(StockHold.customer_id == customer_id)).rowcount
+
+
+def release_expired(db: Session, now: Optional[datetime] = None, batch: int = SWEEP_BATCH) -> int:
+    '''Deletes the expired holds, batch rows per statement and transaction. Returns the number of holds deleted.'''
+    now = now or datetime.utcnow()
+    released = 0
+    while True:
+        hold_ids = db.execute(
+            select(StockHold.hold_id).where(StockHold.expires_at <= now).limit(batch)
+        ).scalars().all()
+        if not hold_ids:
+            return released
+        released += db.execute(
+            delete(StockHold).where(StockHold.hold_id.in_(hold_ids), StockHold.expires_at <= now)
+        ).rowcount
+        db.commit()
+        if len(hold_ids) < batch:
+            return released
+
+
+class StockHoldSweeper:
+    '''Releases the expired stock holds every interval seconds.'''
+
+    def __init__(self, interval: float = SWEEP_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, session_factory) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(session_factory,), name="stock-hold-sweeper",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self, session_factory) -> None:
+        while not self._stop.is_set():
+            db = session_factory()
+            try:
+                released = release_expired(db)
+                if released:
+                    logger.info("released %d expired stock holds", released)
+            except Exception:
+                db.rollback()
+                logger.exception("stock hold sweep failed")
+            finally:
+                db.close()
+            self._stop.wait(self.interval)
+
+
+stock_hold_sweeper = StockHoldSweeper()
+
+
+def ensure_stock_holds(engine: Engine) -> None:
+    StockHold.__table__.create(bind=engine, checkfirst=True)
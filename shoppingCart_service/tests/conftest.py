@@ -3,7 +3,7 @@ from sqlalchemy.orm import sessionmaker
 import pytest
 from models.models import Product, ShoppingCart
 from sqlalchemy.orm import Session
-from models.models import ShoppingCartItem, Customer
+from models.models import ShoppingCartItem, Customer, Discount, CacheVersion, StockHold
 from models.models import Base
 
 # Replace with your database URL
@@ -24,15 +24,9 @@ def db_session():
     # Establish a connection and start a transaction
     connection = engine.connect()
     trans = connection.begin()  # Non-ORM transaction
-    session = sessionmaker(bind=connection)()
-
-    session.begin_nested()  # Start a SAVEPOINT
-
-    # Listen for the end of SAVEPOINT and reopen it
-    @event.listens_for(session, "after_transaction_end")
-    def restart_savepoint(sess, transaction):
-        if transaction.nested and not transaction._parent.nested:
-            sess.begin_nested()
+    # every commit of the session only releases a SAVEPOINT of the outer transaction (SQLAlchemy 2.0 recipe),
+    # so the services may open SAVEPOINTs of their own (begin_nested) and the test still rolls everything back
+    session = sessionmaker(bind=connection, join_transaction_mode="create_savepoint")()
 
     yield session  # Provide the session to the test
 
@@ -52,6 +46,9 @@ def setup_and_teardown_db(db_session: Session):
     db_session.query(ShoppingCart).delete()
     db_session.query(Customer).delete()
     db_session.query(ShoppingCartItem).delete()
+    db_session.query(Discount).delete()
+    db_session.query(CacheVersion).delete()
+    db_session.query(StockHold).delete()
     
 
     # Seed initial data for testing
@@ -1,6 +1,12 @@
 import pytest
+from services.cache_version import bump_cache_versions
 from sqlalchemy.orm import Session
-from models.models import ShoppingCart, ShoppingCartItem, Product, Category
+from datetime import datetime
+from models.models import ShoppingCart, ShoppingCartItem, Product, Category, Discount, CartItem
+from services.cart_service import CartService
+from services.cart_view import CartViewCache
+from services.product_cache import InProcessBackend
+import services.cart_service as cart_service
 
 
 
@@ -17,4 +23,68 @@ def test_remove_item_from_cart(db_session: Session):
     db_session.commit()
 
     cart_item = db_session.query(ShoppingCartItem).first()
-    assert cart_item is None
\ No newline at end of file
+    assert cart_item is None
+
+def test_get_priced_cart_applies_discounts_and_is_cached(db_session: Session):
+    customer_id = "84037c94-99db-11ef-9ff5-80fa5b9b4ebf"
+    product_id = "00000000-0000-0000-0000-000000000002"
+    db_session.add(Discount(
+        product_id=product_id, discount_rate=10,
+        start_date=datetime(2024, 1, 1), end_date=datetime(2099, 1, 1), is_active=1,
+    ))
+    db_session.commit()
+    cache = CartViewCache(backend=InProcessBackend(10), version_check_interval=0)
+    cart_service.cart_view_cache, original = cache, cart_service.cart_view_cache
+    try:
+        view = CartService.get_priced_cart(customer_id, db_session)
+        assert [(line["product_id"], line["quantity"]) for line in view["items"]] == [(product_id, 2)]
+        assert view["items"][0]["discounted_unit_price"] == 8.99
+        assert view["items_total"] == 19.98
+        assert view["subtotal"] == 17.98
+        assert view["discount_total"] == 2.0
+        assert view["all_in_stock"] is True
+
+        assert CartService.get_priced_cart(customer_id, db_session) == view
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # a price change elsewhere bumps the product's version
+        db_session.query(Product).filter_by(product_id=product_id).update({"price": 20})
+        bump_cache_versions(db_session, [f"product:{product_id}"])
+        db_session.commit()
+        assert CartService.get_priced_cart(customer_id, db_session)["subtotal"] == 36.0
+        assert cache.misses == 2
+    finally:
+        cart_service.cart_view_cache = original
+
+
+def test_get_priced_cart_without_cart(db_session: Session):
+    view = CartService.get_priced_cart("no-such-customer", db_session)
+    assert view["items"] == []
+    assert view["subtotal"] == 0
+
+
+def test_merge_session_cart_is_set_based_and_checks_stock(db_session: Session):
+    customer_id = "84037c94-99db-11ef-9ff5-80fa5b9b4ebf"
+    db_session.add(Product(
+        product_id="00000000-0000-0000-0000-000000000005", name="Scarce Product", model="Model-2",
+        category_id=1, serial_number="SN67890", quantity=3, price=5.00, item_sold=0,
+    ))
+    db_session.commit()
+
+    result = CartService.merge_session_cart_with_persistent_cart([
+        CartItem(product_id="00000000-0000-0000-0000-000000000002", quantity=3),
+        CartItem(product_id="00000000-0000-0000-0000-000000000005", quantity=2),
+        CartItem(product_id="missing-product", quantity=1),
+        CartItem(product_id="00000000-0000-0000-0000-000000000005", quantity=2),
+    ], customer_id, db_session)
+
+    statuses = {line["product_id"]: (line["status"], line["quantity"]) for line in result["results"]}
+    assert statuses == {
+        "00000000-0000-0000-0000-000000000002": ("merged", 5),
+        "00000000-0000-0000-0000-000000000005": ("clamped", 3),
+        "missing-product": ("rejected", None),
+    }
+    assert result["metrics"]["written"] == 2
+
+    lines = {item.product_id: item.quantity for item in db_session.query(ShoppingCartItem).filter_by(cart_id=result["cart_id"])}
+    assert lines == {"00000000-0000-0000-0000-000000000002": 5, "00000000-0000-0000-0000-000000000005": 3}
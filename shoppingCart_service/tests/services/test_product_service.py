@@ -1,6 +1,11 @@
 import pytest
+from services.cache_version import bump_cache_versions
 from sqlalchemy.orm import Session
-from models.models import Product, Category
+from datetime import datetime
+from models.models import Product, Category, Discount
+from services.product_service import ProductService
+from services.product_cache import ProductCache, InProcessBackend
+import services.product_service as product_service
 
 
 def test_get_product_by_id(db_session: Session):
@@ -16,4 +21,52 @@ def test_update_product_quantity(db_session: Session):
     db_session.commit()
 
     updated_product = db_session.query(Product).filter_by(product_id="00000000-0000-0000-0000-000000000002").first()
-    assert updated_product.quantity == 110
\ No newline at end of file
+    assert updated_product.quantity == 110
+
+def test_get_product_by_id_is_cached_until_its_version_changes(db_session: Session):
+    product_id = "00000000-0000-0000-0000-000000000002"
+    cache = ProductCache("test", backend=InProcessBackend(10), version_check_interval=0)
+    product_service.cart_product_cache, original = cache, product_service.cart_product_cache
+    try:
+        first = ProductService.get_product_by_id(product_id, db_session)
+        assert ProductService.get_product_by_id(product_id, db_session) == first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # a write elsewhere changes the stock and bumps the product's version
+        product = db_session.query(Product).filter_by(product_id=product_id).first()
+        product.quantity = 7
+        bump_cache_versions(db_session, [f"product:{product_id}"])
+        db_session.commit()
+
+        assert ProductService.get_product_by_id(product_id, db_session)["quantity"] == 7
+        assert cache.misses == 2
+    finally:
+        product_service.cart_product_cache = original
+
+
+def test_get_products_by_ids_keeps_order_and_drops_duplicates(db_session: Session):
+    db_session.add(Product(
+        product_id="00000000-0000-0000-0000-000000000005", name="Second Product", model="Model-2",
+        category_id=1, serial_number="SN67890", quantity=0, price=5.00, item_sold=0,
+    ))
+    db_session.add(Discount(
+        product_id="00000000-0000-0000-0000-000000000002", discount_rate=10,
+        start_date=datetime(2024, 1, 1), end_date=datetime(2099, 1, 1), is_active=1,
+    ))
+    db_session.commit()
+
+    result = ProductService.get_products_by_ids([
+        "00000000-0000-0000-0000-000000000005",
+        "00000000-0000-0000-0000-000000000002",
+        "missing-product",
+        "00000000-0000-0000-0000-000000000005",
+    ], db_session)
+
+    assert [product["product_id"] for product in result["products"]] == [
+        "00000000-0000-0000-0000-000000000005",
+        "00000000-0000-0000-0000-000000000002",
+    ]
+    assert result["products"][0]["in_stock"] is False
+    assert result["products"][0]["discount_rate"] == 0
+    assert result["products"][1]["discount_rate"] == 10.0
+    assert result["missing"] == ["missing-product"]
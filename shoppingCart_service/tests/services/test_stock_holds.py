@@ -0,0 +1,57 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from models.models import Product, StockHold, ShoppingCartItem
+from services.cart_service import CartService
+from services.product_service import ProductService
+from services.stock_holds import place_holds, available_to_sell, release_expired, StockHoldError
+
+CUSTOMER_ID = "84037c94-99db-11ef-9ff5-80fa5b9b4ebf"
+PRODUCT_ID = "00000000-0000-0000-0000-000000000002"
+
+
+def test_prepare_checkout_holds_the_cart(db_session: Session):
+    result = CartService.prepare_checkout(CUSTOMER_ID, db_session)
+
+    assert result["holds"] == [{"product_id": PRODUCT_ID, "quantity": 2, "available": 100}]
+    assert result["expires_at"] > datetime.utcnow()
+    # the held units are not available to the others, but are to the customer
+    assert available_to_sell(db_session, [PRODUCT_ID]) == {PRODUCT_ID: 98}
+    assert available_to_sell(db_session, [PRODUCT_ID], customer_id=CUSTOMER_ID) == {PRODUCT_ID: 100}
+    assert ProductService.get_product_inventory_status(PRODUCT_ID, db_session)["available"] == 98
+
+    # preparing again replaces the holds
+    db_session.query(ShoppingCartItem).update({"quantity": 5})
+    db_session.commit()
+    CartService.prepare_checkout(CUSTOMER_ID, db_session)
+    assert [(hold.product_id, hold.quantity) for hold in db_session.query(StockHold)] == [(PRODUCT_ID, 5)]
+
+
+def test_prepare_checkout_fails_when_the_stock_is_held(db_session: Session):
+    place_holds(db_session, "other", [{"product_id": PRODUCT_ID, "quantity": 99}])
+    db_session.commit()
+
+    with pytest.raises(HTTPException) as error:
+        CartService.prepare_checkout(CUSTOMER_ID, db_session)
+    assert error.value.status_code == 409
+    assert error.value.detail["failures"] == [
+        {"product_id": PRODUCT_ID, "requested": 2, "available": 1, "reason": "insufficient_stock"},
+    ]
+    assert db_session.query(StockHold).filter_by(customer_id=CUSTOMER_ID).count() == 0
+
+    with pytest.raises(StockHoldError):
+        place_holds(db_session, "other", [{"product_id": "missing", "quantity": 1}])
+
+
+def test_expired_holds_are_released(db_session: Session):
+    now = datetime.utcnow()
+    place_holds(db_session, "c1", [{"product_id": PRODUCT_ID, "quantity": 10}], now=now - timedelta(hours=1))
+    place_holds(db_session, "c2", [{"product_id": PRODUCT_ID, "quantity": 20}], now=now - timedelta(hours=1))
+    place_holds(db_session, "c3", [{"product_id": PRODUCT_ID, "quantity": 30}], now=now)
+    db_session.commit()
+
+    # expired holds no longer count, even before the sweep
+    assert available_to_sell(db_session, [PRODUCT_ID]) == {PRODUCT_ID: 70}
+    assert release_expired(db_session, batch=1) == 2
+    assert [hold.customer_id for hold in db_session.query(StockHold)] == ["c3"]